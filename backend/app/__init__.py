@@ -3,18 +3,21 @@ from flask import Flask, g, request
 from .api_routes import api_bp
 from .pierre_routes import pierre_bp
 from .auth import can_user_write, configure_auth, get_current_user, is_auth_exempt_path, is_viewer_write_exempt_path
+from .bcb_sync import start_bcb_sync
 from .chart_sync import start_chart_sync
 from .db import init_app as init_db_app
 from .fixed_income_sync import start_fixed_income_sync
 from .market_sync import start_market_sync
 from .notifications import notify_event
 from .observability import configure_observability
+from .serialization import configure_json
 from .upcoming_income_sync import start_upcoming_income_sync
 
 
 def create_app() -> Flask:
     app = Flask(__name__)
     configure_observability(app)
+    configure_json(app)
     init_db_app(app)
     configure_auth(app)
     app.register_blueprint(api_bp, url_prefix="/api")
@@ -23,6 +26,7 @@ def create_app() -> Flask:
     start_fixed_income_sync(app)
     start_chart_sync(app)
     start_upcoming_income_sync(app)
+    start_bcb_sync(app)
     notify_event(
         "startup",
         "Backend iniciado",
@@ -31,6 +35,7 @@ def create_app() -> Flask:
             "chart_snapshot_enabled": bool(app.config.get("CHART_SNAPSHOT_ENABLED")),
             "fixed_income_snapshot_enabled": bool(app.config.get("FIXED_INCOME_SNAPSHOT_ENABLED")),
             "upcoming_income_sync_enabled": bool(app.config.get("UPCOMING_INCOME_SYNC_ENABLED")),
+            "bcb_index_sync_enabled": bool(app.config.get("BCB_INDEX_SYNC_ENABLED")),
         },
         dedupe_key="app:startup",
         min_interval_seconds=300,
@@ -1,3 +1,4 @@
+import hashlib
 import json
 import math
 import os
@@ -5,8 +6,8 @@ import re
 import sqlite3
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from threading import Lock, Thread
-from time import monotonic
+from threading import Thread
+from time import time
 from urllib import error as urlerror
 from urllib import parse as urlparse
 from urllib import request as urlrequest
@@ -25,6 +26,7 @@ from .auth import (
     set_user_active_state,
 )
 from .db import create_database_backups, get_db, list_database_backups, resolve_database_backup_path
+from .memory_cache import MemoryCache
 from .notifications import notify_event, send_telegram_text, telegram_status_payload
 from .observability import build_health_payload, get_route_metrics
 from .services import (
@@ -44,16 +46,22 @@ from .services import (
     get_asset_price_history,
     get_asset_upcoming_incomes,
     get_asset_transactions,
+    get_assets_data_version,
     get_benchmark_comparison,
+    get_chart_series_cache_stats,
     get_fixed_income_summary,
     get_fixed_income_payload_cached,
+    get_fixed_income_value_daily_series,
     get_fixed_incomes,
     get_incomes,
     get_monthly_class_summary,
     get_monthly_ticker_summary,
     get_metric_formulas_catalog,
     get_patrimony_open_pnl_by_type_series,
+    get_portfolio_as_of_data_version,
+    get_portfolio_data_version,
     get_portfolio_snapshot,
+    get_portfolio_snapshot_as_of,
     get_portfolios,
     get_sectors_summary,
     get_top_assets,
@@ -80,6 +88,7 @@ from .services import (
     update_metric_formula,
 )
 from .services import _legacy as legacy_market
+from .single_flight import get_single_flight_stats, single_flight
 api_bp = Blueprint("api", __name__)
 _SCANNER_USER_NOTE_PATTERN = re.compile(r"^\[\[TYI_UID:(\d+)\]\]\s*")
 _SAFE_SQL_IDENT_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
@@ -110,6 +119,27 @@ def _json_ok(payload=None, status=200):
     return jsonify({"ok": True, "data": payload}), status
 
 
+def _json_ok_conditional(version, build_payload):
+    """_json_ok with a weak ETag derived from ``version``, path and query.
+
+    A matching If-None-Match answers 304 before ``build_payload`` runs, so
+    polling clients only pay for the (cheap) version lookup.
+    """
+    raw = json.dumps(
+        [request.path, sorted(request.args.items(multi=True)), version],
+        default=str,
+        separators=(",", ":"),
+    )
+    etag = hashlib.sha1(raw.encode("utf-8")).hexdigest()[:24]
+    if request.if_none_match.contains_weak(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response, _status = _json_ok(build_payload())
+    response.set_etag(etag, weak=True)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
 def _json_error(message, status=400, details=None):
     payload = {"ok": False, "error": message}
     if details is not None:
@@ -1569,12 +1599,10 @@ def _start_scanner_manual_scan(user: dict):
 
 
 # Cache em memoria (por worker) do payload de graficos: o snapshot da carteira
-# e caro e trava o worker do gunicorn. Fingerprint de transactions/incomes
-# invalida na hora apos lancamentos do usuario; mudancas so de preco ficam
-# defasadas por ate CHARTS_CORE_CACHE_TTL_SECONDS.
-_CHARTS_CORE_CACHE = {}
-_CHARTS_CORE_CACHE_LOCK = Lock()
-_CHARTS_CORE_CACHE_TTL_SECONDS = 120
+# e caro e trava o worker do gunicorn. Fingerprint de transactions/incomes e a
+# versao de dados das carteiras (data_versions) invalidam na hora apos
+# lancamentos ou precos novos; o TTL so limita quanto tempo a entrada vive.
+_CHARTS_CORE_CACHE = MemoryCache("charts_core", max_entries=64, ttl_seconds=120)
 
 
 def _charts_core_fingerprint():
@@ -1590,18 +1618,24 @@ def _charts_core_fingerprint():
     return (row["tx_max"], row["tx_count"], row["inc_max"], row["inc_count"])
 
 
-def _build_charts_core_payload_cached(portfolio_ids):
+def _build_charts_core_payload_cached(portfolio_ids, data_version=None):
     key = tuple(sorted(int(pid) for pid in (portfolio_ids or [])))
-    fingerprint = _charts_core_fingerprint()
-    now = monotonic()
-    with _CHARTS_CORE_CACHE_LOCK:
-        entry = _CHARTS_CORE_CACHE.get(key)
-        if entry and entry["fingerprint"] == fingerprint and (now - entry["at"]) < _CHARTS_CORE_CACHE_TTL_SECONDS:
-            return entry["payload"]
-    payload = _build_charts_core_payload(portfolio_ids)
-    with _CHARTS_CORE_CACHE_LOCK:
-        _CHARTS_CORE_CACHE[key] = {"payload": payload, "fingerprint": fingerprint, "at": monotonic()}
-    return payload
+    if data_version is None:
+        data_version = get_portfolio_data_version(portfolio_ids)
+    # Mesma versao do ETag: um 200 nunca leva payload anterior a ela.
+    fingerprint = (_charts_core_fingerprint(), data_version)
+    fingerprint_key = hashlib.sha1(repr(fingerprint).encode("utf-8")).hexdigest()[:16]
+    cache_key = (key, fingerprint_key)
+    cached = _CHARTS_CORE_CACHE.get(cache_key)
+    if cached is not None:
+        return cached
+
+    def _build_and_store():
+        return _CHARTS_CORE_CACHE.set(cache_key, _build_charts_core_payload(portfolio_ids))
+
+    # Requisicoes simultaneas do dashboard esperam a primeira montar o payload.
+    # O cache e por worker: outro worker nao teria o que reler, entao sem lease.
+    return single_flight(f"charts_core:{key}:{fingerprint_key}", _build_and_store, lease=False)
 
 
 def _build_charts_core_payload(portfolio_ids):
@@ -2472,7 +2506,13 @@ def admin_metric_formula_save(metric_key: str):
 
 @api_bp.route("/metrics", methods=["GET"])
 def metrics():
-    return _json_ok({"routes": get_route_metrics(current_app)})
+    return _json_ok(
+        {
+            "routes": get_route_metrics(current_app),
+            "caches": {"chart_series": get_chart_series_cache_stats()},
+            "single_flight": get_single_flight_stats(),
+        }
+    )
 
 
 @api_bp.route("/backup/database", methods=["GET", "POST"])
@@ -2525,7 +2565,8 @@ def portfolios():
 
 @api_bp.route("/assets", methods=["GET"])
 def assets():
-    return _json_ok(get_top_assets())
+    # market_data.age_seconds/is_stale andam com o relogio: bucket de 60s.
+    return _json_ok_conditional((get_assets_data_version(), int(time() // 60)), get_top_assets)
 
 
 @api_bp.route("/assets/<ticker>", methods=["GET"])
@@ -2573,13 +2614,41 @@ def asset_enrich_openclaw(ticker: str):
     )
 
 
+def _portfolio_snapshot_version(portfolio_ids):
+    # Alem dos contadores da carteira/ativos, o snapshot traz market_data
+    # (age_seconds, is_stale, is_live) calculado pelo relogio e valores em USD
+    # convertidos pelo cambio atual: o ETag tambem gira a cada minuto e com o cambio.
+    return (get_portfolio_data_version(portfolio_ids), int(time() // 60), legacy_market._get_usdbrl_rate())
+
+
 @api_bp.route("/portfolio/snapshot", methods=["GET"])
 def portfolio_snapshot():
     portfolio_ids = _selected_portfolio_ids_from_request()
+    as_of = (request.args.get("as_of") or "").strip()
+    if as_of:
+        # Carteira reconstruida no fim do dia as_of (checkpoints mensais + eventos).
+        try:
+            as_of_date = datetime.strptime(as_of, "%Y-%m-%d").date()
+        except ValueError:
+            return _json_error("Parametro as_of invalido (use AAAA-MM-DD).", status=400)
+        # Precos vem de price_closes e ativos ja vendidos nao entram no contador
+        # de ativos em carteira: o ETag inclui os ativos negociados ate as_of e
+        # a ultima sincronizacao dos fechamentos deles.
+        return _json_ok_conditional(
+            (_portfolio_snapshot_version(portfolio_ids), get_portfolio_as_of_data_version(portfolio_ids, as_of_date)),
+            lambda: get_portfolio_snapshot_as_of(
+                portfolio_ids,
+                as_of_date,
+                sort_by=request.args.get("sort_by", "value"),
+                sort_dir=request.args.get("sort_dir", "desc"),
+            ),
+        )
     sort_by = request.args.get("sort_by", "name")
     sort_dir = request.args.get("sort_dir", "asc")
-    payload = get_portfolio_snapshot(portfolio_ids, sort_by=sort_by, sort_dir=sort_dir)
-    return _json_ok(payload)
+    return _json_ok_conditional(
+        _portfolio_snapshot_version(portfolio_ids),
+        lambda: get_portfolio_snapshot(portfolio_ids, sort_by=sort_by, sort_dir=sort_dir),
+    )
 
 
 @api_bp.route("/portfolio/analysis", methods=["GET"])
@@ -2735,7 +2804,10 @@ def fixed_incomes():
         portfolio_ids = _selected_portfolio_ids_from_request()
         sort_by = request.args.get("sort_by", "date_aporte")
         sort_dir = request.args.get("sort_dir", "desc")
-        return _json_ok(get_fixed_income_payload_cached(portfolio_ids, sort_by=sort_by, sort_dir=sort_dir))
+        return _json_ok_conditional(
+            get_portfolio_data_version(portfolio_ids),
+            lambda: get_fixed_income_payload_cached(portfolio_ids, sort_by=sort_by, sort_dir=sort_dir),
+        )
 
     if request.method == "POST":
         payload = request.get_json(silent=True) or request.form.to_dict()
@@ -2815,7 +2887,11 @@ def charts_benchmark():
 @api_bp.route("/charts/core", methods=["GET"])
 def charts_core():
     portfolio_ids = _selected_portfolio_ids_from_request()
-    return _json_ok(_build_charts_core_payload_cached(portfolio_ids))
+    data_version = get_portfolio_data_version(portfolio_ids)
+    return _json_ok_conditional(
+        data_version,
+        lambda: _build_charts_core_payload_cached(portfolio_ids, data_version=data_version),
+    )
 
 
 @api_bp.route("/charts/ticker-summary", methods=["GET"])
@@ -2832,6 +2908,13 @@ def charts_variable_income_value_daily():
     return _json_ok(get_variable_income_value_daily_series(portfolio_ids, range_key=range_key))
 
 
+@api_bp.route("/charts/fixed-income-value-daily", methods=["GET"])
+def charts_fixed_income_value_daily():
+    portfolio_ids = _selected_portfolio_ids_from_request()
+    range_key = (request.args.get("range") or "90d").strip().lower()
+    return _json_ok(get_fixed_income_value_daily_series(portfolio_ids, range_key=range_key))
+
+
 @api_bp.route("/charts/patrimony-open-pnl-by-type", methods=["GET"])
 def charts_patrimony_open_pnl_by_type():
     portfolio_ids = _selected_portfolio_ids_from_request()
@@ -2844,16 +2927,24 @@ def charts_dashboard():
     portfolio_ids = _selected_portfolio_ids_from_request()
     benchmark_range = (request.args.get("range") or "12m").strip().lower()
     benchmark_scope = (request.args.get("scope") or "all").strip().lower()
-    payload = dict(_build_charts_core_payload_cached(portfolio_ids))
-    payload["monthly_ticker_summary"] = get_monthly_ticker_summary(portfolio_ids, months=8)
-    payload["benchmark_chart"] = get_benchmark_comparison(
-        portfolio_ids,
-        range_key=benchmark_range,
-        scope_key=benchmark_scope,
-    )
-    payload["benchmark_range"] = payload["benchmark_chart"].get("range_key", "12m")
-    payload["benchmark_scope"] = payload["benchmark_chart"].get("scope_key", "all")
-    return _json_ok(payload)
+    data_version = get_portfolio_data_version(portfolio_ids)
+
+    def _build_payload():
+        payload = dict(_build_charts_core_payload_cached(portfolio_ids, data_version=data_version))
+        payload["monthly_ticker_summary"] = get_monthly_ticker_summary(portfolio_ids, months=8)
+        payload["benchmark_chart"] = get_benchmark_comparison(
+            portfolio_ids,
+            range_key=benchmark_range,
+            scope_key=benchmark_scope,
+        )
+        payload["benchmark_range"] = payload["benchmark_chart"].get("range_key", "12m")
+        payload["benchmark_scope"] = payload["benchmark_chart"].get("scope_key", "all")
+        return payload
+
+    # O benchmark vem do chart_series_cache, renovado por idade (stale-while-
+    # revalidate) e nao por versao: o ETag tambem gira a cada max age.
+    max_age = max(int(current_app.config.get("CHART_SERIES_CACHE_MAX_AGE_SECONDS", 900)), 1)
+    return _json_ok_conditional((data_version, int(time() // max_age)), _build_payload)
 
 
 def _scanner_upstream_covers_ticker(upstream_scan: dict, ticker: str):
@@ -0,0 +1,96 @@
+import os
+import time
+from threading import Event, Thread
+
+from .observability import init_job_status, mark_job_finished, mark_job_started
+from .runtime_lock import should_run_background_jobs
+from .services import sync_bcb_index_series
+
+
+def _as_bool(value):
+    return str(value or "").strip().lower() in {"1", "true", "yes", "on"}
+
+
+def _run_sync_once(app):
+    with app.app_context():
+        mark_job_started(app, "bcb_index_sync")
+        try:
+            result = sync_bcb_index_series()
+            mark_job_finished(app, "bcb_index_sync", result=result)
+            app.logger.info(
+                "Series BCB sincronizadas: %s serie(s), %s observacao(oes) nova(s), falhas: %s.",
+                int(result.get("series", 0)),
+                int(result.get("observations", 0)),
+                ", ".join(str(code) for code in result.get("failed") or []) or "nenhuma",
+            )
+        except Exception as exc:
+            mark_job_finished(app, "bcb_index_sync", error=exc)
+            app.logger.exception("Falha ao sincronizar as series do BCB.")
+
+
+def _sync_loop(app, stop_event: Event):
+    interval = int(app.config.get("BCB_INDEX_SYNC_INTERVAL_SECONDS", 21600))
+    warmup = bool(app.config.get("BCB_INDEX_SYNC_WARMUP_ON_STARTUP", True))
+
+    if warmup and not stop_event.is_set():
+        app.extensions["bcb_index_sync_running"] = True
+        try:
+            _run_sync_once(app)
+            app.extensions["bcb_index_sync_last_run"] = time.time()
+        finally:
+            app.extensions["bcb_index_sync_running"] = False
+
+    while not stop_event.is_set():
+        stop_event.wait(interval)
+        if stop_event.is_set():
+            break
+        app.extensions["bcb_index_sync_running"] = True
+        try:
+            _run_sync_once(app)
+            app.extensions["bcb_index_sync_last_run"] = time.time()
+        finally:
+            app.extensions["bcb_index_sync_running"] = False
+
+
+def start_bcb_sync(app):
+    enabled_default = _as_bool(os.getenv("BCB_INDEX_SYNC_ENABLED", "1"))
+    try:
+        interval_default = max(int(os.getenv("BCB_INDEX_SYNC_INTERVAL_SECONDS", "21600")), 900)
+    except (TypeError, ValueError):
+        interval_default = 21600
+    warmup_default = _as_bool(os.getenv("BCB_INDEX_SYNC_WARMUP_ON_STARTUP", "1"))
+
+    app.config.setdefault("BCB_INDEX_SYNC_ENABLED", enabled_default)
+    app.config.setdefault("BCB_INDEX_SYNC_INTERVAL_SECONDS", interval_default)
+    app.config.setdefault("BCB_INDEX_SYNC_WARMUP_ON_STARTUP", warmup_default)
+    app.config.setdefault("BCB_INDEX_SYNC_MAX_AGE_SECONDS", interval_default * 2)
+    app.extensions.setdefault("bcb_index_sync_last_run", 0.0)
+    app.extensions.setdefault("bcb_index_sync_running", False)
+
+    should_start = app.config["BCB_INDEX_SYNC_ENABLED"] and should_run_background_jobs(app)
+    init_job_status(
+        app,
+        "bcb_index_sync",
+        interval_seconds=app.config["BCB_INDEX_SYNC_INTERVAL_SECONDS"],
+        max_age_seconds=app.config["BCB_INDEX_SYNC_MAX_AGE_SECONDS"],
+        enabled=should_start,
+        configured_enabled=app.config["BCB_INDEX_SYNC_ENABLED"],
+    )
+
+    if not should_start:
+        return
+
+    # Evita thread duplicada no processo pai do reloader do Flask.
+    if app.debug and os.environ.get("WERKZEUG_RUN_MAIN") != "true":
+        return
+
+    if app.extensions.get("bcb_index_sync_started"):
+        return
+
+    stop_event = Event()
+    worker = Thread(target=_sync_loop, args=(app, stop_event), daemon=True)
+    worker.start()
+
+    app.extensions["bcb_index_sync_started"] = True
+    app.extensions["bcb_index_sync_stop_event"] = stop_event
+    app.extensions["bcb_index_sync_thread"] = worker
@@ -4,18 +4,19 @@ from threading import Event, Thread
 
 from .observability import init_job_status, mark_job_finished, mark_job_started
 from .runtime_lock import should_run_background_jobs
-from .services import rebuild_chart_snapshots
+from .services import rebuild_dirty_chart_snapshots
 
 
 def _run_sync_once(app):
     with app.app_context():
         mark_job_started(app, "chart_snapshot")
         try:
-            result = rebuild_chart_snapshots()
+            result = rebuild_dirty_chart_snapshots()
             mark_job_finished(app, "chart_snapshot", result=result)
             app.logger.info(
-                "Snapshot de graficos atualizado: %s carteira(s).",
+                "Snapshot de graficos atualizado: %s carteira(s), %s pendente(s).",
                 int(result.get("portfolios", 0)),
+                int(result.get("pending", 0)),
             )
         except Exception as exc:
             mark_job_finished(app, "chart_snapshot", error=exc)
@@ -51,6 +52,7 @@ def start_chart_sync(app):
     app.config.setdefault("CHART_SNAPSHOT_INTERVAL_SECONDS", 300)
     app.config.setdefault("CHART_SNAPSHOT_WARMUP_ON_STARTUP", True)
     app.config.setdefault("CHART_SNAPSHOT_MAX_AGE_SECONDS", 900)
+    app.config.setdefault("CHART_SNAPSHOT_REBUILD_BATCH", 25)
     app.config.setdefault("BENCHMARK_CACHE_TTL_SECONDS", 900)
     app.config.setdefault("YAHOO_MONTHLY_CACHE_TTL_SECONDS", 21600)
     app.extensions.setdefault("chart_snapshot_last_run", 0.0)
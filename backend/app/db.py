@@ -338,6 +338,277 @@ def init_app(app):
                 app.logger.exception("Falha ao criar backup automatico do banco.")
 
 
+_POSITION_STATE_TRIGGERS = (
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_position_state_tx_insert
+    AFTER INSERT ON transactions
+    BEGIN
+      INSERT INTO position_state (portfolio_id, ticker, dirty, version)
+      VALUES (NEW.portfolio_id, NEW.ticker, 1, 1)
+      ON CONFLICT(portfolio_id, ticker) DO UPDATE SET
+        dirty = CASE
+          WHEN position_state.dirty = 2 THEN 2
+          WHEN NEW.date < COALESCE(position_state.last_tx_date, '') THEN 2
+          ELSE 1
+        END,
+        version = position_state.version + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_position_state_tx_update
+    AFTER UPDATE ON transactions
+    BEGIN
+      INSERT INTO position_state (portfolio_id, ticker, dirty, version)
+      VALUES (OLD.portfolio_id, OLD.ticker, 2, 1)
+      ON CONFLICT(portfolio_id, ticker) DO UPDATE SET
+        dirty = 2,
+        version = position_state.version + 1;
+      INSERT INTO position_state (portfolio_id, ticker, dirty, version)
+      VALUES (NEW.portfolio_id, NEW.ticker, 2, 1)
+      ON CONFLICT(portfolio_id, ticker) DO UPDATE SET
+        dirty = 2,
+        version = position_state.version + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_position_state_tx_delete
+    AFTER DELETE ON transactions
+    BEGIN
+      UPDATE position_state
+      SET dirty = 2, version = version + 1
+      WHERE portfolio_id = OLD.portfolio_id AND ticker = OLD.ticker;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_position_state_income_insert
+    AFTER INSERT ON incomes
+    BEGIN
+      INSERT INTO position_state (portfolio_id, ticker, total_incomes, version)
+      VALUES (NEW.portfolio_id, NEW.ticker, NEW.amount, 1)
+      ON CONFLICT(portfolio_id, ticker) DO UPDATE SET
+        total_incomes = position_state.total_incomes + NEW.amount,
+        version = position_state.version + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_position_state_income_update
+    AFTER UPDATE ON incomes
+    BEGIN
+      UPDATE position_state
+      SET total_incomes = total_incomes - OLD.amount, version = version + 1
+      WHERE portfolio_id = OLD.portfolio_id AND ticker = OLD.ticker;
+      INSERT INTO position_state (portfolio_id, ticker, total_incomes, version)
+      VALUES (NEW.portfolio_id, NEW.ticker, NEW.amount, 1)
+      ON CONFLICT(portfolio_id, ticker) DO UPDATE SET
+        total_incomes = position_state.total_incomes + NEW.amount,
+        version = position_state.version + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_position_state_income_delete
+    AFTER DELETE ON incomes
+    BEGIN
+      UPDATE position_state
+      SET total_incomes = total_incomes - OLD.amount, version = version + 1
+      WHERE portfolio_id = OLD.portfolio_id AND ticker = OLD.ticker;
+    END
+    """,
+)
+
+
+_DIRTY_MONTH_TRIGGERS = (
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_dirty_months_tx_insert
+    AFTER INSERT ON transactions
+    BEGIN
+      UPDATE portfolio_dirty_months
+      SET dirty_from = MIN(COALESCE(dirty_from, substr(COALESCE(NEW.date, ''), 1, 7)), substr(COALESCE(NEW.date, ''), 1, 7)), version = version + 1
+      WHERE portfolio_id = NEW.portfolio_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_dirty_months_tx_update
+    AFTER UPDATE ON transactions
+    BEGIN
+      UPDATE portfolio_dirty_months
+      SET dirty_from = MIN(COALESCE(dirty_from, substr(COALESCE(OLD.date, ''), 1, 7)), substr(COALESCE(OLD.date, ''), 1, 7)), version = version + 1
+      WHERE portfolio_id = OLD.portfolio_id;
+      UPDATE portfolio_dirty_months
+      SET dirty_from = MIN(COALESCE(dirty_from, substr(COALESCE(NEW.date, ''), 1, 7)), substr(COALESCE(NEW.date, ''), 1, 7)), version = version + 1
+      WHERE portfolio_id = NEW.portfolio_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_dirty_months_tx_delete
+    AFTER DELETE ON transactions
+    BEGIN
+      UPDATE portfolio_dirty_months
+      SET dirty_from = MIN(COALESCE(dirty_from, substr(COALESCE(OLD.date, ''), 1, 7)), substr(COALESCE(OLD.date, ''), 1, 7)), version = version + 1
+      WHERE portfolio_id = OLD.portfolio_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_dirty_months_income_insert
+    AFTER INSERT ON incomes
+    BEGIN
+      UPDATE portfolio_dirty_months
+      SET dirty_from = MIN(COALESCE(dirty_from, substr(COALESCE(NEW.date, ''), 1, 7)), substr(COALESCE(NEW.date, ''), 1, 7)), version = version + 1
+      WHERE portfolio_id = NEW.portfolio_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_dirty_months_income_update
+    AFTER UPDATE ON incomes
+    BEGIN
+      UPDATE portfolio_dirty_months
+      SET dirty_from = MIN(COALESCE(dirty_from, substr(COALESCE(OLD.date, ''), 1, 7)), substr(COALESCE(OLD.date, ''), 1, 7)), version = version + 1
+      WHERE portfolio_id = OLD.portfolio_id;
+      UPDATE portfolio_dirty_months
+      SET dirty_from = MIN(COALESCE(dirty_from, substr(COALESCE(NEW.date, ''), 1, 7)), substr(COALESCE(NEW.date, ''), 1, 7)), version = version + 1
+      WHERE portfolio_id = NEW.portfolio_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_dirty_months_income_delete
+    AFTER DELETE ON incomes
+    BEGIN
+      UPDATE portfolio_dirty_months
+      SET dirty_from = MIN(COALESCE(dirty_from, substr(COALESCE(OLD.date, ''), 1, 7)), substr(COALESCE(OLD.date, ''), 1, 7)), version = version + 1
+      WHERE portfolio_id = OLD.portfolio_id;
+    END
+    """,
+)
+
+# Indexes backing the portfolio-scoped hot paths (snapshot, monthly summaries,
+# asset detail, income listings, position replay). Applied on every startup
+# after the table migrations above; keep schema.sql in sync.
+_MANAGED_INDEXES = (
+    ("idx_transactions_portfolio_ticker_date", "transactions", "portfolio_id, ticker, date"),
+    ("idx_incomes_portfolio_date_ticker", "incomes", "portfolio_id, date, ticker"),
+    ("idx_incomes_portfolio_ticker_date", "incomes", "portfolio_id, ticker, date"),
+    ("idx_fixed_incomes_portfolio", "fixed_incomes", "portfolio_id"),
+)
+
+
+def _ensure_managed_indexes(db):
+    for name, table, columns in _MANAGED_INDEXES:
+        db.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+
+
+def _ensure_position_state_schema(db):
+    # Materialized average-cost state per (portfolio, ticker); see schema.sql.
+    existed = db.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'position_state'"
+    ).fetchone()
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS position_state (
+          portfolio_id INTEGER NOT NULL,
+          ticker TEXT NOT NULL,
+          shares REAL NOT NULL DEFAULT 0,
+          open_shares REAL NOT NULL DEFAULT 0,
+          open_cost REAL NOT NULL DEFAULT 0,
+          avg_price REAL NOT NULL DEFAULT 0,
+          total_incomes REAL NOT NULL DEFAULT 0,
+          last_tx_date TEXT,
+          last_tx_id INTEGER,
+          dirty INTEGER NOT NULL DEFAULT 0,
+          version INTEGER NOT NULL DEFAULT 0,
+          updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+          PRIMARY KEY (portfolio_id, ticker)
+        )
+        """
+    )
+    if not existed:
+        # Backfill: every known position starts flagged for a full replay, which
+        # refresh_position_state settles lazily on the first snapshot read.
+        db.execute(
+            """
+            INSERT OR IGNORE INTO position_state (portfolio_id, ticker, dirty)
+            SELECT DISTINCT portfolio_id, ticker, 2 FROM transactions
+            WHERE portfolio_id IS NOT NULL
+            UNION
+            SELECT DISTINCT portfolio_id, ticker, 2 FROM incomes
+            WHERE portfolio_id IS NOT NULL
+            """
+        )
+    for statement in _POSITION_STATE_TRIGGERS:
+        db.execute(statement)
+    db.execute(
+        """
+        DELETE FROM position_state
+        WHERE portfolio_id NOT IN (SELECT id FROM portfolios)
+        """
+    )
+
+
+def _ensure_dirty_months_schema(db):
+    # Month watermarks of the monthly flows and position checkpoints; see
+    # schema.sql. The per-table state tables they replace are dropped: a
+    # missing watermark row means a full rebuild on the first read.
+    for target in ("monthly_flows", "position_checkpoints"):
+        for suffix in ("tx_insert", "tx_update", "tx_delete", "income_insert", "income_update", "income_delete"):
+            db.execute(f"DROP TRIGGER IF EXISTS trg_{target}_{suffix}")
+    db.execute("DROP TABLE IF EXISTS portfolio_monthly_flows_state")
+    db.execute("DROP TABLE IF EXISTS position_checkpoint_state")
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS portfolio_dirty_months (
+          portfolio_id INTEGER NOT NULL,
+          target TEXT NOT NULL,
+          dirty_from TEXT,
+          version INTEGER NOT NULL DEFAULT 0,
+          updated_at TEXT,
+          PRIMARY KEY (portfolio_id, target)
+        ) WITHOUT ROWID
+        """
+    )
+    for statement in _DIRTY_MONTH_TRIGGERS:
+        db.execute(statement)
+    db.execute("DELETE FROM portfolio_dirty_months WHERE portfolio_id NOT IN (SELECT id FROM portfolios)")
+
+
+def _ensure_monthly_flows_schema(db):
+    # Monthly flow aggregates behind the monthly summaries; see schema.sql.
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS portfolio_monthly_flows (
+          portfolio_id INTEGER NOT NULL,
+          month_key TEXT NOT NULL,
+          ticker TEXT NOT NULL,
+          buy_amount REAL NOT NULL DEFAULT 0,
+          buy_count INTEGER NOT NULL DEFAULT 0,
+          income_amount REAL NOT NULL DEFAULT 0,
+          income_count INTEGER NOT NULL DEFAULT 0,
+          tx_count INTEGER NOT NULL DEFAULT 0,
+          PRIMARY KEY (portfolio_id, month_key, ticker)
+        ) WITHOUT ROWID
+        """
+    )
+    db.execute("DELETE FROM portfolio_monthly_flows WHERE portfolio_id NOT IN (SELECT id FROM portfolios)")
+
+
+def _ensure_position_checkpoint_schema(db):
+    # Monthly position checkpoints (point-in-time snapshots); see schema.sql.
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS position_checkpoints (
+          portfolio_id INTEGER NOT NULL,
+          month_key TEXT NOT NULL,
+          ticker TEXT NOT NULL,
+          shares REAL NOT NULL DEFAULT 0,
+          open_shares REAL NOT NULL DEFAULT 0,
+          open_cost REAL NOT NULL DEFAULT 0,
+          bought REAL NOT NULL DEFAULT 0,
+          sold REAL NOT NULL DEFAULT 0,
+          incomes REAL NOT NULL DEFAULT 0,
+          PRIMARY KEY (portfolio_id, month_key, ticker)
+        ) WITHOUT ROWID
+        """
+    )
+    db.execute("DELETE FROM position_checkpoints WHERE portfolio_id NOT IN (SELECT id FROM portfolios)")
+
+
 def ensure_schema_upgrades():
     db = get_db()
     db.execute(
@@ -527,6 +798,11 @@ def ensure_schema_upgrades():
         db.execute("ALTER TABLE incomes ADD COLUMN portfolio_id INTEGER")
     db.execute("UPDATE incomes SET portfolio_id = 1 WHERE portfolio_id IS NULL")
 
+    _ensure_position_state_schema(db)
+    _ensure_dirty_months_schema(db)
+    _ensure_monthly_flows_schema(db)
+    _ensure_position_checkpoint_schema(db)
+
     asset_cols = [row["name"] for row in db.execute("PRAGMA table_info(assets)").fetchall()]
     if "variation_7d" not in asset_cols:
         db.execute("ALTER TABLE assets ADD COLUMN variation_7d REAL NOT NULL DEFAULT 0")
@@ -960,21 +1236,14 @@ def ensure_schema_upgrades():
         """
     )
 
+    # The monthly class/ticker summaries are read from portfolio_monthly_flows;
+    # the chart snapshot keeps only when each portfolio was last rebuilt.
+    db.execute("DROP TABLE IF EXISTS chart_snapshot_monthly_class")
+    db.execute("DROP TABLE IF EXISTS chart_snapshot_monthly_ticker")
     db.execute(
         """
-        CREATE TABLE IF NOT EXISTS chart_snapshot_monthly_class (
-          portfolio_id INTEGER PRIMARY KEY,
-          payload_json TEXT NOT NULL,
-          updated_at TEXT NOT NULL,
-          FOREIGN KEY (portfolio_id) REFERENCES portfolios (id)
-        )
-        """
-    )
-    db.execute(
-        """
-        CREATE TABLE IF NOT EXISTS chart_snapshot_monthly_ticker (
+        CREATE TABLE IF NOT EXISTS chart_snapshot_state (
           portfolio_id INTEGER PRIMARY KEY,
-          payload_json TEXT NOT NULL,
           updated_at TEXT NOT NULL,
           FOREIGN KEY (portfolio_id) REFERENCES portfolios (id)
         )
@@ -992,6 +1261,73 @@ def ensure_schema_upgrades():
         )
         """
     )
+    # Dependency tags for chart_series_cache (portfolio ids + market sources).
+    # Entries cached before the tags existed cannot be invalidated selectively,
+    # so they are dropped and rewarmed.
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS chart_series_cache_deps (
+          dependency TEXT NOT NULL,
+          cache_key TEXT NOT NULL,
+          PRIMARY KEY (dependency, cache_key)
+        ) WITHOUT ROWID
+        """
+    )
+    db.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_chart_series_cache_deps_key
+        ON chart_series_cache_deps (cache_key)
+        """
+    )
+    db.execute(
+        """
+        DELETE FROM chart_series_cache
+        WHERE cache_key NOT IN (SELECT cache_key FROM chart_series_cache_deps)
+        """
+    )
+    # Dirty-portfolio queue drained by the chart / fixed-income snapshot loops.
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS snapshot_rebuild_queue (
+          portfolio_id INTEGER NOT NULL,
+          target TEXT NOT NULL,
+          priority INTEGER NOT NULL DEFAULT 0,
+          reason TEXT NOT NULL DEFAULT '',
+          enqueued_at TEXT NOT NULL,
+          version INTEGER NOT NULL DEFAULT 1,
+          PRIMARY KEY (portfolio_id, target)
+        ) WITHOUT ROWID
+        """
+    )
+    db.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_snapshot_rebuild_queue_order
+        ON snapshot_rebuild_queue (target, priority DESC, enqueued_at)
+        """
+    )
+    # Short leases used by app/single_flight.py to coalesce cache misses
+    # across gunicorn workers.
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS single_flight_leases (
+          lease_key TEXT PRIMARY KEY,
+          owner TEXT NOT NULL,
+          expires_at REAL NOT NULL
+        ) WITHOUT ROWID
+        """
+    )
+    # Version counters behind the ETags of the polled GET endpoints.
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS data_versions (
+          scope TEXT NOT NULL,
+          item_key TEXT NOT NULL,
+          version INTEGER NOT NULL DEFAULT 0,
+          updated_at TEXT NOT NULL,
+          PRIMARY KEY (scope, item_key)
+        ) WITHOUT ROWID
+        """
+    )
     # Last-good cache of BCB/SGS index observations, so a transient BCB outage
     # does not break fixed-income projections tied to CDI/IPCA.
     db.execute(
@@ -1007,13 +1343,54 @@ def ensure_schema_upgrades():
     )
     db.execute(
         """
-        DELETE FROM chart_snapshot_monthly_class
-        WHERE portfolio_id NOT IN (SELECT id FROM portfolios)
+        CREATE TABLE IF NOT EXISTS bcb_series_sync (
+          series_code INTEGER PRIMARY KEY,
+          covered_from TEXT NOT NULL,
+          synced_at TEXT NOT NULL
+        )
+        """
+    )
+    # Cumulative CDI/IPCA factors per multiplier (see _bcb_index_factor_table).
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS bcb_index_factors (
+          series_code INTEGER NOT NULL,
+          multiplier REAL NOT NULL,
+          obs_date TEXT NOT NULL,
+          value REAL NOT NULL,
+          cum_log_factor REAL NOT NULL,
+          PRIMARY KEY (series_code, multiplier, obs_date)
+        ) WITHOUT ROWID
+        """
+    )
+    # Shared daily close store for chart computations (see _price_closes_map).
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS price_closes (
+          symbol TEXT NOT NULL,
+          interval TEXT NOT NULL,
+          date TEXT NOT NULL,
+          close REAL NOT NULL,
+          PRIMARY KEY (symbol, interval, date)
+        ) WITHOUT ROWID
+        """
+    )
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS price_close_sync (
+          symbol TEXT NOT NULL,
+          interval TEXT NOT NULL,
+          covered_from TEXT NOT NULL,
+          synced_at TEXT NOT NULL,
+          PRIMARY KEY (symbol, interval)
+        )
         """
     )
+    # fixed_incomes may have been recreated above, which drops its indexes.
+    _ensure_managed_indexes(db)
     db.execute(
         """
-        DELETE FROM chart_snapshot_monthly_ticker
+        DELETE FROM chart_snapshot_state
         WHERE portfolio_id NOT IN (SELECT id FROM portfolios)
         """
     )
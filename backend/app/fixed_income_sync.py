@@ -4,19 +4,19 @@ from threading import Event, Thread
 
 from .observability import init_job_status, mark_job_finished, mark_job_started
 from .runtime_lock import should_run_background_jobs
-from .services import rebuild_fixed_income_snapshots
+from .services import rebuild_dirty_fixed_income_snapshots
 
 
 def _run_sync_once(app):
     with app.app_context():
         mark_job_started(app, "fixed_income_snapshot")
         try:
-            result = rebuild_fixed_income_snapshots()
+            result = rebuild_dirty_fixed_income_snapshots()
             mark_job_finished(app, "fixed_income_snapshot", result=result)
             app.logger.info(
-                "Snapshot renda fixa atualizado: %s carteira(s), %s item(ns).",
+                "Snapshot renda fixa atualizado: %s carteira(s), %s pendente(s).",
                 int(result.get("portfolios", 0)),
-                int(result.get("items", 0)),
+                int(result.get("pending", 0)),
             )
         except Exception as exc:
             mark_job_finished(app, "fixed_income_snapshot", error=exc)
@@ -52,6 +52,7 @@ def start_fixed_income_sync(app):
     app.config.setdefault("FIXED_INCOME_SNAPSHOT_INTERVAL_SECONDS", 300)
     app.config.setdefault("FIXED_INCOME_SNAPSHOT_WARMUP_ON_STARTUP", True)
     app.config.setdefault("FIXED_INCOME_SNAPSHOT_MAX_AGE_SECONDS", 900)
+    app.config.setdefault("FIXED_INCOME_SNAPSHOT_REBUILD_BATCH", 25)
     app.extensions.setdefault("fixed_income_snapshot_last_run", 0.0)
     app.extensions.setdefault("fixed_income_snapshot_running", False)
     should_start = app.config["FIXED_INCOME_SNAPSHOT_ENABLED"] and should_run_background_jobs(app)
@@ -0,0 +1,109 @@
+import threading
+import time
+from collections import OrderedDict
+
+from .single_flight import single_flight
+
+# Per-worker in-memory caches. Every cache is bounded (TTL + LRU on
+# max_entries), thread-safe and counts hits/misses/evictions; the counters of
+# all instances are reported by build_health_payload via get_memory_cache_stats.
+
+_MISSING = object()
+_REGISTRY = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+class MemoryCache:
+    """TTL + LRU cache. An expired entry is a miss for ``get`` but stays
+    readable through ``get_stale`` until the cache goes over max_entries, when
+    expired entries are dropped before any LRU eviction."""
+
+    def __init__(self, name: str, max_entries: int = 256, ttl_seconds: float = 300.0):
+        self.name = name
+        self.max_entries = max(int(max_entries), 1)
+        self.ttl_seconds = float(ttl_seconds)
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self._stats = {"hits": 0, "misses": 0, "sets": 0, "evictions": 0, "expirations": 0}
+        with _REGISTRY_LOCK:
+            _REGISTRY[name] = self
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                self._stats["misses"] += 1
+                return default
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[1]
+
+    def get_stale(self, key, default=None):
+        """Last stored value even if expired (fallback when a refresh fails)."""
+        with self._lock:
+            entry = self._entries.get(key)
+        return default if entry is None else entry[1]
+
+    def set(self, key, value, ttl_seconds=None):
+        ttl = self.ttl_seconds if ttl_seconds is None else float(ttl_seconds)
+        now = time.monotonic()
+        with self._lock:
+            self._entries[key] = (now + ttl, value)
+            self._entries.move_to_end(key)
+            self._stats["sets"] += 1
+            if len(self._entries) > self.max_entries:
+                self._drop_expired(now)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+        return value
+
+    def get_or_set(self, key, compute_fn, ttl_seconds=None, should_cache=None):
+        """Cached value or ``compute_fn()``; concurrent misses of the same key
+        in this process wait for a single compute."""
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        def _compute_and_store():
+            computed = compute_fn()
+            if should_cache is None or should_cache(computed):
+                self.set(key, computed, ttl_seconds)
+            return computed
+
+        return single_flight(f"memory_cache:{self.name}:{key!r}", _compute_and_store, lease=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _drop_expired(self, now):
+        expired = [key for key, entry in self._entries.items() if entry[0] <= now]
+        for key in expired:
+            del self._entries[key]
+        self._stats["expirations"] += len(expired)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        stats["max_entries"] = self.max_entries
+        stats["ttl_seconds"] = self.ttl_seconds
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else None
+        return stats
+
+
+def get_memory_cache_stats():
+    with _REGISTRY_LOCK:
+        caches = sorted(_REGISTRY.items())
+    return {name: cache.stats() for name, cache in caches}
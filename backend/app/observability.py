@@ -10,6 +10,7 @@ from flask import current_app, g, has_app_context, has_request_context, request
 from werkzeug.exceptions import HTTPException
 
 from .db import get_db, list_database_backups
+from .memory_cache import get_memory_cache_stats
 from .notifications import notify_event, telegram_status_payload
 
 
@@ -489,7 +490,7 @@ def get_provider_usage_statuses():
         return []
 
     statuses = []
-    for provider in ("brapi", "coingecko"):
+    for provider in ("brapi", "coingecko", "twelve_data", "alpha_vantage"):
         try:
             status = legacy_market._provider_usage_status(provider)
         except Exception:
@@ -554,6 +555,7 @@ def build_health_payload():
         "metrics": {
             "routes_tracked": len(current_app.extensions.get("route_metrics", {})),
         },
+        "caches": get_memory_cache_stats(),
     }
 
 
@@ -253,6 +253,9 @@ CREATE TABLE IF NOT EXISTS transactions (
   FOREIGN KEY (ticker) REFERENCES assets (ticker)
 );
 
+CREATE INDEX IF NOT EXISTS idx_transactions_portfolio_ticker_date
+ON transactions (portfolio_id, ticker, date);
+
 CREATE TABLE IF NOT EXISTS incomes (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
   portfolio_id INTEGER NOT NULL,
@@ -264,6 +267,201 @@ CREATE TABLE IF NOT EXISTS incomes (
   FOREIGN KEY (ticker) REFERENCES assets (ticker)
 );
 
+CREATE INDEX IF NOT EXISTS idx_incomes_portfolio_date_ticker
+ON incomes (portfolio_id, date, ticker);
+
+CREATE INDEX IF NOT EXISTS idx_incomes_portfolio_ticker_date
+ON incomes (portfolio_id, ticker, date);
+
+-- Materialized average-cost state per (portfolio, ticker), so the portfolio
+-- snapshot is one indexed read instead of a full transaction replay. Amounts
+-- stay in the asset's native currency (USD for US stocks). Triggers flag rows
+-- as dirty (1 = only appended transactions pending, 2 = full replay needed)
+-- and keep total_incomes up to date; refresh_position_state settles them.
+CREATE TABLE IF NOT EXISTS position_state (
+  portfolio_id INTEGER NOT NULL,
+  ticker TEXT NOT NULL,
+  shares REAL NOT NULL DEFAULT 0,
+  open_shares REAL NOT NULL DEFAULT 0,
+  open_cost REAL NOT NULL DEFAULT 0,
+  avg_price REAL NOT NULL DEFAULT 0,
+  total_incomes REAL NOT NULL DEFAULT 0,
+  last_tx_date TEXT,
+  last_tx_id INTEGER,
+  dirty INTEGER NOT NULL DEFAULT 0,
+  version INTEGER NOT NULL DEFAULT 0,
+  updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (portfolio_id, ticker)
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_position_state_tx_insert
+AFTER INSERT ON transactions
+BEGIN
+  INSERT INTO position_state (portfolio_id, ticker, dirty, version)
+  VALUES (NEW.portfolio_id, NEW.ticker, 1, 1)
+  ON CONFLICT(portfolio_id, ticker) DO UPDATE SET
+    dirty = CASE
+      WHEN position_state.dirty = 2 THEN 2
+      WHEN NEW.date < COALESCE(position_state.last_tx_date, '') THEN 2
+      ELSE 1
+    END,
+    version = position_state.version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_position_state_tx_update
+AFTER UPDATE ON transactions
+BEGIN
+  INSERT INTO position_state (portfolio_id, ticker, dirty, version)
+  VALUES (OLD.portfolio_id, OLD.ticker, 2, 1)
+  ON CONFLICT(portfolio_id, ticker) DO UPDATE SET
+    dirty = 2,
+    version = position_state.version + 1;
+  INSERT INTO position_state (portfolio_id, ticker, dirty, version)
+  VALUES (NEW.portfolio_id, NEW.ticker, 2, 1)
+  ON CONFLICT(portfolio_id, ticker) DO UPDATE SET
+    dirty = 2,
+    version = position_state.version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_position_state_tx_delete
+AFTER DELETE ON transactions
+BEGIN
+  UPDATE position_state
+  SET dirty = 2, version = version + 1
+  WHERE portfolio_id = OLD.portfolio_id AND ticker = OLD.ticker;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_position_state_income_insert
+AFTER INSERT ON incomes
+BEGIN
+  INSERT INTO position_state (portfolio_id, ticker, total_incomes, version)
+  VALUES (NEW.portfolio_id, NEW.ticker, NEW.amount, 1)
+  ON CONFLICT(portfolio_id, ticker) DO UPDATE SET
+    total_incomes = position_state.total_incomes + NEW.amount,
+    version = position_state.version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_position_state_income_update
+AFTER UPDATE ON incomes
+BEGIN
+  UPDATE position_state
+  SET total_incomes = total_incomes - OLD.amount, version = version + 1
+  WHERE portfolio_id = OLD.portfolio_id AND ticker = OLD.ticker;
+  INSERT INTO position_state (portfolio_id, ticker, total_incomes, version)
+  VALUES (NEW.portfolio_id, NEW.ticker, NEW.amount, 1)
+  ON CONFLICT(portfolio_id, ticker) DO UPDATE SET
+    total_incomes = position_state.total_incomes + NEW.amount,
+    version = position_state.version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_position_state_income_delete
+AFTER DELETE ON incomes
+BEGIN
+  UPDATE position_state
+  SET total_incomes = total_incomes - OLD.amount, version = version + 1
+  WHERE portfolio_id = OLD.portfolio_id AND ticker = OLD.ticker;
+END;
+
+-- Month watermark of the per-month tables derived from transactions/incomes,
+-- one row per (portfolio, target): target is 'monthly_flows' or
+-- 'position_checkpoints'. Triggers lower dirty_from to the earliest month
+-- touched by a change (NULL = in sync, '' or no row = full rebuild) and bump
+-- version; a refresh clears dirty_from only if version did not move meanwhile.
+CREATE TABLE IF NOT EXISTS portfolio_dirty_months (
+  portfolio_id INTEGER NOT NULL,
+  target TEXT NOT NULL,
+  dirty_from TEXT,
+  version INTEGER NOT NULL DEFAULT 0,
+  updated_at TEXT,
+  PRIMARY KEY (portfolio_id, target)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS trg_dirty_months_tx_insert
+AFTER INSERT ON transactions
+BEGIN
+  UPDATE portfolio_dirty_months
+  SET dirty_from = MIN(COALESCE(dirty_from, substr(COALESCE(NEW.date, ''), 1, 7)), substr(COALESCE(NEW.date, ''), 1, 7)), version = version + 1
+  WHERE portfolio_id = NEW.portfolio_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_dirty_months_tx_update
+AFTER UPDATE ON transactions
+BEGIN
+  UPDATE portfolio_dirty_months
+  SET dirty_from = MIN(COALESCE(dirty_from, substr(COALESCE(OLD.date, ''), 1, 7)), substr(COALESCE(OLD.date, ''), 1, 7)), version = version + 1
+  WHERE portfolio_id = OLD.portfolio_id;
+  UPDATE portfolio_dirty_months
+  SET dirty_from = MIN(COALESCE(dirty_from, substr(COALESCE(NEW.date, ''), 1, 7)), substr(COALESCE(NEW.date, ''), 1, 7)), version = version + 1
+  WHERE portfolio_id = NEW.portfolio_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_dirty_months_tx_delete
+AFTER DELETE ON transactions
+BEGIN
+  UPDATE portfolio_dirty_months
+  SET dirty_from = MIN(COALESCE(dirty_from, substr(COALESCE(OLD.date, ''), 1, 7)), substr(COALESCE(OLD.date, ''), 1, 7)), version = version + 1
+  WHERE portfolio_id = OLD.portfolio_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_dirty_months_income_insert
+AFTER INSERT ON incomes
+BEGIN
+  UPDATE portfolio_dirty_months
+  SET dirty_from = MIN(COALESCE(dirty_from, substr(COALESCE(NEW.date, ''), 1, 7)), substr(COALESCE(NEW.date, ''), 1, 7)), version = version + 1
+  WHERE portfolio_id = NEW.portfolio_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_dirty_months_income_update
+AFTER UPDATE ON incomes
+BEGIN
+  UPDATE portfolio_dirty_months
+  SET dirty_from = MIN(COALESCE(dirty_from, substr(COALESCE(OLD.date, ''), 1, 7)), substr(COALESCE(OLD.date, ''), 1, 7)), version = version + 1
+  WHERE portfolio_id = OLD.portfolio_id;
+  UPDATE portfolio_dirty_months
+  SET dirty_from = MIN(COALESCE(dirty_from, substr(COALESCE(NEW.date, ''), 1, 7)), substr(COALESCE(NEW.date, ''), 1, 7)), version = version + 1
+  WHERE portfolio_id = NEW.portfolio_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_dirty_months_income_delete
+AFTER DELETE ON incomes
+BEGIN
+  UPDATE portfolio_dirty_months
+  SET dirty_from = MIN(COALESCE(dirty_from, substr(COALESCE(OLD.date, ''), 1, 7)), substr(COALESCE(OLD.date, ''), 1, 7)), version = version + 1
+  WHERE portfolio_id = OLD.portfolio_id;
+END;
+
+-- Per-(portfolio, month YYYY-MM, ticker) sums behind the monthly class and
+-- ticker summaries, in the asset's native currency; _refresh_monthly_flows
+-- recomputes only the months from its portfolio_dirty_months watermark on.
+CREATE TABLE IF NOT EXISTS portfolio_monthly_flows (
+  portfolio_id INTEGER NOT NULL,
+  month_key TEXT NOT NULL,
+  ticker TEXT NOT NULL,
+  buy_amount REAL NOT NULL DEFAULT 0,
+  buy_count INTEGER NOT NULL DEFAULT 0,
+  income_amount REAL NOT NULL DEFAULT 0,
+  income_count INTEGER NOT NULL DEFAULT 0,
+  tx_count INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (portfolio_id, month_key, ticker)
+) WITHOUT ROWID;
+
+-- Average-cost state of every ticker at the end of each month, from the first
+-- to the last event month of the portfolio (native currency; bought/sold/
+-- incomes are cumulative). A position on any date is the last checkpoint
+-- before it plus the events since. Watermarked like the monthly flows.
+CREATE TABLE IF NOT EXISTS position_checkpoints (
+  portfolio_id INTEGER NOT NULL,
+  month_key TEXT NOT NULL,
+  ticker TEXT NOT NULL,
+  shares REAL NOT NULL DEFAULT 0,
+  open_shares REAL NOT NULL DEFAULT 0,
+  open_cost REAL NOT NULL DEFAULT 0,
+  bought REAL NOT NULL DEFAULT 0,
+  sold REAL NOT NULL DEFAULT 0,
+  incomes REAL NOT NULL DEFAULT 0,
+  PRIMARY KEY (portfolio_id, month_key, ticker)
+) WITHOUT ROWID;
+
 CREATE TABLE IF NOT EXISTS fixed_incomes (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
   portfolio_id INTEGER NOT NULL,
@@ -283,6 +481,9 @@ CREATE TABLE IF NOT EXISTS fixed_incomes (
   FOREIGN KEY (portfolio_id) REFERENCES portfolios (id)
 );
 
+CREATE INDEX IF NOT EXISTS idx_fixed_incomes_portfolio
+ON fixed_incomes (portfolio_id);
+
 CREATE TABLE IF NOT EXISTS fixed_income_snapshot_items (
   portfolio_id INTEGER NOT NULL,
   fixed_income_id INTEGER NOT NULL,
@@ -300,16 +501,10 @@ CREATE TABLE IF NOT EXISTS fixed_income_snapshot_summary (
   FOREIGN KEY (portfolio_id) REFERENCES portfolios (id)
 );
 
-CREATE TABLE IF NOT EXISTS chart_snapshot_monthly_class (
-  portfolio_id INTEGER PRIMARY KEY,
-  payload_json TEXT NOT NULL,
-  updated_at TEXT NOT NULL,
-  FOREIGN KEY (portfolio_id) REFERENCES portfolios (id)
-);
-
-CREATE TABLE IF NOT EXISTS chart_snapshot_monthly_ticker (
+-- When rebuild_chart_snapshots last settled a portfolio (flows, checkpoints,
+-- warmed series); the rebuild loop re-queues portfolios missing a row for today.
+CREATE TABLE IF NOT EXISTS chart_snapshot_state (
   portfolio_id INTEGER PRIMARY KEY,
-  payload_json TEXT NOT NULL,
   updated_at TEXT NOT NULL,
   FOREIGN KEY (portfolio_id) REFERENCES portfolios (id)
 );
@@ -323,6 +518,51 @@ CREATE TABLE IF NOT EXISTS chart_series_cache (
   updated_at TEXT NOT NULL
 );
 
+-- What each chart_series_cache entry was built from ("portfolio:<id>",
+-- "market:<source>"), so invalidation drops only the dependent entries.
+CREATE TABLE IF NOT EXISTS chart_series_cache_deps (
+  dependency TEXT NOT NULL,
+  cache_key TEXT NOT NULL,
+  PRIMARY KEY (dependency, cache_key)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_chart_series_cache_deps_key
+ON chart_series_cache_deps (cache_key);
+
+-- Portfolios whose chart / fixed-income snapshots must be rebuilt by the
+-- background loops (target = 'chart' | 'fixed_income'). version is bumped on
+-- every re-queue so a rebuild only dequeues the rows it actually covered.
+CREATE TABLE IF NOT EXISTS snapshot_rebuild_queue (
+  portfolio_id INTEGER NOT NULL,
+  target TEXT NOT NULL,
+  priority INTEGER NOT NULL DEFAULT 0,
+  reason TEXT NOT NULL DEFAULT '',
+  enqueued_at TEXT NOT NULL,
+  version INTEGER NOT NULL DEFAULT 1,
+  PRIMARY KEY (portfolio_id, target)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_snapshot_rebuild_queue_order
+ON snapshot_rebuild_queue (target, priority DESC, enqueued_at);
+
+-- Cross-worker single-flight leases (app/single_flight.py): the worker
+-- computing a missed cache key holds the row until it is done.
+CREATE TABLE IF NOT EXISTS single_flight_leases (
+  lease_key TEXT PRIMARY KEY,
+  owner TEXT NOT NULL,
+  expires_at REAL NOT NULL
+) WITHOUT ROWID;
+
+-- Monotonic data versions used for ETags (scope = 'portfolio' | 'asset').
+-- Bumped by portfolio mutations, snapshot rebuilds and market-data writes.
+CREATE TABLE IF NOT EXISTS data_versions (
+  scope TEXT NOT NULL,
+  item_key TEXT NOT NULL,
+  version INTEGER NOT NULL DEFAULT 0,
+  updated_at TEXT NOT NULL,
+  PRIMARY KEY (scope, item_key)
+) WITHOUT ROWID;
+
 -- Last-good cache of BCB/SGS index observations (CDI=11, IPCA=433, ...), one
 -- row per (series, day), so a transient BCB 502 falls back to stored data
 -- instead of a broken projection.
@@ -333,3 +573,44 @@ CREATE TABLE IF NOT EXISTS bcb_series_observations (
   updated_at TEXT NOT NULL,
   PRIMARY KEY (series_code, obs_date)
 );
+
+-- bcb_series_sync records the contiguous window kept in
+-- bcb_series_observations (from covered_from to the last sync), so only days
+-- after the last stored observation are fetched again.
+CREATE TABLE IF NOT EXISTS bcb_series_sync (
+  series_code INTEGER PRIMARY KEY,
+  covered_from TEXT NOT NULL,
+  synced_at TEXT NOT NULL
+);
+
+-- Prefix log-sums of (1 + value/100 * multiplier) per series and multiplier
+-- (rate_cdi/100, rate_ipca/100): the compound factor between two days is
+-- exp(cum[end] - cum[start-1]). Derived from bcb_series_observations; rows
+-- from a revised day on are deleted and rebuilt on the next lookup.
+CREATE TABLE IF NOT EXISTS bcb_index_factors (
+  series_code INTEGER NOT NULL,
+  multiplier REAL NOT NULL,
+  obs_date TEXT NOT NULL,
+  value REAL NOT NULL,
+  cum_log_factor REAL NOT NULL,
+  PRIMARY KEY (series_code, multiplier, obs_date)
+) WITHOUT ROWID;
+
+-- Daily closes shared by every worker for chart/benchmark computations. Synced
+-- incrementally: price_close_sync records which window is covered and when
+-- it was last refreshed, so only bars after the last stored date are fetched.
+CREATE TABLE IF NOT EXISTS price_closes (
+  symbol TEXT NOT NULL,
+  interval TEXT NOT NULL,
+  date TEXT NOT NULL,
+  close REAL NOT NULL,
+  PRIMARY KEY (symbol, interval, date)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS price_close_sync (
+  symbol TEXT NOT NULL,
+  interval TEXT NOT NULL,
+  covered_from TEXT NOT NULL,
+  synced_at TEXT NOT NULL,
+  PRIMARY KEY (symbol, interval)
+);
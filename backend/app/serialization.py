@@ -0,0 +1,133 @@
+import gzip
+import json
+import zlib
+
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+# JSON (de)serialization for API responses and cached payloads. orjson is used
+# when installed (several times faster on the dashboard payloads); otherwise
+# everything falls back to the stdlib json module with the same output shape.
+
+_COMPRESSIBLE_MIMETYPES = {"application/json"}
+_PAYLOAD_COMPRESS_MIN_BYTES = 512
+
+
+def _json_default(value):
+    return DefaultJSONProvider.default(value)
+
+
+def dumps_bytes(payload, sort_keys: bool = False) -> bytes:
+    """Compact UTF-8 JSON. NaN/Infinity become null with orjson."""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_PASSTHROUGH_DATETIME
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(payload, default=_json_default, option=option)
+    return json.dumps(
+        payload,
+        ensure_ascii=False,
+        separators=(",", ":"),
+        sort_keys=sort_keys,
+        default=_json_default,
+    ).encode("utf-8")
+
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = bytes(data).decode("utf-8")
+    return json.loads(data)
+
+
+def pack_payload(payload):
+    """Value for a ``payload_json`` column: JSON text for small payloads,
+    zlib-compressed JSON (stored as BLOB) from _PAYLOAD_COMPRESS_MIN_BYTES on."""
+    raw = dumps_bytes(payload)
+    if len(raw) < _PAYLOAD_COMPRESS_MIN_BYTES:
+        return raw.decode("utf-8")
+    return zlib.compress(raw, 6)
+
+
+def unpack_payload(value, default=None):
+    """Inverse of pack_payload; also reads rows written as plain JSON text."""
+    if value is None or value == "" or value == b"":
+        return default
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        try:
+            value = zlib.decompress(bytes(value))
+        except zlib.error as exc:
+            raise ValueError(f"payload comprimido invalido: {exc}") from exc
+    return loads(value)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson when available.
+
+    Calls with extra json.dumps arguments (indent, separators from the session
+    serializer, ...) keep going through the stdlib implementation.
+    """
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return dumps_bytes(obj, sort_keys=self.sort_keys).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None or self.compact is False or (self.compact is None and self._app.debug):
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj, sort_keys=self.sort_keys) + b"\n", mimetype=self.mimetype)
+
+
+def _negotiated_encoding():
+    accepted = request.accept_encodings
+    for encoding in ("gzip", "deflate"):
+        if accepted[encoding] > 0:
+            return encoding
+    return None
+
+
+def configure_json(app):
+    """orjson provider plus gzip/deflate of large JSON responses."""
+    app.json = FastJSONProvider(app)
+    app.config.setdefault("JSON_COMPRESSION_MIN_BYTES", 1024)
+    app.config.setdefault("JSON_COMPRESSION_LEVEL", 5)
+
+    @app.after_request
+    def _compress_json_response(response):
+        if (
+            response.status_code < 200
+            or response.status_code in (204, 304)
+            or response.direct_passthrough
+            or response.is_streamed
+            or response.mimetype not in _COMPRESSIBLE_MIMETYPES
+            or "Content-Encoding" in response.headers
+        ):
+            return response
+        response.vary.add("Accept-Encoding")
+        body = response.get_data()
+        if len(body) < int(app.config["JSON_COMPRESSION_MIN_BYTES"]):
+            return response
+        encoding = _negotiated_encoding()
+        if encoding is None:
+            return response
+        level = int(app.config["JSON_COMPRESSION_LEVEL"])
+        if encoding == "gzip":
+            compressed = gzip.compress(body, compresslevel=level, mtime=0)
+        else:
+            compressed = zlib.compress(body, level)
+        response.set_data(compressed)
+        response.headers["Content-Encoding"] = encoding
+        return response
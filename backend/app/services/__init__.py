@@ -3,6 +3,7 @@
 from . import _legacy as _legacy
 from .market_data import (
     get_asset,
+    get_assets_data_version,
     get_asset_upcoming_incomes,
     get_asset_price_history,
     get_top_assets,
@@ -11,6 +12,7 @@ from .market_data import (
     refresh_all_assets_market_data,
     refresh_asset_market_data,
     refresh_stale_assets_market_data,
+    sync_bcb_index_series,
 )
 from .openclaw import (
     enrich_asset_with_openclaw,
@@ -44,14 +46,19 @@ from .portfolio import (
     get_asset_position_summary,
     get_asset_transactions,
     get_benchmark_comparison,
+    get_chart_series_cache_stats,
     get_fixed_income_payload_cached,
     get_fixed_income_summary,
+    get_fixed_income_value_daily_series,
     get_fixed_incomes,
     get_incomes,
     get_monthly_class_summary,
     get_monthly_ticker_summary,
     get_patrimony_open_pnl_by_type_series,
+    get_portfolio_as_of_data_version,
+    get_portfolio_data_version,
     get_portfolio_snapshot,
+    get_portfolio_snapshot_as_of,
     get_portfolios,
     get_sectors_summary,
     get_transactions,
@@ -60,6 +67,8 @@ from .portfolio import (
     import_transactions_csv,
     normalize_portfolio_ids,
     rebuild_chart_snapshots,
+    rebuild_dirty_chart_snapshots,
+    rebuild_dirty_fixed_income_snapshots,
     rebuild_fixed_income_snapshots,
     resolve_portfolio_id,
     update_income,
@@ -85,6 +94,7 @@ __all__ = [
     "get_daily_overview",
     "generate_finance_insights",
     "get_asset",
+    "get_assets_data_version",
     "get_asset_upcoming_incomes",
     "get_asset_enrichment",
     "get_asset_enrichment_history",
@@ -93,9 +103,11 @@ __all__ = [
     "get_asset_price_history",
     "get_asset_transactions",
     "get_benchmark_comparison",
+    "get_chart_series_cache_stats",
     "get_finance_insights",
     "get_fixed_income_payload_cached",
     "get_fixed_income_summary",
+    "get_fixed_income_value_daily_series",
     "get_fixed_incomes",
     "get_incomes",
     "get_metric_formulas_catalog",
@@ -103,7 +115,10 @@ __all__ = [
     "get_monthly_ticker_summary",
     "get_patrimony_open_pnl_by_type_series",
     "get_portfolio_analysis",
+    "get_portfolio_as_of_data_version",
+    "get_portfolio_data_version",
     "get_portfolio_snapshot",
+    "get_portfolio_snapshot_as_of",
     "get_portfolios",
     "get_sectors_summary",
     "get_top_assets",
@@ -114,12 +129,15 @@ __all__ = [
     "normalize_portfolio_ids",
     "prefetch_upcoming_incomes_for_portfolios",
     "rebuild_chart_snapshots",
+    "rebuild_dirty_chart_snapshots",
+    "rebuild_dirty_fixed_income_snapshots",
     "rebuild_fixed_income_snapshots",
     "refresh_assets_market_data",
     "refresh_all_assets_market_data",
     "refresh_asset_market_data",
     "refresh_stale_assets_market_data",
     "resolve_portfolio_id",
+    "sync_bcb_index_series",
     "update_income",
     "update_fixed_income",
     "update_transaction",
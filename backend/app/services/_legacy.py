@@ -1,39 +1,47 @@
 import json
 import logging
+import math
 import os
 import re
 import sqlite3
 import threading
 import time
 import unicodedata
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import date, datetime, timedelta
 from urllib.error import HTTPError, URLError
 from urllib.parse import urlencode
 from urllib.request import Request, urlopen
 
+import numpy as np
 from flask import current_app, has_app_context, has_request_context
 
 from ..auth import get_current_user
 from ..db import get_db
+from ..memory_cache import MemoryCache
 from ..notifications import notify_event
+from ..serialization import pack_payload, unpack_payload
+from ..single_flight import single_flight
+from . import fixed_income_kernel, series_kernel
 
 try:
     import yfinance as yf
 except ImportError:  # pragma: no cover
     yf = None
 
-_FX_CACHE = {"usdbrl": None, "expires_at": 0.0}
-_BCB_SERIES_CACHE = {}
-_COINGECKO_CACHE = {}
+_FX_CACHE = MemoryCache("fx_rates", max_entries=8, ttl_seconds=300)
+_BCB_SERIES_CACHE = MemoryCache("bcb_series", max_entries=256, ttl_seconds=6 * 3600)
+_BCB_INDEX_FACTOR_CACHE = MemoryCache("bcb_index_factors", max_entries=64, ttl_seconds=60)
+_BCB_SGS_MAX_WINDOW_DAYS = 3650
+# Series mantidas por sync_bcb_index_series, desde o inicio de cada uma no SGS.
+BCB_INDEX_SERIES_START = {11: "1986-06-04", 433: "1980-01-01", 12: "1986-06-04"}
+_COINGECKO_CACHE = MemoryCache("coingecko", max_entries=1024, ttl_seconds=300)
 _COINGECKO_CIRCUIT = {"until": 0.0, "status_code": None}
-_TWELVE_DATA_CACHE = {}
-_ALPHA_VANTAGE_CACHE = {}
-_YAHOO_MONTHLY_CACHE = {}
-_YAHOO_DAILY_CACHE = {}
-_ASSET_PRICE_HISTORY_CACHE = {}
-_BENCHMARK_CACHE = {}
-_PORTFOLIO_DAILY_VALUE_CACHE = {}
-_MARKET_SCANNER_CACHE = {}
+_TWELVE_DATA_CACHE = MemoryCache("twelve_data", max_entries=512, ttl_seconds=300)
+_ALPHA_VANTAGE_CACHE = MemoryCache("alpha_vantage", max_entries=512, ttl_seconds=300)
+_ASSET_PRICE_HISTORY_CACHE = MemoryCache("asset_price_history", max_entries=512, ttl_seconds=900)
+_MARKET_SCANNER_CACHE = MemoryCache("market_scanner", max_entries=512, ttl_seconds=120)
 _LOGGER = logging.getLogger(__name__)
 _BRAPI_DIAG = {
     "missing_token_logged": False,
@@ -42,10 +50,26 @@ _BRAPI_DIAG = {
 }
 _BRAPI_BATCH_LIMIT = 10
 _BRAPI_QUOTE_CACHE_TTL_DEFAULT_SECONDS = 120.0
-_BRAPI_QUOTE_RESULT_CACHE = {}
+_BRAPI_CACHE_MISS = object()
+_BRAPI_QUOTE_RESULT_CACHE = MemoryCache("brapi_quotes", max_entries=500, ttl_seconds=_BRAPI_QUOTE_CACHE_TTL_DEFAULT_SECONDS)
 _BRAPI_CIRCUIT = {"until": 0.0, "status_code": None}
 _PROVIDER_CIRCUIT_CACHE = {}
 _PROVIDER_USAGE_CACHE = {}
+_PROVIDER_USAGE_COUNTERS = ("request_count", "success_count", "error_count", "status_429_count")
+_PROVIDER_USAGE_PENDING = {}
+_PROVIDER_USAGE_PENDING_SINCE = []
+_PROVIDER_LIMITER_LOCK = threading.RLock()
+_PROVIDER_SLOTS = {}
+_PROVIDER_SLOTS_LOCK = threading.Lock()
+_PROVIDER_DEFAULT_CONCURRENCY = {
+    "market_scanner": 8,
+    "yahoo": 4,
+    "brapi": 2,
+    "google": 2,
+    "twelve_data": 2,
+    "alpha_vantage": 1,
+    "coingecko": 1,
+}
 # v4: fixed the CDI/IPCA fallback to treat the stored rate as "% of index"
 # instead of an absolute annual rate; bumped to invalidate cached snapshots
 # built with the inflated projection.
@@ -398,21 +422,47 @@ def _provider_usage_get(provider: str, window: str, bucket: str):
     return value
 
 
-def _provider_usage_record(provider: str, status_code):
+def _provider_usage_flush_threshold():
+    raw = (os.getenv("PROVIDER_USAGE_FLUSH_EVERY") or "10").strip()
+    try:
+        return max(int(raw), 1)
+    except (TypeError, ValueError):
+        return 10
+
+
+def _provider_usage_pending(provider: str, window: str, bucket: str):
+    counts = _PROVIDER_USAGE_PENDING.get((provider, window, bucket)) or {}
+    return {field: int(counts.get(field) or 0) for field in _PROVIDER_USAGE_COUNTERS}
+
+
+def _provider_usage_pending_add(provider: str, now_dt: datetime, **increments):
+    # Caller holds _PROVIDER_LIMITER_LOCK.
+    for window in ("minute", "hour", "day"):
+        key = (provider, window, _provider_usage_bucket(window, now_dt=now_dt))
+        counts = _PROVIDER_USAGE_PENDING.setdefault(
+            key,
+            {field: 0 for field in _PROVIDER_USAGE_COUNTERS},
+        )
+        for field, amount in increments.items():
+            counts[field] += int(amount)
+    if not _PROVIDER_USAGE_PENDING_SINCE:
+        _PROVIDER_USAGE_PENDING_SINCE.append(time.monotonic())
+
+
+def _provider_usage_flush():
+    """Write the locally batched usage counters to api_provider_usage_window."""
     if not has_app_context():
         return
-    normalized_provider = str(provider or "").strip().lower()
-    if not normalized_provider:
-        return
-    now_dt = datetime.utcnow()
-    now_iso = _now_iso()
-    is_success = bool(status_code is not None and int(status_code) < 400)
-    is_429 = bool(status_code is not None and int(status_code) == 429)
-    try:
-        db = get_db()
-        for window in ("minute", "hour", "day"):
-            bucket = _provider_usage_bucket(window, now_dt=now_dt)
-            db.execute(
+    with _PROVIDER_LIMITER_LOCK:
+        if not _PROVIDER_USAGE_PENDING:
+            return
+        pending = dict(_PROVIDER_USAGE_PENDING)
+        _PROVIDER_USAGE_PENDING.clear()
+        _PROVIDER_USAGE_PENDING_SINCE.clear()
+        now_iso = _now_iso()
+        try:
+            db = get_db()
+            db.executemany(
                 """
                 INSERT INTO api_provider_usage_window (
                     provider,
@@ -424,56 +474,192 @@ def _provider_usage_record(provider: str, status_code):
                     status_429_count,
                     updated_at
                 )
-                VALUES (?, ?, ?, 1, ?, ?, ?, ?)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
                 ON CONFLICT(provider, window, bucket) DO UPDATE SET
-                    request_count = api_provider_usage_window.request_count + 1,
+                    request_count = api_provider_usage_window.request_count + excluded.request_count,
                     success_count = api_provider_usage_window.success_count + excluded.success_count,
                     error_count = api_provider_usage_window.error_count + excluded.error_count,
                     status_429_count = api_provider_usage_window.status_429_count + excluded.status_429_count,
                     updated_at = excluded.updated_at
                 """,
-                (
-                    normalized_provider,
-                    window,
-                    bucket,
-                    1 if is_success else 0,
-                    0 if is_success else 1,
-                    1 if is_429 else 0,
-                    now_iso,
-                ),
+                [
+                    (
+                        provider,
+                        window,
+                        bucket,
+                        counts["request_count"],
+                        counts["success_count"],
+                        counts["error_count"],
+                        counts["status_429_count"],
+                        now_iso,
+                    )
+                    for (provider, window, bucket), counts in pending.items()
+                ],
             )
-            cache_key = (normalized_provider, window, bucket)
-            _PROVIDER_USAGE_CACHE.pop(cache_key, None)
-        db.commit()
-    except Exception:
-        return
+            db.commit()
+        except Exception:
+            # Keep the counts for the next flush instead of losing them.
+            for key, counts in pending.items():
+                merged = _PROVIDER_USAGE_PENDING.setdefault(
+                    key,
+                    {field: 0 for field in _PROVIDER_USAGE_COUNTERS},
+                )
+                for field in _PROVIDER_USAGE_COUNTERS:
+                    merged[field] += counts[field]
+            _PROVIDER_USAGE_PENDING_SINCE.append(time.monotonic())
+            return
+        for key in pending:
+            _PROVIDER_USAGE_CACHE.pop(key, None)
+
+
+def _provider_usage_maybe_flush(force: bool = False):
+    with _PROVIDER_LIMITER_LOCK:
+        if not _PROVIDER_USAGE_PENDING:
+            return
+        pending_requests = sum(
+            counts["request_count"]
+            for (_provider, window, _bucket), counts in _PROVIDER_USAGE_PENDING.items()
+            if window == "minute"
+        )
+        oldest = _PROVIDER_USAGE_PENDING_SINCE[0] if _PROVIDER_USAGE_PENDING_SINCE else time.monotonic()
+        due = (
+            force
+            or pending_requests >= _provider_usage_flush_threshold()
+            or (time.monotonic() - oldest) >= 1.0
+        )
+    if due:
+        _provider_usage_flush()
 
 
-def _provider_budget_allows_request(provider: str):
+def _provider_usage_record(provider: str, status_code):
+    """Record the outcome of a request previously admitted by the limiter."""
     normalized_provider = str(provider or "").strip().lower()
     if not normalized_provider:
-        return True
-    for window in ("minute", "hour", "day"):
-        limit = _provider_budget_limit(normalized_provider, window)
+        return
+    is_success = bool(status_code is not None and int(status_code) < 400)
+    is_429 = bool(status_code is not None and int(status_code) == 429)
+    with _PROVIDER_LIMITER_LOCK:
+        _provider_usage_pending_add(
+            normalized_provider,
+            datetime.utcnow(),
+            success_count=1 if is_success else 0,
+            error_count=0 if is_success else 1,
+            status_429_count=1 if is_429 else 0,
+        )
+    # A 429 is a signal the other workers should see right away.
+    _provider_usage_maybe_flush(force=is_429)
+
+
+def _provider_call_burst(provider: str, limit: int):
+    raw = (os.getenv(f"{provider.upper()}_CALL_BURST") or "").strip()
+    if not raw:
+        return limit
+    try:
+        return min(max(int(raw), 1), limit)
+    except (TypeError, ValueError):
+        return limit
+
+
+def _provider_rate_limit_max_wait_seconds(provider: str):
+    raw = (
+        os.getenv(f"{provider.upper()}_RATE_LIMIT_MAX_WAIT_SECONDS")
+        or os.getenv("PROVIDER_RATE_LIMIT_MAX_WAIT_SECONDS")
+        or "5"
+    ).strip()
+    try:
+        return max(float(raw), 0.0)
+    except (TypeError, ValueError):
+        return 5.0
+
+
+def _provider_bucket_elapsed_seconds(window: str, now_dt: datetime):
+    seconds_in_minute = now_dt.second + now_dt.microsecond / 1_000_000
+    if window == "minute":
+        return seconds_in_minute
+    if window == "hour":
+        return now_dt.minute * 60 + seconds_in_minute
+    return now_dt.hour * 3600 + now_dt.minute * 60 + seconds_in_minute
+
+
+def _provider_rate_limit_wait(provider: str, limits: dict, now_dt: datetime):
+    """Seconds until the provider's token buckets admit one more request.
+
+    Each configured window is a token bucket holding up to ``limit`` tokens and
+    refilled at ``limit / window`` per second, starting each bucket with
+    ``burst`` tokens (the full limit unless <PROVIDER>_CALL_BURST is set for the
+    minute window). Tokens spent are the shared api_provider_usage_window count
+    plus this process's not-yet-flushed requests. Caller holds the limiter lock.
+    """
+    wait_seconds = 0.0
+    blocking = None
+    for window, limit in limits.items():
         if limit <= 0:
             continue
-        bucket = _provider_usage_bucket(window)
-        current = int(_provider_usage_get(normalized_provider, window, bucket).get("request_count") or 0)
-        if current >= limit:
+        window_seconds = _provider_window_seconds(window)
+        bucket = _provider_usage_bucket(window, now_dt=now_dt)
+        pending = _provider_usage_pending(provider, window, bucket)["request_count"]
+        used = int(_provider_usage_get(provider, window, bucket).get("request_count") or 0) + pending
+        if limit - used <= _provider_usage_flush_threshold():
+            # Close to the limit: publish our counts and re-read the others'.
+            _provider_usage_flush()
+            _PROVIDER_USAGE_CACHE.pop((provider, window, bucket), None)
+            pending = _provider_usage_pending(provider, window, bucket)["request_count"]
+            used = int(_provider_usage_get(provider, window, bucket).get("request_count") or 0) + pending
+        burst = _provider_call_burst(provider, limit) if window == "minute" else limit
+        elapsed = _provider_bucket_elapsed_seconds(window, now_dt)
+        allowed = min(limit, burst + int(elapsed * limit / window_seconds))
+        if used < allowed:
+            continue
+        if used < limit:
+            window_wait = (used - burst + 1) * window_seconds / limit - elapsed
+        else:
+            window_wait = window_seconds - elapsed
+        window_wait = max(window_wait, 0.01)
+        if window_wait > wait_seconds:
+            wait_seconds = window_wait
+            blocking = {"window": window, "bucket": bucket, "limit": int(limit), "request_count": int(used)}
+    return wait_seconds, blocking
+
+
+def _provider_rate_limit_acquire(provider: str, max_wait_seconds: float | None = None):
+    """Take one token for ``provider``, sleeping for it when the wait is short.
+
+    Returns False (without spending a token) when the next token is further away
+    than ``max_wait_seconds`` (<PROVIDER>_RATE_LIMIT_MAX_WAIT_SECONDS by default).
+    """
+    normalized_provider = str(provider or "").strip().lower()
+    if not normalized_provider:
+        return True
+    limits = {
+        window: _provider_budget_limit(normalized_provider, window)
+        for window in ("minute", "hour", "day")
+    }
+    if max_wait_seconds is None:
+        max_wait_seconds = _provider_rate_limit_max_wait_seconds(normalized_provider)
+    deadline = time.monotonic() + max(float(max_wait_seconds), 0.0)
+    while True:
+        with _PROVIDER_LIMITER_LOCK:
+            now_dt = datetime.utcnow()
+            wait_seconds, blocking = (
+                _provider_rate_limit_wait(normalized_provider, limits, now_dt)
+                if any(limit > 0 for limit in limits.values())
+                else (0.0, None)
+            )
+            if wait_seconds <= 0:
+                _provider_usage_pending_add(normalized_provider, now_dt, request_count=1)
+                break
+        if wait_seconds > deadline - time.monotonic():
+            window = blocking["window"]
             notify_event(
                 "provider_budget_exhausted",
                 f"Orcamento esgotado: {normalized_provider.upper()}",
-                details={
-                    "provider": normalized_provider,
-                    "window": window,
-                    "bucket": bucket,
-                    "limit": int(limit),
-                    "request_count": int(current),
-                },
-                dedupe_key=f"provider:budget:{normalized_provider}:{window}:{bucket}",
+                details={"provider": normalized_provider, **blocking},
+                dedupe_key=f"provider:budget:{normalized_provider}:{window}:{blocking['bucket']}",
                 min_interval_seconds=max(int(_provider_window_seconds(window) / 2), 30),
             )
             return False
+        time.sleep(wait_seconds)
+    _provider_usage_maybe_flush()
     return True
 
 
@@ -485,17 +671,19 @@ def _provider_usage_status(provider: str):
     for window in ("minute", "hour", "day"):
         bucket = _provider_usage_bucket(window)
         usage = _provider_usage_get(normalized_provider, window, bucket)
+        with _PROVIDER_LIMITER_LOCK:
+            pending = _provider_usage_pending(normalized_provider, window, bucket)
         limit = _provider_budget_limit(normalized_provider, window)
-        count = int(usage.get("request_count") or 0)
+        count = int(usage.get("request_count") or 0) + pending["request_count"]
         remaining = max(limit - count, 0) if limit > 0 else None
         usage_pct = round((count / limit) * 100.0, 2) if limit > 0 else None
         windows[window] = {
             "bucket": bucket,
             "limit": limit,
             "request_count": count,
-            "success_count": int(usage.get("success_count") or 0),
-            "error_count": int(usage.get("error_count") or 0),
-            "status_429_count": int(usage.get("status_429_count") or 0),
+            "success_count": int(usage.get("success_count") or 0) + pending["success_count"],
+            "error_count": int(usage.get("error_count") or 0) + pending["error_count"],
+            "status_429_count": int(usage.get("status_429_count") or 0) + pending["status_429_count"],
             "remaining": remaining,
             "usage_pct": usage_pct,
             "updated_at": usage.get("updated_at"),
@@ -503,6 +691,31 @@ def _provider_usage_status(provider: str):
     return {"provider": normalized_provider, "windows": windows}
 
 
+def _provider_concurrency_limit(provider: str):
+    normalized_provider = str(provider or "").strip().lower()
+    default_limit = _PROVIDER_DEFAULT_CONCURRENCY.get(normalized_provider, 2)
+    if not normalized_provider:
+        return default_limit
+    raw = (os.getenv(f"{normalized_provider.upper()}_MAX_CONCURRENCY") or "").strip()
+    if not raw:
+        return default_limit
+    try:
+        return max(int(raw), 1)
+    except (TypeError, ValueError):
+        return default_limit
+
+
+def _provider_slot(provider: str):
+    """Semaphore bounding in-flight calls to one provider across worker threads."""
+    normalized_provider = str(provider or "").strip().lower()
+    with _PROVIDER_SLOTS_LOCK:
+        slot = _PROVIDER_SLOTS.get(normalized_provider)
+        if slot is None:
+            slot = threading.BoundedSemaphore(_provider_concurrency_limit(normalized_provider))
+            _PROVIDER_SLOTS[normalized_provider] = slot
+    return slot
+
+
 def _normalize_metric_formula_value(value, fallback=0.0):
     numeric = _to_number(value)
     if numeric is None:
@@ -1359,8 +1572,7 @@ def _coingecko_close_circuit():
 def _coingecko_get_json(url: str, timeout: float = 12.0):
     if _coingecko_is_temporarily_unavailable():
         return None
-    if not _provider_budget_allows_request("coingecko"):
-        _provider_usage_record("coingecko", 429)
+    if not _provider_rate_limit_acquire("coingecko"):
         _coingecko_open_circuit(429)
         return None
 
@@ -1405,26 +1617,21 @@ def _fetch_coingecko_market_item(ticker: str):
     if not symbol:
         return None
 
-    cache_key = ("cg_market", symbol)
-    cached = _memory_cache_get(_COINGECKO_CACHE, cache_key)
-    if cached is not None:
-        return dict(cached)
+    def _load():
+        payload = _coingecko_get_json(
+            (
+                f"{_get_coingecko_base_url()}/coins/markets"
+                f"?vs_currency=usd&symbols={symbol}&price_change_percentage=24h,7d,30d"
+            ),
+            timeout=12.0,
+        ) or []
+        try:
+            return (payload[0] if payload else None) or None
+        except Exception:
+            return None
 
-    payload = _coingecko_get_json(
-        (
-            f"{_get_coingecko_base_url()}/coins/markets"
-            f"?vs_currency=usd&symbols={symbol}&price_change_percentage=24h,7d,30d"
-        ),
-        timeout=12.0,
-    ) or []
-    try:
-        item = (payload[0] if payload else None) or None
-    except Exception:
-        item = None
-    if item:
-        _memory_cache_set(_COINGECKO_CACHE, cache_key, dict(item), 120)
-        return item
-    return None
+    item = _COINGECKO_CACHE.get_or_set(("cg_market", symbol), _load, ttl_seconds=120, should_cache=bool)
+    return dict(item) if item else None
 
 
 def _resolve_coingecko_coin_id(ticker: str):
@@ -1485,49 +1692,50 @@ def _fetch_coingecko_history(ticker: str, range_key: str = "1y"):
     if not coin_id:
         return result
 
-    cache_key = ("cg_history", coin_id, normalized_key)
-    cached = _memory_cache_get(_COINGECKO_CACHE, cache_key)
-    if cached is not None:
-        return dict(cached)
+    def _load():
+        payload = _coingecko_get_json(
+            f"{_get_coingecko_base_url()}/coins/{coin_id}/market_chart?vs_currency=usd&days={cfg['days']}",
+            timeout=12.0,
+        ) or {}
+        prices_payload = payload.get("prices") or []
+        if not prices_payload:
+            return None
 
-    payload = _coingecko_get_json(
-        f"{_get_coingecko_base_url()}/coins/{coin_id}/market_chart?vs_currency=usd&days={cfg['days']}",
-        timeout=12.0,
-    ) or {}
-    prices_payload = payload.get("prices") or []
-    if not prices_payload:
-        return result
+        usdbrl = _get_usdbrl_rate() if _is_usd_quoted_ticker(ticker) else None
+        prices = []
+        labels = []
+        for point in prices_payload:
+            try:
+                timestamp_ms, close_value = point[0], point[1]
+            except Exception:
+                continue
+            price_value = _to_number(close_value)
+            if price_value is None:
+                continue
+            try:
+                dt = datetime.fromtimestamp(float(timestamp_ms) / 1000.0)
+            except Exception:
+                continue
+            if usdbrl is not None and usdbrl > 0:
+                price_value *= usdbrl
+            prices.append(round(float(price_value), 2))
+            labels.append(dt.strftime(cfg["date_fmt"]))
 
-    usdbrl = _get_usdbrl_rate() if _is_usd_quoted_ticker(ticker) else None
-    prices = []
-    labels = []
-    for point in prices_payload:
-        try:
-            timestamp_ms, close_value = point[0], point[1]
-        except Exception:
-            continue
-        price_value = _to_number(close_value)
-        if price_value is None:
-            continue
-        try:
-            dt = datetime.fromtimestamp(float(timestamp_ms) / 1000.0)
-        except Exception:
-            continue
-        if usdbrl is not None and usdbrl > 0:
-            price_value *= usdbrl
-        prices.append(round(float(price_value), 2))
-        labels.append(dt.strftime(cfg["date_fmt"]))
+        if not prices:
+            return None
 
-    if not prices:
-        return result
+        first = prices[0]
+        last = prices[-1]
+        return {
+            "range_key": normalized_key,
+            "labels": labels,
+            "prices": prices,
+            "change_pct": ((last / first) - 1) * 100 if first not in (None, 0) else None,
+        }
 
-    first = prices[0]
-    last = prices[-1]
-    result["labels"] = labels
-    result["prices"] = prices
-    result["change_pct"] = ((last / first) - 1) * 100 if first not in (None, 0) else None
-    _memory_cache_set(_COINGECKO_CACHE, cache_key, dict(result), 300)
-    return result
+    cache_key = ("cg_history", coin_id, normalized_key)
+    cached = _COINGECKO_CACHE.get_or_set(cache_key, _load, ttl_seconds=300, should_cache=bool)
+    return dict(cached) if cached else result
 
 
 def _get_alpha_vantage_api_key():
@@ -1546,21 +1754,28 @@ def _fetch_alpha_vantage(function_name: str, params=None, ttl_seconds: int = 300
     query = {"function": function_name, "apikey": api_key}
     if params:
         query.update(params)
-    cache_key = (function_name, tuple(sorted(query.items())))
-    cached = _memory_cache_get(_ALPHA_VANTAGE_CACHE, cache_key)
-    if cached is not None:
-        return dict(cached) if isinstance(cached, dict) else cached
+    def _load():
+        if not _provider_rate_limit_acquire("alpha_vantage"):
+            return None
+        payload, status_code = _http_get_json_with_status(
+            f"{_get_alpha_vantage_base_url()}?{urlencode(query)}",
+            timeout=15.0,
+        )
+        if payload and (payload.get("Information") or payload.get("Note")):
+            # Alpha Vantage answers throttled calls with HTTP 200 and a "Note".
+            status_code = 429
+        _provider_usage_record("alpha_vantage", status_code)
+        if not payload:
+            return None
+        if payload.get("Information") or payload.get("Note") or payload.get("Error Message"):
+            return None
+        return payload
 
-    payload = _http_get_json(
-        f"{_get_alpha_vantage_base_url()}?{urlencode(query)}",
-        timeout=15.0,
+    cache_key = (function_name, tuple(sorted(query.items())))
+    payload = _ALPHA_VANTAGE_CACHE.get_or_set(
+        cache_key, _load, ttl_seconds=ttl_seconds, should_cache=lambda value: value is not None
     )
-    if not payload:
-        return None
-    if payload.get("Information") or payload.get("Note") or payload.get("Error Message"):
-        return None
-    _memory_cache_set(_ALPHA_VANTAGE_CACHE, cache_key, payload, ttl_seconds)
-    return payload
+    return dict(payload) if isinstance(payload, dict) else payload
 
 
 def _fetch_alpha_vantage_quote(ticker: str):
@@ -1750,28 +1965,34 @@ def _fetch_twelve_data(path: str, params=None, ttl_seconds: int = 300):
     if not api_key:
         return None
     params = params or {}
-    cache_key = (path, tuple(sorted(params.items())))
-    cached = _memory_cache_get(_TWELVE_DATA_CACHE, cache_key)
-    if cached is not None:
-        return dict(cached) if isinstance(cached, dict) else cached
+    def _load():
+        if not _provider_rate_limit_acquire("twelve_data"):
+            return None
+        payload, status_code = _http_get_json_with_status(
+            f"{_get_twelve_data_base_url()}/{path}?{urlencode(params)}",
+            headers={
+                "Authorization": f"apikey {api_key}",
+                "User-Agent": (
+                    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
+                    "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36"
+                ),
+            },
+            timeout=15.0,
+        )
+        if payload and payload.get("code") == 429:
+            status_code = 429
+        _provider_usage_record("twelve_data", status_code)
+        if not payload:
+            return None
+        if payload.get("status") == "error" or payload.get("code"):
+            return None
+        return payload
 
-    payload = _http_get_json(
-        f"{_get_twelve_data_base_url()}/{path}?{urlencode(params)}",
-        headers={
-            "Authorization": f"apikey {api_key}",
-            "User-Agent": (
-                "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
-                "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36"
-            ),
-        },
-        timeout=15.0,
+    cache_key = (path, tuple(sorted(params.items())))
+    payload = _TWELVE_DATA_CACHE.get_or_set(
+        cache_key, _load, ttl_seconds=ttl_seconds, should_cache=lambda value: value is not None
     )
-    if not payload:
-        return None
-    if payload.get("status") == "error" or payload.get("code"):
-        return None
-    _memory_cache_set(_TWELVE_DATA_CACHE, cache_key, payload, ttl_seconds)
-    return payload
+    return dict(payload) if isinstance(payload, dict) else payload
 
 
 def _fetch_twelve_data_quote(ticker: str):
@@ -1944,10 +2165,16 @@ def _market_scanner_load_snapshot(symbol: str):
             (symbol, ticker_base),
         ).fetchone()
 
+        # Scanner novo grava em price_bars; bancos antigos ainda tem "prices".
+        price_table = "price_bars"
+        if cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'price_bars'"
+        ).fetchone() is None:
+            price_table = "prices"
         price_rows = cursor.execute(
-            """
+            f"""
             SELECT close, timestamp
-            FROM prices
+            FROM {price_table}
             WHERE ticker = ? AND interval = '1d'
             ORDER BY timestamp DESC
             LIMIT 400
@@ -1956,9 +2183,9 @@ def _market_scanner_load_snapshot(symbol: str):
         ).fetchall()
         if not price_rows:
             price_rows = cursor.execute(
-                """
+                f"""
                 SELECT close, timestamp
-                FROM prices
+                FROM {price_table}
                 WHERE ticker = ?
                 ORDER BY timestamp DESC
                 LIMIT 400
@@ -1966,19 +2193,46 @@ def _market_scanner_load_snapshot(symbol: str):
                 (symbol,),
             ).fetchall()
 
-        metric_rows = cursor.execute(
-            """
-            SELECT metric_name, metric_value, timestamp
-            FROM metrics
-            WHERE ticker = ?
-            ORDER BY timestamp DESC
-            LIMIT 200
-            """,
-            (symbol,),
-        ).fetchall()
-
         latest_metrics = {}
         latest_metric_ts = None
+        metric_rows = []
+        has_latest_table = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'latest_metrics'"
+        ).fetchone() is not None
+        if has_latest_table:
+            latest_row = cursor.execute(
+                """
+                SELECT metrics, timestamp
+                FROM latest_metrics
+                WHERE ticker = ?
+                ORDER BY timestamp DESC
+                LIMIT 1
+                """,
+                (symbol,),
+            ).fetchone()
+            if latest_row is not None:
+                latest_metric_ts = latest_row["timestamp"]
+                try:
+                    packed = json.loads(latest_row["metrics"] or "{}")
+                except (TypeError, ValueError):
+                    packed = {}
+                for name, value in (packed.items() if isinstance(packed, dict) else []):
+                    metric_name = str(name or "").strip().lower()
+                    metric_value = _to_number(value)
+                    if metric_name and metric_value is not None:
+                        latest_metrics[metric_name] = float(metric_value)
+        else:
+            metric_rows = cursor.execute(
+                """
+                SELECT metric_name, metric_value, timestamp
+                FROM metrics
+                WHERE ticker = ?
+                ORDER BY timestamp DESC
+                LIMIT 200
+                """,
+                (symbol,),
+            ).fetchall()
+
         if metric_rows:
             latest_metric_ts = metric_rows[0]["timestamp"]
             for row in metric_rows:
@@ -2017,21 +2271,13 @@ def _fetch_market_scanner_snapshot(ticker: str):
     if not symbol:
         return None
 
-    cache_key = ("market_scanner_snapshot", symbol)
-    cached = _memory_cache_get(_MARKET_SCANNER_CACHE, cache_key)
-    if cached is not None:
-        return dict(cached)
-
-    snapshot = _market_scanner_load_snapshot(symbol)
-    if snapshot is None:
-        return None
-    _memory_cache_set(
-        _MARKET_SCANNER_CACHE,
-        cache_key,
-        dict(snapshot),
-        _market_scanner_data_ttl_seconds(),
+    snapshot = _MARKET_SCANNER_CACHE.get_or_set(
+        ("market_scanner_snapshot", symbol),
+        lambda: _market_scanner_load_snapshot(symbol),
+        ttl_seconds=_market_scanner_data_ttl_seconds(),
+        should_cache=lambda value: value is not None,
     )
-    return snapshot
+    return dict(snapshot) if snapshot is not None else None
 
 
 def _market_scanner_price_series_desc(snapshot):
@@ -2298,31 +2544,15 @@ def _set_brapi_cached_quote_result(
     modules=None,
 ):
     cache_key = _brapi_quote_cache_key(ticker, range_key=range_key, interval=interval, modules=modules)
-    _BRAPI_QUOTE_RESULT_CACHE[cache_key] = {
-        "expires_at": time.time() + _brapi_quote_cache_ttl_seconds(),
-        "result": result,
-    }
-    if len(_BRAPI_QUOTE_RESULT_CACHE) > 500:
-        now_ts = time.time()
-        expired_keys = [
-            key
-            for key, value in _BRAPI_QUOTE_RESULT_CACHE.items()
-            if float((value or {}).get("expires_at") or 0.0) <= now_ts
-        ]
-        for key in expired_keys:
-            _BRAPI_QUOTE_RESULT_CACHE.pop(key, None)
+    _BRAPI_QUOTE_RESULT_CACHE.set(cache_key, result, _brapi_quote_cache_ttl_seconds())
 
 
 def _get_brapi_cached_quote_result(ticker: str, range_key: str = None, interval: str = None, modules=None):
     cache_key = _brapi_quote_cache_key(ticker, range_key=range_key, interval=interval, modules=modules)
-    cached = _BRAPI_QUOTE_RESULT_CACHE.get(cache_key)
-    if not cached:
-        return False, None
-    expires_at = float(cached.get("expires_at") or 0.0)
-    if expires_at <= time.time():
-        _BRAPI_QUOTE_RESULT_CACHE.pop(cache_key, None)
+    cached = _BRAPI_QUOTE_RESULT_CACHE.get(cache_key, _BRAPI_CACHE_MISS)
+    if cached is _BRAPI_CACHE_MISS:
         return False, None
-    return True, cached.get("result")
+    return True, cached
 
 
 def _log_brapi_empty_payload(tickers, query: str):
@@ -2414,8 +2644,7 @@ def _fetch_brapi_quote_results_batch(tickers, range_key: str = None, interval: s
 
     for start in range(0, len(pending), _BRAPI_BATCH_LIMIT):
         chunk = pending[start : start + _BRAPI_BATCH_LIMIT]
-        if not _provider_budget_allows_request("brapi"):
-            _provider_usage_record("brapi", 429)
+        if not _provider_rate_limit_acquire("brapi"):
             _brapi_open_circuit(429)
             for ticker in chunk:
                 result_map[ticker] = None
@@ -2492,13 +2721,23 @@ def _fetch_brapi_quote_result(ticker: str, range_key: str = None, interval: str
     normalized_ticker = _normalize_brapi_symbol(ticker)
     if not _is_brazilian_market_ticker(normalized_ticker):
         return None
-    result_map = _fetch_brapi_quote_results_batch(
-        [normalized_ticker],
-        range_key=range_key,
-        interval=interval,
-        modules=modules,
+
+    def _load():
+        result_map = _fetch_brapi_quote_results_batch(
+            [normalized_ticker],
+            range_key=range_key,
+            interval=interval,
+            modules=modules,
+        )
+        return result_map.get(normalized_ticker)
+
+    # The batch fetch stores each result (None included) itself; get_or_set
+    # only collapses concurrent misses of the same quote into one request.
+    return _BRAPI_QUOTE_RESULT_CACHE.get_or_set(
+        _brapi_quote_cache_key(normalized_ticker, range_key=range_key, interval=interval, modules=modules),
+        _load,
+        should_cache=lambda value: False,
     )
-    return result_map.get(normalized_ticker)
 
 
 def _history_config_for_brapi(range_key: str):
@@ -2700,11 +2939,32 @@ def _prefetch_brapi_market_data_for_tickers(tickers):
 
 
 def _bcb_series_store(series_code: int, parsed):
-    """Persist fetched BCB observations as last-good cache (upsert per day)."""
+    """Persist fetched BCB observations as last-good cache (upsert per day).
+
+    Only new or revised days are written; the cumulative factor rows from the
+    first changed day on are dropped and the series version is bumped so every
+    worker rebuilds its in-memory factor table.
+    """
     if not parsed or not has_app_context():
-        return
+        return 0
     try:
         db = get_db()
+        code = int(series_code)
+        first_day = min(day for day, _ in parsed)
+        last_day = max(day for day, _ in parsed)
+        stored = {
+            row["obs_date"]: float(row["value"])
+            for row in db.execute(
+                """
+                SELECT obs_date, value FROM bcb_series_observations
+                WHERE series_code = ? AND obs_date BETWEEN ? AND ?
+                """,
+                (code, first_day, last_day),
+            ).fetchall()
+        }
+        changed = [(day, float(value)) for day, value in parsed if stored.get(day) != float(value)]
+        if not changed:
+            return 0
         stamp = _snapshot_now()
         db.executemany(
             """
@@ -2714,14 +2974,21 @@ def _bcb_series_store(series_code: int, parsed):
               value = excluded.value,
               updated_at = excluded.updated_at
             """,
-            [(int(series_code), d, float(v), stamp) for d, v in parsed],
+            [(code, day, value, stamp) for day, value in changed],
         )
-        db.commit()
+        db.execute(
+            "DELETE FROM bcb_index_factors WHERE series_code = ? AND obs_date >= ?",
+            (code, min(day for day, _ in changed)),
+        )
+        bump_data_versions("bcb_series", [code])
+        _BCB_INDEX_FACTOR_CACHE.pop(code)
+        return len(changed)
     except Exception:
         try:
             get_db().rollback()
         except Exception:
             pass
+        return 0
 
 
 def _bcb_series_load(series_code: int, date_start: str, date_end: str):
@@ -2742,57 +3009,266 @@ def _bcb_series_load(series_code: int, date_start: str, date_end: str):
     return [(row["obs_date"], float(row["value"])) for row in rows]
 
 
-def _fetch_bcb_series(series_code: int, date_start: str, date_end: str):
-    cache_key = (int(series_code), date_start, date_end)
-    if cache_key in _BCB_SERIES_CACHE:
-        return _BCB_SERIES_CACHE[cache_key]
-
+def _bcb_series_download(series_code: int, date_start: str, date_end: str):
+    """Observations from the BCB/SGS API, split in windows of at most
+    _BCB_SGS_MAX_WINDOW_DAYS (the API rejects longer ranges of daily series).
+    Empty when any window fails."""
     start_dt = datetime.strptime(date_start, "%Y-%m-%d")
     end_dt = datetime.strptime(date_end, "%Y-%m-%d")
-    data_inicial = start_dt.strftime("%d/%m/%Y")
-    data_final = end_dt.strftime("%d/%m/%Y")
-    url = (
-        "https://api.bcb.gov.br/dados/serie/bcdata.sgs."
-        f"{series_code}/dados?formato=json&dataInicial={data_inicial}&dataFinal={data_final}"
-    )
-    payload = _http_get_json(url) or []
     parsed = []
-    for item in payload:
-        raw_date = (item.get("data") or "").strip()
-        raw_value = item.get("valor")
-        try:
-            date_value = datetime.strptime(raw_date, "%d/%m/%Y").strftime("%Y-%m-%d")
-        except ValueError:
-            continue
-        numeric = _parse_float(raw_value)
-        if numeric is None:
-            continue
-        parsed.append((date_value, float(numeric)))
+    while start_dt <= end_dt:
+        window_end = min(start_dt + timedelta(days=_BCB_SGS_MAX_WINDOW_DAYS), end_dt)
+        url = (
+            "https://api.bcb.gov.br/dados/serie/bcdata.sgs."
+            f"{series_code}/dados?formato=json&dataInicial={start_dt.strftime('%d/%m/%Y')}"
+            f"&dataFinal={window_end.strftime('%d/%m/%Y')}"
+        )
+        payload = _http_get_json(url)
+        if payload is None:
+            # Janela falhou: nada de serie parcial (sync marcaria o trecho como coberto).
+            return []
+        for item in payload:
+            raw_date = (item.get("data") or "").strip()
+            raw_value = item.get("valor")
+            try:
+                date_value = datetime.strptime(raw_date, "%d/%m/%Y").strftime("%Y-%m-%d")
+            except ValueError:
+                continue
+            numeric = _parse_float(raw_value)
+            if numeric is None:
+                continue
+            parsed.append((date_value, float(numeric)))
+        start_dt = window_end + timedelta(days=1)
+    return sorted(dict(parsed).items())
 
-    if parsed:
-        # Live fetch succeeded: refresh the last-good cache and memoize.
-        _bcb_series_store(series_code, parsed)
-        _BCB_SERIES_CACHE[cache_key] = parsed
-        return parsed
 
-    # Live fetch failed/empty (e.g. BCB 502): fall back to last-good DB cache.
-    # Do not memoize the empty result so the next call can retry the live API.
-    cached = _bcb_series_load(series_code, date_start, date_end)
-    if cached:
-        _BCB_SERIES_CACHE[cache_key] = cached
-    return cached
+def _fetch_bcb_series(series_code: int, date_start: str, date_end: str):
+    def _load():
+        parsed = _bcb_series_download(series_code, date_start, date_end)
+        if parsed:
+            # Live fetch succeeded: refresh the last-good cache.
+            _bcb_series_store(series_code, parsed)
+            return parsed
+        # Live fetch failed/empty (e.g. BCB 502): fall back to last-good DB cache.
+        return _bcb_series_load(series_code, date_start, date_end)
+
+    # Do not memoize an empty result so the next call can retry the live API.
+    return _BCB_SERIES_CACHE.get_or_set((int(series_code), date_start, date_end), _load, should_cache=bool)
+
+
+def _bcb_series_sync_plan(db, series_code: int, date_start: str, max_age_seconds: int):
+    """What bcb_series_observations needs for ``date_start`` on: None,
+    ("full", covered_from) or ("since", last_date)."""
+    state = db.execute(
+        "SELECT covered_from, synced_at FROM bcb_series_sync WHERE series_code = ?",
+        (int(series_code),),
+    ).fetchone()
+    if state is None or state["covered_from"] > date_start:
+        covered_from = date_start if state is None else min(date_start, state["covered_from"])
+        return "full", covered_from
+    age = _snapshot_age_seconds(state["synced_at"])
+    if age is not None and age <= max_age_seconds:
+        return None
+    last_date = db.execute(
+        "SELECT MAX(obs_date) AS last_date FROM bcb_series_observations WHERE series_code = ?",
+        (int(series_code),),
+    ).fetchone()["last_date"]
+    if not last_date:
+        return "full", state["covered_from"]
+    # Rebusca o ultimo dia salvo: o BCB pode revisar o valor mais recente.
+    return "since", last_date
+
+
+def _bcb_series_sync(series_code: int, date_start: str, max_age_seconds: int = 0):
+    """Keep bcb_series_observations contiguous from ``date_start`` to today;
+    fetches only what is missing. Returns the number of new or revised
+    observations, or None when BCB could not be reached."""
+    db = get_db()
+    plan = _bcb_series_sync_plan(db, series_code, date_start, max_age_seconds)
+    if plan is None:
+        return 0
+    mode, since = plan
+    parsed = _bcb_series_download(series_code, since, datetime.now().strftime("%Y-%m-%d"))
+    if not parsed:
+        # Download vazio nao marca a janela como coberta nem atualiza synced_at.
+        return None
+    changed = _bcb_series_store(series_code, parsed)
+    db.execute(
+        """
+        INSERT INTO bcb_series_sync (series_code, covered_from, synced_at)
+        VALUES (?, ?, ?)
+        ON CONFLICT(series_code) DO UPDATE SET
+          covered_from = COALESCE(?, bcb_series_sync.covered_from),
+          synced_at = excluded.synced_at
+        """,
+        (int(series_code), since, _snapshot_now(), since if mode == "full" else None),
+    )
+    db.commit()
+    return changed
 
 
-def _compound_from_bcb_series(
-    series_code: int,
-    start_date,
-    end_date,
-    multiplier: float = 1.0,
+def sync_bcb_index_series(series_codes=None):
+    """Background sync of the BCB series read by projections and benchmarks
+    (CDI 11, IPCA 433, CDI 12). Request paths only read the stored series.
+
+    New observations drop the chart series cached from BCB data and queue the
+    snapshots of portfolios with index-linked fixed income.
+    """
+    codes = [int(code) for code in (series_codes or BCB_INDEX_SERIES_START)]
+    result = {"series": len(codes), "observations": 0, "failed": []}
+    changed_codes = []
+    for code in codes:
+        start = BCB_INDEX_SERIES_START.get(code, BCB_INDEX_SERIES_START[11])
+        try:
+            changed = _bcb_series_sync(code, start)
+        except Exception:
+            get_db().rollback()
+            _LOGGER.exception("Falha ao sincronizar a serie BCB %s.", code)
+            changed = None
+        if changed is None:
+            result["failed"].append(code)
+            continue
+        result["observations"] += int(changed)
+        if changed:
+            changed_codes.append(code)
+    if changed_codes:
+        invalidate_chart_series_dependencies(["market:bcb"])
+    if set(changed_codes) & {11, 433}:
+        rows = get_db().execute(
+            """
+            SELECT DISTINCT portfolio_id FROM fixed_incomes
+            WHERE rate_cdi > 0 OR rate_ipca > 0 OR rate_type != 'FIXO'
+            """
+        ).fetchall()
+        mark_portfolios_dirty(
+            [row["portfolio_id"] for row in rows],
+            priority=SNAPSHOT_REBUILD_PRIORITY_MARKET_DATA,
+            reason="bcb_index",
+        )
+    return result
+
+
+def _bcb_index_factor_rows(db, series_code: int, multiplier: float):
+    """Persisted prefix log-sums of ``1 + value/100 * multiplier`` for the
+    stored observations, extended with the days added since the last build."""
+    code = int(series_code)
+    last = db.execute(
+        """
+        SELECT obs_date, cum_log_factor FROM bcb_index_factors
+        WHERE series_code = ? AND multiplier = ?
+        ORDER BY obs_date DESC LIMIT 1
+        """,
+        (code, multiplier),
+    ).fetchone()
+    last_date = last["obs_date"] if last is not None else ""
+    base = float(last["cum_log_factor"]) if last is not None else 0.0
+    pending = db.execute(
+        """
+        SELECT obs_date, value FROM bcb_series_observations
+        WHERE series_code = ? AND obs_date > ?
+        ORDER BY obs_date
+        """,
+        (code, last_date),
+    ).fetchall()
+    if pending:
+        values = np.array([float(row["value"]) for row in pending], dtype=float)
+        cumulative = base + np.cumsum(np.log1p(values / 100.0 * multiplier))
+        db.executemany(
+            """
+            INSERT OR REPLACE INTO bcb_index_factors (series_code, multiplier, obs_date, value, cum_log_factor)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            [
+                (code, multiplier, row["obs_date"], float(value), float(cum))
+                for row, value, cum in zip(pending, values, cumulative)
+            ],
+        )
+        db.commit()
+    return db.execute(
+        """
+        SELECT obs_date, value, cum_log_factor FROM bcb_index_factors
+        WHERE series_code = ? AND multiplier = ?
+        ORDER BY obs_date
+        """,
+        (code, multiplier),
+    ).fetchall()
+
+
+def _bcb_series_version(db, series_code: int):
+    row = db.execute(
+        "SELECT version FROM data_versions WHERE scope = 'bcb_series' AND item_key = ?",
+        (str(int(series_code)),),
+    ).fetchone()
+    return int(row["version"]) if row is not None else 0
+
+
+def _bcb_index_factor_table(series_code: int, multiplier: float):
+    """In-memory factor table ``(dates, values, prefix, arrays)`` for a series
+    and multiplier; ``prefix[i]`` is the log of the compound factor of the
+    first ``i`` observations and ``arrays`` holds the same data as NumPy arrays
+    (day ordinals, values, prefix) for fixed_income_kernel. Revalidated
+    against the series version on TTL expiry."""
+    code = int(series_code)
+    multiplier = float(multiplier)
+    db = get_db()
+    entry = _BCB_INDEX_FACTOR_CACHE.get(code)
+    if entry is None:
+        version = _bcb_series_version(db, code)
+        stale = _BCB_INDEX_FACTOR_CACHE.get_stale(code)
+        entry = stale if stale is not None and stale["version"] == version else {"version": version, "tables": {}}
+        _BCB_INDEX_FACTOR_CACHE.set(code, entry)
+    table = entry["tables"].get(multiplier)
+    if table is None:
+        rows = _bcb_index_factor_rows(db, code, multiplier)
+        dates = [row["obs_date"] for row in rows]
+        values = [float(row["value"]) for row in rows]
+        prefix = [0.0] + [float(row["cum_log_factor"]) for row in rows]
+        arrays = (
+            np.array([date.fromisoformat(day).toordinal() for day in dates], dtype=np.int64),
+            np.array(values, dtype=float),
+            np.array(prefix, dtype=float),
+        )
+        table = (dates, values, prefix, arrays)
+        entry["tables"][multiplier] = table
+    return table
+
+
+def _bcb_index_factor_lookup(table, start_date, end_date, multiplier: float, extrapolation_step_days: float):
+    """Compound factor over [start_date, end_date] from a factor table: two
+    bisects and a subtraction, extrapolated past the last observation."""
+    dates, values, prefix, _arrays = table
+    lo = bisect_left(dates, start_date.strftime("%Y-%m-%d"))
+    hi = bisect_right(dates, end_date.strftime("%Y-%m-%d"))
+    if hi <= lo:
+        return 1.0, False
+    factor = math.exp(prefix[hi] - prefix[lo])
+    last_series_date = date.fromisoformat(dates[hi - 1])
+    missing_days = max((end_date - last_series_date).days, 0)
+    if missing_days > 0 and extrapolation_step_days > 0:
+        step_factor = 1 + ((values[hi - 1] / 100.0) * multiplier)
+        factor *= step_factor ** (missing_days / extrapolation_step_days)
+    return factor, True
+
+
+def _compound_from_bcb_series(
+    series_code: int,
+    start_date,
+    end_date,
+    multiplier: float = 1.0,
     extrapolation_step_days: float = 1.0,
 ):
     if start_date > end_date:
         return 1.0, True
     start_iso = start_date.strftime("%Y-%m-%d")
+    if has_app_context():
+        # Somente a serie local (sync_bcb_index_series); nunca o BCB na request.
+        try:
+            table = _bcb_index_factor_table(series_code, multiplier)
+        except Exception:
+            return 1.0, False
+        return _bcb_index_factor_lookup(table, start_date, end_date, multiplier, extrapolation_step_days)
+
+    # Fora do app (scripts): janela direto do BCB, sem a tabela persistida.
     end_iso = end_date.strftime("%Y-%m-%d")
     try:
         series = _fetch_bcb_series(series_code, start_iso, end_iso)
@@ -2899,17 +3375,18 @@ def _is_usd_quoted_ticker(ticker: str):
 
 
 def _get_usdbrl_rate():
-    now = time.time()
-    stale_rate = _FX_CACHE["usdbrl"]
-    if _FX_CACHE["usdbrl"] is not None and now < _FX_CACHE["expires_at"]:
-        return _FX_CACHE["usdbrl"]
+    rate = _FX_CACHE.get_or_set("usdbrl", _fetch_usdbrl_rate, should_cache=lambda value: value is not None)
+    if rate is not None:
+        return rate
+    # Se nada respondeu agora, usa ultimo valor em cache para evitar falhas em lote.
+    return _FX_CACHE.get_stale("usdbrl")
+
 
+def _fetch_usdbrl_rate():
     for symbol in ("BRL=X", "USDBRL=X"):
         quote = _fetch_yahoo_quote(symbol)
         rate = _to_number(quote.get("regularMarketPrice")) or _to_number(quote.get("postMarketPrice"))
         if rate is not None and rate > 0:
-            _FX_CACHE["usdbrl"] = rate
-            _FX_CACHE["expires_at"] = now + 300
             return rate
 
     # Fallback HTTP fora do Yahoo (mais resiliencia quando Yahoo oscila).
@@ -2919,8 +3396,6 @@ def _get_usdbrl_rate():
     except Exception:
         awesome_rate = None
     if awesome_rate is not None and awesome_rate > 0:
-        _FX_CACHE["usdbrl"] = awesome_rate
-        _FX_CACHE["expires_at"] = now + 300
         return awesome_rate
 
     erapi = _http_get_json("https://open.er-api.com/v6/latest/USD")
@@ -2929,8 +3404,6 @@ def _get_usdbrl_rate():
     except Exception:
         erapi_rate = None
     if erapi_rate is not None and erapi_rate > 0:
-        _FX_CACHE["usdbrl"] = erapi_rate
-        _FX_CACHE["expires_at"] = now + 300
         return erapi_rate
 
     if yf is not None:
@@ -2945,8 +3418,6 @@ def _get_usdbrl_rate():
                     or _to_number(_safe_get(info, "currentPrice"))
                 )
                 if rate is not None and rate > 0:
-                    _FX_CACHE["usdbrl"] = rate
-                    _FX_CACHE["expires_at"] = now + 300
                     return rate
             except Exception:
                 continue
@@ -2958,13 +3429,10 @@ def _get_usdbrl_rate():
                 if hist is not None and not hist.empty:
                     rate = _to_number(hist["Close"].dropna().iloc[-1])
                     if rate is not None and rate > 0:
-                        _FX_CACHE["usdbrl"] = rate
-                        _FX_CACHE["expires_at"] = now + 300
                         return rate
             except Exception:
                 continue
-    # Se nada respondeu agora, usa ultimo valor em cache para evitar falhas em lote.
-    return stale_rate
+    return None
 
 
 def _metrics_in_brl_if_needed(ticker: str, metrics: dict):
@@ -3046,7 +3514,7 @@ def migrate_us_assets_stored_to_usd():
         db.commit()
         return {"status": "done", "tx": 0, "incomes": 0, "reason": "no-us-rows"}
 
-    day_map = _download_daily_close_map("USDBRL=X", "max") or _download_daily_close_map("BRL=X", "max")
+    day_map = _download_daily_close_maps({_USDBRL_HISTORY_KEY: _USDBRL_HISTORY_SYMBOLS}, "max")[_USDBRL_HISTORY_KEY]
     fallback_rate = _get_usdbrl_rate()
 
     def _rate_on(date_value):
@@ -3227,7 +3695,20 @@ def _get_yahoo_asset_price_history(ticker: str, range_key: str = "1y"):
     for symbol in _candidate_yahoo_symbols(ticker):
         points = []
 
-        if yf is not None:
+        if cfg["interval"] in ("1d", "1wk"):
+            # Faixas diarias/semanais saem do store compartilhado (fechamento ajustado).
+            cache_ttl = (
+                int(current_app.config.get("YAHOO_DAILY_CACHE_TTL_SECONDS", 1800)) if has_app_context() else 1800
+            )
+            weekly = {}
+            for day_key, close in sorted(_price_closes_map(symbol, cfg["period"], cache_ttl).items()):
+                dt = datetime.strptime(day_key, "%Y-%m-%d")
+                if cfg["interval"] == "1d":
+                    points.append((dt, close))
+                else:
+                    weekly[dt.isocalendar()[:2]] = (dt, close)
+            points.extend(weekly.values())
+        elif yf is not None:
             try:
                 hist = yf.download(
                     symbol,
@@ -3792,15 +4273,9 @@ def _normalize_fixed_income_rate_components(rate_type, annual_rate, rate_fixed,
     return fixed, ipca, cdi
 
 
-def _fixed_income_projection_at_date(item, reference_date):
-    aporte_date = datetime.strptime(item["date_aporte"], "%Y-%m-%d").date()
-    maturity_date = datetime.strptime(item["maturity_date"], "%Y-%m-%d").date()
-    today = reference_date if isinstance(reference_date, date) else datetime.now().date()
-
-    principal = float(item["aporte"]) + float(item["reinvested"])
-    total_days = max((maturity_date - aporte_date).days, 1)
-    elapsed_days = max(min((today - aporte_date).days, total_days), 0)
-
+def _fixed_income_rate_components(item):
+    """``(rate_type, rate_fixed, rate_ipca, rate_cdi)`` of a fixed-income row,
+    with legacy records (only annual_rate) mapped to their components."""
     annual_rate = max(float(item.get("annual_rate", 0.0)), 0.0)
     rate_fixed = max(float(item.get("rate_fixed", 0.0)), 0.0)
     rate_ipca = max(float(item.get("rate_ipca", 0.0)), 0.0)
@@ -3827,6 +4302,18 @@ def _fixed_income_projection_at_date(item, reference_date):
         rate_ipca,
         rate_cdi,
     )
+    return rate_type, rate_fixed, rate_ipca, rate_cdi
+
+
+def _fixed_income_projection_at_date(item, reference_date):
+    aporte_date = datetime.strptime(item["date_aporte"], "%Y-%m-%d").date()
+    maturity_date = datetime.strptime(item["maturity_date"], "%Y-%m-%d").date()
+    today = reference_date if isinstance(reference_date, date) else datetime.now().date()
+
+    principal = float(item["aporte"]) + float(item["reinvested"])
+    total_days = max((maturity_date - aporte_date).days, 1)
+    elapsed_days = max(min((today - aporte_date).days, total_days), 0)
+    rate_type, rate_fixed, rate_ipca, rate_cdi = _fixed_income_rate_components(item)
 
     def _fixed_factor(days: int):
         if days <= 0 or rate_fixed <= 0:
@@ -3899,6 +4386,12 @@ def _fixed_income_projection_at_date(item, reference_date):
     current_value = principal * current_factor
     final_value = principal * final_factor
     is_matured = today >= maturity_date
+    return _fixed_income_projected_item(
+        item, principal, elapsed_days, total_days, is_matured, current_value, final_value
+    )
+
+
+def _fixed_income_projected_item(item, principal, elapsed_days, total_days, is_matured, current_value, final_value):
     active_applied_value = 0.0 if is_matured else principal
     active_current_value = 0.0 if is_matured else current_value
     active_current_income = 0.0 if is_matured else (current_value - principal)
@@ -3925,6 +4418,153 @@ def _fixed_income_projection_at_date(item, reference_date):
     return projected
 
 
+def _fixed_income_projections(items):
+    return _fixed_income_projections_at_dates(items, datetime.now().date())
+
+
+def _fixed_income_day_ordinal(text):
+    try:
+        return date.fromisoformat(text).toordinal()
+    except (TypeError, ValueError):
+        return datetime.strptime(text, "%Y-%m-%d").toordinal()
+
+
+def _fixed_income_index_factors(series_code, kind, rate, start, end, days, extrapolation_step_days):
+    """Index leg (CDI/IPCA) of every row: one factor table per distinct rate,
+    rows without BCB data fall back to the assumed annual index rate.
+
+    ``rate`` and ``start`` have one entry per row; ``end``/``days`` are (rows,)
+    or (rows, days) for a whole daily grid.
+    """
+    factors = np.ones(np.shape(end))
+    active = rate > 0
+    if not active.any():
+        return factors
+    has_data = np.zeros(factors.shape, dtype=bool)
+    row_shape = (1,) * (factors.ndim - 1)
+    try:
+        for rate_pct in np.unique(rate[active]):
+            rows = active & (rate == rate_pct)
+            multiplier = float(rate_pct) / 100.0
+            ordinals, values, prefix = _bcb_index_factor_table(series_code, multiplier)[3]
+            row_start = start[rows].reshape(-1, *row_shape)
+            factors[rows], has_data[rows] = fixed_income_kernel.window_factors(
+                ordinals, values, prefix, row_start, end[rows], multiplier, extrapolation_step_days
+            )
+    except Exception:
+        factors[:] = 1.0
+        has_data[:] = False
+    missing = active.reshape(-1, *row_shape) & ~has_data
+    if missing.any():
+        effective_annual = (rate / 100.0) * _index_annual_fallback_pct(kind)
+        effective_annual = np.broadcast_to(effective_annual.reshape(-1, *row_shape), factors.shape)
+        factors[missing] = fixed_income_kernel.annualized_factors(effective_annual[missing], days[missing])
+    return factors
+
+
+def _fixed_income_batch_rows(items):
+    """Fixed-income rows as arrays for fixed_income_kernel (one entry per row)."""
+    count = len(items)
+    rows = {
+        "aporte": np.empty(count, dtype=np.int64),
+        "maturity": np.empty(count, dtype=np.int64),
+        "principal": np.empty(count),
+        "rate_fixed": np.empty(count),
+        "rate_ipca": np.empty(count),
+        "rate_cdi": np.empty(count),
+        "type_codes": np.empty(count, dtype=np.int64),
+    }
+    for index, item in enumerate(items):
+        rows["aporte"][index] = _fixed_income_day_ordinal(item["date_aporte"])
+        rows["maturity"][index] = _fixed_income_day_ordinal(item["maturity_date"])
+        rows["principal"][index] = float(item["aporte"]) + float(item["reinvested"])
+        rate_type, rate_fixed, rate_ipca, rate_cdi = _fixed_income_rate_components(item)
+        rows["rate_fixed"][index] = rate_fixed
+        rows["rate_ipca"][index] = rate_ipca
+        rows["rate_cdi"][index] = rate_cdi
+        rows["type_codes"][index] = fixed_income_kernel.rate_type_code(rate_type)
+    rows["total_days"] = np.maximum(rows["maturity"] - rows["aporte"], 1)
+    return rows
+
+
+def _fixed_income_batch_factors(rows, days):
+    """Compound factor of each row over ``days`` counted from its aporte;
+    ``days`` is (rows,) or (rows, days)."""
+    days = np.asarray(days, dtype=np.int64)
+    row_shape = (-1,) + (1,) * (days.ndim - 1)
+    aporte = rows["aporte"]
+    end = aporte.reshape(row_shape) + days
+    return fixed_income_kernel.combine_factors(
+        rows["type_codes"].reshape(row_shape),
+        fixed_income_kernel.annualized_factors(rows["rate_fixed"].reshape(row_shape), days),
+        _fixed_income_index_factors(11, "cdi", rows["rate_cdi"], aporte, end, days, 1.0),
+        _fixed_income_index_factors(433, "ipca", rows["rate_ipca"], aporte, end, days, 30.0),
+    )
+
+
+def _fixed_income_projections_at_dates(items, reference_dates):
+    """_fixed_income_projection_at_date for many rows at once (NumPy).
+
+    ``reference_dates`` is one date for every row or a sequence with one date
+    per row. Output matches the scalar projection row by row.
+    """
+    items = list(items or [])
+    if isinstance(reference_dates, date) or reference_dates is None:
+        reference_dates = [reference_dates] * len(items)
+    else:
+        reference_dates = list(reference_dates)
+    if not items:
+        return []
+    if not has_app_context():
+        return [_fixed_income_projection_at_date(item, ref) for item, ref in zip(items, reference_dates)]
+
+    default_today = datetime.now().date()
+    rows = _fixed_income_batch_rows(items)
+    today = np.array(
+        [(ref if isinstance(ref, date) else default_today).toordinal() for ref in reference_dates], dtype=np.int64
+    )
+    total_days = rows["total_days"]
+    elapsed_days = np.maximum(np.minimum(today - rows["aporte"], total_days), 0)
+    principal = rows["principal"]
+    current_values = (principal * _fixed_income_batch_factors(rows, elapsed_days)).tolist()
+    final_values = (principal * _fixed_income_batch_factors(rows, total_days)).tolist()
+    is_matured = (today >= rows["maturity"]).tolist()
+    return [
+        _fixed_income_projected_item(item, principal_value, elapsed, total, matured, current_value, final_value)
+        for item, principal_value, elapsed, total, matured, current_value, final_value in zip(
+            items,
+            principal.tolist(),
+            elapsed_days.tolist(),
+            total_days.tolist(),
+            is_matured,
+            current_values,
+            final_values,
+        )
+    ]
+
+
+def _fixed_income_daily_values(items, day_keys):
+    """Gross value and applied principal of the active rows on each day.
+
+    One factor grid (rows x days) over the cumulative CDI/IPCA tables; a row
+    counts from its aporte until the day before maturity, like
+    current_gross_value / active_applied_value of the scalar projection.
+    """
+    day_ordinals = np.array([date.fromisoformat(key).toordinal() for key in day_keys], dtype=np.int64)
+    items = list(items or [])
+    if not items or not len(day_ordinals):
+        return np.zeros(len(day_ordinals)), np.zeros(len(day_ordinals))
+    rows = _fixed_income_batch_rows(items)
+    aporte = rows["aporte"][:, None]
+    elapsed_days = np.maximum(np.minimum(day_ordinals[None, :] - aporte, rows["total_days"][:, None]), 0)
+    factors = _fixed_income_batch_factors(rows, elapsed_days)
+    active = (day_ordinals[None, :] >= aporte) & (day_ordinals[None, :] < rows["maturity"][:, None])
+    principal = rows["principal"][:, None]
+    values = np.where(active, principal * factors, 0.0).sum(axis=0)
+    invested = np.where(active, principal, 0.0).sum(axis=0)
+    return values, invested
+
+
 def get_fixed_incomes(portfolio_ids, sort_by: str = "date_aporte", sort_dir: str = "desc"):
     from . import portfolio as portfolio_services
 
@@ -3945,36 +4585,45 @@ def get_fixed_income_summary_from_items(items):
 
     return portfolio_services.get_fixed_income_summary_from_items(items)
 
-def _memory_cache_get(cache_store, cache_key):
-    entry = cache_store.get(cache_key)
-    if not entry:
-        return None
-    expires_at = float(entry.get("expires_at", 0.0) or 0.0)
-    if expires_at > 0 and time.time() < expires_at:
-        return entry.get("value")
-    cache_store.pop(cache_key, None)
-    return None
-
-
-def _memory_cache_set(cache_store, cache_key, value, ttl_seconds: int):
-    cache_store[cache_key] = {
-        "value": value,
-        "expires_at": time.time() + max(int(ttl_seconds), 1),
-    }
-
-
-def _clear_benchmark_cache():
-    _BENCHMARK_CACHE.clear()
-
-
 # --- DB-backed read-through cache for heavy chart series -----------------------
 # Shared across gunicorn workers and persisted across restarts (table
 # chart_series_cache). Common portfolio combinations are kept warm by the
 # periodic rebuild_chart_snapshots job; uncommon combinations are served stale
 # while a single background thread refreshes them (stale-while-revalidate).
+# Each entry is tagged (chart_series_cache_deps) with the portfolios and market
+# data it was built from, so a change only drops the entries that depend on it.
 
 _CHART_SERIES_REFRESH_INFLIGHT = set()
 _CHART_SERIES_REFRESH_LOCK = threading.Lock()
+_CHART_SERIES_MARKET_DEPENDENCIES = {
+    "patrimony_open_pnl_by_type": ("market:quotes", "market:price_closes", "market:bcb"),
+    "benchmark_comparison": ("market:quotes", "market:price_closes", "market:bcb"),
+    "variable_income_value_daily": ("market:quotes", "market:price_closes"),
+    "fixed_income_value_daily": ("market:bcb",),
+}
+# Per-process counters, exposed in /api/metrics.
+_CHART_SERIES_CACHE_STATS = {"hits": 0, "stale_hits": 0, "misses": 0, "writes": 0, "invalidated": 0}
+_CHART_SERIES_CACHE_STATS_LOCK = threading.Lock()
+
+
+def _chart_series_cache_count(counter, amount=1):
+    with _CHART_SERIES_CACHE_STATS_LOCK:
+        _CHART_SERIES_CACHE_STATS[counter] += amount
+
+
+def get_chart_series_cache_stats():
+    with _CHART_SERIES_CACHE_STATS_LOCK:
+        stats = dict(_CHART_SERIES_CACHE_STATS)
+    lookups = stats["hits"] + stats["stale_hits"] + stats["misses"]
+    stats["lookups"] = lookups
+    stats["hit_rate"] = round((stats["hits"] + stats["stale_hits"]) / lookups, 4) if lookups else None
+    return stats
+
+
+def _chart_series_dependencies(name, pids):
+    dependencies = [f"portfolio:{pid}" for pid in sorted(normalize_portfolio_ids(pids))]
+    dependencies.extend(_CHART_SERIES_MARKET_DEPENDENCIES.get(name, ()))
+    return dependencies
 
 
 def _chart_series_cache_key(name, pids, range_key, scope_key=None):
@@ -3997,13 +4646,13 @@ def _chart_series_cache_read(cache_key):
     if row is None:
         return None
     try:
-        payload = json.loads(row["payload_json"])
+        payload = unpack_payload(row["payload_json"])
     except (TypeError, ValueError):
         return None
     return payload, _snapshot_age_seconds(row["updated_at"])
 
 
-def _chart_series_cache_write(cache_key, payload):
+def _chart_series_cache_write(cache_key, payload, dependencies):
     try:
         db = get_db()
         db.execute(
@@ -4014,9 +4663,15 @@ def _chart_series_cache_write(cache_key, payload):
               payload_json = excluded.payload_json,
               updated_at = excluded.updated_at
             """,
-            (cache_key, json.dumps(payload, ensure_ascii=False), _snapshot_now()),
+            (cache_key, pack_payload(payload), _snapshot_now()),
+        )
+        db.execute("DELETE FROM chart_series_cache_deps WHERE cache_key = ?", (cache_key,))
+        db.executemany(
+            "INSERT OR IGNORE INTO chart_series_cache_deps (dependency, cache_key) VALUES (?, ?)",
+            [(dependency, cache_key) for dependency in dependencies],
         )
         db.commit()
+        _chart_series_cache_count("writes")
     except Exception:
         try:
             get_db().rollback()
@@ -4024,7 +4679,7 @@ def _chart_series_cache_write(cache_key, payload):
             pass
 
 
-def _chart_series_refresh_async(app, cache_key, pids, compute_fn):
+def _chart_series_refresh_async(app, cache_key, pids, compute_fn, dependencies):
     """Recompute a chart series in the background and store it. One per key."""
     with _CHART_SERIES_REFRESH_LOCK:
         if cache_key in _CHART_SERIES_REFRESH_INFLIGHT:
@@ -4035,7 +4690,7 @@ def _chart_series_refresh_async(app, cache_key, pids, compute_fn):
         try:
             with app.app_context():
                 payload = compute_fn(pids)
-                _chart_series_cache_write(cache_key, payload)
+                _chart_series_cache_write(cache_key, payload, dependencies)
         except Exception:
             app.logger.exception("Falha ao atualizar chart_series_cache %s", cache_key)
         finally:
@@ -4053,17 +4708,53 @@ def _cached_chart_series(name, pids, range_key, compute_fn, scope_key=None):
     """
     max_age = int(current_app.config.get("CHART_SERIES_CACHE_MAX_AGE_SECONDS", 900))
     cache_key = _chart_series_cache_key(name, pids, range_key, scope_key)
+    dependencies = _chart_series_dependencies(name, pids)
     cached = _chart_series_cache_read(cache_key)
     if cached is not None:
         payload, age = cached
         if age is not None and age > max_age and has_app_context():
+            _chart_series_cache_count("stale_hits")
             _chart_series_refresh_async(
-                current_app._get_current_object(), cache_key, pids, compute_fn
+                current_app._get_current_object(), cache_key, pids, compute_fn, dependencies
             )
+        else:
+            _chart_series_cache_count("hits")
         return payload
-    payload = compute_fn(pids)
-    _chart_series_cache_write(cache_key, payload)
-    return payload
+    _chart_series_cache_count("misses")
+
+    def _compute_and_store():
+        payload = compute_fn(pids)
+        _chart_series_cache_write(cache_key, payload, dependencies)
+        return payload
+
+    def _stored_by_other_worker():
+        found = _chart_series_cache_read(cache_key)
+        return None if found is None else found[0]
+
+    return single_flight(f"chart_series:{cache_key}", _compute_and_store, recheck_fn=_stored_by_other_worker)
+
+
+def invalidate_chart_series_dependencies(dependencies):
+    """Drop the cached chart series built from any of ``dependencies``."""
+    dependencies = sorted(set(dependencies))
+    if not dependencies:
+        return 0
+    placeholders = ",".join(["?"] * len(dependencies))
+    db = get_db()
+    keys = [
+        row["cache_key"]
+        for row in db.execute(
+            "SELECT DISTINCT cache_key FROM chart_series_cache_deps WHERE dependency IN (" + placeholders + ")",
+            tuple(dependencies),
+        ).fetchall()
+    ]
+    if not keys:
+        return 0
+    key_params = [(key,) for key in keys]
+    db.executemany("DELETE FROM chart_series_cache WHERE cache_key = ?", key_params)
+    db.executemany("DELETE FROM chart_series_cache_deps WHERE cache_key = ?", key_params)
+    _chart_series_cache_count("invalidated", len(keys))
+    return len(keys)
 
 
 def invalidate_fixed_income_snapshot(portfolio_ids):
@@ -4168,171 +4859,568 @@ def get_sectors_summary():
 
     return portfolio_services.get_sectors_summary()
 
-def get_portfolio_snapshot(portfolio_ids, sort_by: str = "name", sort_dir: str = "asc"):
-    pids = normalize_portfolio_ids(portfolio_ids)
-    placeholders = ",".join(["?"] * len(pids))
+def _apply_position_transactions(state: dict, tx_rows):
+    """Average-cost replay of tx_rows (ordered by date, id) on top of state.
+
+    Checkpoint states also carry cumulative "bought"/"sold" amounts (sales
+    only count up to the open shares)."""
+    for tx in tx_rows:
+        tx_shares = float(tx["shares"] or 0.0)
+        if tx["tx_type"] == "buy":
+            state["shares"] += tx_shares
+            state["open_shares"] += tx_shares
+            state["open_cost"] += tx_shares * float(tx["price"] or 0.0)
+            if "bought" in state:
+                state["bought"] += tx_shares * float(tx["price"] or 0.0)
+        else:
+            state["shares"] -= tx_shares
+            if state["open_shares"] > 0:
+                avg_price = state["open_cost"] / state["open_shares"]
+                sell_shares = min(tx_shares, state["open_shares"])
+                state["open_shares"] -= sell_shares
+                state["open_cost"] -= avg_price * sell_shares
+                if "sold" in state:
+                    state["sold"] += sell_shares * float(tx["price"] or 0.0)
+                if state["open_shares"] == 0:
+                    state["open_cost"] = 0.0
+        state["last_tx_date"] = tx["date"]
+        state["last_tx_id"] = int(tx["id"])
+    return state
+
+
+def refresh_position_state(portfolio_ids=None):
+    """Settle dirty position_state rows (all portfolios when ids is None).
+
+    dirty=1 only applies the transactions appended after last_tx_date/id on
+    top of the stored state; dirty=2 replays the position from scratch. Rows
+    touched concurrently (version changed) stay dirty for the next call.
+    """
     db = get_db()
-    rows = db.execute(
-        """
-        SELECT
-            a.ticker,
-            a.name,
-            a.sector,
-            a.logo_url,
-            a.market_data_status,
-            a.market_data_source,
-            a.market_data_updated_at,
-            a.market_data_last_attempt_at,
-            a.market_data_last_error,
-            b.shares,
-            a.price,
-            a.dy,
-            (a.price * b.shares) AS value
-        FROM assets a
-        JOIN (
-            SELECT
-                ticker,
-                SUM(CASE WHEN tx_type = 'buy' THEN shares ELSE -shares END) AS shares
-            FROM transactions
-            WHERE portfolio_id IN ("""
-        + placeholders
-        + """)
-            GROUP BY ticker
-            HAVING shares > 0
-        ) b ON b.ticker = a.ticker
-        ORDER BY value DESC
-        """,
-        tuple(pids),
-    ).fetchall()
+    query = """
+        SELECT portfolio_id, ticker, shares, open_shares, open_cost, total_incomes,
+               last_tx_date, last_tx_id, dirty, version
+        FROM position_state
+        WHERE dirty > 0
+    """
+    params = []
+    if portfolio_ids is not None:
+        pids = [int(pid) for pid in portfolio_ids]
+        if not pids:
+            return 0
+        query += " AND portfolio_id IN (" + ",".join(["?"] * len(pids)) + ")"
+        params.extend(pids)
+    rows = db.execute(query, tuple(params)).fetchall()
+    if not rows:
+        return 0
 
-    positions = []
-    total = 0.0
-    monthly_dividends = 0.0
-    invested_total = 0.0
-    incomes_total = 0.0
-    incomes_current_month = 0.0
-    incomes_3m = 0.0
-    incomes_12m = 0.0
+    settled = 0
+    stamp = _snapshot_now()
+    try:
+        for row in rows:
+            portfolio_id = int(row["portfolio_id"])
+            ticker = row["ticker"]
+            if int(row["dirty"]) == 1:
+                state = {
+                    "shares": float(row["shares"] or 0.0),
+                    "open_shares": float(row["open_shares"] or 0.0),
+                    "open_cost": float(row["open_cost"] or 0.0),
+                    "total_incomes": float(row["total_incomes"] or 0.0),
+                    "last_tx_date": row["last_tx_date"],
+                    "last_tx_id": row["last_tx_id"],
+                }
+                last_date = row["last_tx_date"] or ""
+                tx_rows = db.execute(
+                    """
+                    SELECT id, tx_type, shares, price, date
+                    FROM transactions
+                    WHERE portfolio_id = ? AND ticker = ?
+                      AND (date > ? OR (date = ? AND id > ?))
+                    ORDER BY date ASC, id ASC
+                    """,
+                    (portfolio_id, ticker, last_date, last_date, int(row["last_tx_id"] or 0)),
+                ).fetchall()
+            else:
+                income_row = db.execute(
+                    """
+                    SELECT COALESCE(SUM(amount), 0) AS total_incomes
+                    FROM incomes
+                    WHERE portfolio_id = ? AND ticker = ?
+                    """,
+                    (portfolio_id, ticker),
+                ).fetchone()
+                state = {
+                    "shares": 0.0,
+                    "open_shares": 0.0,
+                    "open_cost": 0.0,
+                    "total_incomes": float(income_row["total_incomes"] or 0.0),
+                    "last_tx_date": None,
+                    "last_tx_id": None,
+                }
+                tx_rows = db.execute(
+                    """
+                    SELECT id, tx_type, shares, price, date
+                    FROM transactions
+                    WHERE portfolio_id = ? AND ticker = ?
+                    ORDER BY date ASC, id ASC
+                    """,
+                    (portfolio_id, ticker),
+                ).fetchall()
+            _apply_position_transactions(state, tx_rows)
+            avg_price = (
+                state["open_cost"] / state["open_shares"] if state["open_shares"] > 0 else 0.0
+            )
+            cursor = db.execute(
+                """
+                UPDATE position_state
+                SET shares = ?,
+                    open_shares = ?,
+                    open_cost = ?,
+                    avg_price = ?,
+                    total_incomes = ?,
+                    last_tx_date = ?,
+                    last_tx_id = ?,
+                    dirty = 0,
+                    updated_at = ?
+                WHERE portfolio_id = ? AND ticker = ? AND version = ?
+                """,
+                (
+                    state["shares"],
+                    state["open_shares"],
+                    state["open_cost"],
+                    avg_price,
+                    state["total_incomes"],
+                    state["last_tx_date"],
+                    state["last_tx_id"],
+                    stamp,
+                    portfolio_id,
+                    ticker,
+                    int(row["version"]),
+                ),
+            )
+            settled += cursor.rowcount or 0
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return settled
 
-    for row in rows:
-        item = dict(row)
-        total += item["value"]
-        monthly_dividends += item["value"] * (item["dy"] / 100) / 12
-        positions.append(
-            {
-                "ticker": item["ticker"],
-                "name": item["name"],
-                "sector": item["sector"],
-                "logo_url": item.get("logo_url", ""),
-                "shares": item["shares"],
-                "price": item["price"],
-                "value": item["value"],
-                "market_data": _market_data_meta_from_asset(item),
-            }
-        )
 
-    # Custo em aberto por ticker (media movel), para calcular resultado em aberto da carteira.
-    tx_rows = db.execute(
-        """
-        SELECT ticker, tx_type, shares, price
-        FROM transactions
-        WHERE portfolio_id IN ("""
-        + placeholders
-        + """)
-        ORDER BY ticker ASC, date ASC, id ASC
-        """,
-        tuple(pids),
-    ).fetchall()
-    # Acoes US guardam price/amount em USD; converte para BRL pela cotacao de hoje.
-    usdbrl_rate = _get_usdbrl_rate()
-    cost_state = {}
-    for tx in tx_rows:
-        ticker = tx["ticker"]
-        current = cost_state.get(ticker, {"shares": 0, "cost": 0.0})
-        shares = current["shares"]
-        cost = current["cost"]
+# --- Point-in-time positions (event replay over monthly checkpoints) ----------
+# position_checkpoints keeps, per portfolio, the average-cost state of every
+# ticker at the end of each month from the first to the last event month, in
+# native currency with cumulative bought/sold/incomes, watermarked in
+# portfolio_dirty_months like the monthly flows. A position on any date is the
+# last checkpoint up to it plus the events since, so the chart builders and
+# the as_of snapshot never replay the whole history.
 
-        tx_price = _usd_to_brl_amount(ticker, tx["price"], usdbrl_rate)
-        if tx["tx_type"] == "buy":
-            shares += tx["shares"]
-            cost += tx["shares"] * tx_price
-        else:
-            if shares > 0:
-                avg_price = cost / shares
-                sell_shares = min(tx["shares"], shares)
-                shares -= sell_shares
-                cost -= avg_price * sell_shares
-                if shares == 0:
-                    cost = 0.0
+_POSITION_CHECKPOINT_FIELDS = ("shares", "open_shares", "open_cost", "bought", "sold", "incomes")
 
-        cost_state[ticker] = {"shares": shares, "cost": cost}
 
-    today = datetime.now().date()
-    current_month_start = today.replace(day=1)
+def _empty_position_checkpoint():
+    state = dict.fromkeys(_POSITION_CHECKPOINT_FIELDS, 0.0)
+    state["last_tx_date"] = None
+    state["last_tx_id"] = None
+    return state
 
-    def _subtract_months(date_value, months_back):
-        year = date_value.year
-        month = date_value.month - months_back
-        while month <= 0:
-            month += 12
-            year -= 1
-        return date_value.replace(year=year, month=month, day=1)
 
-    start_3m = _subtract_months(current_month_start, 2)
-    start_12m = _subtract_months(current_month_start, 11)
+def _next_month_key(month_key):
+    year, month = int(month_key[:4]), int(month_key[5:7])
+    return f"{year + month // 12:04d}-{month % 12 + 1:02d}"
+
+
+def _checkpoint_cutoff_month(as_of_date):
+    """Last month whose closing checkpoint is on or before ``as_of_date``."""
+    if (as_of_date + timedelta(days=1)).month != as_of_date.month:
+        return f"{as_of_date.year:04d}-{as_of_date.month:02d}"
+    previous = as_of_date.replace(day=1) - timedelta(days=1)
+    return f"{previous.year:04d}-{previous.month:02d}"
+
 
-    # Proventos por ticker para as carteiras selecionadas.
-    income_rows = db.execute(
+def _position_events(db, portfolio_id, after_date, until_date="9999-12-31"):
+    """Transactions and incomes with ``after_date < date <= until_date`` in
+    replay order; rows with an unparseable date are skipped."""
+    events = []
+    for row in db.execute(
         """
-        SELECT ticker, COALESCE(SUM(amount), 0) AS total_incomes
-        FROM incomes
-        WHERE portfolio_id IN ("""
-        + placeholders
-        + """)
-        GROUP BY ticker
+        SELECT id, ticker, tx_type, shares, price, date
+        FROM transactions
+        WHERE portfolio_id = ? AND date > ? AND date <= ?
+        ORDER BY date ASC, id ASC
         """,
-        tuple(pids),
-    ).fetchall()
-    incomes_by_ticker = {
-        row["ticker"]: _usd_to_brl_amount(row["ticker"], float(row["total_incomes"]), usdbrl_rate)
-        for row in income_rows
-    }
-    incomes_total = sum(incomes_by_ticker.values())
-    income_current_month_rows = db.execute(
+        (portfolio_id, after_date, until_date),
+    ):
+        if row["ticker"] and _flow_month_key(row["date"]):
+            events.append((row["date"], 0, int(row["id"]), row))
+    for row in db.execute(
         """
-        SELECT ticker, COALESCE(SUM(amount), 0) AS total_incomes
+        SELECT id, ticker, amount, date
         FROM incomes
-        WHERE portfolio_id IN ("""
-        + placeholders
-        + """)
-          AND date >= ?
-        GROUP BY ticker
+        WHERE portfolio_id = ? AND date > ? AND date <= ?
+        ORDER BY date ASC, id ASC
         """,
-        tuple(pids + [current_month_start.strftime("%Y-%m-%d")]),
-    ).fetchall()
-    incomes_current_month_by_ticker = {
-        row["ticker"]: _usd_to_brl_amount(row["ticker"], float(row["total_incomes"]), usdbrl_rate)
-        for row in income_current_month_rows
+        (portfolio_id, after_date, until_date),
+    ):
+        if row["ticker"] and _flow_month_key(row["date"]):
+            events.append((row["date"], 1, int(row["id"]), row))
+    events.sort(key=lambda event: event[:3])
+    return events
+
+
+def _apply_position_events(positions, events):
+    for _date, kind, _event_id, row in events:
+        state = positions.get(row["ticker"])
+        if state is None:
+            state = positions[row["ticker"]] = _empty_position_checkpoint()
+        if kind:
+            state["incomes"] += float(row["amount"] or 0.0)
+        else:
+            _apply_position_transactions(state, (row,))
+    return positions
+
+
+def _load_position_checkpoint(db, portfolio_id, month_key):
+    positions = {}
+    for row in db.execute(
+        """
+        SELECT ticker, shares, open_shares, open_cost, bought, sold, incomes
+        FROM position_checkpoints
+        WHERE portfolio_id = ? AND month_key = ?
+        """,
+        (portfolio_id, month_key),
+    ):
+        state = _empty_position_checkpoint()
+        for field in _POSITION_CHECKPOINT_FIELDS:
+            state[field] = float(row[field] or 0.0)
+        positions[row["ticker"]] = state
+    return positions
+
+
+def _refresh_position_checkpoints(portfolio_ids):
+    """Rewrite the checkpoints of the dirty months of ``portfolio_ids`` from
+    the last clean checkpoint on."""
+    return _refresh_dirty_months("position_checkpoints", portfolio_ids, _rebuild_position_checkpoints)
+
+
+def _rebuild_position_checkpoints(db, pid, from_month):
+    base_month = None
+    if from_month:
+        base_month = db.execute(
+            "SELECT MAX(month_key) AS month_key FROM position_checkpoints WHERE portfolio_id = ? AND month_key < ?",
+            (pid, from_month),
+        ).fetchone()["month_key"]
+    positions = {}
+    after_date = ""
+    if base_month:
+        positions = _load_position_checkpoint(db, pid, base_month)
+        after_date = _month_key_to_date_bounds(base_month)[1].isoformat()
+    events = _position_events(db, pid, after_date)
+
+    rows = []
+    if events:
+        month_key = _next_month_key(base_month) if base_month else events[0][0][:7]
+        last_month = events[-1][0][:7]
+        index = 0
+        while month_key <= last_month:
+            month_end = _month_key_to_date_bounds(month_key)[1].isoformat()
+            start = index
+            while index < len(events) and events[index][0][:10] <= month_end:
+                index += 1
+            _apply_position_events(positions, events[start:index])
+            rows.extend(
+                (pid, month_key, ticker, *(values[field] for field in _POSITION_CHECKPOINT_FIELDS))
+                for ticker, values in positions.items()
+            )
+            month_key = _next_month_key(month_key)
+
+    db.execute(
+        "DELETE FROM position_checkpoints WHERE portfolio_id = ? AND month_key > ?",
+        (pid, base_month or ""),
+    )
+    db.executemany(
+        """
+        INSERT INTO position_checkpoints
+          (portfolio_id, month_key, ticker, shares, open_shares, open_cost, bought, sold, incomes)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        rows,
+    )
+
+
+def _positions_as_of(portfolio_ids, as_of_dates):
+    """Position state per ticker, summed over ``portfolio_ids``, at the end of
+    each date in ``as_of_dates``. Returns ``(states, replayed_events)``: one
+    ``{ticker: state}`` per date and how many events were replayed on top of
+    the checkpoints."""
+    pids = normalize_portfolio_ids(portfolio_ids)
+    dates = [
+        value if isinstance(value, date) else datetime.strptime(str(value)[:10], "%Y-%m-%d").date()
+        for value in as_of_dates
+    ]
+    results = [{} for _ in dates]
+    if not dates:
+        return results, 0
+    _refresh_position_checkpoints(pids)
+    db = get_db()
+    replayed = 0
+    for pid in pids:
+        stored_months = [
+            row["month_key"]
+            for row in db.execute(
+                "SELECT DISTINCT month_key FROM position_checkpoints WHERE portfolio_id = ? ORDER BY month_key",
+                (pid,),
+            )
+        ]
+        loaded = {}
+        for index, as_of in enumerate(dates):
+            position = bisect_right(stored_months, _checkpoint_cutoff_month(as_of))
+            base_month = stored_months[position - 1] if position else None
+            if base_month not in loaded:
+                loaded[base_month] = _load_position_checkpoint(db, pid, base_month) if base_month else {}
+            positions = {ticker: dict(values) for ticker, values in loaded[base_month].items()}
+            after_date = _month_key_to_date_bounds(base_month)[1].isoformat() if base_month else ""
+            until_date = as_of.isoformat()
+            if after_date < until_date:
+                events = _position_events(db, pid, after_date, until_date)
+                _apply_position_events(positions, events)
+                replayed += len(events)
+            merged = results[index]
+            for ticker, values in positions.items():
+                target = merged.get(ticker)
+                if target is None:
+                    merged[ticker] = {field: values[field] for field in _POSITION_CHECKPOINT_FIELDS}
+                    continue
+                for field in _POSITION_CHECKPOINT_FIELDS:
+                    target[field] += values[field]
+    return results, replayed
+
+
+_AS_OF_SORT_KEYS = (
+    "ticker",
+    "name",
+    "shares",
+    "price",
+    "avg_price",
+    "invested_value",
+    "value",
+    "open_pnl_value",
+    "total_incomes",
+    "weight",
+)
+
+
+def _stored_close_as_of(db, candidates, as_of_text):
+    for symbol in candidates or []:
+        row = db.execute(
+            """
+            SELECT close FROM price_closes
+            WHERE symbol = ? AND interval = '1d' AND date <= ?
+            ORDER BY date DESC
+            LIMIT 1
+            """,
+            ((symbol or "").strip().upper(), as_of_text),
+        ).fetchone()
+        if row is not None:
+            return float(row["close"])
+    return None
+
+
+def get_portfolio_snapshot_as_of(portfolio_ids, as_of, sort_by: str = "value", sort_dir: str = "desc"):
+    """Positions of ``portfolio_ids`` at the end of ``as_of`` (date or
+    YYYY-MM-DD). Prices come from the local daily closes store (no download);
+    from today on the current asset price is used, like the live snapshot."""
+    pids = normalize_portfolio_ids(portfolio_ids)
+    as_of_date = as_of if isinstance(as_of, date) else datetime.strptime(str(as_of or "").strip(), "%Y-%m-%d").date()
+    as_of_text = as_of_date.isoformat()
+    (states,), replayed = _positions_as_of(pids, [as_of_date])
+    db = get_db()
+    held = sorted(ticker for ticker, state in states.items() if state["shares"] > 0)
+    assets = {}
+    if held:
+        assets = {
+            row["ticker"]: row
+            for row in db.execute(
+                "SELECT ticker, name, sector, price FROM assets WHERE ticker IN (" + ",".join(["?"] * len(held)) + ")",
+                tuple(held),
+            ).fetchall()
+        }
+    usdbrl_rate = _get_usdbrl_rate()
+    use_current_price = as_of_date >= datetime.now().date()
+    usdbrl_close = None if use_current_price else _stored_close_as_of(db, _USDBRL_HISTORY_SYMBOLS, as_of_text)
+
+    positions = []
+    missing_prices = []
+    for ticker in held:
+        asset = assets.get(ticker)
+        if asset is None:
+            continue
+        state = states[ticker]
+        if use_current_price:
+            price = float(asset["price"] or 0.0)
+        else:
+            price = _stored_close_as_of(db, _candidate_yahoo_symbols(ticker), as_of_text)
+            if price is not None and _is_us_stock_ticker(ticker):
+                price = _usd_to_brl_amount(ticker, price, usdbrl_rate)
+            elif price is not None and _is_usd_quoted_ticker(ticker):
+                # Cripto cotada em USD: cambio da data (ou o de hoje, se nao houver).
+                price *= usdbrl_close or usdbrl_rate or 1.0
+        if price is None:
+            missing_prices.append(ticker)
+        invested = _usd_to_brl_amount(ticker, state["open_cost"], usdbrl_rate)
+        value = state["shares"] * price if price is not None else 0.0
+        positions.append(
+            {
+                "ticker": ticker,
+                "name": asset["name"],
+                "sector": asset["sector"],
+                "category": _position_category(ticker, asset["name"], asset["sector"]),
+                "shares": state["shares"],
+                "price": None if price is None else round(price, 4),
+                "value": round(value, 2),
+                "invested_value": round(invested, 2),
+                "avg_price": round(invested / state["shares"], 2) if state["shares"] > 0 else 0.0,
+                "open_pnl_value": round(value - invested, 2) if price is not None else None,
+                "total_incomes": round(_usd_to_brl_amount(ticker, state["incomes"], usdbrl_rate), 2),
+            }
+        )
+
+    total = sum(item["value"] for item in positions)
+    invested_total = sum(item["invested_value"] for item in positions)
+    # Como no snapshot atual, proventos contam tambem de posicoes ja encerradas.
+    incomes_total = sum(_usd_to_brl_amount(ticker, state["incomes"], usdbrl_rate) for ticker, state in states.items())
+    for item in positions:
+        item["weight"] = round((item["value"] / total) * 100, 2) if total else 0.0
+
+    safe_sort_by = (sort_by or "").strip().lower()
+    if safe_sort_by not in _AS_OF_SORT_KEYS:
+        safe_sort_by = "value"
+    safe_sort_dir = "asc" if (sort_dir or "").strip().lower() == "asc" else "desc"
+
+    def _sort_value(item):
+        value = item.get(safe_sort_by)
+        if isinstance(value, str):
+            return value.upper()
+        return value if value is not None else 0
+
+    positions.sort(key=_sort_value, reverse=safe_sort_dir == "desc")
+    open_pnl_value = total - invested_total
+    return {
+        "as_of": as_of_text,
+        "total_value": round(total, 2),
+        "invested_value": round(invested_total, 2),
+        "open_pnl_value": round(open_pnl_value, 2),
+        "open_pnl_pct": round((open_pnl_value / invested_total) * 100, 2) if invested_total > 0 else 0.0,
+        "total_incomes": round(incomes_total, 2),
+        "positions": positions,
+        "missing_prices": missing_prices,
+        "replayed_events": replayed,
+        "sort_by": safe_sort_by,
+        "sort_dir": safe_sort_dir,
+        "usdbrl_rate": usdbrl_rate,
     }
-    income_3m_rows = db.execute(
+
+
+def get_portfolio_snapshot(portfolio_ids, sort_by: str = "name", sort_dir: str = "asc"):
+    pids = normalize_portfolio_ids(portfolio_ids)
+    placeholders = ",".join(["?"] * len(pids))
+    db = get_db()
+    # Normally a no-op: mutators settle their rows right after writing.
+    refresh_position_state(pids)
+    rows = db.execute(
         """
-        SELECT ticker, COALESCE(SUM(amount), 0) AS total_incomes
-        FROM incomes
-        WHERE portfolio_id IN ("""
+        SELECT
+            ps.ticker,
+            a.ticker AS asset_ticker,
+            a.name,
+            a.sector,
+            a.logo_url,
+            a.market_data_status,
+            a.market_data_source,
+            a.market_data_updated_at,
+            a.market_data_last_attempt_at,
+            a.market_data_last_error,
+            ps.shares,
+            ps.open_cost,
+            ps.total_incomes,
+            a.price,
+            a.dy,
+            (a.price * ps.shares) AS value
+        FROM (
+            SELECT
+                ticker,
+                SUM(shares) AS shares,
+                SUM(open_cost) AS open_cost,
+                SUM(total_incomes) AS total_incomes
+            FROM position_state
+            WHERE portfolio_id IN ("""
         + placeholders
         + """)
-          AND date >= ?
-        GROUP BY ticker
+            GROUP BY ticker
+        ) ps
+        LEFT JOIN assets a ON a.ticker = ps.ticker
+        ORDER BY value DESC
         """,
-        tuple(pids + [start_3m.strftime("%Y-%m-%d")]),
+        tuple(pids),
     ).fetchall()
-    incomes_3m_by_ticker = {
-        row["ticker"]: _usd_to_brl_amount(row["ticker"], float(row["total_incomes"]), usdbrl_rate)
-        for row in income_3m_rows
-    }
-    income_12m_rows = db.execute(
+
+    positions = []
+    total = 0.0
+    monthly_dividends = 0.0
+    invested_total = 0.0
+    incomes_total = 0.0
+    incomes_current_month = 0.0
+    incomes_3m = 0.0
+    incomes_12m = 0.0
+
+    # Acoes US guardam price/amount em USD; converte para BRL pela cotacao de hoje.
+    usdbrl_rate = _get_usdbrl_rate()
+    # Custo em aberto por ticker (media movel), para calcular resultado em aberto da carteira.
+    cost_state = {}
+    incomes_by_ticker = {}
+    for row in rows:
+        item = dict(row)
+        ticker = item["ticker"]
+        if abs(float(item["total_incomes"] or 0.0)) > 0.0000001:
+            incomes_by_ticker[ticker] = _usd_to_brl_amount(ticker, float(item["total_incomes"]), usdbrl_rate)
+        if item["asset_ticker"] is None or not (item["shares"] or 0) > 0:
+            continue
+        cost_state[ticker] = {"cost": _usd_to_brl_amount(ticker, float(item["open_cost"] or 0.0), usdbrl_rate)}
+        total += item["value"]
+        monthly_dividends += item["value"] * (item["dy"] / 100) / 12
+        positions.append(
+            {
+                "ticker": item["ticker"],
+                "name": item["name"],
+                "sector": item["sector"],
+                "logo_url": item.get("logo_url", ""),
+                "shares": item["shares"],
+                "price": item["price"],
+                "value": item["value"],
+                "market_data": _market_data_meta_from_asset(item),
+            }
+        )
+
+    today = datetime.now().date()
+    current_month_start = today.replace(day=1)
+
+    def _subtract_months(date_value, months_back):
+        year = date_value.year
+        month = date_value.month - months_back
+        while month <= 0:
+            month += 12
+            year -= 1
+        return date_value.replace(year=year, month=month, day=1)
+
+    start_3m = _subtract_months(current_month_start, 2)
+    start_12m = _subtract_months(current_month_start, 11)
+
+    # Proventos recentes por ticker: uma unica agregacao limitada aos ultimos 12 meses.
+    income_window_rows = db.execute(
         """
-        SELECT ticker, COALESCE(SUM(amount), 0) AS total_incomes
+        SELECT
+            ticker,
+            COALESCE(SUM(CASE WHEN date >= ? THEN amount ELSE 0 END), 0) AS incomes_current_month,
+            COALESCE(SUM(CASE WHEN date >= ? THEN amount ELSE 0 END), 0) AS incomes_3m,
+            COALESCE(SUM(amount), 0) AS incomes_12m
         FROM incomes
         WHERE portfolio_id IN ("""
         + placeholders
@@ -4340,12 +5428,22 @@ def get_portfolio_snapshot(portfolio_ids, sort_by: str = "name", sort_dir: str =
           AND date >= ?
         GROUP BY ticker
         """,
-        tuple(pids + [start_12m.strftime("%Y-%m-%d")]),
+        tuple(
+            [current_month_start.strftime("%Y-%m-%d"), start_3m.strftime("%Y-%m-%d")]
+            + pids
+            + [start_12m.strftime("%Y-%m-%d")]
+        ),
     ).fetchall()
-    incomes_12m_by_ticker = {
-        row["ticker"]: _usd_to_brl_amount(row["ticker"], float(row["total_incomes"]), usdbrl_rate)
-        for row in income_12m_rows
-    }
+    incomes_current_month_by_ticker = {}
+    incomes_3m_by_ticker = {}
+    incomes_12m_by_ticker = {}
+    for row in income_window_rows:
+        ticker = row["ticker"]
+        incomes_current_month_by_ticker[ticker] = _usd_to_brl_amount(
+            ticker, float(row["incomes_current_month"]), usdbrl_rate
+        )
+        incomes_3m_by_ticker[ticker] = _usd_to_brl_amount(ticker, float(row["incomes_3m"]), usdbrl_rate)
+        incomes_12m_by_ticker[ticker] = _usd_to_brl_amount(ticker, float(row["incomes_12m"]), usdbrl_rate)
     # Totais gerais derivam dos mapas por ticker (ja convertidos p/ BRL), garantindo
     # que topo == soma dos grupos == soma das posicoes mesmo com acoes US em USD.
     incomes_total = sum(incomes_by_ticker.values())
@@ -4454,130 +5552,204 @@ def get_portfolio_snapshot(portfolio_ids, sort_by: str = "name", sort_dir: str =
     }
 
 
-def _build_monthly_class_summary(portfolio_ids):
-    pids = normalize_portfolio_ids(portfolio_ids)
-    placeholders = ",".join(["?"] * len(pids))
-    db = get_db()
-
-    month_names = {
-        1: "jan",
-        2: "fev",
-        3: "mar",
-        4: "abr",
-        5: "mai",
-        6: "jun",
-        7: "jul",
-        8: "ago",
-        9: "set",
-        10: "out",
-        11: "nov",
-        12: "dez",
-    }
+# --- Monthly flow aggregates (monthly class / ticker summaries) ---------------
+# portfolio_monthly_flows keeps, per (portfolio, month, ticker), the bought
+# amount and the incomes in the asset's native currency. Triggers lower the
+# portfolio_dirty_months watermark to the earliest month touched by a
+# transaction/income change ('' = full rebuild); _refresh_dirty_months only
+# recomputes the months from there on. Categories and the USD rate are applied
+# when the summaries are read, so asset metadata and FX moves need no rebuild.
+
+_MONTHLY_FLOW_MONTH_RE = re.compile(r"^\d{4}-\d{2}$")
+_MONTHLY_CLASS_BUCKETS = {
+    "br_stocks": "br",
+    "us_stocks": "us",
+    "etfs": "etf",
+    "fiis": "fii",
+    "crypto": "cripto",
+}
+_MONTHLY_CLASS_METRIC_KEYS = (
+    "br_invested",
+    "br_incomes",
+    "us_invested",
+    "us_incomes",
+    "etf_invested",
+    "etf_incomes",
+    "fii_invested",
+    "fii_incomes",
+    "fixa_invested",
+    "fixa_incomes",
+    "cripto_invested",
+    "cripto_incomes",
+)
+_MONTH_SHORT_NAMES = {
+    1: "jan",
+    2: "fev",
+    3: "mar",
+    4: "abr",
+    5: "mai",
+    6: "jun",
+    7: "jul",
+    8: "ago",
+    9: "set",
+    10: "out",
+    11: "nov",
+    12: "dez",
+}
 
-    def _month_key(date_text: str):
-        try:
-            parsed = datetime.strptime((date_text or "")[:10], "%Y-%m-%d")
-            return parsed.year, parsed.month
-        except ValueError:
-            return None
 
-    def _category_bucket(ticker: str, name: str, sector: str):
-        category = _position_category(ticker, name, sector)
-        if category == "br_stocks":
-            return "br"
-        if category == "us_stocks":
-            return "us"
-        if category == "etfs":
-            return "etf"
-        if category == "fiis":
-            return "fii"
-        if category == "crypto":
-            return "cripto"
+def _flow_month_key(date_text):
+    try:
+        parsed = datetime.strptime((date_text or "")[:10], "%Y-%m-%d")
+    except ValueError:
         return None
+    return f"{parsed.year:04d}-{parsed.month:02d}"
 
-    usdbrl_rate = _get_usdbrl_rate()
-    rows_map = {}
-    month_set = set()
 
-    def _ensure_month_entry(month_key):
-        if month_key not in rows_map:
-            rows_map[month_key] = {
-                "br_invested": 0.0,
-                "br_incomes": 0.0,
-                "us_invested": 0.0,
-                "us_incomes": 0.0,
-                "etf_invested": 0.0,
-                "etf_incomes": 0.0,
-                "fii_invested": 0.0,
-                "fii_incomes": 0.0,
-                "fixa_invested": 0.0,
-                "fixa_incomes": 0.0,
-                "cripto_invested": 0.0,
-                "cripto_incomes": 0.0,
-            }
-        month_set.add(month_key)
+def _refresh_dirty_months(target, portfolio_ids, rebuild_fn):
+    """Settle the ``target`` rows of ``portfolio_ids`` from their
+    portfolio_dirty_months watermark on: ``rebuild_fn(db, pid, from_month)``
+    rewrites the months from ``from_month`` ('' = everything). Portfolios
+    without a watermark row are rebuilt from scratch; rows touched
+    concurrently (version changed) stay dirty for the next call."""
+    pids = sorted({int(pid) for pid in portfolio_ids or []})
+    if not pids:
+        return 0
+    db = get_db()
+    states = {
+        int(row["portfolio_id"]): row
+        for row in db.execute(
+            "SELECT portfolio_id, dirty_from, version FROM portfolio_dirty_months WHERE target = ? AND portfolio_id IN ("
+            + ",".join(["?"] * len(pids))
+            + ")",
+            (target, *pids),
+        ).fetchall()
+    }
+    stamp = _snapshot_now()
+    refreshed = 0
+    try:
+        for pid in pids:
+            state = states.get(pid)
+            if state is not None and state["dirty_from"] is None:
+                continue
+            from_month = "" if state is None else str(state["dirty_from"])
+            if not _MONTHLY_FLOW_MONTH_RE.match(from_month):
+                from_month = ""
+            rebuild_fn(db, pid, from_month)
+            if state is None:
+                db.execute(
+                    """
+                    INSERT INTO portfolio_dirty_months (portfolio_id, target, dirty_from, version, updated_at)
+                    VALUES (?, ?, NULL, 0, ?)
+                    ON CONFLICT(portfolio_id, target) DO NOTHING
+                    """,
+                    (pid, target, stamp),
+                )
+            else:
+                db.execute(
+                    """
+                    UPDATE portfolio_dirty_months
+                    SET dirty_from = NULL, updated_at = ?
+                    WHERE portfolio_id = ? AND target = ? AND version = ?
+                    """,
+                    (stamp, pid, target, int(state["version"])),
+                )
+            refreshed += 1
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return refreshed
+
+
+def _refresh_monthly_flows(portfolio_ids):
+    """Recompute the flow rows of the dirty months of ``portfolio_ids``."""
+    return _refresh_dirty_months("monthly_flows", portfolio_ids, _rebuild_monthly_flows)
 
-    tx_rows = db.execute(
+
+def _rebuild_monthly_flows(db, pid, from_month):
+    since = f"{from_month}-01" if from_month else ""
+    # [buy_amount, buy_count, income_amount, income_count, tx_count]
+    flows = {}
+    for row in db.execute(
         """
-        SELECT
-            t.date,
-            t.tx_type,
-            (t.shares * t.price) AS amount,
-            a.ticker,
-            a.name,
-            a.sector
-        FROM transactions t
-        JOIN assets a ON a.ticker = t.ticker
-        WHERE t.portfolio_id IN ("""
-        + placeholders
-        + """)
-        ORDER BY t.date ASC, t.id ASC
+        SELECT date, ticker, tx_type, (shares * price) AS amount
+        FROM transactions
+        WHERE portfolio_id = ? AND date >= ?
+        ORDER BY date ASC, id ASC
         """,
-        tuple(pids),
-    ).fetchall()
-    for row in tx_rows:
-        month_key = _month_key(row["date"])
-        if not month_key:
+        (pid, since),
+    ):
+        month_key = _flow_month_key(row["date"])
+        if not month_key or not row["ticker"]:
             continue
-        bucket = _category_bucket(row["ticker"], row["name"], row["sector"])
-        if not bucket:
+        slot = flows.setdefault((month_key, row["ticker"]), [0.0, 0, 0.0, 0, 0])
+        slot[4] += 1
+        if (row["tx_type"] or "").lower() == "buy":
+            slot[0] += float(row["amount"] or 0.0)
+            slot[1] += 1
+    for row in db.execute(
+        """
+        SELECT date, ticker, amount
+        FROM incomes
+        WHERE portfolio_id = ? AND date >= ?
+        ORDER BY date ASC, id ASC
+        """,
+        (pid, since),
+    ):
+        month_key = _flow_month_key(row["date"])
+        if not month_key or not row["ticker"]:
             continue
-        _ensure_month_entry(month_key)
-        # "Investidos" segue aporte de compras no mes.
-        if row["tx_type"] == "buy":
-            amount = _usd_to_brl_amount(row["ticker"], float(row["amount"] or 0.0), usdbrl_rate)
-            rows_map[month_key][f"{bucket}_invested"] += amount
+        slot = flows.setdefault((month_key, row["ticker"]), [0.0, 0, 0.0, 0, 0])
+        slot[2] += float(row["amount"] or 0.0)
+        slot[3] += 1
 
-    income_rows = db.execute(
+    db.execute(
+        "DELETE FROM portfolio_monthly_flows WHERE portfolio_id = ? AND month_key >= ?",
+        (pid, from_month),
+    )
+    db.executemany(
+        """
+        INSERT INTO portfolio_monthly_flows
+          (portfolio_id, month_key, ticker, buy_amount, buy_count, income_amount, income_count, tx_count)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        [(pid, month_key, ticker, *values) for (month_key, ticker), values in flows.items()],
+    )
+
+
+def _monthly_flow_rows(portfolio_ids):
+    """Stored flow rows of ``portfolio_ids`` (dirty months settled first)."""
+    pids = normalize_portfolio_ids(portfolio_ids)
+    _refresh_monthly_flows(pids)
+    rows = get_db().execute(
         """
         SELECT
-            i.date,
-            i.amount,
-            a.ticker,
+            f.month_key,
+            f.ticker,
+            f.buy_amount,
+            f.buy_count,
+            f.income_amount,
+            f.income_count,
+            f.tx_count,
+            a.ticker AS asset_ticker,
             a.name,
             a.sector
-        FROM incomes i
-        JOIN assets a ON a.ticker = i.ticker
-        WHERE i.portfolio_id IN ("""
-        + placeholders
+        FROM portfolio_monthly_flows f
+        LEFT JOIN assets a ON a.ticker = f.ticker
+        WHERE f.portfolio_id IN ("""
+        + ",".join(["?"] * len(pids))
         + """)
-        ORDER BY i.date ASC, i.id ASC
+        ORDER BY f.month_key ASC, f.ticker ASC
         """,
         tuple(pids),
     ).fetchall()
-    for row in income_rows:
-        month_key = _month_key(row["date"])
-        if not month_key:
-            continue
-        bucket = _category_bucket(row["ticker"], row["name"], row["sector"])
-        if not bucket:
-            continue
-        _ensure_month_entry(month_key)
-        rows_map[month_key][f"{bucket}_incomes"] += _usd_to_brl_amount(
-            row["ticker"], float(row["amount"] or 0.0), usdbrl_rate
-        )
+    return [dict(row) for row in rows]
 
-    fixed_rows = db.execute(
+
+def _monthly_fixed_income_items(portfolio_ids):
+    pids = normalize_portfolio_ids(portfolio_ids)
+    rows = get_db().execute(
         """
         SELECT
             id,
@@ -4592,248 +5764,157 @@ def _build_monthly_class_summary(portfolio_ids):
             reinvested
         FROM fixed_incomes
         WHERE portfolio_id IN ("""
-        + placeholders
+        + ",".join(["?"] * len(pids))
         + """)
         ORDER BY date_aporte ASC, id ASC
         """,
         tuple(pids),
     ).fetchall()
-    for row in fixed_rows:
-        item = dict(row)
-        aporte_month = _month_key(item["date_aporte"])
-        if aporte_month:
-            _ensure_month_entry(aporte_month)
-            rows_map[aporte_month]["fixa_invested"] += float(item.get("aporte") or 0.0)
-
-        maturity_month = _month_key(item["maturity_date"])
-        if maturity_month:
-            projected = _fixed_income_projection(item)
-            _ensure_month_entry(maturity_month)
-            rows_map[maturity_month]["fixa_incomes"] += float(projected.get("final_income") or 0.0)
+    return [dict(row) for row in rows]
 
-    if not month_set:
-        return []
 
-    ordered_months = sorted(month_set)
-    result = []
-    for year, month in ordered_months:
-        values = rows_map[(year, month)]
-        total_invested = (
-            values["br_invested"]
-            + values["us_invested"]
-            + values["etf_invested"]
-            + values["fii_invested"]
-            + values["fixa_invested"]
-            + values["cripto_invested"]
-        )
-        total_incomes = (
-            values["br_incomes"]
-            + values["us_incomes"]
-            + values["etf_incomes"]
-            + values["fii_incomes"]
-            + values["fixa_incomes"]
-            + values["cripto_incomes"]
-        )
-        result.append(
-            {
-                "label": f"{month_names[month]}/{str(year)[2:]}",
-                "br_invested": round(values["br_invested"], 2),
-                "br_incomes": round(values["br_incomes"], 2),
-                "us_invested": round(values["us_invested"], 2),
-                "us_incomes": round(values["us_incomes"], 2),
-                "etf_invested": round(values["etf_invested"], 2),
-                "etf_incomes": round(values["etf_incomes"], 2),
-                "fii_invested": round(values["fii_invested"], 2),
-                "fii_incomes": round(values["fii_incomes"], 2),
-                "fixa_invested": round(values["fixa_invested"], 2),
-                "fixa_incomes": round(values["fixa_incomes"], 2),
-                "cripto_invested": round(values["cripto_invested"], 2),
-                "cripto_incomes": round(values["cripto_incomes"], 2),
-                "total_invested": round(total_invested, 2),
-                "total_incomes": round(total_incomes, 2),
-            }
-        )
-    return result
+def _build_monthly_class_summary(portfolio_ids):
+    pids = normalize_portfolio_ids(portfolio_ids)
+    return _combine_monthly_class_rows(_monthly_flow_rows(pids), _monthly_fixed_income_items(pids))
 
 
 def _build_monthly_ticker_summary(portfolio_ids, months=24):
-    pids = normalize_portfolio_ids(portfolio_ids)
-    placeholders = ",".join(["?"] * len(pids))
-    db = get_db()
+    return _combine_monthly_ticker_summaries(_monthly_flow_rows(portfolio_ids), months=months)
 
-    try:
-        months = int(months)
-    except (TypeError, ValueError):
-        months = 8
-    months = max(1, min(months, 24))
-
-    month_names = {
-        1: "jan.",
-        2: "fev.",
-        3: "mar.",
-        4: "abr.",
-        5: "mai.",
-        6: "jun.",
-        7: "jul.",
-        8: "ago.",
-        9: "set.",
-        10: "out.",
-        11: "nov.",
-        12: "dez.",
-    }
-
-    def _month_key(date_text: str):
-        try:
-            parsed = datetime.strptime((date_text or "")[:10], "%Y-%m-%d")
-            return f"{parsed.year:04d}-{parsed.month:02d}"
-        except ValueError:
-            return None
-
-    def _month_label(month_key: str):
-        try:
-            year, month = month_key.split("-", 1)
-            month_num = int(month)
-            return f"{month_names.get(month_num, month)} / {str(year)[2:]}"
-        except (ValueError, TypeError):
-            return month_key
-
-    ticker_month_map = {}
-    month_totals = {}
-    month_set = set()
-    ticker_name_map = {}
-    ticker_category_map = {}
 
-    def _ensure_values(month_map, month_key):
-        if month_key not in month_map:
-            month_map[month_key] = {"invested": 0.0, "incomes": 0.0}
+def _combine_monthly_class_rows(flow_rows, fixed_items=(), usdbrl_rate=None):
+    """Monthly invested/incomes per class from stored flow rows (any mix of
+    portfolios) plus the fixed-income aportes and maturities."""
+    if usdbrl_rate is None:
+        usdbrl_rate = _get_usdbrl_rate()
+    rows_map = {}
+    bucket_cache = {}
 
-    usdbrl_rate = _get_usdbrl_rate()
-    tx_rows = db.execute(
-        """
-        SELECT
-            t.date,
-            t.ticker,
-            t.tx_type,
-            (t.shares * t.price) AS amount,
-            a.name,
-            a.sector
-        FROM transactions t
-        LEFT JOIN assets a ON a.ticker = t.ticker
-        WHERE t.portfolio_id IN ("""
-        + placeholders
-        + """)
-        ORDER BY t.date ASC, t.id ASC
-        """,
-        tuple(pids),
-    ).fetchall()
+    def _ensure_month_entry(month_key):
+        if month_key not in rows_map:
+            rows_map[month_key] = dict.fromkeys(_MONTHLY_CLASS_METRIC_KEYS, 0.0)
+        return rows_map[month_key]
 
-    for row in tx_rows:
-        month_key = _month_key(row["date"])
-        if not month_key:
-            continue
-        if (row["tx_type"] or "").lower() != "buy":
+    for row in flow_rows or []:
+        # Lancamentos de ativos fora do cadastro nao entram no resumo por classe.
+        if row.get("asset_ticker") is None:
             continue
-        ticker = (row["ticker"] or "").strip().upper()
-        if not ticker:
+        ticker = row["ticker"]
+        if ticker not in bucket_cache:
+            bucket_cache[ticker] = _MONTHLY_CLASS_BUCKETS.get(
+                _position_category(ticker, row.get("name"), row.get("sector"))
+            )
+        bucket = bucket_cache[ticker]
+        if not bucket or not (row.get("tx_count") or row.get("income_count")):
             continue
+        values = _ensure_month_entry(row["month_key"])
+        # "Investidos" segue aporte de compras no mes.
+        values[f"{bucket}_invested"] += _usd_to_brl_amount(ticker, float(row.get("buy_amount") or 0.0), usdbrl_rate)
+        values[f"{bucket}_incomes"] += _usd_to_brl_amount(
+            ticker, float(row.get("income_amount") or 0.0), usdbrl_rate
+        )
 
-        amount = _usd_to_brl_amount(ticker, float(row["amount"] or 0.0), usdbrl_rate)
-        ticker_name_map[ticker] = (row["name"] or ticker).strip() or ticker
-        ticker_category_map[ticker] = _position_category(ticker, row["name"], row["sector"])
-
-        ticker_values = ticker_month_map.setdefault(ticker, {})
-        _ensure_values(ticker_values, month_key)
-        ticker_values[month_key]["invested"] += amount
+    fixed_items = list(fixed_items or [])
+    for item, projected in zip(fixed_items, _fixed_income_projections(fixed_items)):
+        aporte_month = _flow_month_key(item["date_aporte"])
+        if aporte_month:
+            _ensure_month_entry(aporte_month)["fixa_invested"] += float(item.get("aporte") or 0.0)
 
-        _ensure_values(month_totals, month_key)
-        month_totals[month_key]["invested"] += amount
-        month_set.add(month_key)
+        maturity_month = _flow_month_key(item["maturity_date"])
+        if maturity_month:
+            _ensure_month_entry(maturity_month)["fixa_incomes"] += float(projected.get("final_income") or 0.0)
 
-    income_rows = db.execute(
-        """
-        SELECT
-            i.date,
-            i.ticker,
-            i.amount,
-            a.name,
-            a.sector
-        FROM incomes i
-        LEFT JOIN assets a ON a.ticker = i.ticker
-        WHERE i.portfolio_id IN ("""
-        + placeholders
-        + """)
-        ORDER BY i.date ASC, i.id ASC
-        """,
-        tuple(pids),
-    ).fetchall()
+    result = []
+    for month_key in sorted(rows_map):
+        values = rows_map[month_key]
+        year, month = month_key.split("-", 1)
+        entry = {"label": f"{_MONTH_SHORT_NAMES[int(month)]}/{year[2:]}"}
+        for key in _MONTHLY_CLASS_METRIC_KEYS:
+            entry[key] = round(values[key], 2)
+        entry["total_invested"] = round(
+            sum(values[key] for key in _MONTHLY_CLASS_METRIC_KEYS if key.endswith("_invested")), 2
+        )
+        entry["total_incomes"] = round(
+            sum(values[key] for key in _MONTHLY_CLASS_METRIC_KEYS if key.endswith("_incomes")), 2
+        )
+        result.append(entry)
+    return result
 
-    for row in income_rows:
-        month_key = _month_key(row["date"])
-        if not month_key:
-            continue
-        ticker = (row["ticker"] or "").strip().upper()
-        if not ticker:
-            continue
 
-        amount = _usd_to_brl_amount(ticker, float(row["amount"] or 0.0), usdbrl_rate)
-        ticker_name_map[ticker] = (row["name"] or ticker).strip() or ticker
-        ticker_category_map[ticker] = _position_category(ticker, row["name"], row["sector"])
+def _combine_monthly_ticker_summaries(flow_rows, months=8, usdbrl_rate=None):
+    """Invested/incomes per ticker for the last ``months`` months with
+    activity, from stored flow rows (any mix of portfolios)."""
+    try:
+        months = int(months)
+    except (TypeError, ValueError):
+        months = 8
+    months = max(1, min(months, 24))
+    if usdbrl_rate is None:
+        usdbrl_rate = _get_usdbrl_rate()
 
-        ticker_values = ticker_month_map.setdefault(ticker, {})
-        _ensure_values(ticker_values, month_key)
-        ticker_values[month_key]["incomes"] += amount
+    ticker_month_map = {}
+    month_totals = {}
+    ticker_name_map = {}
+    ticker_category_map = {}
 
-        _ensure_values(month_totals, month_key)
-        month_totals[month_key]["incomes"] += amount
-        month_set.add(month_key)
+    for row in flow_rows or []:
+        ticker = (row.get("ticker") or "").strip().upper()
+        if not ticker or not (row.get("buy_count") or row.get("income_count")):
+            continue
+        month_key = row["month_key"]
+        if ticker not in ticker_category_map:
+            ticker_name_map[ticker] = (row.get("name") or ticker).strip() or ticker
+            ticker_category_map[ticker] = _position_category(ticker, row.get("name"), row.get("sector"))
 
-    if not month_set:
+        ticker_values = ticker_month_map.setdefault(ticker, {}).setdefault(
+            month_key, {"invested": 0.0, "incomes": 0.0}
+        )
+        totals = month_totals.setdefault(month_key, {"invested": 0.0, "incomes": 0.0})
+        if row.get("buy_count"):
+            invested = _usd_to_brl_amount(ticker, float(row.get("buy_amount") or 0.0), usdbrl_rate)
+            ticker_values["invested"] += invested
+            totals["invested"] += invested
+        if row.get("income_count"):
+            incomes = _usd_to_brl_amount(ticker, float(row.get("income_amount") or 0.0), usdbrl_rate)
+            ticker_values["incomes"] += incomes
+            totals["incomes"] += incomes
+
+    if not month_totals:
         return {"months": [], "totals": [], "rows": []}
 
-    ordered_months = sorted(month_set)
-    if len(ordered_months) > months:
-        ordered_months = ordered_months[-months:]
-    selected_months = set(ordered_months)
-
-    month_items = [{"key": key, "label": _month_label(key)} for key in ordered_months]
-
-    totals = []
+    ordered_months = sorted(month_totals)[-months:]
+    month_items = []
     for key in ordered_months:
-        values = month_totals.get(key, {"invested": 0.0, "incomes": 0.0})
-        totals.append(
-            {
-                "month_key": key,
-                "invested": round(float(values.get("invested", 0.0)), 2),
-                "incomes": round(float(values.get("incomes", 0.0)), 2),
-            }
-        )
+        year, month = key.split("-", 1)
+        month_items.append({"key": key, "label": f"{_MONTH_SHORT_NAMES[int(month)]}. / {year[2:]}"})
+
+    totals = [
+        {
+            "month_key": key,
+            "invested": round(month_totals[key]["invested"], 2),
+            "incomes": round(month_totals[key]["incomes"], 2),
+        }
+        for key in ordered_months
+    ]
 
     rows = []
-    for ticker in sorted(ticker_month_map.keys()):
+    for ticker in sorted(ticker_month_map):
         per_month = ticker_month_map[ticker]
+        if not any(
+            key in per_month and (abs(per_month[key]["invested"]) > 0 or abs(per_month[key]["incomes"]) > 0)
+            for key in ordered_months
+        ):
+            continue
         month_values = {}
         row_invested = 0.0
         row_incomes = 0.0
-
         for key in ordered_months:
             values = per_month.get(key, {"invested": 0.0, "incomes": 0.0})
-            invested = round(float(values.get("invested", 0.0)), 2)
-            incomes = round(float(values.get("incomes", 0.0)), 2)
+            invested = round(values["invested"], 2)
+            incomes = round(values["incomes"], 2)
             month_values[key] = {"invested": invested, "incomes": incomes}
             row_invested += invested
             row_incomes += incomes
-
-        has_any_value = any(
-            key in selected_months
-            and (
-                abs(float(per_month.get(key, {}).get("invested", 0.0))) > 0
-                or abs(float(per_month.get(key, {}).get("incomes", 0.0))) > 0
-            )
-            for key in per_month.keys()
-        )
-        if not has_any_value:
-            continue
-
         rows.append(
             {
                 "ticker": ticker,
@@ -4848,235 +5929,282 @@ def _build_monthly_ticker_summary(portfolio_ids, months=24):
     return {"months": month_items, "totals": totals, "rows": rows}
 
 
-def _month_label_sort_key(label: str):
-    raw = (label or "").strip().lower()
-    if "/" not in raw:
-        return (0, 0)
-    month_key, year_short = raw.split("/", 1)
-    month_order = {
-        "jan": 1,
-        "fev": 2,
-        "mar": 3,
-        "abr": 4,
-        "mai": 5,
-        "jun": 6,
-        "jul": 7,
-        "ago": 8,
-        "set": 9,
-        "out": 10,
-        "nov": 11,
-        "dez": 12,
-    }
-    try:
-        return (2000 + int(year_short), month_order.get(month_key, 0))
-    except ValueError:
-        return (0, 0)
-
-
-def _combine_monthly_class_rows(parts):
-    metric_keys = (
-        "br_invested",
-        "br_incomes",
-        "us_invested",
-        "us_incomes",
-        "etf_invested",
-        "etf_incomes",
-        "fii_invested",
-        "fii_incomes",
-        "fixa_invested",
-        "fixa_incomes",
-        "cripto_invested",
-        "cripto_incomes",
+# --- Data versions (ETags of the polled GET endpoints) -------------------------
+# data_versions keeps one monotonic counter per portfolio and per asset. Anything
+# that can change what a portfolio/asset endpoint returns bumps it, so the API
+# can answer If-None-Match with 304 without rebuilding the payload.
+
+
+def bump_data_versions(scope, item_keys):
+    keys = sorted({str(key).strip() for key in item_keys or []} - {""})
+    if not keys:
+        return 0
+    stamp = _snapshot_now()
+    db = get_db()
+    db.executemany(
+        """
+        INSERT INTO data_versions (scope, item_key, version, updated_at)
+        VALUES (?, ?, 1, ?)
+        ON CONFLICT(scope, item_key) DO UPDATE SET
+          version = data_versions.version + 1,
+          updated_at = excluded.updated_at
+        """,
+        [(scope, key, stamp) for key in keys],
     )
-    rows_map = {}
-    for rows in parts:
-        for row in rows or []:
-            label = row.get("label")
-            if not label:
-                continue
-            if label not in rows_map:
-                rows_map[label] = {"label": label}
-                for key in metric_keys:
-                    rows_map[label][key] = 0.0
-            for key in metric_keys:
-                rows_map[label][key] += float(row.get(key, 0.0) or 0.0)
+    db.commit()
+    return len(keys)
 
-    result = []
-    for label in sorted(rows_map.keys(), key=_month_label_sort_key):
-        values = rows_map[label]
-        total_invested = (
-            values["br_invested"]
-            + values["us_invested"]
-            + values["etf_invested"]
-            + values["fii_invested"]
-            + values["fixa_invested"]
-            + values["cripto_invested"]
-        )
-        total_incomes = (
-            values["br_incomes"]
-            + values["us_incomes"]
-            + values["etf_incomes"]
-            + values["fii_incomes"]
-            + values["fixa_incomes"]
-            + values["cripto_incomes"]
-        )
-        result.append(
-            {
-                "label": label,
-                "br_invested": round(values["br_invested"], 2),
-                "br_incomes": round(values["br_incomes"], 2),
-                "us_invested": round(values["us_invested"], 2),
-                "us_incomes": round(values["us_incomes"], 2),
-                "etf_invested": round(values["etf_invested"], 2),
-                "etf_incomes": round(values["etf_incomes"], 2),
-                "fii_invested": round(values["fii_invested"], 2),
-                "fii_incomes": round(values["fii_incomes"], 2),
-                "fixa_invested": round(values["fixa_invested"], 2),
-                "fixa_incomes": round(values["fixa_incomes"], 2),
-                "cripto_invested": round(values["cripto_invested"], 2),
-                "cripto_incomes": round(values["cripto_incomes"], 2),
-                "total_invested": round(total_invested, 2),
-                "total_incomes": round(total_incomes, 2),
-            }
-        )
-    return result
 
+def bump_portfolio_versions(portfolio_ids):
+    return bump_data_versions("portfolio", (int(pid) for pid in portfolio_ids or []))
 
-def _trim_monthly_ticker_summary(payload, months=8):
-    if not payload:
-        return {"months": [], "totals": [], "rows": []}
-    try:
-        months = int(months)
-    except (TypeError, ValueError):
-        months = 8
-    months = max(1, min(months, 24))
 
-    ordered_months = list(payload.get("months") or [])
-    if len(ordered_months) > months:
-        ordered_months = ordered_months[-months:]
-    month_keys = [item.get("key") for item in ordered_months if item.get("key")]
+def bump_asset_versions(tickers):
+    return bump_data_versions("asset", (str(ticker or "").strip().upper() for ticker in tickers or []))
 
-    totals_map = {
-        item.get("month_key"): {
-            "invested": round(float(item.get("invested", 0.0) or 0.0), 2),
-            "incomes": round(float(item.get("incomes", 0.0) or 0.0), 2),
-        }
-        for item in (payload.get("totals") or [])
-        if item.get("month_key")
-    }
-    totals = [
-        {
-            "month_key": key,
-            "invested": totals_map.get(key, {}).get("invested", 0.0),
-            "incomes": totals_map.get(key, {}).get("incomes", 0.0),
-        }
-        for key in month_keys
+
+def get_portfolio_data_version(portfolio_ids):
+    """Version of everything a portfolio-scoped payload reads: the portfolios'
+    own counters, the counters of the assets they hold and the current day
+    (daily series and fixed-income accruals roll over at midnight)."""
+    pids = normalize_portfolio_ids(portfolio_ids)
+    today = _snapshot_now()[:10]
+    if not pids:
+        return (today,)
+    placeholders = ",".join(["?"] * len(pids))
+    db = get_db()
+    rows = db.execute(
+        "SELECT item_key, version FROM data_versions WHERE scope = 'portfolio' AND item_key IN ("
+        + placeholders
+        + ")",
+        tuple(str(pid) for pid in pids),
+    ).fetchall()
+    versions = {row["item_key"]: int(row["version"]) for row in rows}
+    held = db.execute(
+        """
+        SELECT COUNT(v.version) AS total, COALESCE(SUM(v.version), 0) AS version_sum
+        FROM (SELECT DISTINCT ticker FROM position_state WHERE portfolio_id IN ("""
+        + placeholders
+        + """)) ps
+        JOIN data_versions v ON v.scope = 'asset' AND v.item_key = ps.ticker
+        """,
+        tuple(pids),
+    ).fetchone()
+    return (
+        today,
+        tuple((pid, versions.get(str(pid), 0)) for pid in pids),
+        int(held["total"]),
+        int(held["version_sum"]),
+    )
+
+
+def get_portfolio_as_of_data_version(portfolio_ids, as_of):
+    """What get_portfolio_snapshot_as_of reads besides the portfolio counters:
+    the counters of every asset traded up to ``as_of`` (held then, even if
+    sold since) and the last sync of their stored daily closes and of the
+    USD/BRL history."""
+    pids = normalize_portfolio_ids(portfolio_ids)
+    as_of_text = as_of.isoformat() if isinstance(as_of, date) else str(as_of or "").strip()
+    if not pids:
+        return (as_of_text,)
+    db = get_db()
+    tickers = [
+        row["ticker"]
+        for row in db.execute(
+            "SELECT DISTINCT ticker FROM transactions WHERE portfolio_id IN ("
+            + ",".join(["?"] * len(pids))
+            + ") AND date <= ?",
+            (*pids, as_of_text),
+        ).fetchall()
+        if row["ticker"]
     ]
+    assets = (0, 0)
+    if tickers:
+        row = db.execute(
+            "SELECT COUNT(*) AS total, COALESCE(SUM(version), 0) AS version_sum FROM data_versions "
+            "WHERE scope = 'asset' AND item_key IN (" + ",".join(["?"] * len(tickers)) + ")",
+            tuple(tickers),
+        ).fetchone()
+        assets = (int(row["total"]), int(row["version_sum"]))
+    symbols = sorted(
+        {(symbol or "").strip().upper() for ticker in tickers for symbol in _candidate_yahoo_symbols(ticker)}
+        | set(_USDBRL_HISTORY_SYMBOLS)
+    )
+    synced = db.execute(
+        "SELECT MAX(synced_at) AS synced_at FROM price_close_sync WHERE interval = '1d' AND symbol IN ("
+        + ",".join(["?"] * len(symbols))
+        + ")",
+        tuple(symbols),
+    ).fetchone()["synced_at"]
+    return (as_of_text, assets, synced)
 
-    rows = []
-    for row in payload.get("rows") or []:
-        per_month = {}
-        total_invested = 0.0
-        total_incomes = 0.0
-        source_months = row.get("months") or {}
-        for key in month_keys:
-            values = source_months.get(key) or {}
-            invested = round(float(values.get("invested", 0.0) or 0.0), 2)
-            incomes = round(float(values.get("incomes", 0.0) or 0.0), 2)
-            per_month[key] = {"invested": invested, "incomes": incomes}
-            total_invested += invested
-            total_incomes += incomes
-        has_any_value = any(
-            abs(float(values.get("invested", 0.0) or 0.0)) > 0
-            or abs(float(values.get("incomes", 0.0) or 0.0)) > 0
-            for values in per_month.values()
-        )
-        if not has_any_value:
-            continue
-        rows.append(
-            {
-                "ticker": row.get("ticker", ""),
-                "name": row.get("name", row.get("ticker", "")),
-                "category": row.get("category", ""),
-                "total_invested": round(total_invested, 2),
-                "total_incomes": round(total_incomes, 2),
-                "months": per_month,
-            }
-        )
 
-    rows.sort(key=lambda item: str(item.get("ticker", "")).upper())
-    return {"months": ordered_months, "totals": totals, "rows": rows}
+def get_assets_data_version():
+    row = get_db().execute(
+        """
+        SELECT
+          (SELECT COUNT(*) FROM assets) AS assets_total,
+          (SELECT COUNT(*) FROM data_versions WHERE scope = 'asset') AS versioned,
+          (SELECT COALESCE(SUM(version), 0) FROM data_versions WHERE scope = 'asset') AS version_sum
+        """
+    ).fetchone()
+    return (int(row["assets_total"]), int(row["versioned"]), int(row["version_sum"]))
+
+
+# --- Dirty-portfolio queue for the background snapshot rebuilds ---------------
+# Mutations and market-data refreshes enqueue the portfolios they affect
+# (snapshot_rebuild_queue, one row per portfolio + target); the chart and
+# fixed-income loops only rebuild what is queued, highest priority first.
+# A snapshot built today stays valid past its max age while nothing is queued
+# for its portfolio; snapshots from a previous day are re-queued by the loop.
+
+SNAPSHOT_REBUILD_PRIORITY_MUTATION = 2
+SNAPSHOT_REBUILD_PRIORITY_MARKET_DATA = 1
+SNAPSHOT_REBUILD_PRIORITY_EXPIRED = 0
+_SNAPSHOT_REBUILD_TARGET_TABLES = {
+    "chart": "chart_snapshot_state",
+    "fixed_income": "fixed_income_snapshot_summary",
+}
 
 
-def _combine_monthly_ticker_summaries(parts, months=8):
-    month_label_map = {}
-    month_totals = {}
-    ticker_rows = {}
+def mark_portfolios_dirty(
+    portfolio_ids,
+    targets=("chart", "fixed_income"),
+    priority=SNAPSHOT_REBUILD_PRIORITY_MUTATION,
+    reason="",
+):
+    """Queue snapshot rebuilds; re-queuing keeps the highest priority and the
+    original position, and bumps version so an in-flight rebuild keeps it."""
+    pids = sorted({int(pid) for pid in portfolio_ids or []})
+    if not pids:
+        return 0
+    stamp = _snapshot_now()
+    db = get_db()
+    db.executemany(
+        """
+        INSERT INTO snapshot_rebuild_queue (portfolio_id, target, priority, reason, enqueued_at, version)
+        VALUES (?, ?, ?, ?, ?, 1)
+        ON CONFLICT(portfolio_id, target) DO UPDATE SET
+          priority = MAX(snapshot_rebuild_queue.priority, excluded.priority),
+          reason = CASE
+            WHEN excluded.priority > snapshot_rebuild_queue.priority THEN excluded.reason
+            ELSE snapshot_rebuild_queue.reason
+          END,
+          version = snapshot_rebuild_queue.version + 1
+        """,
+        [(pid, target, int(priority), str(reason or ""), stamp) for pid in pids for target in targets],
+    )
+    db.commit()
+    if priority > SNAPSHOT_REBUILD_PRIORITY_EXPIRED:
+        # Expired snapshots only matter on a new day, already part of the version.
+        bump_portfolio_versions(pids)
+    return len(pids)
 
-    for payload in parts:
-        for month in payload.get("months") or []:
-            month_key = month.get("key")
-            if month_key:
-                month_label_map[month_key] = month.get("label") or month_key
 
-        for total in payload.get("totals") or []:
-            month_key = total.get("month_key")
-            if not month_key:
-                continue
-            state = month_totals.setdefault(month_key, {"invested": 0.0, "incomes": 0.0})
-            state["invested"] += float(total.get("invested", 0.0) or 0.0)
-            state["incomes"] += float(total.get("incomes", 0.0) or 0.0)
+def mark_ticker_holders_dirty(tickers, reason="market_data"):
+    """Queue the chart rebuild of every portfolio holding one of ``tickers``."""
+    clean = sorted({str(ticker or "").strip().upper() for ticker in tickers or []} - {""})
+    if not clean:
+        return 0
+    placeholders = ",".join(["?"] * len(clean))
+    rows = get_db().execute(
+        "SELECT DISTINCT portfolio_id FROM position_state WHERE shares > 0 AND ticker IN (" + placeholders + ")",
+        tuple(clean),
+    ).fetchall()
+    return mark_portfolios_dirty(
+        [row["portfolio_id"] for row in rows],
+        targets=("chart",),
+        priority=SNAPSHOT_REBUILD_PRIORITY_MARKET_DATA,
+        reason=reason,
+    )
 
-        for row in payload.get("rows") or []:
-            ticker = (row.get("ticker") or "").strip().upper()
-            if not ticker:
-                continue
-            state = ticker_rows.setdefault(
-                ticker,
-                {
-                    "ticker": ticker,
-                    "name": row.get("name", ticker),
-                    "category": row.get("category", ""),
-                    "months": {},
-                },
-            )
-            if not state.get("category") and row.get("category"):
-                state["category"] = row.get("category")
-            for month_key, values in (row.get("months") or {}).items():
-                month_state = state["months"].setdefault(month_key, {"invested": 0.0, "incomes": 0.0})
-                month_state["invested"] += float(values.get("invested", 0.0) or 0.0)
-                month_state["incomes"] += float(values.get("incomes", 0.0) or 0.0)
-
-    ordered_month_keys = sorted(month_label_map.keys())
-    merged = {
-        "months": [{"key": key, "label": month_label_map.get(key, key)} for key in ordered_month_keys],
-        "totals": [
-            {
-                "month_key": key,
-                "invested": round(float(month_totals.get(key, {}).get("invested", 0.0)), 2),
-                "incomes": round(float(month_totals.get(key, {}).get("incomes", 0.0)), 2),
-            }
-            for key in ordered_month_keys
-        ],
-        "rows": [],
-    }
-    for ticker in sorted(ticker_rows.keys()):
-        row = ticker_rows[ticker]
-        merged["rows"].append(
-            {
-                "ticker": ticker,
-                "name": row.get("name", ticker),
-                "category": row.get("category", ""),
-                "months": {
-                    key: {
-                        "invested": round(float(values.get("invested", 0.0) or 0.0), 2),
-                        "incomes": round(float(values.get("incomes", 0.0) or 0.0), 2),
-                    }
-                    for key, values in (row.get("months") or {}).items()
-                },
-            }
+
+def _pending_snapshot_rebuilds(portfolio_ids, target):
+    pids = [int(pid) for pid in portfolio_ids]
+    if not pids:
+        return set()
+    try:
+        rows = get_db().execute(
+            "SELECT portfolio_id FROM snapshot_rebuild_queue WHERE target = ? AND portfolio_id IN ("
+            + ",".join(["?"] * len(pids))
+            + ")",
+            (target, *pids),
+        ).fetchall()
+    except sqlite3.Error:
+        return set(pids)
+    return {int(row["portfolio_id"]) for row in rows}
+
+
+def _snapshot_expired(updated_at, max_age_seconds, pending):
+    age = _snapshot_age_seconds(updated_at)
+    if age is None or str(updated_at or "")[:10] != _snapshot_now()[:10]:
+        return True
+    return age > max_age_seconds and pending
+
+
+def _enqueue_expired_snapshots(target):
+    """Queue portfolios whose snapshot is missing or was built on a previous day."""
+    table = _SNAPSHOT_REBUILD_TARGET_TABLES[target]
+    rows = get_db().execute(
+        f"""
+        SELECT p.id
+        FROM portfolios p
+        LEFT JOIN {table} s ON s.portfolio_id = p.id
+        WHERE s.portfolio_id IS NULL OR substr(s.updated_at, 1, 10) < ?
+        """,
+        (_snapshot_now()[:10],),
+    ).fetchall()
+    return mark_portfolios_dirty(
+        [row["id"] for row in rows],
+        targets=(target,),
+        priority=SNAPSHOT_REBUILD_PRIORITY_EXPIRED,
+        reason="expired",
+    )
+
+
+def rebuild_dirty_snapshots(target, rebuild_fn, batch_size=25):
+    """Rebuild what is queued for ``target`` in priority order, ``batch_size``
+    portfolios per rebuild_fn call (one write transaction each). Portfolios
+    queued while this runs are left for the next cycle."""
+    db = get_db()
+    db.execute("DELETE FROM snapshot_rebuild_queue WHERE portfolio_id NOT IN (SELECT id FROM portfolios)")
+    _enqueue_expired_snapshots(target)
+    queued = db.execute(
+        """
+        SELECT portfolio_id, version
+        FROM snapshot_rebuild_queue
+        WHERE target = ?
+        ORDER BY priority DESC, enqueued_at ASC, portfolio_id ASC
+        """,
+        (target,),
+    ).fetchall()
+    batch_size = max(int(batch_size), 1)
+    rebuilt = 0
+    failed = 0
+    for start in range(0, len(queued), batch_size):
+        batch = queued[start : start + batch_size]
+        pids = [int(row["portfolio_id"]) for row in batch]
+        try:
+            rebuild_fn(pids)
+        except Exception:
+            db.rollback()
+            current_app.logger.exception("Falha ao reconstruir snapshots %s: %s", target, pids)
+            failed += len(pids)
+            continue
+        # Rows re-queued while rebuilding (version bumped) stay in the queue.
+        db.executemany(
+            "DELETE FROM snapshot_rebuild_queue WHERE portfolio_id = ? AND target = ? AND version = ?",
+            [(int(row["portfolio_id"]), target, int(row["version"])) for row in batch],
         )
-    return _trim_monthly_ticker_summary(merged, months=months)
+        db.commit()
+        # Readers switch from the stale snapshot to the rebuilt one.
+        bump_portfolio_versions(pids)
+        rebuilt += len(pids)
+    pending = db.execute(
+        "SELECT COUNT(*) AS total FROM snapshot_rebuild_queue WHERE target = ?",
+        (target,),
+    ).fetchone()["total"]
+    return {"portfolios": rebuilt, "failed": failed, "pending": int(pending)}
 
 
 def invalidate_chart_snapshots(portfolio_ids):
@@ -5085,24 +6213,20 @@ def invalidate_chart_snapshots(portfolio_ids):
     db = get_db()
     try:
         db.execute(
-            "DELETE FROM chart_snapshot_monthly_class WHERE portfolio_id IN (" + placeholders + ")",
+            "DELETE FROM chart_snapshot_state WHERE portfolio_id IN (" + placeholders + ")",
             tuple(pids),
         )
-        db.execute(
-            "DELETE FROM chart_snapshot_monthly_ticker WHERE portfolio_id IN (" + placeholders + ")",
-            tuple(pids),
-        )
-        # Heavy series are cached by portfolio-combination, so a change to any
-        # single portfolio can affect multi-portfolio keys; clear them all and
-        # let the periodic job / next request rewarm.
-        db.execute("DELETE FROM chart_series_cache")
+        # Heavy series are cached by portfolio-combination; drop only the keys
+        # whose combination includes a changed portfolio and let the periodic
+        # job / next request rewarm them.
+        invalidate_chart_series_dependencies(f"portfolio:{pid}" for pid in pids)
         db.commit()
+        mark_portfolios_dirty(pids, targets=("chart",), reason="portfolio_changed")
     except Exception:
         db.rollback()
-    _clear_benchmark_cache()
 
 
-def rebuild_chart_snapshots(portfolio_ids=None):
+def rebuild_chart_snapshots(portfolio_ids=None, warm_combined=True):
     if portfolio_ids is None:
         pids = _all_portfolio_ids()
     else:
@@ -5111,41 +6235,41 @@ def rebuild_chart_snapshots(portfolio_ids=None):
         return {"portfolios": 0}
 
     db = get_db()
+    # Only the months touched since the last rebuild are recomputed here.
+    _refresh_monthly_flows(pids)
+    _refresh_position_checkpoints(pids)
+    # The monthly summaries are merged from the flow rows per request; only
+    # the rebuild time is kept, for the expiry check of the rebuild loop.
     stamp = _snapshot_now()
-    for pid in pids:
-        monthly_class = _build_monthly_class_summary([pid])
-        monthly_ticker = _build_monthly_ticker_summary([pid], months=24)
-        try:
-            db.execute(
-                """
-                INSERT INTO chart_snapshot_monthly_class (portfolio_id, payload_json, updated_at)
-                VALUES (?, ?, ?)
-                ON CONFLICT(portfolio_id) DO UPDATE SET
-                  payload_json = excluded.payload_json,
-                  updated_at = excluded.updated_at
-                """,
-                (pid, json.dumps(monthly_class, ensure_ascii=False), stamp),
-            )
-            db.execute(
-                """
-                INSERT INTO chart_snapshot_monthly_ticker (portfolio_id, payload_json, updated_at)
-                VALUES (?, ?, ?)
-                ON CONFLICT(portfolio_id) DO UPDATE SET
-                  payload_json = excluded.payload_json,
-                  updated_at = excluded.updated_at
-                """,
-                (pid, json.dumps(monthly_ticker, ensure_ascii=False), stamp),
-            )
-        except Exception:
-            db.rollback()
-            raise
+    try:
+        db.executemany(
+            """
+            INSERT INTO chart_snapshot_state (portfolio_id, updated_at)
+            VALUES (?, ?)
+            ON CONFLICT(portfolio_id) DO UPDATE SET updated_at = excluded.updated_at
+            """,
+            [(pid, stamp) for pid in pids],
+        )
+    except Exception:
+        db.rollback()
+        raise
     db.commit()
 
-    _warm_heavy_chart_series(pids)
+    _warm_heavy_chart_series(pids, warm_combined=warm_combined)
     return {"portfolios": len(pids)}
 
 
-def _warm_heavy_chart_series(pids):
+def rebuild_dirty_chart_snapshots():
+    batch_size = int(current_app.config.get("CHART_SNAPSHOT_REBUILD_BATCH", 25))
+    # A dirty batch is not a combination anyone selects; warm single portfolios.
+    return rebuild_dirty_snapshots(
+        "chart",
+        lambda pids: rebuild_chart_snapshots(pids, warm_combined=False),
+        batch_size=batch_size,
+    )
+
+
+def _warm_heavy_chart_series(pids, warm_combined=True):
     """Precompute the heavy chart series for the combinations users hit most:
     each single portfolio and the full "all selected" combo. Keeps the
     chart_series_cache fresh so requests take the fast read-through path."""
@@ -5153,7 +6277,7 @@ def _warm_heavy_chart_series(pids):
     if not pids:
         return
     combos = [(pid,) for pid in pids]
-    if len(pids) > 1:
+    if warm_combined and len(pids) > 1:
         combos.append(tuple(pids))
 
     jobs = [
@@ -5161,6 +6285,8 @@ def _warm_heavy_chart_series(pids):
          lambda combo, rng: _compute_patrimony_open_pnl_by_type_series(combo, rng)),
         ("variable_income_value_daily", ("90d",),
          lambda combo, rng: _compute_variable_income_value_daily_series(combo, rng)),
+        ("fixed_income_value_daily", ("90d",),
+         lambda combo, rng: _compute_fixed_income_value_daily_series(combo, rng)),
     ]
     for combo in combos:
         for name, ranges, compute in jobs:
@@ -5168,7 +6294,9 @@ def _warm_heavy_chart_series(pids):
                 try:
                     payload = compute(combo, rng)
                     _chart_series_cache_write(
-                        _chart_series_cache_key(name, combo, rng), payload
+                        _chart_series_cache_key(name, combo, rng),
+                        payload,
+                        _chart_series_dependencies(name, combo),
                     )
                 except Exception:
                     current_app.logger.exception(
@@ -5181,6 +6309,7 @@ def _warm_heavy_chart_series(pids):
             _chart_series_cache_write(
                 _chart_series_cache_key("benchmark_comparison", combo, "12m", "all"),
                 payload,
+                _chart_series_dependencies("benchmark_comparison", combo),
             )
         except Exception:
             current_app.logger.exception(
@@ -5189,66 +6318,13 @@ def _warm_heavy_chart_series(pids):
 
 
 def get_monthly_class_summary(portfolio_ids):
-    pids = normalize_portfolio_ids(portfolio_ids)
-    max_age_seconds = int(current_app.config.get("CHART_SNAPSHOT_MAX_AGE_SECONDS", 900))
-    placeholders = ",".join(["?"] * len(pids))
-    db = get_db()
-
-    try:
-        rows = db.execute(
-            """
-            SELECT portfolio_id, payload_json, updated_at
-            FROM chart_snapshot_monthly_class
-            WHERE portfolio_id IN ("""
-            + placeholders
-            + """)
-            """,
-            tuple(pids),
-        ).fetchall()
-        if len(rows) != len(pids):
-            raise RuntimeError("snapshot_miss")
-        parts = []
-        for row in rows:
-            age = _snapshot_age_seconds(row["updated_at"])
-            if age is None or age > max_age_seconds:
-                raise RuntimeError("snapshot_stale")
-            parts.append(json.loads(row["payload_json"] or "[]"))
-        return _combine_monthly_class_rows(parts)
-    except Exception:
-        return _build_monthly_class_summary(pids)
+    # Flow rows are settled lazily (only the dirty months) and merged per call,
+    # so any portfolio combination reads the stored months directly.
+    return _build_monthly_class_summary(portfolio_ids)
 
 
 def get_monthly_ticker_summary(portfolio_ids, months=8):
-    pids = normalize_portfolio_ids(portfolio_ids)
-    max_age_seconds = int(current_app.config.get("CHART_SNAPSHOT_MAX_AGE_SECONDS", 900))
-    placeholders = ",".join(["?"] * len(pids))
-    db = get_db()
-
-    try:
-        rows = db.execute(
-            """
-            SELECT portfolio_id, payload_json, updated_at
-            FROM chart_snapshot_monthly_ticker
-            WHERE portfolio_id IN ("""
-            + placeholders
-            + """)
-            """,
-            tuple(pids),
-        ).fetchall()
-        if len(rows) != len(pids):
-            raise RuntimeError("snapshot_miss")
-        parts = []
-        for row in rows:
-            age = _snapshot_age_seconds(row["updated_at"])
-            if age is None or age > max_age_seconds:
-                raise RuntimeError("snapshot_stale")
-            payload = json.loads(row["payload_json"] or "{}")
-            if any("category" not in item for item in (payload.get("rows") or [])):
-                raise RuntimeError("snapshot_missing_category")
-            parts.append(payload)
-        return _combine_monthly_ticker_summaries(parts, months=months)
-    except Exception:
-        return _build_monthly_ticker_summary(pids, months=months)
+    return _build_monthly_ticker_summary(portfolio_ids, months=months)
 
 
 def _subtract_months_from_date(date_value, months_back: int):
@@ -5284,105 +6360,362 @@ def _day_keys_back(days: int):
     return keys
 
 
-def _day_label(day_key: str):
+def _day_label(day_key: str):
+    try:
+        dt = datetime.strptime(str(day_key), "%Y-%m-%d")
+        return dt.strftime("%d/%m")
+    except Exception:
+        return str(day_key)
+
+
+# Serie de cambio pedida junto com as posicoes (BRL=X e o fallback historico).
+_USDBRL_HISTORY_KEY = "__usdbrl__"
+_USDBRL_HISTORY_SYMBOLS = ["USDBRL=X", "BRL=X"]
+_PRICE_CLOSE_PERIOD_DAYS = {
+    "5d": 7,
+    "1mo": 31,
+    "2mo": 62,
+    "3mo": 92,
+    "6mo": 183,
+    "1y": 366,
+    "2y": 731,
+    "5y": 1827,
+    "10y": 3653,
+}
+
+
+# Diferenca relativa entre fechamentos do mesmo dia que indica reajuste.
+_PRICE_CLOSE_REBASE_TOLERANCE = 1e-4
+
+
+def _price_close_period_start(period: str):
+    """First day a Yahoo ``period`` covers; "" means the full history."""
+    normalized = (period or "").strip().lower() or "3mo"
+    if normalized == "max":
+        return ""
+    if normalized == "ytd":
+        return f"{datetime.now().year:04d}-01-01"
+    days = _PRICE_CLOSE_PERIOD_DAYS.get(normalized, _PRICE_CLOSE_PERIOD_DAYS["3mo"])
+    return (datetime.now().date() - timedelta(days=days)).isoformat()
+
+
+def _yahoo_chart_base_url():
+    return (os.getenv("YAHOO_CHART_BASE_URL") or "https://query1.finance.yahoo.com").rstrip("/")
+
+
+def _yahoo_history_batch_workers():
+    raw = (os.getenv("YAHOO_HISTORY_BATCH_WORKERS") or "4").strip()
     try:
-        dt = datetime.strptime(str(day_key), "%Y-%m-%d")
-        return dt.strftime("%d/%m")
-    except Exception:
-        return str(day_key)
+        return max(int(raw), 1)
+    except (TypeError, ValueError):
+        return 4
 
 
-def _download_daily_close_map(symbol: str, period: str):
-    ticker = (symbol or "").strip().upper()
-    normalized_period = (period or "").strip().lower() or "3mo"
-    if not ticker:
+def _day_map_from_close_series(series):
+    if series is None:
         return {}
-    cache_ttl = int(current_app.config.get("YAHOO_DAILY_CACHE_TTL_SECONDS", 1800))
-    cache_key = (ticker, normalized_period)
-    cached = _memory_cache_get(_YAHOO_DAILY_CACHE, cache_key)
-    if cached is not None:
-        return dict(cached)
+    try:
+        series = series.dropna()
+    except Exception:
+        pass
+    result = {}
+    try:
+        for idx, value in series.items():
+            close_value = _to_number(value)
+            if close_value is None:
+                continue
+            dt = idx.to_pydatetime() if hasattr(idx, "to_pydatetime") else idx
+            result[dt.strftime("%Y-%m-%d")] = float(close_value)
+    except Exception:
+        return {}
+    return result
+
 
-    def _to_map_from_series(series):
-        if series is None:
-            return {}
-        result = {}
+def _yahoo_chart_closes(symbol: str, period: str | None = None, start: str | None = None):
+    """Daily closes for one symbol from the Yahoo chart API."""
+    if start:
+        period1 = int(datetime.strptime(start, "%Y-%m-%d").timestamp())
+        query = f"period1={period1}&period2={int(time.time())}"
+    else:
+        query = f"range={period or '3mo'}"
+    with _provider_slot("yahoo"):
+        payload = _http_get_json(f"{_yahoo_chart_base_url()}/v8/finance/chart/{symbol}?{query}&interval=1d")
+    day_map = {}
+    if payload:
         try:
-            for idx, value in series.items():
-                close_value = _to_number(value)
+            result = payload.get("chart", {}).get("result", [])
+            item = result[0] if result else {}
+            timestamps = item.get("timestamp") or []
+            quote_row = ((item.get("indicators") or {}).get("quote") or [{}])[0]
+            closes = quote_row.get("close") or []
+            for ts, close in zip(timestamps, closes):
+                close_value = _to_number(close)
                 if close_value is None:
                     continue
-                dt = idx.to_pydatetime() if hasattr(idx, "to_pydatetime") else idx
-                key = dt.strftime("%Y-%m-%d")
-                result[key] = float(close_value)
+                dt = datetime.fromtimestamp(int(ts))
+                day_map[dt.strftime("%Y-%m-%d")] = float(close_value)
         except Exception:
-            return {}
-        return result
+            day_map = {}
+    return day_map
 
-    day_map = {}
+
+def _yahoo_daily_closes_many(symbols, period: str | None = None, start: str | None = None):
+    """Daily adjusted closes for many symbols as {symbol: {YYYY-MM-DD: close}}.
+
+    One multi-symbol yfinance download; symbols it does not return are fetched
+    from the chart API in a bounded parallel set. Either a ``period`` (full
+    window) or a ``start`` date (incremental sync).
+    """
+    unique = []
+    for symbol in symbols or []:
+        if symbol and symbol not in unique:
+            unique.append(symbol)
+    if not unique:
+        return {}
+    window = {"start": start} if start else {"period": period or "3mo"}
+    result = {}
     if yf is not None:
         try:
-            hist = yf.download(
-                ticker,
-                period=normalized_period,
-                interval="1d",
-                progress=False,
-                threads=False,
-                auto_adjust=True,
-            )
+            with _provider_slot("yahoo"):
+                hist = yf.download(
+                    unique,
+                    interval="1d",
+                    group_by="ticker",
+                    progress=False,
+                    threads=min(len(unique), _yahoo_history_batch_workers()),
+                    auto_adjust=True,
+                    **window,
+                )
         except Exception:
             hist = None
-        closes = _extract_close_series(hist)
-        if closes is not None:
+        for symbol in unique:
             try:
-                closes = closes.dropna()
+                frame = hist[symbol] if hist is not None and symbol in hist.columns.get_level_values(0) else None
             except Exception:
-                pass
-            day_map = _to_map_from_series(closes)
+                frame = hist if len(unique) == 1 else None
+            day_map = _day_map_from_close_series(_extract_close_series(frame))
+            if day_map:
+                result[symbol] = day_map
 
-    if not day_map:
-        payload = _http_get_json(
-            f"https://query1.finance.yahoo.com/v8/finance/chart/{ticker}?range={normalized_period}&interval=1d"
-        )
-        if payload:
+    missing = [symbol for symbol in unique if symbol not in result]
+    if not missing:
+        return result
+    workers = min(len(missing), _yahoo_history_batch_workers())
+    if workers <= 1:
+        for symbol in missing:
+            result[symbol] = _yahoo_chart_closes(symbol, period=period, start=start)
+        return result
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="yahoo-history") as pool:
+        futures = {
+            pool.submit(_yahoo_chart_closes, symbol, period, start): symbol
+            for symbol in missing
+        }
+        for future in as_completed(futures):
             try:
-                result = payload.get("chart", {}).get("result", [])
-                item = result[0] if result else {}
-                timestamps = item.get("timestamp") or []
-                quote = ((item.get("indicators") or {}).get("quote") or [{}])[0]
-                closes = quote.get("close") or []
-                for ts, close in zip(timestamps, closes):
-                    close_value = _to_number(close)
-                    if close_value is None:
-                        continue
-                    dt = datetime.fromtimestamp(int(ts))
-                    day_map[dt.strftime("%Y-%m-%d")] = float(close_value)
+                result[futures[future]] = future.result()
             except Exception:
-                day_map = {}
+                result[futures[future]] = {}
+    return result
 
-    if day_map:
-        _memory_cache_set(_YAHOO_DAILY_CACHE, cache_key, dict(day_map), cache_ttl)
-    return day_map
+
+def _price_close_sync_plan(db, symbol: str, period: str, max_age_seconds: int):
+    """What price_closes needs for ``symbol``: None, ("period", covered_from) or ("since", last_date)."""
+    start = _price_close_period_start(period)
+    state = db.execute(
+        "SELECT covered_from, synced_at FROM price_close_sync WHERE symbol = ? AND interval = '1d'",
+        (symbol,),
+    ).fetchone()
+    covered = state is not None and (
+        state["covered_from"] == "" or (start != "" and state["covered_from"] <= start)
+    )
+    if not covered:
+        covered_from = start
+        if state is not None and (state["covered_from"] == "" or (start and state["covered_from"] < start)):
+            covered_from = state["covered_from"]
+        return "period", covered_from
+    age = _snapshot_age_seconds(state["synced_at"])
+    if age is not None and age <= max_age_seconds:
+        return None
+    recent_dates = db.execute(
+        "SELECT date FROM price_closes WHERE symbol = ? AND interval = '1d' ORDER BY date DESC LIMIT 2",
+        (symbol,),
+    ).fetchall()
+    if not recent_dates:
+        return "period", state["covered_from"]
+    # Rebusca a partir do penultimo pregao salvo: o ultimo fechamento pode ter
+    # mudado e o penultimo (ja fechado) confere a base do ajuste (auto_adjust).
+    return "since", recent_dates[-1]["date"]
+
+
+def _price_closes_rebased(db, symbol: str, day_map):
+    """True when a closed bar already stored differs from ``day_map``.
+
+    Yahoo adjusted closes are restated after a split or dividend; stored rows
+    on the old basis cannot be mixed with new ones. The last stored day is
+    skipped: its close may have been saved intraday.
+    """
+    first_day = min(day_map)
+    stored = db.execute(
+        """
+        SELECT date, close FROM price_closes
+        WHERE symbol = ? AND interval = '1d' AND date >= ?
+        ORDER BY date
+        """,
+        (symbol, first_day),
+    ).fetchall()
+    for row in stored[:-1]:
+        fetched = day_map.get(row["date"])
+        if fetched is None:
+            continue
+        if abs(fetched - float(row["close"])) > _PRICE_CLOSE_REBASE_TOLERANCE * max(abs(float(row["close"])), 1e-9):
+            return True
+    return False
+
+
+def _price_closes_sync(db, symbols, period: str, max_age_seconds: int):
+    """Bring price_closes up to date for ``period``; fetches only what is missing."""
+    full = {}
+    since = {}
+    for symbol in symbols:
+        plan = _price_close_sync_plan(db, symbol, period, max_age_seconds)
+        if plan is None:
+            continue
+        mode, value = plan
+        if mode == "period":
+            full[symbol] = value
+        else:
+            since[symbol] = value
+    fetched = {}
+    if full:
+        fetched.update(_yahoo_daily_closes_many(list(full), period=period))
+    if since:
+        fetched.update(_yahoo_daily_closes_many(list(since), start=min(since.values())))
+    rebased = [
+        symbol for symbol in since if fetched.get(symbol) and _price_closes_rebased(db, symbol, fetched[symbol])
+    ]
+    if rebased:
+        # Historico reajustado (desdobramento/provento): baixa a janela inteira
+        # de novo e descarta as linhas antigas, que ficaram em outra base.
+        refetched = _yahoo_daily_closes_many(rebased, period=period)
+        for symbol in rebased:
+            fetched[symbol] = refetched.get(symbol) or {}
+            full[symbol] = _price_close_period_start(period)
+    if not fetched:
+        return
+    stamp = _snapshot_now()
+    changed = 0
+    try:
+        for symbol, day_map in fetched.items():
+            if not day_map:
+                # Download vazio nao marca a janela como coberta nem atualiza synced_at.
+                continue
+            if symbol in rebased:
+                db.execute("DELETE FROM price_closes WHERE symbol = ? AND interval = '1d'", (symbol,))
+            changed += db.executemany(
+                """
+                INSERT INTO price_closes (symbol, interval, date, close)
+                VALUES (?, '1d', ?, ?)
+                ON CONFLICT(symbol, interval, date) DO UPDATE SET close = excluded.close
+                WHERE price_closes.close != excluded.close
+                """,
+                [(symbol, day, close) for day, close in day_map.items()],
+            ).rowcount
+            db.execute(
+                """
+                INSERT INTO price_close_sync (symbol, interval, covered_from, synced_at)
+                VALUES (?, '1d', ?, ?)
+                ON CONFLICT(symbol, interval) DO UPDATE SET
+                  covered_from = COALESCE(?, price_close_sync.covered_from),
+                  synced_at = excluded.synced_at
+                """,
+                (symbol, full.get(symbol, ""), stamp, full.get(symbol)),
+            )
+        if changed:
+            invalidate_chart_series_dependencies(["market:price_closes"])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+
+def _price_closes_maps(candidates_by_key, period: str, max_age_seconds: int):
+    """Daily closes for many keys at once from the shared price_closes store.
+
+    ``candidates_by_key`` maps a caller key (ticker, "usdbrl", ...) to the
+    Yahoo symbols to try in order. Each round syncs one candidate per
+    unresolved key in a single batch, so a portfolio costs one download per
+    round instead of one per position. Every worker reads the same rows; a
+    restart or TTL expiry only costs the bars after the last stored date.
+    Without an app context (or if the store fails) it downloads directly.
+    """
+    normalized_period = (period or "").strip().lower() or "3mo"
+    pending = {}
+    for key, candidates in (candidates_by_key or {}).items():
+        symbols = []
+        for symbol in candidates or []:
+            clean = (symbol or "").strip().upper()
+            if clean and clean not in symbols:
+                symbols.append(clean)
+        if symbols:
+            pending[key] = symbols
+    result = {key: {} for key in candidates_by_key or {}}
+    period_start = _price_close_period_start(normalized_period)
+    round_index = 0
+    while pending:
+        current = {key: symbols[round_index] for key, symbols in pending.items() if round_index < len(symbols)}
+        if not current:
+            break
+        symbols = sorted(set(current.values()))
+        maps = {}
+        stored = has_app_context()
+        if stored:
+            try:
+                db = get_db()
+                _price_closes_sync(db, symbols, normalized_period, max_age_seconds)
+                placeholders = ", ".join("?" for _ in symbols)
+                rows = db.execute(
+                    f"""
+                    SELECT symbol, date, close FROM price_closes
+                    WHERE interval = '1d' AND symbol IN ({placeholders}) AND date >= ?
+                    ORDER BY symbol, date
+                    """,
+                    (*symbols, period_start),
+                ).fetchall()
+                for row in rows:
+                    maps.setdefault(row["symbol"], {})[row["date"]] = float(row["close"])
+            except Exception:
+                stored = False
+        if not stored:
+            maps = _yahoo_daily_closes_many(symbols, period=normalized_period)
+        for key, symbol in current.items():
+            day_map = maps.get(symbol) or {}
+            if day_map:
+                result[key] = day_map
+                pending.pop(key, None)
+        round_index += 1
+    return result
+
+
+def _price_closes_map(symbol: str, period: str, max_age_seconds: int):
+    """Daily closes for one symbol (see ``_price_closes_maps``)."""
+    return _price_closes_maps({"symbol": [symbol]}, period, max_age_seconds)["symbol"]
+
+
+def _download_daily_close_maps(candidates_by_key, period: str):
+    cache_ttl = int(current_app.config.get("YAHOO_DAILY_CACHE_TTL_SECONDS", 1800))
+    return _price_closes_maps(candidates_by_key, period, cache_ttl)
+
+
+def _download_daily_close_map(symbol: str, period: str):
+    cache_ttl = int(current_app.config.get("YAHOO_DAILY_CACHE_TTL_SECONDS", 1800))
+    return _price_closes_map(symbol, period, cache_ttl)
 
 
 def _levels_from_day_map(day_keys, day_map, fill_before_first: bool = True):
     if not day_keys:
         return []
-    result = []
-    last_value = None
-    first_index = None
-    for idx, key in enumerate(day_keys):
-        if key in day_map:
-            last_value = day_map[key]
-            if first_index is None:
-                first_index = idx
-        result.append(last_value)
-
-    if fill_before_first and first_index is not None and first_index > 0:
-        first_value = result[first_index]
-        for idx in range(first_index):
-            result[idx] = first_value
-    return result
+    levels = series_kernel.aligned_levels(day_keys, [day_map], fill_before_first=fill_before_first)
+    return series_kernel.to_list(levels[0])
 
 
 def _portfolio_daily_value_series(snapshot: dict, day_keys, period: str):
@@ -5408,53 +6741,50 @@ def _portfolio_daily_value_series(snapshot: dict, day_keys, period: str):
             "missing_tickers": [],
         }
 
-    usdbrl_map = _download_daily_close_map("USDBRL=X", period)
-    if not usdbrl_map:
-        usdbrl_map = _download_daily_close_map("BRL=X", period)
-    usdbrl_levels = _levels_from_day_map(day_keys, usdbrl_map, fill_before_first=True) if usdbrl_map else []
+    candidates = {_USDBRL_HISTORY_KEY: _USDBRL_HISTORY_SYMBOLS}
+    for item in selected_positions:
+        ticker = str(item.get("ticker") or "").strip().upper()
+        if ticker and float(item.get("value") or 0.0) > 0:
+            candidates[ticker] = _candidate_yahoo_symbols(ticker)
+    day_maps = _download_daily_close_maps(candidates, period)
+    usdbrl_map = day_maps.get(_USDBRL_HISTORY_KEY) or {}
 
-    totals = [0.0 for _ in day_keys]
-    included_tickers = []
+    tickers = []
+    current_values = []
     missing_tickers = []
     for item in selected_positions:
         ticker = str(item.get("ticker") or "").strip().upper()
         current_value = float(item.get("value") or 0.0)
         if not ticker or current_value <= 0:
             continue
-
-        ticker_day_map = {}
-        for symbol in _candidate_yahoo_symbols(ticker):
-            ticker_day_map = _download_daily_close_map(symbol, period)
-            if ticker_day_map:
-                break
-        if not ticker_day_map:
-            missing_tickers.append(ticker)
-            continue
-
-        levels = _levels_from_day_map(day_keys, ticker_day_map, fill_before_first=True)
-        # Acoes US: a serie e um ratio sobre current_value (ja em BRL pela cotacao de
-        # hoje); deixar os niveis em USD faz o FX se cancelar no ratio -> "tudo pela
-        # cotacao atual". Cripto cotada em USD mantem o cambio historico (existente).
-        if _is_usd_quoted_ticker(ticker) and not _is_us_stock_ticker(ticker) and usdbrl_levels:
-            converted = []
-            for idx, value in enumerate(levels):
-                fx = usdbrl_levels[idx] if idx < len(usdbrl_levels) else None
-                if value is None or fx in (None, 0):
-                    converted.append(None)
-                    continue
-                converted.append(float(value) * float(fx))
-            levels = converted
-
-        latest_value = next((value for value in reversed(levels) if value not in (None, 0)), None)
-        if latest_value in (None, 0):
+        if not day_maps.get(ticker):
             missing_tickers.append(ticker)
             continue
+        tickers.append(ticker)
+        current_values.append(current_value)
+
+    # Uma linha por posicao (+ cambio na ultima), alinhada aos dias do grafico.
+    levels = series_kernel.aligned_levels(
+        day_keys,
+        [day_maps[ticker] for ticker in tickers] + [usdbrl_map],
+        fill_before_first=True,
+    )
+    levels, usdbrl_levels = levels[:-1], levels[-1]
+    # Acoes US: a serie e um ratio sobre current_value (ja em BRL pela cotacao de
+    # hoje); deixar os niveis em USD faz o FX se cancelar no ratio -> "tudo pela
+    # cotacao atual". Cripto cotada em USD mantem o cambio historico (existente).
+    if usdbrl_map:
+        fx_rows = [
+            row
+            for row, ticker in enumerate(tickers)
+            if _is_usd_quoted_ticker(ticker) and not _is_us_stock_ticker(ticker)
+        ]
+        series_kernel.convert_fx(levels, fx_rows, usdbrl_levels)
 
-        for idx, value in enumerate(levels):
-            if value is None:
-                continue
-            totals[idx] += current_value * (float(value) / float(latest_value))
-        included_tickers.append(ticker)
+    latest_values = series_kernel.first_nonzero(levels, reverse=True)
+    has_latest = ~np.isnan(latest_values)
+    missing_tickers.extend(ticker for ticker, ok in zip(tickers, has_latest) if not ok)
+    included_tickers = [ticker for ticker, ok in zip(tickers, has_latest) if ok]
 
     if not included_tickers:
         return {
@@ -5463,8 +6793,11 @@ def _portfolio_daily_value_series(snapshot: dict, day_keys, period: str):
             "missing_tickers": sorted(set(missing_tickers)),
         }
 
+    ratios = levels[has_latest] / latest_values[has_latest][:, None]
+    contributions = np.asarray(current_values)[has_latest][:, None] * ratios
+    totals = np.nansum(contributions, axis=0)
     return {
-        "values": [round(float(value), 2) for value in totals],
+        "values": [round(value, 2) for value in totals.tolist()],
         "included_tickers": sorted(set(included_tickers)),
         "missing_tickers": sorted(set(missing_tickers)),
     }
@@ -5501,95 +6834,28 @@ def _month_label(month_key: str):
         return month_key
 
 
-def _download_monthly_close_map(symbol: str, period: str):
-    if yf is None:
-        return {}
+def _download_monthly_close_maps(candidates_by_key, period: str):
     cache_ttl = int(current_app.config.get("YAHOO_MONTHLY_CACHE_TTL_SECONDS", 21600))
-    cache_key = ((symbol or "").strip().upper(), (period or "").strip().lower())
-    cached = _memory_cache_get(_YAHOO_MONTHLY_CACHE, cache_key)
-    if cached is not None:
-        return dict(cached)
-
-    def _to_map(hist):
-        closes = _extract_close_series(hist)
-        if closes is None:
-            return {}
-        try:
-            series = closes.dropna()
-        except Exception:
-            series = closes
-        result = {}
-        try:
-            for idx, value in series.items():
-                close_value = _to_number(value)
-                if close_value is None:
-                    continue
-                dt = idx.to_pydatetime() if hasattr(idx, "to_pydatetime") else idx
-                key = f"{dt.year:04d}-{dt.month:02d}"
-                # Mantem o ultimo valor do mes.
-                result[key] = float(close_value)
-        except Exception:
-            return {}
-        return result
+    result = {}
+    for key, day_map in _price_closes_maps(candidates_by_key, period, cache_ttl).items():
+        month_map = {}
+        # Ultimo fechamento do mes, derivado do store diario.
+        for day_key, close in sorted(day_map.items()):
+            month_map[day_key[:7]] = close
+        result[key] = month_map
+    return result
 
-    try:
-        hist = yf.download(
-            symbol,
-            period=period,
-            interval="1mo",
-            progress=False,
-            threads=False,
-            auto_adjust=True,
-        )
-    except Exception:
-        hist = None
-    month_map = _to_map(hist)
-    if month_map:
-        _memory_cache_set(_YAHOO_MONTHLY_CACHE, cache_key, dict(month_map), cache_ttl)
-        return month_map
 
-    try:
-        hist_daily = yf.download(
-            symbol,
-            period=period,
-            interval="1d",
-            progress=False,
-            threads=False,
-            auto_adjust=True,
-        )
-    except Exception:
-        hist_daily = None
-    month_map = _to_map(hist_daily)
-    if month_map:
-        _memory_cache_set(_YAHOO_MONTHLY_CACHE, cache_key, dict(month_map), cache_ttl)
-    return month_map
+def _download_monthly_close_map(symbol: str, period: str):
+    return _download_monthly_close_maps({"symbol": [symbol]}, period)["symbol"]
 
 
 def _levels_from_month_map(month_keys, month_map):
-    levels = []
-    last_value = None
-    for key in month_keys:
-        if key in month_map:
-            last_value = month_map[key]
-        levels.append(last_value)
-    return levels
+    return series_kernel.to_list(series_kernel.aligned_levels(month_keys, [month_map])[0])
 
 
 def _cumulative_pct_from_levels(levels):
-    base = None
-    for value in levels:
-        if value not in (None, 0):
-            base = float(value)
-            break
-    if base is None:
-        return [None for _ in levels]
-    result = []
-    for value in levels:
-        if value is None:
-            result.append(None)
-        else:
-            result.append(((float(value) / base) - 1.0) * 100.0)
-    return result
+    return series_kernel.to_list(series_kernel.cumulative_pct(levels))
 
 
 def _cdi_monthly_cumulative(month_keys):
@@ -5597,7 +6863,7 @@ def _cdi_monthly_cumulative(month_keys):
         return [None]
     start_date = month_keys[0] + "-01"
     end_date = datetime.now().strftime("%Y-%m-%d")
-    series = _fetch_bcb_series(12, start_date, end_date)  # CDI diario
+    series = _bcb_series_load(12, start_date, end_date)  # CDI diario (sync_bcb_index_series)
     if not series:
         return [None for _ in month_keys]
 
@@ -5639,61 +6905,52 @@ def _portfolio_monthly_cumulative(snapshot, month_keys, period: str, scope_key:
     if not selected_positions:
         return [None for _ in month_keys]
 
-    usdbrl_map = _download_monthly_close_map("USDBRL=X", period)
-    if not usdbrl_map:
-        usdbrl_map = _download_monthly_close_map("BRL=X", period)
-    usdbrl_levels = _levels_from_month_map(month_keys, usdbrl_map) if usdbrl_map else []
-
     total_value = sum(float(item.get("value", 0.0) or 0.0) for item in selected_positions)
     if total_value <= 0:
         return [None for _ in month_keys]
 
-    weighted_rel = [0.0 for _ in month_keys]
-    weights_used = [0.0 for _ in month_keys]
+    candidates = {_USDBRL_HISTORY_KEY: _USDBRL_HISTORY_SYMBOLS}
+    for item in selected_positions:
+        ticker = (item.get("ticker") or "").upper()
+        if ticker and float(item.get("value", 0.0) or 0.0) > 0:
+            candidates[ticker] = _candidate_yahoo_symbols(ticker)
+    month_maps = _download_monthly_close_maps(candidates, period)
+    usdbrl_map = month_maps.get(_USDBRL_HISTORY_KEY) or {}
 
+    tickers = []
+    weights = []
     for item in selected_positions:
         ticker = (item.get("ticker") or "").upper()
         position_value = float(item.get("value", 0.0) or 0.0)
-        if position_value <= 0:
-            continue
-        weight = position_value / total_value
-
-        month_map = {}
-        for symbol in _candidate_yahoo_symbols(ticker):
-            month_map = _download_monthly_close_map(symbol, period)
-            if month_map:
-                break
-        if not month_map:
+        if position_value <= 0 or not month_maps.get(ticker):
             continue
+        tickers.append(ticker)
+        weights.append(position_value / total_value)
+    if not tickers:
+        return [None for _ in month_keys]
 
-        levels = _levels_from_month_map(month_keys, month_map)
-        # Acoes US: serie e ratio sobre position_value (ja BRL pela cotacao de hoje);
-        # niveis em USD -> FX se cancela no ratio. Cripto USD mantem cambio historico.
-        if _is_usd_quoted_ticker(ticker) and not _is_us_stock_ticker(ticker) and usdbrl_levels:
-            converted_levels = []
-            for idx, value in enumerate(levels):
-                fx = usdbrl_levels[idx] if idx < len(usdbrl_levels) else None
-                converted_levels.append((value * fx) if (value is not None and fx is not None) else None)
-            levels = converted_levels
+    levels = series_kernel.aligned_levels(month_keys, [month_maps[ticker] for ticker in tickers] + [usdbrl_map])
+    levels, usdbrl_levels = levels[:-1], levels[-1]
+    # Acoes US: serie e ratio sobre position_value (ja BRL pela cotacao de hoje);
+    # niveis em USD -> FX se cancela no ratio. Cripto USD mantem cambio historico.
+    if usdbrl_map:
+        fx_rows = [
+            row
+            for row, ticker in enumerate(tickers)
+            if _is_usd_quoted_ticker(ticker) and not _is_us_stock_ticker(ticker)
+        ]
+        series_kernel.convert_fx(levels, fx_rows, usdbrl_levels, zero_fx_is_missing=False)
 
-        base = next((value for value in levels if value not in (None, 0)), None)
-        if base in (None, 0):
-            continue
-        for idx, value in enumerate(levels):
-            if value is None:
-                continue
-            rel = float(value) / float(base)
-            weighted_rel[idx] += weight * rel
-            weights_used[idx] += weight
+    bases = series_kernel.first_nonzero(levels)
+    has_base = ~np.isnan(bases)
+    levels = levels[has_base]
+    weights = np.asarray(weights)[has_base][:, None]
+    weighted_rel = np.nansum(weights * (levels / bases[has_base][:, None]), axis=0)
+    weights_used = np.nansum(np.where(np.isnan(levels), np.nan, weights), axis=0)
 
-    series = []
-    for idx in range(len(month_keys)):
-        if weights_used[idx] <= 0:
-            series.append(None)
-            continue
-        normalized_rel = weighted_rel[idx] / weights_used[idx]
-        series.append((normalized_rel - 1.0) * 100.0)
-    return series
+    normalized_rel = np.divide(weighted_rel, weights_used, out=np.zeros_like(weighted_rel), where=weights_used > 0)
+    series = np.where(weights_used > 0, (normalized_rel - 1.0) * 100.0, np.nan)
+    return series_kernel.to_list(series)
 
 
 def _month_key_to_date_bounds(month_key: str):
@@ -5778,7 +7035,6 @@ def _monthly_class_key_map(rows):
 
 def _portfolio_monthly_metrics_by_category(portfolio_ids, month_keys, period: str):
     pids = tuple(sorted(normalize_portfolio_ids(portfolio_ids)))
-    placeholders = ",".join(["?"] * len(pids))
     db = get_db()
     usdbrl_rate = _get_usdbrl_rate()
     category_labels = {
@@ -5798,72 +7054,40 @@ def _portfolio_monthly_metrics_by_category(portfolio_ids, month_keys, period: st
         }
         for key, label in category_labels.items()
     }
+    if not month_keys:
+        return result
 
-    tx_rows = db.execute(
-        """
-        SELECT
-            t.date,
-            t.tx_type,
-            t.shares,
-            t.price,
-            a.ticker,
-            a.name,
-            a.sector
-        FROM transactions t
-        JOIN assets a ON a.ticker = t.ticker
-        WHERE t.portfolio_id IN ("""
-        + placeholders
-        + """)
-        ORDER BY t.date ASC, t.id ASC
-        """,
-        tuple(pids),
-    ).fetchall()
-    income_rows = db.execute(
-        """
-        SELECT
-            i.date,
-            i.amount,
-            a.ticker,
-            a.name,
-            a.sector
-        FROM incomes i
-        JOIN assets a ON a.ticker = i.ticker
-        WHERE i.portfolio_id IN ("""
-        + placeholders
-        + """)
-        ORDER BY i.date ASC, i.id ASC
-        """,
-        tuple(pids),
-    ).fetchall()
-
-    tickers = set()
+    # Posicao no fim de cada mes: checkpoint mensal + eventos desde ele.
+    month_states, _replayed = _positions_as_of(
+        pids, [_month_key_to_date_bounds(month_key)[1] for month_key in month_keys]
+    )
+    known_tickers = sorted({ticker for states in month_states for ticker in states})
     ticker_category = {}
-    for row in tx_rows:
-        ticker = str(row["ticker"] or "").strip().upper()
-        category = _position_category(ticker, row["name"], row["sector"])
-        if category not in result:
-            continue
-        tickers.add(ticker)
-        ticker_category[ticker] = category
-    for row in income_rows:
-        ticker = str(row["ticker"] or "").strip().upper()
-        category = _position_category(ticker, row["name"], row["sector"])
-        if category not in result:
-            continue
-        ticker_category[ticker] = category
+    if known_tickers:
+        for row in db.execute(
+            "SELECT ticker, name, sector FROM assets WHERE ticker IN (" + ",".join(["?"] * len(known_tickers)) + ")",
+            tuple(known_tickers),
+        ).fetchall():
+            category = _position_category(row["ticker"], row["name"], row["sector"])
+            if category in result:
+                ticker_category[row["ticker"]] = category
+    tickers = {
+        ticker
+        for states in month_states
+        for ticker, state in states.items()
+        if ticker in ticker_category and state["open_shares"] > 0
+    }
 
-    usdbrl_map = _download_monthly_close_map("USDBRL=X", period)
-    if not usdbrl_map:
-        usdbrl_map = _download_monthly_close_map("BRL=X", period)
+    candidates = {_USDBRL_HISTORY_KEY: _USDBRL_HISTORY_SYMBOLS}
+    for ticker in tickers:
+        candidates[ticker] = _candidate_yahoo_symbols(ticker)
+    month_maps = _download_monthly_close_maps(candidates, period)
+    usdbrl_map = month_maps.get(_USDBRL_HISTORY_KEY) or {}
     usdbrl_levels = _levels_from_month_map(month_keys, usdbrl_map) if usdbrl_map else []
 
     ticker_levels = {}
     for ticker in sorted(tickers):
-        month_map = {}
-        for symbol in _candidate_yahoo_symbols(ticker):
-            month_map = _download_monthly_close_map(symbol, period)
-            if month_map:
-                break
+        month_map = month_maps.get(ticker) or {}
         if not month_map:
             ticker_levels[ticker] = [None for _ in month_keys]
             continue
@@ -5881,76 +7105,26 @@ def _portfolio_monthly_metrics_by_category(portfolio_ids, month_keys, period: st
             levels = converted_levels
         ticker_levels[ticker] = levels
 
-    def _row_date(row):
-        try:
-            return datetime.strptime(str(row["date"])[:10], "%Y-%m-%d").date()
-        except Exception:
-            return None
-
-    tx_index = 0
-    income_index = 0
-    shares_state = {}
-    cost_state = {}
-    buys_total = {key: 0.0 for key in result}
-    sells_total = {key: 0.0 for key in result}
-    incomes_total = {key: 0.0 for key in result}
-
-    for month_idx, month_key in enumerate(month_keys):
-        _month_start, month_end = _month_key_to_date_bounds(month_key)
-
-        while tx_index < len(tx_rows):
-            row = tx_rows[tx_index]
-            tx_date = _row_date(row)
-            if tx_date is None or tx_date > month_end:
-                break
-            ticker = str(row["ticker"] or "").strip().upper()
-            category = ticker_category.get(ticker)
-            if category in result:
-                unit_price = _usd_to_brl_amount(ticker, float(row["price"] or 0.0), usdbrl_rate)
-                amount = float(row["shares"] or 0.0) * unit_price
-                current_shares = float(shares_state.get(ticker, 0.0) or 0.0)
-                current_cost = float(cost_state.get(ticker, 0.0) or 0.0)
-                if (row["tx_type"] or "").lower() == "buy":
-                    shares_state[ticker] = current_shares + float(row["shares"] or 0.0)
-                    cost_state[ticker] = current_cost + amount
-                    buys_total[category] += amount
-                elif current_shares > 0:
-                    avg_price = current_cost / current_shares if current_shares > 0 else 0.0
-                    sell_shares = min(float(row["shares"] or 0.0), current_shares)
-                    next_shares = current_shares - sell_shares
-                    next_cost = current_cost - (avg_price * sell_shares)
-                    shares_state[ticker] = next_shares
-                    cost_state[ticker] = 0.0 if next_shares <= 0 else next_cost
-                    sells_total[category] += sell_shares * unit_price
-            tx_index += 1
-
-        while income_index < len(income_rows):
-            row = income_rows[income_index]
-            income_date = _row_date(row)
-            if income_date is None or income_date > month_end:
-                break
-            ticker = str(row["ticker"] or "").strip().upper()
-            category = ticker_category.get(ticker)
-            if category in result:
-                incomes_total[category] += _usd_to_brl_amount(
-                    ticker, float(row["amount"] or 0.0), usdbrl_rate
-                )
-            income_index += 1
-
+    for month_idx, states in enumerate(month_states):
         market_values = {key: 0.0 for key in result}
         open_costs = {key: 0.0 for key in result}
-        for ticker, shares in shares_state.items():
-            if float(shares or 0.0) <= 0:
-                continue
+        flows = {key: 0.0 for key in result}
+        for ticker, state in states.items():
             category = ticker_category.get(ticker)
-            if category not in result:
+            if category is None:
+                continue
+            # Vendas + proventos - compras acumulados ate o fim do mes.
+            flows[category] += _usd_to_brl_amount(
+                ticker, state["sold"] + state["incomes"] - state["bought"], usdbrl_rate
+            )
+            if state["open_shares"] <= 0:
                 continue
-            open_costs[category] += float(cost_state.get(ticker, 0.0) or 0.0)
+            open_costs[category] += _usd_to_brl_amount(ticker, state["open_cost"], usdbrl_rate)
             price_levels = ticker_levels.get(ticker) or []
             price = price_levels[month_idx] if month_idx < len(price_levels) else None
             if price is None:
                 continue
-            market_values[category] += float(shares) * float(price)
+            market_values[category] += state["open_shares"] * float(price)
 
         for category, payload in result.items():
             market_value = round(market_values[category], 2)
@@ -5958,21 +7132,16 @@ def _portfolio_monthly_metrics_by_category(portfolio_ids, month_keys, period: st
             payload["value_values"].append(market_value)
             payload["invested_values"].append(open_cost)
             payload["pnl_values"].append(round(market_value - open_cost, 2))
-            payload["net_values"].append(
-                round(
-                    market_value
-                    + sells_total[category]
-                    + incomes_total[category]
-                    - buys_total[category],
-                    2,
-                )
-            )
+            payload["net_values"].append(round(market_value + flows[category], 2))
 
     return result
 
 
 def _fixed_income_monthly_by_type(items, month_keys):
     grouped = {}
+    # (state, indice do mes, item, data de referencia, ja vencido no mes)
+    points = []
+    today = datetime.now().date()
     for raw_item in items or []:
         item = dict(raw_item or {})
         investment_type = _fixed_income_chart_group_label(item.get("investment_type"))
@@ -5997,20 +7166,26 @@ def _fixed_income_monthly_by_type(items, month_keys):
             if month_end < aporte_date:
                 continue
             if month_start > maturity_date:
-                projected = _fixed_income_projection_at_date(item, maturity_date)
-                state["net_values"][idx] += float(projected.get("final_income", 0.0) or 0.0)
+                points.append((state, idx, item, maturity_date, True))
                 continue
-            reference_date = min(month_end, maturity_date, datetime.now().date())
-            projected = _fixed_income_projection_at_date(item, reference_date)
-            current_value = float(projected.get("current_gross_value", 0.0) or 0.0)
-            active_principal = float(projected.get("active_applied_value", 0.0) or 0.0)
-            current_income = float(projected.get("current_income", 0.0) or 0.0)
-            state["value_values"][idx] += current_value
-            state["invested_values"][idx] += active_principal
-            state["pnl_values"][idx] += current_income
-            state["net_values"][idx] += float(
-                projected.get("final_income", 0.0) if projected.get("is_matured") else current_income
-            )
+            points.append((state, idx, item, min(month_end, maturity_date, today), False))
+
+    projections = _fixed_income_projections_at_dates(
+        [point[2] for point in points], [point[3] for point in points]
+    )
+    for (state, idx, _item, _reference_date, past_maturity), projected in zip(points, projections):
+        if past_maturity:
+            state["net_values"][idx] += float(projected.get("final_income", 0.0) or 0.0)
+            continue
+        current_value = float(projected.get("current_gross_value", 0.0) or 0.0)
+        active_principal = float(projected.get("active_applied_value", 0.0) or 0.0)
+        current_income = float(projected.get("current_income", 0.0) or 0.0)
+        state["value_values"][idx] += current_value
+        state["invested_values"][idx] += active_principal
+        state["pnl_values"][idx] += current_income
+        state["net_values"][idx] += float(
+            projected.get("final_income", 0.0) if projected.get("is_matured") else current_income
+        )
 
     for payload in grouped.values():
         for key in ("value_values", "invested_values", "pnl_values", "net_values"):
@@ -6095,13 +7270,13 @@ def _compute_benchmark_comparison(portfolio_ids, range_key: str = "12m", scope_k
 
     portfolio_series = _portfolio_monthly_cumulative(snapshot, month_keys, period, normalized_scope)
     cdi_series = _cdi_monthly_cumulative(month_keys)
-    ibov_series = _cumulative_pct_from_levels(
-        _levels_from_month_map(month_keys, _download_monthly_close_map("^BVSP", period))
+    benchmark_maps = _download_monthly_close_maps(
+        {"ibov": ["^BVSP"], "sp500": ["^GSPC"], _USDBRL_HISTORY_KEY: _USDBRL_HISTORY_SYMBOLS},
+        period,
     )
-    sp500_levels = _levels_from_month_map(month_keys, _download_monthly_close_map("^GSPC", period))
-    usdbrl_levels = _levels_from_month_map(month_keys, _download_monthly_close_map("USDBRL=X", period))
-    if not any(value is not None for value in usdbrl_levels):
-        usdbrl_levels = _levels_from_month_map(month_keys, _download_monthly_close_map("BRL=X", period))
+    ibov_series = _cumulative_pct_from_levels(_levels_from_month_map(month_keys, benchmark_maps["ibov"]))
+    sp500_levels = _levels_from_month_map(month_keys, benchmark_maps["sp500"])
+    usdbrl_levels = _levels_from_month_map(month_keys, benchmark_maps[_USDBRL_HISTORY_KEY])
     sp500_brl_levels = []
     for idx in range(len(month_keys)):
         sp = sp500_levels[idx] if idx < len(sp500_levels) else None
@@ -6155,3 +7330,54 @@ def _compute_variable_income_value_daily_series(portfolio_ids, range_key: str =
         "generated_at": datetime.utcnow().replace(microsecond=0).isoformat() + "Z",
     }
     return result
+
+
+def get_fixed_income_value_daily_series(portfolio_ids, range_key: str = "90d"):
+    normalized_range, _days, _period = _portfolio_daily_range_config(range_key)
+    pids = tuple(sorted(normalize_portfolio_ids(portfolio_ids)))
+    return _cached_chart_series(
+        "fixed_income_value_daily",
+        pids,
+        normalized_range,
+        lambda inner_pids: _compute_fixed_income_value_daily_series(inner_pids, normalized_range),
+    )
+
+
+def _compute_fixed_income_value_daily_series(portfolio_ids, range_key: str = "90d"):
+    normalized_range, days, _period = _portfolio_daily_range_config(range_key)
+    pids = tuple(sorted(normalize_portfolio_ids(portfolio_ids)))
+    day_keys = _day_keys_back(days)
+    placeholders = ",".join(["?"] * len(pids))
+    rows = get_db().execute(
+        """
+        SELECT
+            id,
+            rate_type,
+            annual_rate,
+            rate_fixed,
+            rate_ipca,
+            rate_cdi,
+            date_aporte,
+            maturity_date,
+            aporte,
+            reinvested
+        FROM fixed_incomes
+        WHERE portfolio_id IN ("""
+        + placeholders
+        + """)
+        """,
+        tuple(pids),
+    ).fetchall()
+    values, invested = _fixed_income_daily_values([dict(row) for row in rows], day_keys)
+    values = [round(value, 2) for value in values.tolist()]
+    invested = [round(value, 2) for value in invested.tolist()]
+    return {
+        "range_key": normalized_range,
+        "labels": [_day_label(key) for key in day_keys],
+        "values": values,
+        "invested_values": invested,
+        "income_values": [round(value - applied, 2) for value, applied in zip(values, invested)],
+        "items_count": len(rows),
+        "current_total_value": values[-1] if values else 0.0,
+        "generated_at": datetime.utcnow().replace(microsecond=0).isoformat() + "Z",
+    }
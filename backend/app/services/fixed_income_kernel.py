@@ -0,0 +1,64 @@
+"""Kernel NumPy da projecao de renda fixa (uma linha por titulo).
+
+Espelha ``_fixed_income_projection_at_date`` em operacoes vetoriais: fatores
+prefixados, janelas CDI/IPCA sobre a tabela de fatores acumulados
+(bcb_index_factors) e a combinacao por tipo de taxa, com a mesma ordem de
+operacoes do calculo escalar para que o arredondamento final nao mude.
+"""
+
+import numpy as np
+
+# Codigos de rate_type; qualquer outro valor combina os tres fatores.
+RATE_TYPE_CODES = {"FIXO": 0, "CDI": 1, "IPCA": 2, "FIXO+IPCA": 3, "FIXO+CDI": 4}
+OTHER_RATE_TYPE = 5
+
+
+def rate_type_code(rate_type):
+    return RATE_TYPE_CODES.get(str(rate_type or "").upper(), OTHER_RATE_TYPE)
+
+
+def annualized_factors(rate_pct, days):
+    """``(1 + rate/100) ** (days/365)``; 1.0 onde ``days <= 0`` ou ``rate <= 0``."""
+    rate = np.asarray(rate_pct, dtype=float)
+    days = np.asarray(days, dtype=float)
+    rate, days = np.broadcast_arrays(rate, days)
+    active = (days > 0) & (rate > 0)
+    factors = np.ones(rate.shape)
+    np.power(1 + (rate / 100.0), days / 365.0, out=factors, where=active)
+    return factors
+
+
+def window_factors(day_ordinals, values, prefix, start, end, multiplier, extrapolation_step_days):
+    """Fator composto de cada janela ``[start, end]`` (ordinais de dia).
+
+    ``prefix[i]`` e o log do fator das ``i`` primeiras observacoes. Depois da
+    ultima observacao da janela o fator segue com o ultimo valor, um passo a
+    cada ``extrapolation_step_days``. Retorna ``(fatores, tem_dados)``; sem
+    observacao na janela o fator e 1.0 e ``tem_dados`` False.
+    """
+    start = np.asarray(start, dtype=np.int64)
+    end = np.asarray(end, dtype=np.int64)
+    if len(day_ordinals) == 0:
+        return np.ones(start.shape), np.zeros(start.shape, dtype=bool)
+    lo = np.searchsorted(day_ordinals, start, side="left")
+    hi = np.searchsorted(day_ordinals, end, side="right")
+    has_data = hi > lo
+    last = np.maximum(hi - 1, 0)
+    factors = np.exp(prefix[hi] - prefix[lo])
+    missing_days = np.maximum(end - day_ordinals[last], 0)
+    if extrapolation_step_days > 0:
+        extrapolate = has_data & (missing_days > 0)
+        step_factors = 1 + ((values[last] / 100.0) * multiplier)
+        extrapolated = factors * step_factors ** (missing_days / extrapolation_step_days)
+        factors = np.where(extrapolate, extrapolated, factors)
+    return np.where(has_data, factors, 1.0), has_data
+
+
+def combine_factors(type_codes, fixed, cdi, ipca):
+    """Fator final por tipo de taxa (FIXO, CDI, IPCA, FIXO+IPCA, FIXO+CDI, outros)."""
+    codes = np.asarray(type_codes)
+    return np.select(
+        [codes == 0, codes == 1, codes == 2, codes == 3, codes == 4],
+        [fixed, cdi, ipca, fixed * ipca, fixed * cdi],
+        fixed * cdi * ipca,
+    )
@@ -60,6 +60,36 @@ def _is_truthy_env(name: str, default: str = "0"):
     return value in {"1", "true", "yes", "on"}
 
 
+def _fetch_provider_profile(provider: str, ticker: str):
+    if provider == "alpha_vantage":
+        return legacy._fetch_alpha_vantage_profile(ticker)
+    if provider == "market_scanner":
+        return legacy._fetch_market_scanner_profile(ticker)
+    if provider == "coingecko":
+        return legacy._fetch_coingecko_profile(ticker)
+    if provider == "brapi":
+        return legacy._fetch_brapi_profile(ticker)
+    if provider == "yahoo":
+        return legacy._fetch_yahoo_profile(ticker)
+    return None
+
+
+def _fetch_provider_metrics(provider: str, ticker: str):
+    if provider == "alpha_vantage":
+        return legacy._fetch_alpha_vantage_metrics(ticker)
+    if provider == "twelve_data":
+        return legacy._fetch_twelve_data_metrics(ticker)
+    if provider == "market_scanner":
+        return legacy._fetch_market_scanner_metrics(ticker)
+    if provider == "coingecko":
+        return legacy._fetch_coingecko_metrics(ticker)
+    if provider == "brapi":
+        return legacy._fetch_brapi_metrics(ticker)
+    if provider == "google":
+        return legacy._fetch_google_metrics(ticker)
+    return legacy._fetch_yahoo_metrics(ticker)
+
+
 def _fetch_market_profile(ticker: str, include_scanner_br: bool = True):
     for provider in legacy._market_data_provider_order(
         "profile",
@@ -67,20 +97,8 @@ def _fetch_market_profile(ticker: str, include_scanner_br: bool = True):
         include_scanner_br=include_scanner_br,
     ):
         try:
-            if provider == "alpha_vantage":
-                profile = legacy._fetch_alpha_vantage_profile(ticker)
-            elif provider == "twelve_data":
-                profile = None
-            elif provider == "market_scanner":
-                profile = legacy._fetch_market_scanner_profile(ticker)
-            elif provider == "coingecko":
-                profile = legacy._fetch_coingecko_profile(ticker)
-            elif provider == "brapi":
-                profile = legacy._fetch_brapi_profile(ticker)
-            elif provider == "yahoo":
-                profile = legacy._fetch_yahoo_profile(ticker)
-            else:
-                profile = None
+            with legacy._provider_slot(provider):
+                profile = _fetch_provider_profile(provider, ticker)
         except Exception:
             profile = None
         if profile and any((profile.get("name"), profile.get("sector"))):
@@ -95,20 +113,8 @@ def _fetch_market_metrics(ticker: str, include_scanner_br: bool = True):
         include_scanner_br=include_scanner_br,
     ):
         try:
-            if provider == "alpha_vantage":
-                metrics = legacy._fetch_alpha_vantage_metrics(ticker)
-            elif provider == "twelve_data":
-                metrics = legacy._fetch_twelve_data_metrics(ticker)
-            elif provider == "market_scanner":
-                metrics = legacy._fetch_market_scanner_metrics(ticker)
-            elif provider == "coingecko":
-                metrics = legacy._fetch_coingecko_metrics(ticker)
-            elif provider == "brapi":
-                metrics = legacy._fetch_brapi_metrics(ticker)
-            elif provider == "google":
-                metrics = legacy._fetch_google_metrics(ticker)
-            else:
-                metrics = legacy._fetch_yahoo_metrics(ticker)
+            with legacy._provider_slot(provider):
+                metrics = _fetch_provider_metrics(provider, ticker)
         except Exception:
             metrics = None
         if _has_market_metrics(metrics):
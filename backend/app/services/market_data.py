@@ -3,12 +3,15 @@
 import os
 import random
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 from math import isfinite
 
 from flask import current_app
 
 from ..db import get_db
+from ..memory_cache import MemoryCache
+from ..single_flight import single_flight
 from . import _legacy as legacy
 
 try:
@@ -16,7 +19,7 @@ try:
 except ImportError:  # pragma: no cover
     yf = None
 
-_UPCOMING_INCOME_CACHE = {}
+_UPCOMING_INCOME_CACHE = MemoryCache("upcoming_incomes", max_entries=500, ttl_seconds=1800)
 
 
 def _now_iso():
@@ -100,34 +103,6 @@ def _upcoming_income_db_cache_ttl_seconds():
         return 1800
 
 
-def _upcoming_income_cache_get(cache_key):
-    cached = _UPCOMING_INCOME_CACHE.get(cache_key)
-    if not cached:
-        return None
-    expires_at = float(cached.get("expires_at") or 0.0)
-    if expires_at <= time.time():
-        _UPCOMING_INCOME_CACHE.pop(cache_key, None)
-        return None
-    payload = cached.get("payload") or []
-    return [dict(item) for item in payload if isinstance(item, dict)]
-
-
-def _upcoming_income_cache_set(cache_key, payload):
-    _UPCOMING_INCOME_CACHE[cache_key] = {
-        "expires_at": time.time() + _upcoming_income_cache_ttl_seconds(),
-        "payload": [dict(item) for item in (payload or []) if isinstance(item, dict)],
-    }
-    if len(_UPCOMING_INCOME_CACHE) > 500:
-        now_ts = time.time()
-        expired_keys = [
-            key
-            for key, value in _UPCOMING_INCOME_CACHE.items()
-            if float((value or {}).get("expires_at") or 0.0) <= now_ts
-        ]
-        for key in expired_keys:
-            _UPCOMING_INCOME_CACHE.pop(key, None)
-
-
 def _coerce_date(value):
     if value is None:
         return None
@@ -417,25 +392,45 @@ def get_asset_upcoming_incomes(
         max_count = 8
 
     cache_key = (normalized_ticker, max_count)
-    cached = _upcoming_income_cache_get(cache_key)
-    if cached is not None:
-        if cached or (not allow_live_fetch) or (not refresh_if_empty_cache):
-            return cached
-    try:
-        db_hit, db_cached = _upcoming_income_db_cache_get(normalized_ticker, max_count)
-    except Exception:
-        current_app.logger.exception(
-            "Falha ao ler cache compartilhado de proventos futuros para %s.",
-            normalized_ticker,
-        )
-        db_hit, db_cached = False, []
-    if db_hit:
-        _upcoming_income_cache_set(cache_key, db_cached)
-        if db_cached or (not allow_live_fetch) or (not refresh_if_empty_cache):
+    refresh_empty = allow_live_fetch and refresh_if_empty_cache
+    if refresh_empty and _UPCOMING_INCOME_CACHE.get(cache_key) == []:
+        # Lista vazia em memoria: tenta de novo o cache compartilhado/busca ao vivo.
+        _UPCOMING_INCOME_CACHE.pop(cache_key)
+
+    def _load():
+        try:
+            db_hit, db_cached = _upcoming_income_db_cache_get(normalized_ticker, max_count)
+        except Exception:
+            current_app.logger.exception(
+                "Falha ao ler cache compartilhado de proventos futuros para %s.",
+                normalized_ticker,
+            )
+            db_hit, db_cached = False, []
+        if db_hit and (db_cached or not refresh_empty):
             return db_cached
-    if not allow_live_fetch:
-        return []
+        if not allow_live_fetch:
+            return None
 
+        def _stored_by_other_worker():
+            hit, stored = _upcoming_income_db_cache_get(normalized_ticker, max_count)
+            return stored if hit and stored else None
+
+        return single_flight(
+            f"upcoming_incomes:{normalized_ticker}:{max_count}",
+            lambda: _fetch_upcoming_incomes_live(normalized_ticker, max_count),
+            recheck_fn=_stored_by_other_worker,
+        )
+
+    events = _UPCOMING_INCOME_CACHE.get_or_set(
+        cache_key,
+        _load,
+        ttl_seconds=_upcoming_income_cache_ttl_seconds(),
+        should_cache=lambda value: value is not None,
+    )
+    return [dict(item) for item in (events or []) if isinstance(item, dict)]
+
+
+def _fetch_upcoming_incomes_live(normalized_ticker, max_count):
     symbols = list(legacy._candidate_yahoo_symbols(normalized_ticker))
     if legacy._is_brazilian_market_ticker(normalized_ticker):
         br_symbols = [symbol for symbol in symbols if str(symbol or "").strip().upper().endswith(".SA")]
@@ -455,7 +450,6 @@ def get_asset_upcoming_incomes(
             "Falha ao atualizar cache compartilhado de proventos futuros para %s.",
             normalized_ticker,
         )
-    _upcoming_income_cache_set(cache_key, events)
     return events
 
 
@@ -669,6 +663,7 @@ def _mark_asset_market_data_failed(
         (attempted_at, (error_message or "").strip(), (ticker or "").strip().upper()),
     )
     db.commit()
+    legacy.bump_asset_versions([ticker])
     _record_market_data_sync_audit(
         ticker=ticker,
         success=False,
@@ -714,17 +709,24 @@ def _asset_price_history_cache_ttl_seconds(range_key: str):
 def get_asset_price_history(ticker: str, range_key: str = "1y"):
     normalized_range = legacy._history_config(range_key)[0]
     cache_key = ((ticker or "").strip().upper(), normalized_range)
-    cached = legacy._memory_cache_get(legacy._ASSET_PRICE_HISTORY_CACHE, cache_key)
+    cached = legacy._ASSET_PRICE_HISTORY_CACHE.get(cache_key)
     if cached is not None:
         return dict(cached)
 
-    history, history_source = legacy._fetch_market_history(ticker, range_key)
-    legacy._memory_cache_set(
-        legacy._ASSET_PRICE_HISTORY_CACHE,
-        cache_key,
-        dict(history),
-        _asset_price_history_cache_ttl_seconds(normalized_range),
+    def _fetch_and_store():
+        fetched = legacy._fetch_market_history(ticker, range_key)
+        legacy._ASSET_PRICE_HISTORY_CACHE.set(
+            cache_key,
+            dict(fetched[0]),
+            _asset_price_history_cache_ttl_seconds(normalized_range),
+        )
+        return fetched
+
+    # _ASSET_PRICE_HISTORY_CACHE is per worker: coalesce in-process only.
+    history, history_source = single_flight(
+        f"price_history:{cache_key[0]}:{normalized_range}", _fetch_and_store, lease=False
     )
+    history = dict(history)
     if legacy._is_truthy_env("MARKET_DATA_LOG_SOURCES", "0"):
         logger = legacy._LOGGER
         try:
@@ -742,6 +744,29 @@ def get_asset_price_history(ticker: str, range_key: str = "1y"):
     return history
 
 
+def _fetch_asset_market_payload(
+    ticker: str,
+    include_scanner_br: bool = True,
+    preferred_provider: str | None = None,
+):
+    if str(preferred_provider or "").strip().lower() == "market_scanner":
+        with legacy._provider_slot("market_scanner"):
+            profile = legacy._fetch_market_scanner_profile(ticker) or {}
+            metrics = legacy._fetch_market_scanner_metrics(ticker) or {}
+        profile_source = "market_scanner" if profile else None
+        metrics_source = "market_scanner" if legacy._has_market_metrics(metrics) else None
+        return profile, profile_source, metrics, metrics_source
+    profile, profile_source = legacy._fetch_market_profile(
+        ticker,
+        include_scanner_br=include_scanner_br,
+    )
+    metrics, metrics_source = legacy._fetch_market_metrics(
+        ticker,
+        include_scanner_br=include_scanner_br,
+    )
+    return profile, profile_source, metrics, metrics_source
+
+
 def refresh_asset_market_data(
     ticker: str,
     include_scanner_br: bool = True,
@@ -750,27 +775,25 @@ def refresh_asset_market_data(
     asset = get_asset(ticker)
     if not asset:
         return False
-    providers_tried = legacy._market_data_provider_label(
+    payload = _fetch_asset_market_payload(
+        ticker,
+        include_scanner_br=include_scanner_br,
+        preferred_provider=preferred_provider,
+    )
+    return _apply_asset_market_payload(
+        asset,
         ticker,
+        payload,
         include_scanner_br=include_scanner_br,
     )
-    profile_source = None
-    metrics_source = None
 
-    if str(preferred_provider or "").strip().lower() == "market_scanner":
-        profile = legacy._fetch_market_scanner_profile(ticker) or {}
-        profile_source = "market_scanner" if profile else None
-        metrics = legacy._fetch_market_scanner_metrics(ticker) or {}
-        metrics_source = "market_scanner" if legacy._has_market_metrics(metrics) else None
-    else:
-        profile, profile_source = legacy._fetch_market_profile(
-            ticker,
-            include_scanner_br=include_scanner_br,
-        )
-        metrics, metrics_source = legacy._fetch_market_metrics(
-            ticker,
-            include_scanner_br=include_scanner_br,
-        )
+
+def _apply_asset_market_payload(asset, ticker: str, payload, include_scanner_br: bool = True):
+    profile, profile_source, metrics, metrics_source = payload
+    providers_tried = legacy._market_data_provider_label(
+        ticker,
+        include_scanner_br=include_scanner_br,
+    )
     if not metrics and not profile:
         _mark_asset_market_data_failed(
             ticker,
@@ -887,6 +910,12 @@ def refresh_asset_market_data(
         ),
     )
     db.commit()
+    legacy.bump_asset_versions([ticker])
+    if applied_metrics.get("price") != asset["price"]:
+        # Charts of the portfolios holding this ticker now have stale values.
+        legacy.mark_ticker_holders_dirty([ticker])
+        legacy.invalidate_chart_series_dependencies(["market:quotes"])
+        db.commit()
     _record_market_data_sync_audit(
         ticker=ticker,
         success=bool(has_market_metrics),
@@ -927,6 +956,72 @@ def refresh_asset_market_data(
     return has_market_metrics
 
 
+def _market_data_refresh_workers():
+    raw = (os.getenv("MARKET_DATA_REFRESH_WORKERS") or "8").strip()
+    try:
+        return max(int(raw), 1)
+    except (TypeError, ValueError):
+        return 8
+
+
+def _fetch_asset_market_payload_in_context(app, ticker: str, include_scanner_br: bool):
+    # Worker threads need their own app context (and sqlite connection) for the
+    # provider budget/circuit bookkeeping; asset rows are written by the caller.
+    with app.app_context():
+        return _fetch_asset_market_payload(ticker, include_scanner_br=include_scanner_br)
+
+
+def _refresh_market_data_batch(tickers, include_scanner_br: bool = True):
+    assets = {}
+    for ticker in tickers:
+        asset = get_asset(ticker)
+        if asset:
+            assets[ticker] = asset
+    failed = {ticker for ticker in tickers if ticker not in assets}
+    if not assets:
+        return failed
+
+    def _apply(ticker, fetch_payload):
+        try:
+            ok = _apply_asset_market_payload(
+                assets[ticker],
+                ticker,
+                fetch_payload(),
+                include_scanner_br=include_scanner_br,
+            )
+        except Exception as exc:
+            _mark_asset_market_data_failed(ticker, str(exc))
+            ok = False
+        if not ok:
+            failed.add(ticker)
+
+    workers = min(_market_data_refresh_workers(), len(assets))
+    if workers <= 1:
+        for ticker in assets:
+            _apply(
+                ticker,
+                lambda: _fetch_asset_market_payload(ticker, include_scanner_br=include_scanner_br),
+            )
+        return failed
+
+    # Provider calls fan out across the pool (each provider capped by its own
+    # slot); this thread is the only one writing asset rows and audit entries.
+    app = current_app._get_current_object()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="market-data-refresh") as pool:
+        futures = {
+            pool.submit(
+                _fetch_asset_market_payload_in_context,
+                app,
+                ticker,
+                include_scanner_br,
+            ): ticker
+            for ticker in assets
+        }
+        for future in as_completed(futures):
+            _apply(futures[future], future.result)
+    return failed
+
+
 def refresh_market_data_for_tickers(
     tickers,
     attempts: int = 2,
@@ -942,24 +1037,15 @@ def refresh_market_data_for_tickers(
     for attempt in range(attempts):
         if not failed:
             break
-        next_failed = set()
         current_batch = sorted(failed)
         legacy._prefetch_brapi_market_data_for_tickers(current_batch)
-        for ticker in current_batch:
-            try:
-                ok = refresh_asset_market_data(
-                    ticker,
-                    include_scanner_br=include_scanner_br,
-                )
-            except Exception as exc:
-                _mark_asset_market_data_failed(ticker, str(exc))
-                ok = False
-            if not ok:
-                next_failed.add(ticker)
-            time.sleep(0.12 + random.random() * 0.12)
-        failed = next_failed
+        failed = _refresh_market_data_batch(
+            current_batch,
+            include_scanner_br=include_scanner_br,
+        )
         if failed and attempt < attempts - 1:
             time.sleep(0.5 * (attempt + 1))
+    legacy._provider_usage_flush()
     return sorted(failed)
 
 
@@ -1071,8 +1157,17 @@ def _refresh_assets_market_data_by_scope(
     return {"selected": tickers, "failed": failed}
 
 
+def get_assets_data_version():
+    return legacy.get_assets_data_version()
+
+
+def sync_bcb_index_series(series_codes=None):
+    return legacy.sync_bcb_index_series(series_codes)
+
+
 __all__ = [
     "get_asset",
+    "get_assets_data_version",
     "get_asset_upcoming_incomes",
     "get_asset_price_history",
     "get_top_assets",
@@ -1081,4 +1176,5 @@ __all__ = [
     "refresh_all_assets_market_data",
     "refresh_asset_market_data",
     "refresh_stale_assets_market_data",
+    "sync_bcb_index_series",
 ]
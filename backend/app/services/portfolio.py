@@ -2,13 +2,13 @@
 
 import csv
 import io
-import json
 from datetime import datetime
 
 from flask import current_app
 from flask import has_request_context
 
 from ..db import get_db
+from ..serialization import pack_payload, unpack_payload
 from . import _legacy as legacy
 
 
@@ -458,13 +458,16 @@ def delete_portfolio(portfolio_id):
             "Carteira com lancamentos nao pode ser removida. Remova transacoes/proventos primeiro.",
         )
 
-    db.execute("DELETE FROM chart_snapshot_monthly_class WHERE portfolio_id = ?", (pid,))
-    db.execute("DELETE FROM chart_snapshot_monthly_ticker WHERE portfolio_id = ?", (pid,))
+    db.execute("DELETE FROM chart_snapshot_state WHERE portfolio_id = ?", (pid,))
     db.execute("DELETE FROM fixed_income_snapshot_items WHERE portfolio_id = ?", (pid,))
     db.execute("DELETE FROM fixed_income_snapshot_summary WHERE portfolio_id = ?", (pid,))
+    db.execute("DELETE FROM position_state WHERE portfolio_id = ?", (pid,))
+    db.execute("DELETE FROM portfolio_monthly_flows WHERE portfolio_id = ?", (pid,))
+    db.execute("DELETE FROM position_checkpoints WHERE portfolio_id = ?", (pid,))
+    db.execute("DELETE FROM portfolio_dirty_months WHERE portfolio_id = ?", (pid,))
     db.execute("DELETE FROM portfolios WHERE id = ?", (pid,))
+    legacy.invalidate_chart_series_dependencies([f"portfolio:{pid}"])
     db.commit()
-    legacy._clear_benchmark_cache()
     return True, portfolio["name"]
 
 
@@ -532,6 +535,8 @@ def add_transaction(form_data: dict):
         (portfolio_id, ticker, tx_type, shares, price, transaction_date),
     )
     db.commit()
+    legacy.bump_asset_versions([ticker])
+    legacy.refresh_position_state([portfolio_id])
     legacy.invalidate_chart_snapshots([portfolio_id])
 
     return True, "Transacao registrada com sucesso."
@@ -606,9 +611,11 @@ def update_transaction(transaction_id, form_data: dict):
         (portfolio_id, ticker, tx_type, shares, price, transaction_date, record_id),
     )
     db.commit()
+    legacy.bump_asset_versions([ticker])
     affected_portfolios = [int(current["portfolio_id"])]
     if int(portfolio_id) not in affected_portfolios:
         affected_portfolios.append(int(portfolio_id))
+    legacy.refresh_position_state(affected_portfolios)
     legacy.invalidate_chart_snapshots(affected_portfolios)
 
     return True, "Transacao atualizada com sucesso."
@@ -767,6 +774,7 @@ def add_income(form_data: dict):
         (portfolio_id, ticker, income_type, amount, income_date),
     )
     db.commit()
+    legacy.refresh_position_state([portfolio_id])
     legacy.invalidate_chart_snapshots([portfolio_id])
     return True, "Provento registrado com sucesso."
 
@@ -839,6 +847,7 @@ def update_income(income_id, form_data: dict):
     affected_portfolios = [int(existing["portfolio_id"])]
     if portfolio_id not in affected_portfolios:
         affected_portfolios.append(portfolio_id)
+    legacy.refresh_position_state(affected_portfolios)
     legacy.invalidate_chart_snapshots(affected_portfolios)
     return True, "Provento atualizado com sucesso."
 
@@ -1047,10 +1056,10 @@ def delete_fixed_incomes(fixed_income_ids, portfolio_ids):
     return cursor.rowcount or 0
 
 
-def _fixed_income_projection(item):
-    # Reusa a regra consolidada existente enquanto a extração do cálculo
-    # atuarial completo ainda está em andamento.
-    return legacy._fixed_income_projection(item)
+def _fixed_income_projections(items):
+    # Projeção em lote (NumPy) com a mesma regra de
+    # legacy._fixed_income_projection_at_date, item a item.
+    return legacy._fixed_income_projections(items)
 
 
 def get_fixed_incomes(portfolio_ids, sort_by: str = "date_aporte", sort_dir: str = "desc"):
@@ -1084,7 +1093,7 @@ def get_fixed_incomes(portfolio_ids, sort_by: str = "date_aporte", sort_dir: str
         """,
         tuple(pids),
     ).fetchall()
-    items = [_fixed_income_projection(dict(row)) for row in rows]
+    items = _fixed_income_projections([dict(row) for row in rows])
     return _sort_fixed_income_items(items, sort_by=sort_by, sort_dir=sort_dir)
 
 
@@ -1151,14 +1160,6 @@ def _snapshot_now():
     return datetime.now().isoformat(timespec="seconds")
 
 
-def _snapshot_age_seconds(iso_text: str):
-    try:
-        created = datetime.fromisoformat((iso_text or "").strip())
-    except (TypeError, ValueError):
-        return None
-    return max((datetime.now() - created).total_seconds(), 0.0)
-
-
 def invalidate_fixed_income_snapshot(portfolio_ids):
     pids = normalize_portfolio_ids(portfolio_ids)
     placeholders = ",".join(["?"] * len(pids))
@@ -1173,6 +1174,7 @@ def invalidate_fixed_income_snapshot(portfolio_ids):
             tuple(pids),
         )
         db.commit()
+        legacy.mark_portfolios_dirty(pids, targets=("fixed_income",), reason="portfolio_changed")
     except Exception:
         db.rollback()
 
@@ -1205,7 +1207,7 @@ def rebuild_fixed_income_snapshots(portfolio_ids=None):
                   payload_json = excluded.payload_json,
                   updated_at = excluded.updated_at
                 """,
-                (pid, json.dumps(summary, ensure_ascii=False), stamp),
+                (pid, pack_payload(summary), stamp),
             )
             for item in items:
                 db.execute(
@@ -1216,7 +1218,7 @@ def rebuild_fixed_income_snapshots(portfolio_ids=None):
                       payload_json = excluded.payload_json,
                       updated_at = excluded.updated_at
                     """,
-                    (pid, int(item["id"]), json.dumps(item, ensure_ascii=False), stamp),
+                    (pid, int(item["id"]), pack_payload(item), stamp),
                 )
         except Exception:
             db.rollback()
@@ -1225,6 +1227,11 @@ def rebuild_fixed_income_snapshots(portfolio_ids=None):
     return {"portfolios": len(pids), "items": total_items}
 
 
+def rebuild_dirty_fixed_income_snapshots():
+    batch_size = int(current_app.config.get("FIXED_INCOME_SNAPSHOT_REBUILD_BATCH", 25))
+    return legacy.rebuild_dirty_snapshots("fixed_income", rebuild_fixed_income_snapshots, batch_size=batch_size)
+
+
 def get_fixed_income_payload_cached(portfolio_ids, sort_by: str = "date_aporte", sort_dir: str = "desc"):
     pids = normalize_portfolio_ids(portfolio_ids)
     max_age_seconds = int(current_app.config.get("FIXED_INCOME_SNAPSHOT_MAX_AGE_SECONDS", 900))
@@ -1246,12 +1253,12 @@ def get_fixed_income_payload_cached(portfolio_ids, sort_by: str = "date_aporte",
         if len(summary_rows) != len(pids):
             raise RuntimeError("snapshot_miss")
 
+        pending = legacy._pending_snapshot_rebuilds(pids, "fixed_income")
         summary_map = {}
         for row in summary_rows:
-            age = _snapshot_age_seconds(row["updated_at"])
-            if age is None or age > max_age_seconds:
+            if legacy._snapshot_expired(row["updated_at"], max_age_seconds, row["portfolio_id"] in pending):
                 raise RuntimeError("snapshot_stale")
-            summary_map[int(row["portfolio_id"])] = json.loads(row["payload_json"] or "{}")
+            summary_map[int(row["portfolio_id"])] = unpack_payload(row["payload_json"], {})
 
         item_rows = db.execute(
             """
@@ -1266,10 +1273,9 @@ def get_fixed_income_payload_cached(portfolio_ids, sort_by: str = "date_aporte",
 
         items = []
         for row in item_rows:
-            age = _snapshot_age_seconds(row["updated_at"])
-            if age is None or age > max_age_seconds:
+            if legacy._snapshot_expired(row["updated_at"], max_age_seconds, row["portfolio_id"] in pending):
                 raise RuntimeError("snapshot_stale")
-            item = json.loads(row["payload_json"] or "{}")
+            item = unpack_payload(row["payload_json"], {})
             if int(item.get("projection_version") or 0) < expected_projection_version:
                 raise RuntimeError("snapshot_projection_version")
             if "open_pnl_value" not in item:
@@ -1586,6 +1592,7 @@ def delete_transactions(transaction_ids, portfolio_ids):
         tuple(ids + pids),
     )
     db.commit()
+    legacy.refresh_position_state(pids)
     legacy.invalidate_chart_snapshots(pids)
     return cursor.rowcount
 
@@ -1654,6 +1661,7 @@ def delete_incomes(income_ids, portfolio_ids):
         tuple(ids + pids),
     )
     db.commit()
+    legacy.refresh_position_state(pids)
     legacy.invalidate_chart_snapshots(pids)
     return cursor.rowcount or 0
 
@@ -1864,6 +1872,10 @@ def get_variable_income_value_daily_series(portfolio_ids, range_key: str = "90d"
     return legacy.get_variable_income_value_daily_series(portfolio_ids, range_key=range_key)
 
 
+def get_fixed_income_value_daily_series(portfolio_ids, range_key: str = "90d"):
+    return legacy.get_fixed_income_value_daily_series(portfolio_ids, range_key=range_key)
+
+
 def get_patrimony_open_pnl_by_type_series(portfolio_ids, range_key: str = "12m"):
     return legacy.get_patrimony_open_pnl_by_type_series(portfolio_ids, range_key=range_key)
 
@@ -1872,6 +1884,10 @@ def get_portfolio_snapshot(portfolio_ids, sort_by: str = "name", sort_dir: str =
     return legacy.get_portfolio_snapshot(portfolio_ids, sort_by=sort_by, sort_dir=sort_dir)
 
 
+def get_portfolio_snapshot_as_of(portfolio_ids, as_of, sort_by: str = "value", sort_dir: str = "desc"):
+    return legacy.get_portfolio_snapshot_as_of(portfolio_ids, as_of, sort_by=sort_by, sort_dir=sort_dir)
+
+
 def get_monthly_class_summary(portfolio_ids):
     return legacy.get_monthly_class_summary(portfolio_ids)
 
@@ -1883,6 +1899,22 @@ def get_monthly_ticker_summary(portfolio_ids, months=8):
 def rebuild_chart_snapshots(portfolio_ids=None):
     return legacy.rebuild_chart_snapshots(portfolio_ids=portfolio_ids)
 
+
+def rebuild_dirty_chart_snapshots():
+    return legacy.rebuild_dirty_chart_snapshots()
+
+
+def get_chart_series_cache_stats():
+    return legacy.get_chart_series_cache_stats()
+
+
+def get_portfolio_data_version(portfolio_ids):
+    return legacy.get_portfolio_data_version(portfolio_ids)
+
+
+def get_portfolio_as_of_data_version(portfolio_ids, as_of):
+    return legacy.get_portfolio_as_of_data_version(portfolio_ids, as_of)
+
 __all__ = [
     "add_fixed_income",
     "add_income",
@@ -1896,14 +1928,19 @@ __all__ = [
     "get_asset_position_summary",
     "get_asset_transactions",
     "get_benchmark_comparison",
+    "get_chart_series_cache_stats",
     "get_fixed_income_payload_cached",
     "get_fixed_income_summary",
+    "get_fixed_income_value_daily_series",
     "get_fixed_incomes",
     "get_incomes",
     "get_monthly_class_summary",
     "get_monthly_ticker_summary",
     "get_patrimony_open_pnl_by_type_series",
+    "get_portfolio_as_of_data_version",
+    "get_portfolio_data_version",
     "get_portfolio_snapshot",
+    "get_portfolio_snapshot_as_of",
     "get_portfolios",
     "get_sectors_summary",
     "get_transactions",
@@ -1912,6 +1949,8 @@ __all__ = [
     "import_transactions_csv",
     "normalize_portfolio_ids",
     "rebuild_chart_snapshots",
+    "rebuild_dirty_chart_snapshots",
+    "rebuild_dirty_fixed_income_snapshots",
     "rebuild_fixed_income_snapshots",
     "resolve_portfolio_id",
     "update_income",
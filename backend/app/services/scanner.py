@@ -222,7 +222,7 @@ def recalculate_metric_formulas_for_all_assets():
         ORDER BY ticker ASC
         """
     ).fetchall()
-    updated = 0
+    updated = []
     for row in rows:
         ticker = str(row["ticker"] or "").strip().upper()
         if not ticker:
@@ -267,9 +267,12 @@ def recalculate_metric_formulas_for_all_assets():
             ),
         )
         if int(cursor.rowcount or 0) > 0:
-            updated += 1
+            updated.append(ticker)
+    if updated:
+        legacy.invalidate_chart_series_dependencies(["market:quotes"])
     db.commit()
-    return {"updated_count": updated, "applied_at": _now_iso()}
+    legacy.bump_asset_versions(updated)
+    return {"updated_count": len(updated), "applied_at": _now_iso()}
 
 
 def update_metric_formula(metric_key: str, formula: str):
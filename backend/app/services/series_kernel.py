@@ -0,0 +1,74 @@
+"""Kernel NumPy das series dos graficos (chaves de data x posicoes).
+
+Cada serie chega como mapa ``{chave: fechamento}``; aqui vira uma linha de
+uma matriz alinhada as chaves do grafico, com NaN no lugar de "sem valor".
+Forward fill, cambio, normalizacao e somas passam a ser operacoes vetoriais,
+mantendo a mesma ordem de operacoes dos loops antigos para que o
+arredondamento final nao mude.
+"""
+
+from itertools import repeat
+
+import numpy as np
+
+
+def aligned_levels(keys, maps, fill_before_first: bool = False):
+    """Matriz ``len(maps) x len(keys)`` com forward fill por linha.
+
+    Antes do primeiro fechamento fica NaN, ou o proprio primeiro fechamento
+    quando ``fill_before_first``.
+    """
+    if not maps or not keys:
+        return np.full((len(maps), len(keys)), np.nan)
+    # dict.get via map() roda em C; None e chave ausente viram NaN.
+    matrix = np.array(
+        [list(map((series_map or {}).get, keys, repeat(np.nan))) for series_map in maps],
+        dtype=float,
+    )
+
+    valid = ~np.isnan(matrix)
+    last_index = np.where(valid, np.arange(matrix.shape[1]), 0)
+    np.maximum.accumulate(last_index, axis=1, out=last_index)
+    filled = np.take_along_axis(matrix, last_index, axis=1)
+    if fill_before_first:
+        first_index = valid.argmax(axis=1)[:, None]
+        first_values = np.take_along_axis(matrix, first_index, axis=1)
+        return np.where(np.isnan(filled), first_values, filled)
+    # Sem valor ainda: o indice 0 acumulado apontaria para a coluna 0.
+    return np.where(np.logical_or.accumulate(valid, axis=1), filled, np.nan)
+
+
+def convert_fx(matrix, rows, fx_levels, zero_fx_is_missing: bool = True):
+    """Multiplica as linhas ``rows`` pelo cambio de cada chave (broadcast)."""
+    if not len(rows) or matrix.size == 0:
+        return matrix
+    fx = np.asarray(fx_levels, dtype=float)
+    if zero_fx_is_missing:
+        fx = np.where(fx == 0, np.nan, fx)
+    matrix[rows] = matrix[rows] * fx
+    return matrix
+
+
+def first_nonzero(matrix, reverse: bool = False):
+    """Primeiro (ou ultimo) valor nao nulo e != 0 de cada linha; NaN se nao houver."""
+    if matrix.shape[1] == 0:
+        return np.full(matrix.shape[0], np.nan)
+    if reverse:
+        matrix = matrix[:, ::-1]
+    usable = ~np.isnan(matrix) & (matrix != 0)
+    values = np.take_along_axis(matrix, usable.argmax(axis=1)[:, None], axis=1)[:, 0]
+    return np.where(usable.any(axis=1), values, np.nan)
+
+
+def cumulative_pct(levels):
+    """Variacao % sobre o primeiro nivel nao nulo e != 0 (tudo NaN sem base)."""
+    levels = np.asarray(levels, dtype=float).reshape(1, -1)
+    base = first_nonzero(levels)[0]
+    if np.isnan(base):
+        return np.full(levels.shape[1], np.nan)
+    return ((levels[0] / base) - 1.0) * 100.0
+
+
+def to_list(values):
+    """Array -> lista de floats com None no lugar de NaN."""
+    return [None if value != value else value for value in np.asarray(values, dtype=float).tolist()]
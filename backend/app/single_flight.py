@@ -0,0 +1,179 @@
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from flask import current_app, has_app_context
+
+# Coalesces concurrent cache misses for the same key. Inside a process the
+# first caller (leader) runs the compute and the others wait on its Future;
+# across gunicorn workers the leader also holds a short lease row in SQLite
+# (single_flight_leases), and other workers poll their shared cache until the
+# lease is released instead of running the same compute.
+
+_INFLIGHT = {}
+_INFLIGHT_LOCK = threading.Lock()
+_LEASE_OWNER_PREFIX = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+_STATS = {"leaders": 0, "followers": 0, "lease_waits": 0, "lease_timeouts": 0}
+
+
+def _count(counter):
+    with _INFLIGHT_LOCK:
+        _STATS[counter] += 1
+
+
+def get_single_flight_stats():
+    with _INFLIGHT_LOCK:
+        stats = dict(_STATS)
+        stats["in_flight"] = len(_INFLIGHT)
+    return stats
+
+
+def _lease_connection():
+    # Own short-lived connection: acquiring/releasing a lease must not commit
+    # whatever the request has pending on its get_db() connection.
+    connection = sqlite3.connect(current_app.config["DATABASE"], timeout=5.0)
+    connection.row_factory = sqlite3.Row
+    return connection
+
+
+def _try_acquire_lease(lease_key, owner, lease_seconds):
+    now = time.time()
+    connection = _lease_connection()
+    try:
+        cursor = connection.execute(
+            """
+            INSERT INTO single_flight_leases (lease_key, owner, expires_at)
+            VALUES (?, ?, ?)
+            ON CONFLICT(lease_key) DO UPDATE SET
+              owner = excluded.owner,
+              expires_at = excluded.expires_at
+            WHERE single_flight_leases.expires_at < ?
+            """,
+            (lease_key, owner, now + lease_seconds, now),
+        )
+        connection.commit()
+        return cursor.rowcount > 0
+    finally:
+        connection.close()
+
+
+def _lease_held_elsewhere(lease_key, owner):
+    connection = _lease_connection()
+    try:
+        row = connection.execute(
+            "SELECT owner, expires_at FROM single_flight_leases WHERE lease_key = ?",
+            (lease_key,),
+        ).fetchone()
+    finally:
+        connection.close()
+    return row is not None and row["owner"] != owner and float(row["expires_at"]) >= time.time()
+
+
+def _release_lease(lease_key, owner):
+    connection = _lease_connection()
+    try:
+        connection.execute(
+            "DELETE FROM single_flight_leases WHERE lease_key = ? AND owner = ?",
+            (lease_key, owner),
+        )
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def _run_with_lease(lease_key, compute_fn, recheck_fn, lease_seconds, wait_seconds, poll_seconds):
+    owner = f"{_LEASE_OWNER_PREFIX}:{threading.get_ident()}"
+    try:
+        acquired = _try_acquire_lease(lease_key, owner, lease_seconds)
+    except sqlite3.Error:
+        # No lease table / locked database: degrade to in-process coalescing.
+        return compute_fn()
+
+    if not acquired:
+        _count("lease_waits")
+        deadline = time.monotonic() + wait_seconds
+        while time.monotonic() < deadline:
+            time.sleep(poll_seconds)
+            if recheck_fn is not None:
+                found = recheck_fn()
+                if found is not None:
+                    return found
+            try:
+                if not _lease_held_elsewhere(lease_key, owner):
+                    break
+            except sqlite3.Error:
+                break
+        else:
+            _count("lease_timeouts")
+        if recheck_fn is not None:
+            found = recheck_fn()
+            if found is not None:
+                return found
+        try:
+            acquired = _try_acquire_lease(lease_key, owner, lease_seconds)
+        except sqlite3.Error:
+            acquired = False
+
+    try:
+        return compute_fn()
+    finally:
+        if acquired:
+            try:
+                _release_lease(lease_key, owner)
+            except sqlite3.Error:
+                pass
+
+
+def single_flight(
+    key,
+    compute_fn,
+    recheck_fn=None,
+    lease_seconds=60.0,
+    wait_seconds=30.0,
+    poll_seconds=0.25,
+    lease=True,
+):
+    """Run ``compute_fn()`` once per ``key`` across concurrent callers.
+
+    ``recheck_fn`` reads the shared cache the compute fills and returns None
+    on a miss; a worker that finds the lease taken polls it instead of
+    computing. Without it (or after ``wait_seconds``) the caller computes
+    once the lease is released. Followers in the same process receive the
+    leader's result or exception. ``lease=False`` keeps the coalescing
+    in-process (per-worker caches have nothing to share across workers).
+    """
+    lease_key = str(key)
+    with _INFLIGHT_LOCK:
+        future = _INFLIGHT.get(lease_key)
+        leader = future is None
+        if leader:
+            future = Future()
+            _INFLIGHT[lease_key] = future
+
+    if not leader:
+        _count("followers")
+        try:
+            return future.result(timeout=wait_seconds)
+        except FutureTimeoutError:
+            return compute_fn()
+
+    _count("leaders")
+    try:
+        if lease and has_app_context():
+            result = _run_with_lease(lease_key, compute_fn, recheck_fn, lease_seconds, wait_seconds, poll_seconds)
+        else:
+            result = compute_fn()
+    except BaseException as exc:
+        future.set_exception(exc)
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        with _INFLIGHT_LOCK:
+            if _INFLIGHT.get(lease_key) is future:
+                del _INFLIGHT[lease_key]
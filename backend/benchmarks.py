@@ -0,0 +1,199 @@
+"""Micro-benchmarks of the backend hot paths (not part of the test suite).
+
+Each benchmark reuses the fixtures of its test module and prints best-of-N
+wall-clock timings; correctness is covered by the tests themselves. Run from
+backend/:
+
+    python benchmarks.py                  # every benchmark
+    python benchmarks.py series_kernel    # only the named ones
+"""
+
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "tests"))
+
+BENCHMARKS = {}
+
+
+def benchmark(func):
+    BENCHMARKS[func.__name__.removeprefix("bench_")] = func
+    return func
+
+
+def best_of(func, *args, repeat=3):
+    """(best seconds, last result) over ``repeat`` calls."""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(*args)
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+@contextmanager
+def fixture_case(case_class):
+    """A TestCase instance between its setUp and tearDown (temp DB + app)."""
+    case = case_class()
+    case.setUp()
+    try:
+        yield case
+    finally:
+        case.tearDown()
+
+
+@benchmark
+def bench_series_kernel():
+    import test_series_kernel as fixtures
+    from app.services import _legacy
+
+    keys, positions, maps = fixtures._fixture(500, 200)
+
+    def kernel():
+        with mock.patch.object(_legacy, "_download_daily_close_maps", return_value=maps):
+            return _legacy._portfolio_daily_value_series({"positions": positions}, keys, "2y")
+
+    reference_seconds, _expected = best_of(fixtures._reference_daily, positions, keys, maps)
+    kernel_seconds, _daily = best_of(kernel)
+    print(f"serie diaria 500x200: loops {reference_seconds * 1000:.1f} ms, kernel {kernel_seconds * 1000:.1f} ms")
+
+
+@benchmark
+def bench_serialization():
+    import gzip
+    import json
+    import zlib
+
+    import test_serialization as fixtures
+    from app import serialization
+
+    payload = fixtures._dashboard_like_payload()
+    stdlib_seconds, stdlib_body = best_of(
+        lambda: json.dumps(payload, separators=(",", ":"), sort_keys=True).encode("utf-8"), repeat=5
+    )
+    fast_seconds, fast_body = best_of(lambda: serialization.dumps_bytes(payload, sort_keys=True), repeat=5)
+    gzip_seconds, gzipped = best_of(lambda: gzip.compress(fast_body, compresslevel=5, mtime=0), repeat=5)
+    zlib_seconds, stored = best_of(lambda: zlib.compress(fast_body, 6), repeat=5)
+    print(
+        f"dashboard {len(stdlib_body) / 1024:.0f} KiB: json {stdlib_seconds * 1000:.2f} ms, "
+        f"dumps_bytes {fast_seconds * 1000:.2f} ms; gzip-5 {gzip_seconds * 1000:.2f} ms -> "
+        f"{len(gzipped) / 1024:.0f} KiB; zlib-6 (cache) {zlib_seconds * 1000:.2f} ms -> {len(stored) / 1024:.0f} KiB"
+    )
+
+
+@benchmark
+def bench_bcb_index_factors():
+    from datetime import date
+
+    import test_bcb_index_factors as fixtures
+    from app.services import _legacy
+
+    items = fixtures._projection_items(fixtures.BcbIndexFactorTest.FIRST_DAY, 1000)
+    reference = date(2026, 4, 15)
+    with fixture_case(fixtures.BcbIndexFactorTest) as case, case.app.app_context():
+        case._sync()
+        _legacy._fixed_income_projection_at_date(items[0], reference)  # warm-up: factor tables
+        seconds, _projected = best_of(
+            lambda: [_legacy._fixed_income_projection_at_date(item, reference) for item in items]
+        )
+    print(f"1000 projecoes de renda fixa pela tabela de fatores: {seconds * 1000:.1f} ms")
+
+
+@benchmark
+def bench_fixed_income_batch():
+    from datetime import date
+
+    import test_fixed_income_batch as fixtures
+    from app.services import _legacy
+
+    items = fixtures._random_items(1000, seed=2)
+    reference = date(2026, 4, 15)
+    with fixture_case(fixtures.FixedIncomeBatchProjectionTest) as case, case.app.app_context():
+        case._sync()
+        _legacy._fixed_income_projections_at_dates(items, reference)  # tabelas de fatores
+        scalar_seconds, _scalar = best_of(
+            lambda: [_legacy._fixed_income_projection_at_date(item, reference) for item in items]
+        )
+        batch_seconds, _batch = best_of(_legacy._fixed_income_projections_at_dates, items, reference)
+    print(f"1000 linhas de renda fixa: escalar {scalar_seconds * 1000:.1f} ms, lote {batch_seconds * 1000:.1f} ms")
+
+
+@benchmark
+def bench_fixed_income_daily_series():
+    import test_fixed_income_daily_series as fixtures
+    from app.services import _legacy
+
+    with fixture_case(fixtures.FixedIncomeDailySeriesTest) as case, case.app.app_context():
+        day_keys = _legacy._day_keys_back(90)
+        grid_seconds, _grid = best_of(_legacy._fixed_income_daily_values, case.items, day_keys)
+        scalar_seconds, _scalar = best_of(case._scalar_daily, day_keys, repeat=1)
+        rows = len(case.items)
+    print(f"{rows} linhas x {len(day_keys)} dias: escalar {scalar_seconds * 1000:.0f} ms, grade {grid_seconds * 1000:.1f} ms")
+
+
+
+@benchmark
+def bench_monthly_flows():
+    import test_monthly_flows as fixtures
+    from app.db import get_db
+    from app.services import _legacy
+
+    with fixture_case(fixtures.MonthlyFlowsTest) as case, case.app.app_context():
+        db = get_db()
+        pid = case.pids[0]
+        _legacy._refresh_monthly_flows([pid])
+
+        def refresh_from(month_key):
+            # '' recalcula a carteira inteira; um mes recalcula dali em diante.
+            db.execute(
+                "UPDATE portfolio_dirty_months SET dirty_from = ? WHERE portfolio_id = ? AND target = 'monthly_flows'",
+                (month_key, pid),
+            )
+            db.commit()
+            return _legacy._refresh_monthly_flows([pid])
+
+        full_seconds, _refreshed = best_of(refresh_from, "")
+        incremental_seconds, _refreshed = best_of(refresh_from, "2024-05")
+    print(f"fluxos mensais: completo {full_seconds * 1000:.1f} ms, a partir de 2024-05 {incremental_seconds * 1000:.1f} ms")
+
+
+@benchmark
+def bench_position_checkpoints():
+    from datetime import date
+
+    import test_position_checkpoints as fixtures
+    from app.db import get_db
+    from app.services import _legacy
+
+    with fixture_case(fixtures.PositionCheckpointsTest) as case, case.app.app_context():
+        db = get_db()
+
+        def full_build():
+            db.execute("UPDATE portfolio_dirty_months SET dirty_from = '' WHERE target = 'position_checkpoints'")
+            db.commit()
+            return _legacy._refresh_position_checkpoints(case.pids)
+
+        _legacy._refresh_position_checkpoints(case.pids)
+        build_seconds, _built = best_of(full_build)
+        lookup_seconds, _states = best_of(_legacy._positions_as_of, case.pids, [date(2023, 7, 16)], repeat=20)
+        replay_seconds, _replayed = best_of(case._replay, case.pids, "2023-07-16", repeat=20)
+    print(
+        f"posicoes em uma data: checkpoints {build_seconds * 1000:.1f} ms para montar, "
+        f"consulta {lookup_seconds * 1000:.2f} ms vs replay completo {replay_seconds * 1000:.2f} ms"
+    )
+
+
+def main(names):
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        raise SystemExit(f"unknown benchmark(s): {', '.join(unknown)}; available: {', '.join(BENCHMARKS)}")
+    for name in names or list(BENCHMARKS):
+        BENCHMARKS[name]()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
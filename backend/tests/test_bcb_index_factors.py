@@ -0,0 +1,236 @@
+import os
+import random
+import tempfile
+import unittest
+from datetime import date, timedelta
+from pathlib import Path
+from unittest import mock
+
+from app import create_app
+from app.db import get_db
+from app.services import _legacy
+
+
+def _synthetic_series(code, first_day, last_day, seed=11):
+    """Business-day CDI-like (daily %) or monthly IPCA-like observations."""
+    rng = random.Random(seed + code)
+    rows = []
+    day = first_day
+    while day <= last_day:
+        if code == 433:
+            if day.day == 1:
+                rows.append((day.isoformat(), round(rng.uniform(-0.3, 1.2), 2)))
+        elif day.weekday() < 5:
+            rows.append((day.isoformat(), round(rng.uniform(0.02, 0.06), 6)))
+        day += timedelta(days=1)
+    return rows
+
+
+def _projection_items(first_day, count, seed=9):
+    """Random CDI/IPCA/prefixed fixed-income rows starting from ``first_day``."""
+    rng = random.Random(seed)
+    items = []
+    for index in range(count):
+        aporte = first_day + timedelta(days=rng.randint(0, 2300))
+        rate_type = rng.choice(('CDI', 'IPCA', 'FIXO+IPCA', 'FIXO+CDI', 'FIXO'))
+        items.append(
+            {
+                'id': index,
+                'date_aporte': aporte.isoformat(),
+                'maturity_date': (aporte + timedelta(days=rng.randint(180, 3000))).isoformat(),
+                'aporte': 1000.0 + index,
+                'reinvested': 0.0,
+                'annual_rate': 0.0,
+                'rate_fixed': 5.5 if rate_type.startswith('FIXO') else 0.0,
+                'rate_ipca': 100.0 if 'IPCA' in rate_type else 0.0,
+                'rate_cdi': rng.choice((100.0, 105.0, 110.0, 113.0)) if 'CDI' in rate_type else 0.0,
+                'rate_type': rate_type,
+            }
+        )
+    return items
+
+
+class BcbIndexFactorTest(unittest.TestCase):
+    FIRST_DAY = date(2019, 1, 1)
+    LAST_DAY = date(2026, 3, 31)
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        root = Path(self.tmpdir.name)
+        self.original_env = {
+            key: os.environ.get(key)
+            for key in (
+                'DATABASE',
+                'DATABASE_BACKUP_DIR',
+                'AUTH_SECRET_KEY_FILE',
+                'ADMIN_BOOTSTRAP_FILE',
+                'BACKGROUND_JOBS_LOCK_FILE',
+                'DATABASE_STARTUP_LOCK_FILE',
+                'BCB_INDEX_SYNC_ENABLED',
+            )
+        }
+        os.environ['DATABASE'] = str(root / 'test_bcb_index_factors.db')
+        os.environ['DATABASE_BACKUP_DIR'] = str(root / 'backups')
+        os.environ['AUTH_SECRET_KEY_FILE'] = str(root / '.flask-secret')
+        os.environ['ADMIN_BOOTSTRAP_FILE'] = str(root / 'admin-bootstrap.txt')
+        os.environ['BACKGROUND_JOBS_LOCK_FILE'] = str(root / '.bg.lock')
+        os.environ['DATABASE_STARTUP_LOCK_FILE'] = str(root / '.db.lock')
+        os.environ['BCB_INDEX_SYNC_ENABLED'] = '0'
+        self.app = create_app()
+        self.series = {
+            code: _synthetic_series(code, self.FIRST_DAY, self.LAST_DAY) for code in (11, 433)
+        }
+        self.downloads = []
+        _legacy._BCB_INDEX_FACTOR_CACHE.clear()
+        _legacy._BCB_SERIES_CACHE.clear()
+
+    def tearDown(self):
+        _legacy._BCB_INDEX_FACTOR_CACHE.clear()
+        _legacy._BCB_SERIES_CACHE.clear()
+        for name, value in list(self.app.extensions.items()):
+            if name.endswith('_stop_event'):
+                value.set()
+        for name, value in list(self.app.extensions.items()):
+            if name.endswith('_thread'):
+                value.join(30)
+        for key, value in self.original_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        self.tmpdir.cleanup()
+
+    def _download(self, series_code, date_start, date_end):
+        self.downloads.append((series_code, date_start, date_end))
+        return [row for row in self.series.get(series_code, []) if date_start <= row[0] <= date_end]
+
+    def _sync(self):
+        with mock.patch.object(_legacy, '_bcb_series_download', side_effect=self._download):
+            return _legacy.sync_bcb_index_series([11, 433])
+
+    def _no_download(self):
+        return mock.patch.object(_legacy, '_bcb_series_download', side_effect=AssertionError('BCB na request'))
+
+    def _loop_factor(self, code, start, end, multiplier, step_days):
+        """Reference: the per-window product loop used before the factor table."""
+        window = [row for row in self.series[code] if start.isoformat() <= row[0] <= end.isoformat()]
+        with mock.patch.object(_legacy, '_fetch_bcb_series', return_value=window):
+            return _legacy._compound_from_bcb_series(code, start, end, multiplier, step_days)
+
+    def test_lookup_matches_the_window_product_loop(self):
+        rng = random.Random(5)
+        cases = []
+        for _ in range(300):
+            code = rng.choice((11, 433))
+            start = self.FIRST_DAY + timedelta(days=rng.randint(0, 2400))
+            end = start + timedelta(days=rng.randint(0, 1800))  # past the last observation too
+            multiplier = rng.choice((1.0, 1.1, 1.13, 0.95, 1.225))
+            cases.append((code, start, end, multiplier, 30.0 if code == 433 else 1.0))
+
+        expected = [self._loop_factor(*case) for case in cases]
+        with self.app.app_context():
+            self._sync()
+            with self._no_download():
+                got = [_legacy._compound_from_bcb_series(*case) for case in cases]
+                # Window entirely before any stored observation: no data, same as before.
+                self.assertEqual(
+                    _legacy._compound_from_bcb_series(11, date(2018, 1, 1), date(2018, 6, 1), 1.0, 1.0),
+                    (1.0, False),
+                )
+        for case, (want_factor, want_ok), (got_factor, got_ok) in zip(cases, expected, got):
+            self.assertEqual(got_ok, want_ok, case)
+            self.assertAlmostEqual(got_factor / want_factor, 1.0, places=11, msg=case)
+
+    def test_download_is_split_in_sgs_windows(self):
+        with mock.patch.object(_legacy, '_http_get_json', return_value=[]) as http_get:
+            self.assertEqual(_legacy._bcb_series_download(11, '1986-06-04', '2026-10-17'), [])
+        urls = [call.args[0] for call in http_get.call_args_list]
+        self.assertEqual(len(urls), 5)
+        self.assertIn('dataInicial=04/06/1986&dataFinal=01/06/1996', urls[0])
+        self.assertIn('dataInicial=02/06/1996', urls[1])
+        self.assertIn('dataFinal=17/10/2026', urls[-1])
+
+        # Uma janela com falha invalida o download inteiro.
+        with mock.patch.object(_legacy, '_http_get_json', side_effect=[[{'data': '05/06/1986', 'valor': '0,1'}], None]):
+            self.assertEqual(_legacy._bcb_series_download(11, '1986-06-04', '2026-10-17'), [])
+
+    def test_request_path_without_synced_series_uses_the_fallback(self):
+        with self.app.app_context(), self._no_download():
+            self.assertEqual(
+                _legacy._compound_from_bcb_series(11, date(2024, 1, 2), date(2024, 6, 1), 1.1, 1.0), (1.0, False)
+            )
+
+    def test_sync_is_incremental_and_revisions_rebuild_the_factors(self):
+        with self.app.app_context():
+            result = self._sync()
+            self.assertEqual(result['failed'], [])
+            self.assertEqual(result['observations'], len(self.series[11]) + len(self.series[433]))
+            # Serie completa desde o inicio no SGS.
+            self.assertEqual(self.downloads[0][1], _legacy.BCB_INDEX_SERIES_START[11])
+
+            start = date(2020, 1, 2)
+            with self._no_download():
+                first = _legacy._compound_from_bcb_series(11, start, date(2026, 3, 31), 1.1, 1.0)
+                _legacy._compound_from_bcb_series(11, date(2021, 5, 3), date(2027, 1, 1), 1.0, 1.0)
+            db = get_db()
+            stored_multipliers = {
+                row['multiplier'] for row in db.execute("SELECT DISTINCT multiplier FROM bcb_index_factors")
+            }
+            self.assertEqual(stored_multipliers, {1.0, 1.1})
+
+            # The next run only fetches from the last stored day; BCB revised
+            # 2026-03-31 and published 2026-04-01.
+            revised_from = self.series[11][-1][1]
+            self.series[11][-1] = ('2026-03-31', 0.5)
+            self.series[11].append(('2026-04-01', 0.05))
+            self.downloads.clear()
+            pid = int(db.execute("INSERT INTO portfolios (name, user_id) VALUES ('RF', 1)").lastrowid)
+            db.execute(
+                """
+                INSERT INTO fixed_incomes (portfolio_id, distributor, issuer, investment_type, rate_type,
+                  annual_rate, rate_cdi, date_aporte, aporte, maturity_date)
+                VALUES (?, 'XP', 'Banco', 'CDB', 'CDI', 110, 110, '2024-01-02', 1000, '2027-01-04')
+                """,
+                (pid,),
+            )
+            db.commit()
+            result = self._sync()
+            self.assertEqual([(code, start_day) for code, start_day, _end in self.downloads], [
+                (11, '2026-03-31'),
+                (433, self.series[433][-1][0]),
+            ])
+            self.assertEqual(result['observations'], 2)
+            queued = db.execute(
+                "SELECT target, reason FROM snapshot_rebuild_queue WHERE portfolio_id = ? ORDER BY target", (pid,)
+            ).fetchall()
+            self.assertEqual([tuple(row) for row in queued], [('chart', 'bcb_index'), ('fixed_income', 'bcb_index')])
+            with self._no_download():
+                second = _legacy._compound_from_bcb_series(11, start, date(2026, 3, 31), 1.1, 1.0)
+            self.assertAlmostEqual(
+                second[0] / first[0], (1 + 0.5 / 100 * 1.1) / (1 + revised_from / 100 * 1.1), places=12
+            )
+            self.assertEqual(
+                db.execute("SELECT MAX(obs_date) AS d FROM bcb_index_factors WHERE multiplier = 1.1").fetchone()['d'],
+                '2026-04-01',
+            )
+
+            # BCB fora do ar: falha registrada, nada marcado como sincronizado.
+            synced_at = db.execute("SELECT synced_at FROM bcb_series_sync WHERE series_code = 11").fetchone()[0]
+            with mock.patch.object(_legacy, '_bcb_series_download', return_value=[]):
+                self.assertEqual(_legacy.sync_bcb_index_series([11])['failed'], [11])
+            self.assertEqual(
+                db.execute("SELECT synced_at FROM bcb_series_sync WHERE series_code = 11").fetchone()[0], synced_at
+            )
+
+    def test_projections_read_only_the_factor_table(self):
+        items = _projection_items(self.FIRST_DAY, 1000)
+        reference = date(2026, 4, 15)
+        with self.app.app_context():
+            self._sync()
+            with self._no_download():
+                projected = [_legacy._fixed_income_projection_at_date(item, reference) for item in items]
+        self.assertEqual(len(projected), 1000)
+
+
+if __name__ == '__main__':
+    unittest.main()
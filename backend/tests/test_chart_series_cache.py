@@ -2,11 +2,12 @@ import os
 import tempfile
 import unittest
 from pathlib import Path
+from unittest import mock
 
 from app import create_app
 from app.auth import create_user_account
 from app.db import get_db
-from app.services import _legacy, portfolio
+from app.services import _legacy, market_data, portfolio
 
 
 class ChartSeriesCacheTest(unittest.TestCase):
@@ -118,6 +119,79 @@ class ChartSeriesCacheTest(unittest.TestCase):
                 get_db().execute("SELECT COUNT(*) c FROM chart_series_cache").fetchone()['c'], 0
             )
 
+    def test_invalidate_only_drops_dependent_entries(self):
+        with self.app.app_context():
+            pid = self._seed()
+            other = int(
+                get_db().execute(
+                    "INSERT INTO portfolios (name, user_id) SELECT 'Outra', user_id FROM portfolios WHERE id = ?",
+                    (pid,),
+                ).lastrowid
+            )
+            get_db().commit()
+            _legacy.get_variable_income_value_daily_series([pid], range_key='90d')
+            _legacy.get_variable_income_value_daily_series([other], range_key='90d')
+            _legacy.get_variable_income_value_daily_series([pid, other], range_key='90d')
+            deps = {
+                row['dependency']
+                for row in get_db().execute(
+                    "SELECT dependency FROM chart_series_cache_deps WHERE cache_key = ?",
+                    (f'variable_income_value_daily|{pid}|90d',),
+                ).fetchall()
+            }
+            self.assertIn(f'portfolio:{pid}', deps)
+            self.assertIn('market:price_closes', deps)
+
+            before = _legacy.get_chart_series_cache_stats()
+            _legacy.invalidate_chart_snapshots([other])
+            keys = {
+                row['cache_key']
+                for row in get_db().execute("SELECT cache_key FROM chart_series_cache").fetchall()
+            }
+            self.assertEqual(keys, {f'variable_income_value_daily|{pid}|90d'})
+            self.assertEqual(_legacy.get_chart_series_cache_stats()['invalidated'], before['invalidated'] + 2)
+
+            # the untouched portfolio is still a cache hit
+            _legacy.get_variable_income_value_daily_series([pid], range_key='90d')
+            self.assertEqual(_legacy.get_chart_series_cache_stats()['hits'], before['hits'] + 1)
+            user_id = get_db().execute("SELECT user_id FROM portfolios WHERE id = ?", (pid,)).fetchone()['user_id']
+
+        with self.app.test_client() as client:
+            with client.session_transaction() as sess:
+                sess['user_id'] = int(user_id)
+            response = client.get('/api/metrics')
+            self.assertEqual(response.status_code, 200)
+            stats = (response.get_json() or {})['data']['caches']['chart_series']
+            self.assertGreaterEqual(stats['lookups'], 4)
+            self.assertIsNotNone(stats['hit_rate'])
+
+
+    def test_market_updates_drop_the_series_built_from_them(self):
+        def cached_keys():
+            return {row['cache_key'] for row in get_db().execute("SELECT cache_key FROM chart_series_cache")}
+
+        with self.app.app_context():
+            pid = self._seed()
+            _legacy._chart_series_cache_write('closes', {}, [f'portfolio:{pid}', 'market:price_closes'])
+            _legacy._chart_series_cache_write('quotes', {}, [f'portfolio:{pid}', 'market:quotes'])
+            _legacy._chart_series_cache_write('bcb', {}, [f'portfolio:{pid}', 'market:bcb'])
+            closes = {'ITUB4.SA': {'2026-01-05': 25.0, '2026-01-06': 26.0}}
+            with mock.patch.object(_legacy, '_yahoo_daily_closes_many', return_value=closes):
+                _legacy._price_closes_sync(get_db(), ['ITUB4.SA'], '1mo', 0)
+            self.assertEqual(cached_keys(), {'quotes', 'bcb'})
+
+            # Same closes again: nothing changed, nothing is dropped.
+            _legacy._chart_series_cache_write('closes', {}, ['market:price_closes'])
+            get_db().execute("UPDATE price_close_sync SET synced_at = '2000-01-01T00:00:00'")
+            with mock.patch.object(_legacy, '_yahoo_daily_closes_many', return_value=closes) as download:
+                _legacy._price_closes_sync(get_db(), ['ITUB4.SA'], '1mo', 0)
+            download.assert_called_once()
+            self.assertEqual(cached_keys(), {'closes', 'quotes', 'bcb'})
+
+            asset = market_data.get_asset('ITUB4')
+            market_data._apply_asset_market_payload(asset, 'ITUB4', ({}, '', {'price': 31.5}, 'test'))
+            self.assertEqual(cached_keys(), {'closes', 'bcb'})
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,211 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from app import api_routes, create_app
+from app.auth import create_user_account
+from app.db import get_db
+from app.services import _legacy
+
+
+class ConditionalGetTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        root = Path(self.tmpdir.name)
+        self.original_env = {
+            key: os.environ.get(key)
+            for key in (
+                'DATABASE',
+                'DATABASE_BACKUP_DIR',
+                'AUTH_SECRET_KEY_FILE',
+                'ADMIN_BOOTSTRAP_FILE',
+                'BACKGROUND_JOBS_LOCK_FILE',
+                'DATABASE_STARTUP_LOCK_FILE',
+            )
+        }
+        os.environ['DATABASE'] = str(root / 'test_conditional_get.db')
+        os.environ['DATABASE_BACKUP_DIR'] = str(root / 'backups')
+        os.environ['AUTH_SECRET_KEY_FILE'] = str(root / '.flask-secret')
+        os.environ['ADMIN_BOOTSTRAP_FILE'] = str(root / 'admin-bootstrap.txt')
+        os.environ['BACKGROUND_JOBS_LOCK_FILE'] = str(root / '.bg.lock')
+        os.environ['DATABASE_STARTUP_LOCK_FILE'] = str(root / '.db.lock')
+        self.app = create_app()
+
+        with self.app.app_context():
+            ok, _msg, user = create_user_account('etag_user', 'etag-pass-123', role='trader')
+            self.assertTrue(ok)
+            self.user_id = int(user['id'])
+            db = get_db()
+            self.pids = [
+                int(db.execute("INSERT INTO portfolios (name, user_id) VALUES (?, ?)", (name, self.user_id)).lastrowid)
+                for name in ('Acoes', 'Outra')
+            ]
+            db.execute("INSERT INTO assets (ticker, name, sector, price) VALUES ('ITUB4', 'Itau', 'Bancos', 30.0)")
+            db.execute("INSERT INTO assets (ticker, name, sector, price) VALUES ('VALE3', 'Vale', 'Mineracao', 60.0)")
+            db.execute(
+                """
+                INSERT INTO transactions (portfolio_id, ticker, tx_type, shares, price, date)
+                VALUES (?, 'ITUB4', 'buy', 100, 25.0, '2026-01-05')
+                """,
+                (self.pids[0],),
+            )
+            db.commit()
+            _legacy.refresh_position_state(self.pids)
+
+    def tearDown(self):
+        for name, value in list(self.app.extensions.items()):
+            if name.endswith('_stop_event'):
+                value.set()
+        for name, value in list(self.app.extensions.items()):
+            if name.endswith('_thread'):
+                value.join(30)
+        for key, value in self.original_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        self.tmpdir.cleanup()
+
+    def _client(self):
+        client = self.app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = self.user_id
+        return client
+
+    def _bump(self, func, *args):
+        with self.app.app_context():
+            func(*args)
+
+    def test_portfolio_snapshot_answers_304_until_a_version_changes(self):
+        now = api_routes.time()
+        for patcher in (
+            mock.patch.object(_legacy, '_get_usdbrl_rate', return_value=5.0),
+            mock.patch.object(api_routes, 'time', return_value=now),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        client = self._client()
+        url = f'/api/portfolio/snapshot?portfolio_id={self.pids[0]}'
+        first = client.get(url)
+        self.assertEqual(first.status_code, 200)
+        etag = first.headers['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+        self.assertEqual(first.headers['Cache-Control'], 'private, no-cache')
+
+        with mock.patch.object(api_routes, 'get_portfolio_snapshot', return_value={'positions': []}) as build:
+            cached = client.get(url, headers={'If-None-Match': etag})
+            self.assertEqual(cached.status_code, 304)
+            self.assertEqual(cached.headers['ETag'], etag)
+            self.assertEqual(cached.data, b'')
+            build.assert_not_called()
+
+            # Query string is part of the tag.
+            other_sort = client.get(url + '&sort_dir=desc', headers={'If-None-Match': etag})
+            self.assertEqual(other_sort.status_code, 200)
+            self.assertEqual(build.call_count, 1)
+
+            # Assets the portfolio does not hold and other portfolios do not matter.
+            self._bump(_legacy.bump_asset_versions, ['VALE3'])
+            self._bump(_legacy.bump_portfolio_versions, [self.pids[1]])
+            self.assertEqual(client.get(url, headers={'If-None-Match': etag}).status_code, 304)
+            self.assertEqual(build.call_count, 1)
+
+        # Market sync of a held asset changes the tag.
+        self._bump(_legacy.bump_asset_versions, ['ITUB4'])
+        refreshed = client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(refreshed.status_code, 200)
+        self.assertNotEqual(refreshed.headers['ETag'], etag)
+
+        # So does a mutation (through the dirty-queue hook).
+        etag = refreshed.headers['ETag']
+        self._bump(_legacy.mark_portfolios_dirty, [self.pids[0]])
+        refreshed = client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(refreshed.status_code, 200)
+
+        # Market data age flags and USD conversions follow the clock and the FX rate.
+        etag = refreshed.headers['ETag']
+        with mock.patch.object(_legacy, '_get_usdbrl_rate', return_value=5.2):
+            self.assertEqual(client.get(url, headers={'If-None-Match': etag}).status_code, 200)
+        with mock.patch.object(api_routes, 'time', return_value=now + 60):
+            self.assertEqual(client.get(url, headers={'If-None-Match': etag}).status_code, 200)
+
+    def test_as_of_snapshot_tag_follows_sold_assets_and_stored_closes(self):
+        now = api_routes.time()
+        for patcher in (
+            mock.patch.object(_legacy, '_get_usdbrl_rate', return_value=5.0),
+            mock.patch.object(api_routes, 'time', return_value=now),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        with self.app.app_context():
+            db = get_db()
+            db.execute(
+                """
+                INSERT INTO transactions (portfolio_id, ticker, tx_type, shares, price, date)
+                VALUES (?, 'ITUB4', 'sell', 100, 32.0, '2026-03-02')
+                """,
+                (self.pids[0],),
+            )
+            db.commit()
+            _legacy.refresh_position_state(self.pids)
+
+        def record_sync(symbol, synced_at):
+            with self.app.app_context():
+                get_db().execute(
+                    """
+                    INSERT INTO price_close_sync (symbol, interval, covered_from, synced_at)
+                    VALUES (?, '1d', '2025-01-01', ?)
+                    ON CONFLICT(symbol, interval) DO UPDATE SET synced_at = excluded.synced_at
+                    """,
+                    (symbol, synced_at),
+                )
+                get_db().commit()
+
+        client = self._client()
+        url = f'/api/portfolio/snapshot?portfolio_id={self.pids[0]}&as_of=2026-02-10'
+        etag = client.get(url).headers['ETag']
+        self.assertEqual(client.get(url, headers={'If-None-Match': etag}).status_code, 304)
+
+        # Closes synced for a symbol the portfolio never traded do not matter.
+        record_sync('VALE3.SA', '2026-03-05T10:00:00')
+        self.assertEqual(client.get(url, headers={'If-None-Match': etag}).status_code, 304)
+
+        # ITUB4 was held on as_of: its closes and its asset counter do.
+        record_sync('ITUB4.SA', '2026-03-05T10:00:00')
+        refreshed = client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(refreshed.status_code, 200)
+        etag = refreshed.headers['ETag']
+        self._bump(_legacy.bump_asset_versions, ['ITUB4'])
+        self.assertEqual(client.get(url, headers={'If-None-Match': etag}).status_code, 200)
+
+    def test_charts_core_cache_follows_the_data_version(self):
+        client = self._client()
+        url = f'/api/charts/core?portfolio_id={self.pids[0]}'
+        with mock.patch.object(api_routes, '_build_charts_core_payload', return_value={'build': 1}) as build:
+            first = client.get(url)
+            self.assertEqual(first.get_json()['data'], {'build': 1})
+            self.assertEqual(client.get(url, headers={'If-None-Match': first.headers['ETag']}).status_code, 304)
+            self.assertEqual(build.call_count, 1)
+
+            # A price change must reach a 200 right away, not after the memory TTL.
+            build.return_value = {'build': 2}
+            self._bump(_legacy.bump_asset_versions, ['ITUB4'])
+            second = client.get(url, headers={'If-None-Match': first.headers['ETag']})
+            self.assertEqual(second.get_json()['data'], {'build': 2})
+            self.assertEqual(build.call_count, 2)
+
+    def test_assets_list_tag_tracks_asset_versions(self):
+        client = self._client()
+        first = client.get('/api/assets')
+        self.assertEqual(first.status_code, 200)
+        etag = first.headers['ETag']
+        self.assertEqual(client.get('/api/assets', headers={'If-None-Match': etag}).status_code, 304)
+
+        self._bump(_legacy.bump_asset_versions, ['VALE3'])
+        self.assertEqual(client.get('/api/assets', headers={'If-None-Match': etag}).status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+import os
+import random
+import tempfile
+import unittest
+from datetime import date, timedelta
+from pathlib import Path
+from unittest import mock
+
+from app import create_app
+from app.services import _legacy
+
+
+def _synthetic_series(code, first_day, last_day, seed=17):
+    """CDI diario (dias uteis) ou IPCA mensal (dia 1), valores em %."""
+    rng = random.Random(seed + code)
+    rows = []
+    day = first_day
+    while day <= last_day:
+        if code == 433:
+            if day.day == 1:
+                rows.append((day.isoformat(), round(rng.uniform(-0.3, 1.2), 2)))
+        elif day.weekday() < 5:
+            rows.append((day.isoformat(), round(rng.uniform(0.02, 0.06), 6)))
+        day += timedelta(days=1)
+    return rows
+
+
+def _random_items(count, seed=21):
+    rng = random.Random(seed)
+    items = []
+    for index in range(count):
+        aporte = date(2019, 1, 1) + timedelta(days=rng.randint(0, 2600))
+        rate_type = rng.choice(('FIXO', 'CDI', 'IPCA', 'FIXO+IPCA', 'FIXO+CDI'))
+        item = {
+            'id': index,
+            'portfolio_id': 1,
+            'investment_type': rng.choice(('CDB', 'LCI', 'LCA', 'Tesouro')),
+            'rate_type': rate_type,
+            'date_aporte': aporte.isoformat(),
+            'maturity_date': (aporte + timedelta(days=rng.randint(-5, 3200))).isoformat(),
+            'aporte': round(rng.uniform(0, 50000), 2),
+            'reinvested': rng.choice((0.0, 0.0, round(rng.uniform(0, 900), 2))),
+            'annual_rate': 0.0,
+            'rate_fixed': round(rng.uniform(3, 9), 2) if rate_type.startswith('FIXO') else 0.0,
+            'rate_ipca': rng.choice((100.0, 95.0)) if 'IPCA' in rate_type else 0.0,
+            'rate_cdi': rng.choice((90.0, 100.0, 110.0, 113.5, 120.0)) if 'CDI' in rate_type else 0.0,
+        }
+        if rng.random() < 0.1:
+            # Registro antigo: so annual_rate preenchido.
+            item.update(rate_fixed=0.0, rate_ipca=0.0, rate_cdi=0.0, annual_rate=rng.choice((12.5, 105.0, 110.0)))
+        elif rng.random() < 0.05:
+            # Hibrido migrado: taxa cheia copiada em rate_fixed.
+            item.update(rate_type='FIXO+CDI', rate_fixed=104.0, annual_rate=104.0, rate_cdi=0.0, rate_ipca=0.0)
+        items.append(item)
+    return items
+
+
+class FixedIncomeBatchProjectionTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        root = Path(self.tmpdir.name)
+        self.original_env = {
+            key: os.environ.get(key)
+            for key in (
+                'DATABASE',
+                'DATABASE_BACKUP_DIR',
+                'AUTH_SECRET_KEY_FILE',
+                'ADMIN_BOOTSTRAP_FILE',
+                'BACKGROUND_JOBS_LOCK_FILE',
+                'DATABASE_STARTUP_LOCK_FILE',
+                'BCB_INDEX_SYNC_ENABLED',
+            )
+        }
+        os.environ['DATABASE'] = str(root / 'test_fixed_income_batch.db')
+        os.environ['DATABASE_BACKUP_DIR'] = str(root / 'backups')
+        os.environ['AUTH_SECRET_KEY_FILE'] = str(root / '.flask-secret')
+        os.environ['ADMIN_BOOTSTRAP_FILE'] = str(root / 'admin-bootstrap.txt')
+        os.environ['BACKGROUND_JOBS_LOCK_FILE'] = str(root / '.bg.lock')
+        os.environ['DATABASE_STARTUP_LOCK_FILE'] = str(root / '.db.lock')
+        os.environ['BCB_INDEX_SYNC_ENABLED'] = '0'
+        self.app = create_app()
+        self.series = {code: _synthetic_series(code, date(2018, 6, 1), date(2026, 3, 31)) for code in (11, 433)}
+        _legacy._BCB_INDEX_FACTOR_CACHE.clear()
+
+    def tearDown(self):
+        _legacy._BCB_INDEX_FACTOR_CACHE.clear()
+        for name, value in list(self.app.extensions.items()):
+            if name.endswith('_stop_event'):
+                value.set()
+        for name, value in list(self.app.extensions.items()):
+            if name.endswith('_thread'):
+                value.join(30)
+        for key, value in self.original_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        self.tmpdir.cleanup()
+
+    def _download(self, series_code, date_start, date_end):
+        return [row for row in self.series.get(series_code, []) if date_start <= row[0] <= date_end]
+
+    def _sync(self):
+        with mock.patch.object(_legacy, '_bcb_series_download', side_effect=self._download):
+            _legacy.sync_bcb_index_series([11, 433])
+
+    def _assert_parity(self, items, reference_dates):
+        batch = _legacy._fixed_income_projections_at_dates(items, reference_dates)
+        if not isinstance(reference_dates, list):
+            reference_dates = [reference_dates] * len(items)
+        scalar = [_legacy._fixed_income_projection_at_date(item, ref) for item, ref in zip(items, reference_dates)]
+        self.assertEqual(len(batch), len(scalar))
+        for got, want in zip(batch, scalar):
+            self.assertEqual(got, want)
+            self.assertIs(type(got['is_matured']), bool)
+            self.assertIs(type(got['elapsed_days']), int)
+
+    def test_batch_matches_the_scalar_projection(self):
+        items = _random_items(1500)
+        rng = random.Random(4)
+        per_row = [date(2019, 1, 1) + timedelta(days=rng.randint(0, 3000)) for _ in items]
+        with self.app.app_context():
+            self._sync()
+            self._assert_parity(items, date(2026, 4, 15))
+            self._assert_parity(items, per_row)
+            self.assertEqual(_legacy._fixed_income_projections_at_dates([], date(2026, 4, 15)), [])
+
+    def test_batch_matches_the_scalar_fallback_without_bcb_data(self):
+        del self.series[433]  # IPCA indisponivel: taxa anual assumida
+        items = _random_items(400, seed=8)
+        with self.app.app_context():
+            self._sync()
+            self._assert_parity(items, date(2026, 4, 15))
+        # Fora do app context cai no calculo escalar (BCB direto).
+        with mock.patch.object(_legacy, '_fetch_bcb_series', return_value=[]):
+            self._assert_parity(items[:50], date(2026, 4, 15))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,186 @@
+import os
+import random
+import tempfile
+import unittest
+from datetime import date, timedelta
+from pathlib import Path
+from unittest import mock
+
+from app import create_app
+from app.auth import create_user_account
+from app.db import get_db
+from app.services import _legacy
+
+
+def _synthetic_series(code, first_day, last_day, seed=29):
+    """CDI diario (dias uteis) ou IPCA mensal (dia 1), valores em %."""
+    rng = random.Random(seed + code)
+    rows = []
+    day = first_day
+    while day <= last_day:
+        if code == 433:
+            if day.day == 1:
+                rows.append((day.isoformat(), round(rng.uniform(-0.3, 1.2), 2)))
+        elif day.weekday() < 5:
+            rows.append((day.isoformat(), round(rng.uniform(0.02, 0.06), 6)))
+        day += timedelta(days=1)
+    return rows
+
+
+class FixedIncomeDailySeriesTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        root = Path(self.tmpdir.name)
+        self.original_env = {
+            key: os.environ.get(key)
+            for key in (
+                'DATABASE',
+                'DATABASE_BACKUP_DIR',
+                'AUTH_SECRET_KEY_FILE',
+                'ADMIN_BOOTSTRAP_FILE',
+                'BACKGROUND_JOBS_LOCK_FILE',
+                'DATABASE_STARTUP_LOCK_FILE',
+                'BCB_INDEX_SYNC_ENABLED',
+            )
+        }
+        os.environ['DATABASE'] = str(root / 'test_fixed_income_daily_series.db')
+        os.environ['DATABASE_BACKUP_DIR'] = str(root / 'backups')
+        os.environ['AUTH_SECRET_KEY_FILE'] = str(root / '.flask-secret')
+        os.environ['ADMIN_BOOTSTRAP_FILE'] = str(root / 'admin-bootstrap.txt')
+        os.environ['BACKGROUND_JOBS_LOCK_FILE'] = str(root / '.bg.lock')
+        os.environ['DATABASE_STARTUP_LOCK_FILE'] = str(root / '.db.lock')
+        os.environ['BCB_INDEX_SYNC_ENABLED'] = '0'
+        self.app = create_app()
+        self.series = {code: _synthetic_series(code, date(2020, 1, 1), date(2026, 3, 31)) for code in (11, 433)}
+        _legacy._BCB_INDEX_FACTOR_CACHE.clear()
+
+        today = date.today()
+        rng = random.Random(12)
+        self.items = []
+        for index in range(120):
+            rate_type = rng.choice(('FIXO', 'CDI', 'IPCA', 'FIXO+IPCA', 'FIXO+CDI'))
+            # Aportes e vencimentos espalhados em volta da janela de 90 dias.
+            aporte = today - timedelta(days=rng.randint(0, 1500))
+            self.items.append(
+                {
+                    'distributor': 'XP',
+                    'issuer': f'Banco {index}',
+                    'investment_type': rng.choice(('CDB', 'LCI', 'Tesouro')),
+                    'rate_type': rate_type,
+                    'annual_rate': 0.0,
+                    'rate_fixed': round(rng.uniform(4, 8), 2) if rate_type.startswith('FIXO') else 0.0,
+                    'rate_ipca': 100.0 if 'IPCA' in rate_type else 0.0,
+                    'rate_cdi': rng.choice((100.0, 110.0, 115.0)) if 'CDI' in rate_type else 0.0,
+                    'date_aporte': aporte.isoformat(),
+                    'aporte': round(rng.uniform(500, 20000), 2),
+                    'reinvested': 0.0,
+                    'maturity_date': (aporte + timedelta(days=rng.randint(30, 2500))).isoformat(),
+                }
+            )
+
+        with self.app.app_context():
+            ok, _msg, user = create_user_account('rf_daily', 'rf-daily-123', role='trader')
+            self.assertTrue(ok)
+            self.user_id = int(user['id'])
+            db = get_db()
+            self.pid = int(
+                db.execute("INSERT INTO portfolios (name, user_id) VALUES ('RF', ?)", (self.user_id,)).lastrowid
+            )
+            db.executemany(
+                """
+                INSERT INTO fixed_incomes (portfolio_id, distributor, issuer, investment_type, rate_type,
+                  annual_rate, rate_fixed, rate_ipca, rate_cdi, date_aporte, aporte, reinvested, maturity_date)
+                VALUES (:portfolio_id, :distributor, :issuer, :investment_type, :rate_type, :annual_rate,
+                  :rate_fixed, :rate_ipca, :rate_cdi, :date_aporte, :aporte, :reinvested, :maturity_date)
+                """,
+                [dict(item, portfolio_id=self.pid) for item in self.items],
+            )
+            db.commit()
+            self._sync()
+
+    def tearDown(self):
+        _legacy._BCB_INDEX_FACTOR_CACHE.clear()
+        for name, value in list(self.app.extensions.items()):
+            if name.endswith('_stop_event'):
+                value.set()
+        for name, value in list(self.app.extensions.items()):
+            if name.endswith('_thread'):
+                value.join(30)
+        for key, value in self.original_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        self.tmpdir.cleanup()
+
+    def _sync(self):
+        def download(series_code, date_start, date_end):
+            return [row for row in self.series.get(series_code, []) if date_start <= row[0] <= date_end]
+
+        with mock.patch.object(_legacy, '_bcb_series_download', side_effect=download):
+            return _legacy.sync_bcb_index_series([11, 433])
+
+    def _scalar_daily(self, day_keys):
+        """Reference: the per-day, per-item scalar projection."""
+        expected_values = []
+        expected_invested = []
+        for key in day_keys:
+            day = date.fromisoformat(key)
+            value_total = 0.0
+            invested_total = 0.0
+            for item in self.items:
+                if day < date.fromisoformat(item['date_aporte']):
+                    continue
+                projected = _legacy._fixed_income_projection_at_date(dict(item, id=0), day)
+                value_total += projected['current_gross_value']
+                invested_total += projected['active_applied_value']
+            expected_values.append(value_total)
+            expected_invested.append(invested_total)
+        return expected_values, expected_invested
+
+    def test_daily_grid_matches_the_scalar_projection_per_day(self):
+        day_keys = _legacy._day_keys_back(90)
+        with self.app.app_context():
+            values, invested = _legacy._fixed_income_daily_values(self.items, day_keys)
+            expected_values, expected_invested = self._scalar_daily(day_keys)
+        # O escalar arredonda cada item a centavos; a grade soma sem arredondar.
+        for got, want in zip(values.tolist(), expected_values):
+            self.assertAlmostEqual(got, want, delta=0.005 * len(self.items))
+        for got, want in zip(invested.tolist(), expected_invested):
+            self.assertAlmostEqual(got, want, delta=0.005 * len(self.items))
+
+    def test_endpoint_is_cached_and_follows_bcb_updates(self):
+        client = self.app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = self.user_id
+        response = client.get(f'/api/charts/fixed-income-value-daily?portfolio_id={self.pid}&range=30d')
+        self.assertEqual(response.status_code, 200)
+        payload = response.get_json()['data']
+        self.assertEqual(payload['range_key'], '30d')
+        self.assertEqual(len(payload['labels']), 30)
+        self.assertEqual(payload['items_count'], len(self.items))
+        self.assertEqual(
+            payload['income_values'][-1], round(payload['values'][-1] - payload['invested_values'][-1], 2)
+        )
+
+        with self.app.app_context():
+            current = sum(item['current_gross_value'] for item in _legacy.get_fixed_incomes([self.pid]))
+            self.assertAlmostEqual(payload['current_total_value'], current, delta=0.005 * len(self.items))
+            cache_key = f'fixed_income_value_daily|{self.pid}|30d'
+            self.assertIsNotNone(_legacy._chart_series_cache_read(cache_key))
+            deps = {
+                row['dependency']
+                for row in get_db().execute(
+                    'SELECT dependency FROM chart_series_cache_deps WHERE cache_key = ?', (cache_key,)
+                )
+            }
+            self.assertEqual(deps, {f'portfolio:{self.pid}', 'market:bcb'})
+
+            # Nova observacao do CDI derruba a serie em cache.
+            self.series[11].append(('2026-04-01', 0.05))
+            self._sync()
+            self.assertIsNone(_legacy._chart_series_cache_read(cache_key))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest import mock
+from urllib.parse import urlparse
+
+from app import create_app
+from app.services import _legacy
+
+
+class _ChartStandIn(BaseHTTPRequestHandler):
+    """Local stand-in for the Yahoo chart API (only the fields we read)."""
+
+    series = {}
+    requests = []
+    in_flight = 0
+    max_in_flight = 0
+    lock = threading.Lock()
+
+    def do_GET(self):  # noqa: N802
+        symbol = urlparse(self.path).path.rsplit('/', 1)[-1]
+        cls = type(self)
+        with cls.lock:
+            cls.requests.append(symbol)
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+        try:
+            time.sleep(0.15)
+            closes = cls.series.get(symbol)
+            if closes is None:
+                body = {'chart': {'result': None, 'error': {'code': 'Not Found'}}}
+            else:
+                timestamps = [int(datetime.strptime(day, '%Y-%m-%d').replace(hour=12).timestamp()) for day in closes]
+                body = {
+                    'chart': {
+                        'result': [
+                            {
+                                'timestamp': timestamps,
+                                'indicators': {'quote': [{'close': list(closes.values())}]},
+                            }
+                        ]
+                    }
+                }
+            payload = json.dumps(body).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        finally:
+            with cls.lock:
+                cls.in_flight -= 1
+
+    def log_message(self, *_args):
+        pass
+
+
+def _closes(start_value, days=20):
+    today = datetime.now().date()
+    return {
+        (today - timedelta(days=offset)).isoformat(): start_value + (days - offset)
+        for offset in range(days - 1, -1, -1)
+    }
+
+
+class HistoryBatchFetchTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        root = Path(self.tmpdir.name)
+        self.original_env = {
+            key: os.environ.get(key)
+            for key in (
+                'DATABASE',
+                'DATABASE_BACKUP_DIR',
+                'AUTH_SECRET_KEY_FILE',
+                'ADMIN_BOOTSTRAP_FILE',
+                'BACKGROUND_JOBS_LOCK_FILE',
+                'DATABASE_STARTUP_LOCK_FILE',
+                'YAHOO_CHART_BASE_URL',
+                'YAHOO_HISTORY_BATCH_WORKERS',
+            )
+        }
+        os.environ['DATABASE'] = str(root / 'test_history_batch.db')
+        os.environ['DATABASE_BACKUP_DIR'] = str(root / 'backups')
+        os.environ['AUTH_SECRET_KEY_FILE'] = str(root / '.flask-secret')
+        os.environ['ADMIN_BOOTSTRAP_FILE'] = str(root / 'admin-bootstrap.txt')
+        os.environ['BACKGROUND_JOBS_LOCK_FILE'] = str(root / '.bg.lock')
+        os.environ['DATABASE_STARTUP_LOCK_FILE'] = str(root / '.db.lock')
+        os.environ['YAHOO_HISTORY_BATCH_WORKERS'] = '4'
+
+        _ChartStandIn.series = {
+            'ITUB4.SA': _closes(30.0),
+            'PETR4.SA': _closes(38.0),
+            'BTC-USD': _closes(60000.0),
+            'USDBRL=X': _closes(5.0),
+        }
+        _ChartStandIn.requests = []
+        _ChartStandIn.max_in_flight = 0
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _ChartStandIn)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        os.environ['YAHOO_CHART_BASE_URL'] = f'http://127.0.0.1:{self.server.server_address[1]}'
+        self.app = create_app()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        for key, value in self.original_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        self.tmpdir.cleanup()
+
+    def test_portfolio_series_fetches_each_symbol_once_in_parallel(self):
+        snapshot = {
+            'positions': [
+                {'ticker': 'ITUB4', 'name': 'Itau', 'sector': 'Bancos', 'value': 3000.0},
+                {'ticker': 'PETR4', 'name': 'Petrobras', 'sector': 'Energia', 'value': 2000.0},
+                {'ticker': 'XPTO3', 'name': 'Sem historico', 'sector': 'Outros', 'value': 500.0},
+                {'ticker': 'BTC-USD', 'name': 'Bitcoin', 'sector': 'Crypto', 'value': 1000.0},
+            ]
+        }
+        day_keys = _legacy._day_keys_back(10)
+        with self.app.app_context(), mock.patch.object(_legacy, 'yf', None):
+            first = _legacy._portfolio_daily_value_series(snapshot, day_keys, '1mo')
+            # Segunda rodada so para os candidatos sem .SA dos que falharam.
+            self.assertEqual(
+                sorted(_ChartStandIn.requests),
+                sorted(['ITUB4.SA', 'PETR4.SA', 'XPTO3.SA', 'BTC-USD', 'USDBRL=X', 'XPTO3']),
+            )
+            self.assertGreater(_ChartStandIn.max_in_flight, 1)
+            self.assertLessEqual(_ChartStandIn.max_in_flight, 4)
+
+            _ChartStandIn.requests = []
+            second = _legacy._portfolio_daily_value_series(snapshot, day_keys, '1mo')
+            # Simbolos com historico saem do store; so o ticker sem dados e refeito.
+            self.assertEqual(sorted(_ChartStandIn.requests), ['XPTO3', 'XPTO3.SA'])
+
+        self.assertEqual(first, second)
+        self.assertEqual(first['included_tickers'], ['BTC-USD', 'ITUB4', 'PETR4'])
+        self.assertEqual(first['missing_tickers'], ['XPTO3'])
+        self.assertEqual(first['values'][-1], 6000.0)
+        self.assertTrue(all(value is not None for value in first['values']))
+
+
+if __name__ == '__main__':
+    unittest.main()
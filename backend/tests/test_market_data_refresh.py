@@ -0,0 +1,139 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from app import create_app
+from app.db import get_db
+from app.services import _legacy, legacy_compat, market_data
+
+
+class MarketDataRefreshConcurrencyTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        root = Path(self.tmpdir.name)
+        self.original_env = {
+            key: os.environ.get(key)
+            for key in (
+                'DATABASE',
+                'DATABASE_BACKUP_DIR',
+                'AUTH_SECRET_KEY_FILE',
+                'ADMIN_BOOTSTRAP_FILE',
+                'BACKGROUND_JOBS_LOCK_FILE',
+                'DATABASE_STARTUP_LOCK_FILE',
+                'MARKET_DATA_REFRESH_WORKERS',
+                'YAHOO_MAX_CONCURRENCY',
+                'MARKET_DATA_PROVIDERS_US',
+            )
+        }
+        os.environ['DATABASE'] = str(root / 'test_market_refresh.db')
+        os.environ['DATABASE_BACKUP_DIR'] = str(root / 'backups')
+        os.environ['AUTH_SECRET_KEY_FILE'] = str(root / '.flask-secret')
+        os.environ['ADMIN_BOOTSTRAP_FILE'] = str(root / 'admin-bootstrap.txt')
+        os.environ['BACKGROUND_JOBS_LOCK_FILE'] = str(root / '.bg.lock')
+        os.environ['DATABASE_STARTUP_LOCK_FILE'] = str(root / '.db.lock')
+        os.environ['MARKET_DATA_REFRESH_WORKERS'] = '6'
+        os.environ['YAHOO_MAX_CONCURRENCY'] = '2'
+        os.environ['MARKET_DATA_PROVIDERS_US'] = 'yahoo'
+        self.app = create_app()
+        self.tickers = ['AAPL', 'MSFT', 'NVDA', 'AMZN', 'META', 'GOOG']
+        with self.app.app_context():
+            db = get_db()
+            for ticker in self.tickers:
+                db.execute(
+                    "INSERT INTO assets (ticker, name, sector, price) VALUES (?, ?, 'Tech', 1.0)",
+                    (ticker, ticker),
+                )
+            db.commit()
+        _legacy._PROVIDER_SLOTS.clear()
+
+    def tearDown(self):
+        _legacy._PROVIDER_SLOTS.clear()
+        for key, value in self.original_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        self.tmpdir.cleanup()
+
+    def test_provider_calls_overlap_within_provider_limit_and_writes_stay_serial(self):
+        state = {'active': 0, 'peak': 0}
+        state_lock = threading.Lock()
+        main_thread = threading.get_ident()
+        writer_threads = set()
+
+        def _fake_metrics(provider, ticker):
+            with state_lock:
+                state['active'] += 1
+                state['peak'] = max(state['peak'], state['active'])
+            time.sleep(0.1)
+            with state_lock:
+                state['active'] -= 1
+            return {'price': 10.0 + len(ticker)}
+
+        original_apply = market_data._apply_asset_market_payload
+
+        def _tracking_apply(*args, **kwargs):
+            writer_threads.add(threading.get_ident())
+            return original_apply(*args, **kwargs)
+
+        with self.app.app_context(), \
+                patch.object(legacy_compat, '_fetch_provider_profile', return_value=None), \
+                patch.object(legacy_compat, '_fetch_provider_metrics', side_effect=_fake_metrics), \
+                patch.object(market_data, '_apply_asset_market_payload', side_effect=_tracking_apply):
+            started = time.monotonic()
+            failed = market_data.refresh_market_data_for_tickers(self.tickers, attempts=1)
+            elapsed = time.monotonic() - started
+
+            self.assertEqual(failed, [])
+            self.assertEqual(state['peak'], 2)
+            self.assertLess(elapsed, 0.1 * len(self.tickers))
+            self.assertEqual(writer_threads, {main_thread})
+            rows = get_db().execute(
+                "SELECT ticker, price, market_data_status FROM assets ORDER BY ticker"
+            ).fetchall()
+            for row in rows:
+                self.assertEqual(row['market_data_status'], 'fresh')
+                self.assertEqual(row['price'], 10.0 + len(row['ticker']))
+            audit_count = get_db().execute(
+                "SELECT COUNT(*) AS total FROM market_data_sync_audit"
+            ).fetchone()['total']
+            self.assertEqual(audit_count, len(self.tickers))
+
+    def test_fetch_errors_are_marked_failed_and_retried(self):
+        calls = {}
+        calls_lock = threading.Lock()
+
+        def _flaky_metrics(provider, ticker):
+            with calls_lock:
+                calls[ticker] = calls.get(ticker, 0) + 1
+                attempt = calls[ticker]
+            if ticker == 'MSFT' and attempt == 1:
+                return None
+            if ticker == 'NVDA':
+                return None
+            return {'price': 5.0}
+
+        with self.app.app_context(), \
+                patch.object(legacy_compat, '_fetch_provider_profile', return_value=None), \
+                patch.object(legacy_compat, '_fetch_provider_metrics', side_effect=_flaky_metrics), \
+                patch.object(market_data.time, 'sleep'):
+            failed = market_data.refresh_market_data_for_tickers(
+                self.tickers + ['UNKNOWN'],
+                attempts=2,
+            )
+            self.assertEqual(failed, ['NVDA', 'UNKNOWN'])
+            self.assertEqual(calls['MSFT'], 2)
+            self.assertEqual(calls['AAPL'], 1)
+            row = get_db().execute(
+                "SELECT market_data_status, market_data_last_error FROM assets WHERE ticker = 'NVDA'"
+            ).fetchone()
+            self.assertEqual(row['market_data_status'], 'stale')
+            self.assertTrue(row['market_data_last_error'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from app import create_app
+from app.memory_cache import MemoryCache, get_memory_cache_stats
+from app.services import _legacy
+
+
+class MemoryCacheTest(unittest.TestCase):
+    def test_ttl_and_lru_bounds_with_counters(self):
+        cache = MemoryCache('test_bounds', max_entries=3, ttl_seconds=60)
+        for key in 'abc':
+            cache.set(key, key.upper())
+        self.assertEqual(cache.get('a'), 'A')  # 'a' becomes most recent
+        cache.set('d', 'D')
+        self.assertIsNone(cache.get('b'))  # least recently used went out
+        self.assertEqual(len(cache), 3)
+
+        with mock.patch('app.memory_cache.time.monotonic', return_value=time.monotonic() + 61):
+            self.assertIsNone(cache.get('a'))
+            self.assertEqual(cache.get_stale('c'), 'C')
+            # Over capacity, expired entries go before any live one.
+            cache.set('e', 'E', ttl_seconds=600)
+            cache.set('f', 'F', ttl_seconds=600)
+            self.assertEqual(cache.get('e'), 'E')
+
+        stats = cache.stats()
+        self.assertEqual(stats['evictions'], 1)
+        self.assertEqual(stats['expirations'], 3)
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['misses'], 2)
+        self.assertEqual(stats['size'], 2)
+        self.assertEqual(stats['hit_rate'], 0.5)
+        self.assertIn('test_bounds', get_memory_cache_stats())
+
+    def test_get_or_set_runs_one_compute_for_concurrent_misses(self):
+        cache = MemoryCache('test_stampede', max_entries=8, ttl_seconds=60)
+        calls = []
+        barrier = threading.Barrier(6)
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return {'value': 42}
+
+        results = []
+
+        def worker():
+            barrier.wait()
+            results.append(cache.get_or_set('key', compute))
+
+        threads = [threading.Thread(target=worker) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'value': 42}] * 6)
+
+        self.assertEqual(cache.get_or_set('empty', list, should_cache=bool), [])
+        self.assertEqual(len(cache), 1)
+
+    def test_usdbrl_rate_falls_back_to_the_stale_value(self):
+        _legacy._FX_CACHE.clear()
+        with mock.patch.object(_legacy, '_fetch_yahoo_quote', return_value={'regularMarketPrice': 5.1}):
+            self.assertEqual(_legacy._get_usdbrl_rate(), 5.1)
+        with mock.patch('app.memory_cache.time.monotonic', return_value=time.monotonic() + 301), mock.patch.object(
+            _legacy, '_fetch_yahoo_quote', return_value={}
+        ), mock.patch.object(_legacy, '_http_get_json', return_value=None), mock.patch.object(_legacy, 'yf', None):
+            self.assertEqual(_legacy._get_usdbrl_rate(), 5.1)
+        _legacy._FX_CACHE.clear()
+
+    def test_concurrent_usdbrl_misses_fetch_the_rate_once(self):
+        _legacy._FX_CACHE.clear()
+        calls = []
+        barrier = threading.Barrier(5)
+
+        def slow_quote(symbol):
+            calls.append(symbol)
+            time.sleep(0.2)
+            return {'regularMarketPrice': 5.2}
+
+        results = []
+
+        def worker():
+            barrier.wait()
+            results.append(_legacy._get_usdbrl_rate())
+
+        with mock.patch.object(_legacy, '_fetch_yahoo_quote', side_effect=slow_quote):
+            threads = [threading.Thread(target=worker) for _ in range(5)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(calls, ['BRL=X'])
+        self.assertEqual(results, [5.2] * 5)
+        _legacy._FX_CACHE.clear()
+
+
+class HealthCacheStatsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        root = Path(self.tmpdir.name)
+        self.original_env = {
+            key: os.environ.get(key)
+            for key in (
+                'DATABASE',
+                'DATABASE_BACKUP_DIR',
+                'AUTH_SECRET_KEY_FILE',
+                'ADMIN_BOOTSTRAP_FILE',
+                'BACKGROUND_JOBS_LOCK_FILE',
+                'DATABASE_STARTUP_LOCK_FILE',
+            )
+        }
+        os.environ['DATABASE'] = str(root / 'test_memory_cache.db')
+        os.environ['DATABASE_BACKUP_DIR'] = str(root / 'backups')
+        os.environ['AUTH_SECRET_KEY_FILE'] = str(root / '.flask-secret')
+        os.environ['ADMIN_BOOTSTRAP_FILE'] = str(root / 'admin-bootstrap.txt')
+        os.environ['BACKGROUND_JOBS_LOCK_FILE'] = str(root / '.bg.lock')
+        os.environ['DATABASE_STARTUP_LOCK_FILE'] = str(root / '.db.lock')
+        self.app = create_app()
+
+    def tearDown(self):
+        for name, value in list(self.app.extensions.items()):
+            if name.endswith('_stop_event'):
+                value.set()
+        for name, value in list(self.app.extensions.items()):
+            if name.endswith('_thread'):
+                value.join(30)
+        for key, value in self.original_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        self.tmpdir.cleanup()
+
+    def test_health_reports_every_migrated_cache(self):
+        response = self.app.test_client().get('/api/health')
+        self.assertEqual(response.status_code, 200)
+        caches = response.get_json()['data']['caches']
+        for name in (
+            'fx_rates',
+            'bcb_series',
+            'brapi_quotes',
+            'coingecko',
+            'asset_price_history',
+            'upcoming_incomes',
+            'charts_core',
+        ):
+            self.assertIn(name, caches)
+            self.assertGreaterEqual(caches[name]['max_entries'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,201 @@
+import os
+import random
+import tempfile
+import unittest
+from collections import defaultdict
+from datetime import date, timedelta
+from pathlib import Path
+from unittest.mock import patch
+
+from app import create_app
+from app.auth import create_user_account
+from app.db import get_db
+from app.services import _legacy
+
+_ASSETS = [
+    ('ITUB4', 'Itau Unibanco', 'Bancos', 'br'),
+    ('PETR4', 'Petrobras', 'Petroleo', 'br'),
+    ('HGLG11', 'CSHG Logistica FII', 'Real Estate', 'fii'),
+    ('AAPL', 'Apple Inc', 'Technology', 'us'),
+    ('BTC-USD', 'Bitcoin', 'Crypto', 'cripto'),
+]
+_MONTH_NAMES = ('jan', 'fev', 'mar', 'abr', 'mai', 'jun', 'jul', 'ago', 'set', 'out', 'nov', 'dez')
+
+
+class MonthlyFlowsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        root = Path(self.tmpdir.name)
+        self.original_env = {
+            key: os.environ.get(key)
+            for key in (
+                'DATABASE',
+                'DATABASE_BACKUP_DIR',
+                'AUTH_SECRET_KEY_FILE',
+                'ADMIN_BOOTSTRAP_FILE',
+                'BACKGROUND_JOBS_LOCK_FILE',
+                'DATABASE_STARTUP_LOCK_FILE',
+            )
+        }
+        os.environ['DATABASE'] = str(root / 'test_monthly_flows.db')
+        os.environ['DATABASE_BACKUP_DIR'] = str(root / 'backups')
+        os.environ['AUTH_SECRET_KEY_FILE'] = str(root / '.flask-secret')
+        os.environ['ADMIN_BOOTSTRAP_FILE'] = str(root / 'admin-bootstrap.txt')
+        os.environ['BACKGROUND_JOBS_LOCK_FILE'] = str(root / '.bg.lock')
+        os.environ['DATABASE_STARTUP_LOCK_FILE'] = str(root / '.db.lock')
+        self.app = create_app()
+        self.fx_patch = patch.object(_legacy, '_get_usdbrl_rate', return_value=5.0)
+        self.fx_patch.start()
+
+        rng = random.Random(24)
+        self.transactions = []
+        self.incomes = []
+        with self.app.app_context():
+            ok, _msg, user = create_user_account('flows_user', 'flows-pass-123', role='trader')
+            self.assertTrue(ok)
+            db = get_db()
+            self.pids = [
+                int(db.execute("INSERT INTO portfolios (name, user_id) VALUES (?, ?)", (name, user['id'])).lastrowid)
+                for name in ('A', 'B')
+            ]
+            db.executemany(
+                "INSERT INTO assets (ticker, name, sector, price) VALUES (?, ?, ?, 10.0)",
+                [(ticker, name, sector) for ticker, name, sector, _bucket in _ASSETS],
+            )
+            first_day = date(2023, 1, 1)
+            for _ in range(3000):
+                ticker = rng.choice(_ASSETS)[0]
+                day = (first_day + timedelta(days=rng.randint(0, 1000))).isoformat()
+                self.transactions.append(
+                    (rng.choice(self.pids), ticker, rng.choice(('buy', 'buy', 'sell')), rng.randint(1, 50),
+                     round(rng.uniform(5, 80), 2), day)
+                )
+            for _ in range(1500):
+                ticker = rng.choice(_ASSETS)[0]
+                day = (first_day + timedelta(days=rng.randint(0, 1000))).isoformat()
+                self.incomes.append((rng.choice(self.pids), ticker, 'dividendo', round(rng.uniform(1, 90), 2), day))
+            db.executemany(
+                "INSERT INTO transactions (portfolio_id, ticker, tx_type, shares, price, date) VALUES (?, ?, ?, ?, ?, ?)",
+                self.transactions,
+            )
+            db.executemany(
+                "INSERT INTO incomes (portfolio_id, ticker, income_type, amount, date) VALUES (?, ?, ?, ?, ?)",
+                self.incomes,
+            )
+            db.commit()
+
+    def tearDown(self):
+        self.fx_patch.stop()
+        for name, value in list(self.app.extensions.items()):
+            if name.endswith('_stop_event'):
+                value.set()
+        for name, value in list(self.app.extensions.items()):
+            if name.endswith('_thread'):
+                value.join(30)
+        for key, value in self.original_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        self.tmpdir.cleanup()
+
+    def _expected_by_month(self, pids):
+        buckets = {ticker: bucket for ticker, _name, _sector, bucket in _ASSETS}
+        expected = defaultdict(lambda: defaultdict(float))
+        for pid, ticker, tx_type, shares, price, day in self.transactions:
+            if pid in pids and tx_type == 'buy':
+                rate = 5.0 if buckets[ticker] == 'us' else 1.0
+                expected[day[:7]][f'{buckets[ticker]}_invested'] += shares * price * rate
+        for pid, ticker, _income_type, amount, day in self.incomes:
+            if pid in pids:
+                rate = 5.0 if buckets[ticker] == 'us' else 1.0
+                expected[day[:7]][f'{buckets[ticker]}_incomes'] += amount * rate
+        return expected
+
+    def _assert_class_summary(self, pids):
+        rows = _legacy.get_monthly_class_summary(pids)
+        expected = self._expected_by_month(set(pids))
+        self.assertEqual(len(rows), len(expected))
+        for row, month_key in zip(rows, sorted(expected)):
+            year, month = month_key.split('-')
+            self.assertEqual(row['label'], f"{_MONTH_NAMES[int(month) - 1]}/{year[2:]}")
+            for key in _legacy._MONTHLY_CLASS_METRIC_KEYS:
+                self.assertAlmostEqual(row[key], expected[month_key][key], delta=0.011, msg=f'{month_key} {key}')
+
+    def test_summaries_match_a_full_replay_for_any_portfolio_mix(self):
+        with self.app.app_context():
+            for pids in ([self.pids[0]], [self.pids[1]], self.pids):
+                with self.subTest(pids=pids):
+                    self._assert_class_summary(pids)
+
+            summary = _legacy.get_monthly_ticker_summary(self.pids, months=6)
+            expected = self._expected_by_month(set(self.pids))
+            last_months = sorted(expected)[-6:]
+            self.assertEqual([item['key'] for item in summary['months']], last_months)
+            self.assertEqual(summary['months'][-1]['label'], 'set. / 25')
+            for total in summary['totals']:
+                values = expected[total['month_key']]
+                self.assertAlmostEqual(
+                    total['invested'],
+                    sum(value for key, value in values.items() if key.endswith('_invested')),
+                    delta=0.011,
+                )
+                self.assertAlmostEqual(
+                    total['incomes'],
+                    sum(value for key, value in values.items() if key.endswith('_incomes')),
+                    delta=0.011,
+                )
+            self.assertEqual({row['ticker'] for row in summary['rows']}, {ticker for ticker, *_ in _ASSETS})
+            self.assertEqual({row['category'] for row in summary['rows'] if row['ticker'] == 'AAPL'}, {'us_stocks'})
+
+    def test_backdated_change_only_recomputes_months_from_its_date(self):
+        with self.app.app_context():
+            db = get_db()
+            pid = self.pids[0]
+            self.assertEqual(_legacy._refresh_monthly_flows([pid]), 1)
+            self.assertEqual(_legacy._refresh_monthly_flows([pid]), 0)
+
+            # Marcadores nos meses anteriores/posteriores ao lancamento retroativo.
+            db.execute(
+                "UPDATE portfolio_monthly_flows SET buy_amount = -1 WHERE portfolio_id = ? AND month_key IN ('2024-03', '2024-06')",
+                (pid,),
+            )
+            db.execute(
+                "INSERT INTO transactions (portfolio_id, ticker, tx_type, shares, price, date) "
+                "VALUES (?, 'PETR4', 'buy', 10, 30.0, '2024-05-20')",
+                (pid,),
+            )
+            db.commit()
+            self.transactions.append((pid, 'PETR4', 'buy', 10, 30.0, '2024-05-20'))
+            state = db.execute(
+                "SELECT dirty_from FROM portfolio_dirty_months WHERE portfolio_id = ? AND target = 'monthly_flows'",
+                (pid,),
+            ).fetchone()
+            self.assertEqual(state['dirty_from'], '2024-05')
+
+            self.assertEqual(_legacy._refresh_monthly_flows([pid]), 1)
+            markers = {
+                row['month_key']: row['total']
+                for row in db.execute(
+                    "SELECT month_key, MIN(buy_amount) AS total FROM portfolio_monthly_flows "
+                    "WHERE portfolio_id = ? AND month_key IN ('2024-03', '2024-06') GROUP BY month_key",
+                    (pid,),
+                )
+            }
+            self.assertEqual(markers['2024-03'], -1)
+            self.assertGreaterEqual(markers['2024-06'], 0)
+
+            db.execute(
+                "UPDATE portfolio_dirty_months SET dirty_from = '' WHERE portfolio_id = ? AND target = 'monthly_flows'",
+                (pid,),
+            )
+            db.commit()
+            db.execute("DELETE FROM incomes WHERE portfolio_id = ? AND date LIKE '2025-%'", (pid,))
+            db.commit()
+            self.incomes = [row for row in self.incomes if not (row[0] == pid and row[4].startswith('2025-'))]
+            self._assert_class_summary([pid])
+            self._assert_class_summary(self.pids)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,261 @@
+import os
+import random
+import tempfile
+import unittest
+from datetime import date, timedelta
+from pathlib import Path
+from unittest.mock import patch
+
+from app import create_app
+from app.auth import create_user_account
+from app.db import get_db
+from app.services import _legacy
+
+_ASSETS = [
+    ('ITUB4', 'Itau Unibanco', 'Bancos'),
+    ('PETR4', 'Petrobras', 'Petroleo'),
+    ('HGLG11', 'CSHG Logistica FII', 'Real Estate'),
+    ('AAPL', 'Apple Inc', 'Technology'),
+]
+
+
+class PositionCheckpointsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        root = Path(self.tmpdir.name)
+        self.original_env = {
+            key: os.environ.get(key)
+            for key in (
+                'DATABASE',
+                'DATABASE_BACKUP_DIR',
+                'AUTH_SECRET_KEY_FILE',
+                'ADMIN_BOOTSTRAP_FILE',
+                'BACKGROUND_JOBS_LOCK_FILE',
+                'DATABASE_STARTUP_LOCK_FILE',
+            )
+        }
+        os.environ['DATABASE'] = str(root / 'test_position_checkpoints.db')
+        os.environ['DATABASE_BACKUP_DIR'] = str(root / 'backups')
+        os.environ['AUTH_SECRET_KEY_FILE'] = str(root / '.flask-secret')
+        os.environ['ADMIN_BOOTSTRAP_FILE'] = str(root / 'admin-bootstrap.txt')
+        os.environ['BACKGROUND_JOBS_LOCK_FILE'] = str(root / '.bg.lock')
+        os.environ['DATABASE_STARTUP_LOCK_FILE'] = str(root / '.db.lock')
+        self.app = create_app()
+        self.fx_patch = patch.object(_legacy, '_get_usdbrl_rate', return_value=5.0)
+        self.fx_patch.start()
+
+        rng = random.Random(25)
+        with self.app.app_context():
+            ok, _msg, user = create_user_account('checkpoint_user', 'checkpoint-pass-123', role='trader')
+            self.assertTrue(ok)
+            self.user_id = int(user['id'])
+            db = get_db()
+            self.pids = [
+                int(db.execute("INSERT INTO portfolios (name, user_id) VALUES (?, ?)", (name, self.user_id)).lastrowid)
+                for name in ('A', 'B')
+            ]
+            db.executemany("INSERT INTO assets (ticker, name, sector, price) VALUES (?, ?, ?, 10.0)", _ASSETS)
+            first_day = date(2021, 1, 1)
+            transactions = []
+            for _ in range(2500):
+                transactions.append(
+                    (
+                        rng.choice(self.pids),
+                        rng.choice(_ASSETS)[0],
+                        rng.choice(('buy', 'buy', 'sell')),
+                        rng.randint(1, 40),
+                        round(rng.uniform(5, 80), 2),
+                        (first_day + timedelta(days=rng.randint(0, 1300))).isoformat(),
+                    )
+                )
+            incomes = [
+                (
+                    rng.choice(self.pids),
+                    rng.choice(_ASSETS)[0],
+                    'dividendo',
+                    round(rng.uniform(1, 50), 2),
+                    (first_day + timedelta(days=rng.randint(0, 1300))).isoformat(),
+                )
+                for _ in range(800)
+            ]
+            db.executemany(
+                "INSERT INTO transactions (portfolio_id, ticker, tx_type, shares, price, date) VALUES (?, ?, ?, ?, ?, ?)",
+                transactions,
+            )
+            db.executemany(
+                "INSERT INTO incomes (portfolio_id, ticker, income_type, amount, date) VALUES (?, ?, ?, ?, ?)",
+                incomes,
+            )
+            db.commit()
+
+    def tearDown(self):
+        self.fx_patch.stop()
+        for name, value in list(self.app.extensions.items()):
+            if name.endswith('_stop_event'):
+                value.set()
+        for name, value in list(self.app.extensions.items()):
+            if name.endswith('_thread'):
+                value.join(30)
+        for key, value in self.original_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        self.tmpdir.cleanup()
+
+    def _replay(self, pids, as_of):
+        """Reference: full replay of every transaction/income up to as_of."""
+        db = get_db()
+        placeholders = ','.join('?' for _ in pids)
+        states = {}
+        for row in db.execute(
+            'SELECT id, portfolio_id, ticker, tx_type, shares, price, date FROM transactions '
+            f'WHERE portfolio_id IN ({placeholders}) AND date <= ? ORDER BY date, id',
+            (*pids, as_of),
+        ):
+            state = states.setdefault((row['portfolio_id'], row['ticker']), _legacy._empty_position_checkpoint())
+            _legacy._apply_position_transactions(state, [row])
+        for row in db.execute(
+            f'SELECT portfolio_id, ticker, amount FROM incomes WHERE portfolio_id IN ({placeholders}) AND date <= ?',
+            (*pids, as_of),
+        ):
+            state = states.setdefault((row['portfolio_id'], row['ticker']), _legacy._empty_position_checkpoint())
+            state['incomes'] += row['amount']
+        merged = {}
+        for (_pid, ticker), state in states.items():
+            target = merged.setdefault(ticker, dict.fromkeys(_legacy._POSITION_CHECKPOINT_FIELDS, 0.0))
+            for field in _legacy._POSITION_CHECKPOINT_FIELDS:
+                target[field] += state[field]
+        return merged
+
+    def _assert_states_match(self, got, expected, label):
+        self.assertEqual(set(got), set(expected), label)
+        for ticker, state in expected.items():
+            for field in _legacy._POSITION_CHECKPOINT_FIELDS:
+                self.assertAlmostEqual(got[ticker][field], state[field], places=6, msg=f'{label} {ticker} {field}')
+
+    def test_any_date_matches_a_full_replay(self):
+        dates = [
+            date(2020, 12, 31),
+            date(2021, 1, 31),
+            date(2022, 2, 14),
+            date(2022, 2, 28),
+            date(2023, 7, 1),
+            date(2024, 7, 20),
+            date(2030, 1, 1),
+        ]
+        with self.app.app_context():
+            _legacy._refresh_position_checkpoints(self.pids)
+            for pids in ([self.pids[0]], self.pids):
+                states, _replayed = _legacy._positions_as_of(pids, dates)
+                for as_of, got in zip(dates, states):
+                    self._assert_states_match(got, self._replay(pids, as_of.isoformat()), f'{pids} {as_of}')
+
+            # Fim de mes sai direto do checkpoint; no meio do mes so os eventos desde ele.
+            _states, replayed = _legacy._positions_as_of([self.pids[0]], [date(2022, 2, 28)])
+            self.assertEqual(replayed, 0)
+            _states, replayed = _legacy._positions_as_of([self.pids[0]], [date(2022, 2, 14)])
+            expected_events = sum(
+                get_db().execute(
+                    f"SELECT COUNT(*) AS total FROM {table} WHERE portfolio_id = ? AND date BETWEEN '2022-02-01' AND '2022-02-14'",
+                    (self.pids[0],),
+                ).fetchone()['total']
+                for table in ('transactions', 'incomes')
+            )
+            self.assertEqual(replayed, expected_events)
+
+    def test_backdated_change_rewrites_checkpoints_from_its_month(self):
+        with self.app.app_context():
+            db = get_db()
+            pid = self.pids[0]
+            _legacy._refresh_position_checkpoints([pid])
+            self.assertEqual(_legacy._refresh_position_checkpoints([pid]), 0)
+            db.execute(
+                "UPDATE position_checkpoints SET incomes = -1 WHERE portfolio_id = ? AND month_key = '2022-01'",
+                (pid,),
+            )
+            db.execute(
+                "INSERT INTO transactions (portfolio_id, ticker, tx_type, shares, price, date) "
+                "VALUES (?, 'ITUB4', 'buy', 7, 21.5, '2022-03-09')",
+                (pid,),
+            )
+            db.commit()
+            state = db.execute(
+                "SELECT dirty_from FROM portfolio_dirty_months WHERE portfolio_id = ? AND target = 'position_checkpoints'",
+                (pid,),
+            ).fetchone()
+            self.assertEqual(state['dirty_from'], '2022-03')
+            self.assertEqual(_legacy._refresh_position_checkpoints([pid]), 1)
+            untouched = db.execute(
+                "SELECT MIN(incomes) AS incomes FROM position_checkpoints WHERE portfolio_id = ? AND month_key = '2022-01'",
+                (pid,),
+            ).fetchone()
+            self.assertEqual(untouched['incomes'], -1)
+
+            db.execute(
+                "UPDATE portfolio_dirty_months SET dirty_from = '' WHERE portfolio_id = ? AND target = 'position_checkpoints'",
+                (pid,),
+            )
+            db.commit()
+            states, _replayed = _legacy._positions_as_of([pid], [date(2022, 3, 31), date(2024, 5, 2)])
+            self._assert_states_match(states[0], self._replay([pid], '2022-03-31'), 'after edit')
+            self._assert_states_match(states[1], self._replay([pid], '2024-05-02'), 'after edit')
+
+    def test_monthly_metrics_and_as_of_endpoint_share_the_engine(self):
+        month_keys = ['2022-11', '2022-12', '2023-01']
+
+        def monthly_closes(candidates, _period):
+            return {key: {month_key: 20.0 for month_key in month_keys} for key in candidates}
+
+        with self.app.app_context(), patch.object(
+            _legacy, '_download_monthly_close_maps', side_effect=monthly_closes
+        ):
+            metrics = _legacy._portfolio_monthly_metrics_by_category(self.pids, month_keys, '1y')
+            for index, month_key in enumerate(month_keys):
+                expected = self._replay(self.pids, _legacy._month_key_to_date_bounds(month_key)[1].isoformat())
+                br_cost = sum(expected[ticker]['open_cost'] for ticker in ('ITUB4', 'PETR4'))
+                br_value = sum(expected[ticker]['open_shares'] * 20.0 for ticker in ('ITUB4', 'PETR4'))
+                self.assertAlmostEqual(metrics['br_stocks']['invested_values'][index], br_cost, delta=0.011)
+                self.assertAlmostEqual(metrics['br_stocks']['value_values'][index], br_value, delta=0.011)
+                us = expected['AAPL']
+                self.assertAlmostEqual(metrics['us_stocks']['invested_values'][index], us['open_cost'] * 5.0, delta=0.011)
+                self.assertAlmostEqual(
+                    metrics['us_stocks']['net_values'][index],
+                    (us['open_shares'] * 20.0 + us['sold'] + us['incomes'] - us['bought']) * 5.0,
+                    delta=0.011,
+                )
+
+            get_db().executemany(
+                "INSERT INTO price_closes (symbol, interval, date, close) VALUES (?, '1d', ?, ?)",
+                [('ITUB4.SA', '2023-06-30', 31.0), ('AAPL', '2023-06-29', 190.0)],
+            )
+            get_db().commit()
+
+        client = self.app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = self.user_id
+        self.assertEqual(client.get('/api/portfolio/snapshot?as_of=2023-13-01').status_code, 400)
+        response = client.get(f'/api/portfolio/snapshot?as_of=2023-07-02&portfolio_id={self.pids[0]}')
+        self.assertEqual(response.status_code, 200)
+        payload = response.get_json()['data']
+        self.assertEqual(payload['as_of'], '2023-07-02')
+        with self.app.app_context():
+            expected = self._replay([self.pids[0]], '2023-07-02')
+        positions = {item['ticker']: item for item in payload['positions']}
+        self.assertEqual(set(positions), {ticker for ticker, state in expected.items() if state['shares'] > 0})
+        for ticker, item in positions.items():
+            self.assertAlmostEqual(item['shares'], expected[ticker]['shares'], places=6)
+        if 'ITUB4' in positions:
+            self.assertEqual(positions['ITUB4']['price'], 31.0)
+        if 'AAPL' in positions:
+            self.assertEqual(positions['AAPL']['price'], 950.0)
+        # Sem fechamento gravado ate a data o ativo fica sem preco, nao com o preco atual.
+        self.assertEqual(set(payload['missing_prices']), {'PETR4', 'HGLG11'} & set(positions))
+        self.assertEqual(
+            payload['total_incomes'],
+            round(sum(state['incomes'] * (5.0 if ticker == 'AAPL' else 1.0) for ticker, state in expected.items()), 2),
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from app import create_app
+from app.auth import create_user_account
+from app.db import get_db
+from app.services import _legacy, portfolio
+
+
+class PositionStateTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        root = Path(self.tmpdir.name)
+        self.original_env = {
+            key: os.environ.get(key)
+            for key in (
+                'DATABASE',
+                'DATABASE_BACKUP_DIR',
+                'AUTH_SECRET_KEY_FILE',
+                'ADMIN_BOOTSTRAP_FILE',
+                'BACKGROUND_JOBS_LOCK_FILE',
+                'DATABASE_STARTUP_LOCK_FILE',
+            )
+        }
+        os.environ['DATABASE'] = str(root / 'test_position_state.db')
+        os.environ['DATABASE_BACKUP_DIR'] = str(root / 'backups')
+        os.environ['AUTH_SECRET_KEY_FILE'] = str(root / '.flask-secret')
+        os.environ['ADMIN_BOOTSTRAP_FILE'] = str(root / 'admin-bootstrap.txt')
+        os.environ['BACKGROUND_JOBS_LOCK_FILE'] = str(root / '.bg.lock')
+        os.environ['DATABASE_STARTUP_LOCK_FILE'] = str(root / '.db.lock')
+        self.app = create_app()
+        self.fx_patch = patch.object(_legacy, '_get_usdbrl_rate', return_value=5.0)
+        self.fx_patch.start()
+
+    def tearDown(self):
+        self.fx_patch.stop()
+        for key, value in self.original_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        self.tmpdir.cleanup()
+
+    def _seed(self):
+        ok, _msg, user = create_user_account('ledger_user', 'ledger-pass-123', role='trader')
+        self.assertTrue(ok)
+        db = get_db()
+        cur = db.execute(
+            "INSERT INTO portfolios (name, user_id) VALUES ('Teste', ?)",
+            (user['id'],),
+        )
+        pid = int(cur.lastrowid)
+        db.execute(
+            """
+            INSERT INTO assets (ticker, name, sector, price)
+            VALUES ('ITUB4', 'Itau', 'Bancos', 30.0)
+            """
+        )
+        db.commit()
+        return pid
+
+    def _add_tx(self, pid, tx_type, shares, price, date):
+        ok, message = portfolio.add_transaction(
+            {
+                'portfolio_id': str(pid),
+                'ticker': 'ITUB4',
+                'tx_type': tx_type,
+                'shares': str(shares),
+                'price': str(price),
+                'date': date,
+            }
+        )
+        self.assertTrue(ok, message)
+
+    def _state_row(self, pid):
+        return get_db().execute(
+            "SELECT * FROM position_state WHERE portfolio_id = ? AND ticker = 'ITUB4'",
+            (pid,),
+        ).fetchone()
+
+    def _position(self, pid):
+        snapshot = _legacy.get_portfolio_snapshot([pid])
+        by_ticker = {item['ticker']: item for item in snapshot['positions']}
+        return snapshot, by_ticker.get('ITUB4')
+
+    def test_appends_apply_incrementally_and_match_replay(self):
+        with self.app.app_context():
+            pid = self._seed()
+            self._add_tx(pid, 'buy', 100, 20.0, '2026-01-05')
+            self._add_tx(pid, 'buy', 100, 30.0, '2026-02-05')
+            self._add_tx(pid, 'sell', 50, 40.0, '2026-03-05')
+
+            row = self._state_row(pid)
+            self.assertEqual(row['dirty'], 0)
+            self.assertAlmostEqual(row['shares'], 150.0)
+            self.assertAlmostEqual(row['open_cost'], 3750.0)
+            self.assertAlmostEqual(row['avg_price'], 25.0)
+
+            snapshot, position = self._position(pid)
+            self.assertEqual(position['shares'], 150.0)
+            self.assertEqual(position['invested_value'], 3750.0)
+            self.assertEqual(position['avg_price'], 25.0)
+            self.assertEqual(position['open_pnl_value'], 750.0)
+            self.assertEqual(snapshot['invested_value'], 3750.0)
+
+    def test_backdated_edit_and_delete_force_replay(self):
+        with self.app.app_context():
+            pid = self._seed()
+            self._add_tx(pid, 'buy', 100, 20.0, '2026-02-05')
+            self._add_tx(pid, 'buy', 100, 40.0, '2026-01-05')
+            self.assertEqual(self._state_row(pid)['dirty'], 0)
+            _snapshot, position = self._position(pid)
+            self.assertEqual(position['invested_value'], 6000.0)
+
+            tx_id = get_db().execute(
+                "SELECT id FROM transactions WHERE price = 40.0"
+            ).fetchone()['id']
+            self.assertEqual(portfolio.delete_transactions([tx_id], [pid]), 1)
+            _snapshot, position = self._position(pid)
+            self.assertEqual(position['shares'], 100.0)
+            self.assertEqual(position['invested_value'], 2000.0)
+
+    def test_raw_writes_are_settled_on_read_and_incomes_tracked(self):
+        with self.app.app_context():
+            pid = self._seed()
+            db = get_db()
+            db.execute(
+                """
+                INSERT INTO transactions (portfolio_id, ticker, tx_type, shares, price, date)
+                VALUES (?, 'ITUB4', 'buy', 10, 25.0, '2026-01-05')
+                """,
+                (pid,),
+            )
+            db.execute(
+                """
+                INSERT INTO incomes (portfolio_id, ticker, income_type, amount, date)
+                VALUES (?, 'ITUB4', 'dividendo', 12.5, '2020-01-10')
+                """,
+                (pid,),
+            )
+            db.commit()
+            self.assertEqual(self._state_row(pid)['dirty'], 1)
+
+            snapshot, position = self._position(pid)
+            self.assertEqual(position['invested_value'], 250.0)
+            self.assertEqual(position['total_incomes'], 12.5)
+            self.assertEqual(snapshot['total_incomes'], 12.5)
+            self.assertEqual(self._state_row(pid)['dirty'], 0)
+
+            db.execute("DELETE FROM incomes WHERE portfolio_id = ?", (pid,))
+            db.commit()
+            snapshot, position = self._position(pid)
+            self.assertEqual(position['total_incomes'], 0.0)
+            self.assertEqual(snapshot['total_incomes'], 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
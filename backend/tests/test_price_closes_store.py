@@ -0,0 +1,150 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest import mock
+
+from app import create_app
+from app.db import get_db
+from app.services import _legacy
+
+
+def _days_back(count):
+    today = datetime.now().date()
+    return [(today - timedelta(days=offset)).isoformat() for offset in range(count - 1, -1, -1)]
+
+
+class PriceClosesStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        root = Path(self.tmpdir.name)
+        self.original_env = {
+            key: os.environ.get(key)
+            for key in (
+                'DATABASE',
+                'DATABASE_BACKUP_DIR',
+                'AUTH_SECRET_KEY_FILE',
+                'ADMIN_BOOTSTRAP_FILE',
+                'BACKGROUND_JOBS_LOCK_FILE',
+                'DATABASE_STARTUP_LOCK_FILE',
+            )
+        }
+        os.environ['DATABASE'] = str(root / 'test_price_closes.db')
+        os.environ['DATABASE_BACKUP_DIR'] = str(root / 'backups')
+        os.environ['AUTH_SECRET_KEY_FILE'] = str(root / '.flask-secret')
+        os.environ['ADMIN_BOOTSTRAP_FILE'] = str(root / 'admin-bootstrap.txt')
+        os.environ['BACKGROUND_JOBS_LOCK_FILE'] = str(root / '.bg.lock')
+        os.environ['DATABASE_STARTUP_LOCK_FILE'] = str(root / '.db.lock')
+        self.app = create_app()
+        self.days = _days_back(40)
+        self.calls = []
+        self.scale = 1.0
+
+    def tearDown(self):
+        for key, value in self.original_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        self.tmpdir.cleanup()
+
+    def _fake_download(self, symbols, period=None, start=None):
+        result = {}
+        for symbol in symbols:
+            self.calls.append((symbol, period, start))
+            days = self.days if start is None else [day for day in self.days if day >= start]
+            result[symbol] = {day: (10.0 + self.days.index(day)) * self.scale for day in days}
+        return result
+
+    def test_store_is_shared_and_synced_incrementally(self):
+        with self.app.app_context(), mock.patch.object(
+            _legacy, '_yahoo_daily_closes_many', side_effect=self._fake_download
+        ):
+            first = _legacy._download_daily_close_map('itub4.sa', '1mo')
+            self.assertEqual(self.calls, [('ITUB4.SA', '1mo', None)])
+            self.assertEqual(min(first), _legacy._price_close_period_start('1mo'))
+
+            # Fresh store: a second call (or another worker) does not download.
+            again = _legacy._download_daily_close_map('ITUB4.SA', '1mo')
+            self.assertEqual(again, first)
+            self.assertEqual(len(self.calls), 1)
+
+            # Stale store: only bars from the last closed stored date onwards.
+            get_db().execute("UPDATE price_close_sync SET synced_at = '2000-01-01T00:00:00'")
+            get_db().commit()
+            _legacy._download_daily_close_map('ITUB4.SA', '1mo')
+            self.assertEqual(self.calls[-1], ('ITUB4.SA', None, self.days[-2]))
+
+            # A longer period than the covered window triggers a full download.
+            _legacy._download_daily_close_map('ITUB4.SA', '6mo')
+            self.assertEqual(self.calls[-1], ('ITUB4.SA', '6mo', None))
+            covered = get_db().execute(
+                "SELECT covered_from FROM price_close_sync WHERE symbol = 'ITUB4.SA'"
+            ).fetchone()['covered_from']
+            self.assertEqual(covered, _legacy._price_close_period_start('6mo'))
+
+            months = _legacy._download_monthly_close_map('ITUB4.SA', '6mo')
+            self.assertEqual(len(self.calls), 3)
+            last_day = max(first)
+            self.assertEqual(months[last_day[:7]], first[last_day])
+
+    def test_restated_history_is_downloaded_again(self):
+        with self.app.app_context(), mock.patch.object(
+            _legacy, '_yahoo_daily_closes_many', side_effect=self._fake_download
+        ):
+            _legacy._download_daily_close_map('PETR4.SA', 'max')
+            get_db().execute("UPDATE price_close_sync SET synced_at = '2000-01-01T00:00:00'")
+            get_db().commit()
+
+            # Provento: o Yahoo reajusta todo o historico para a nova base.
+            self.scale = 0.97
+            closes = _legacy._download_daily_close_map('PETR4.SA', '1mo')
+            self.assertEqual(
+                self.calls[-2:], [('PETR4.SA', None, self.days[-2]), ('PETR4.SA', '1mo', None)]
+            )
+            # Nenhuma linha da base antiga sobra no store.
+            stored = get_db().execute(
+                "SELECT date, close FROM price_closes WHERE symbol = 'PETR4.SA' ORDER BY date"
+            ).fetchall()
+            self.assertEqual(
+                [(row['date'], row['close']) for row in stored],
+                [(day, (10.0 + index) * 0.97) for index, day in enumerate(self.days)],
+            )
+            self.assertEqual(closes[self.days[-1]], 49.0 * 0.97)
+            covered = get_db().execute(
+                "SELECT covered_from FROM price_close_sync WHERE symbol = 'PETR4.SA'"
+            ).fetchone()['covered_from']
+            self.assertEqual(covered, _legacy._price_close_period_start('1mo'))
+
+    def test_empty_download_is_not_marked_covered(self):
+        with self.app.app_context(), mock.patch.object(
+            _legacy, '_yahoo_daily_closes_many', return_value={'XXXX3.SA': {}}
+        ) as download:
+            self.assertEqual(_legacy._download_daily_close_map('XXXX3.SA', '3mo'), {})
+            self.assertEqual(_legacy._download_daily_close_map('XXXX3.SA', '3mo'), {})
+            self.assertEqual(download.call_count, 2)
+            row = get_db().execute("SELECT COUNT(*) AS total FROM price_close_sync").fetchone()
+            self.assertEqual(row['total'], 0)
+
+    def test_failed_incremental_sync_stays_stale(self):
+        with self.app.app_context():
+            with mock.patch.object(_legacy, '_yahoo_daily_closes_many', side_effect=self._fake_download):
+                _legacy._download_daily_close_map('VALE3.SA', '1mo')
+            get_db().execute("UPDATE price_close_sync SET synced_at = '2000-01-01T00:00:00'")
+            get_db().commit()
+            with mock.patch.object(
+                _legacy, '_yahoo_daily_closes_many', return_value={'VALE3.SA': {}}
+            ) as download:
+                self.assertTrue(_legacy._download_daily_close_map('VALE3.SA', '1mo'))
+                _legacy._download_daily_close_map('VALE3.SA', '1mo')
+            # O store continua vencido: a proxima leitura tenta de novo.
+            self.assertEqual(download.call_count, 2)
+            synced_at = get_db().execute(
+                "SELECT synced_at FROM price_close_sync WHERE symbol = 'VALE3.SA'"
+            ).fetchone()['synced_at']
+            self.assertEqual(synced_at, '2000-01-01T00:00:00')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from pathlib import Path
+from unittest.mock import patch
+
+from app import create_app
+from app.db import get_db
+from app.services import _legacy
+
+
+class ProviderRateLimiterTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        root = Path(self.tmpdir.name)
+        self.original_env = {
+            key: os.environ.get(key)
+            for key in (
+                'DATABASE',
+                'DATABASE_BACKUP_DIR',
+                'AUTH_SECRET_KEY_FILE',
+                'ADMIN_BOOTSTRAP_FILE',
+                'BACKGROUND_JOBS_LOCK_FILE',
+                'DATABASE_STARTUP_LOCK_FILE',
+                'PROVIDER_USAGE_FLUSH_EVERY',
+                'COINGECKO_CALL_BUDGET_PER_DAY',
+                'COINGECKO_CALL_BUDGET_PER_MINUTE',
+                'COINGECKO_CALL_BURST',
+                'COINGECKO_RATE_LIMIT_MAX_WAIT_SECONDS',
+            )
+        }
+        os.environ['DATABASE'] = str(root / 'test_rate_limiter.db')
+        os.environ['DATABASE_BACKUP_DIR'] = str(root / 'backups')
+        os.environ['AUTH_SECRET_KEY_FILE'] = str(root / '.flask-secret')
+        os.environ['ADMIN_BOOTSTRAP_FILE'] = str(root / 'admin-bootstrap.txt')
+        os.environ['BACKGROUND_JOBS_LOCK_FILE'] = str(root / '.bg.lock')
+        os.environ['DATABASE_STARTUP_LOCK_FILE'] = str(root / '.db.lock')
+        os.environ['PROVIDER_USAGE_FLUSH_EVERY'] = '3'
+        os.environ['COINGECKO_RATE_LIMIT_MAX_WAIT_SECONDS'] = '0'
+        self.app = create_app()
+        self._reset_limiter_state()
+
+    def tearDown(self):
+        self._reset_limiter_state()
+        for key, value in self.original_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        self.tmpdir.cleanup()
+
+    def _reset_limiter_state(self):
+        _legacy._PROVIDER_USAGE_PENDING.clear()
+        _legacy._PROVIDER_USAGE_PENDING_SINCE.clear()
+        _legacy._PROVIDER_USAGE_CACHE.clear()
+
+    def _stored_day_count(self, provider):
+        row = get_db().execute(
+            """
+            SELECT request_count, success_count, status_429_count
+            FROM api_provider_usage_window
+            WHERE provider = ? AND window = 'day' AND bucket = ?
+            """,
+            (provider, _legacy._provider_usage_bucket('day')),
+        ).fetchone()
+        return dict(row) if row else None
+
+    def test_usage_counters_are_batched_and_visible_before_flush(self):
+        with self.app.app_context(), patch.object(_legacy, 'notify_event'):
+            for _ in range(2):
+                self.assertTrue(_legacy._provider_rate_limit_acquire('coingecko'))
+                _legacy._provider_usage_record('coingecko', 200)
+            self.assertIsNone(self._stored_day_count('coingecko'))
+            status = _legacy._provider_usage_status('coingecko')
+            self.assertEqual(status['windows']['day']['request_count'], 2)
+            self.assertEqual(status['windows']['day']['success_count'], 2)
+
+            self.assertTrue(_legacy._provider_rate_limit_acquire('coingecko'))
+            stored = self._stored_day_count('coingecko')
+            self.assertEqual(stored['request_count'], 3)
+
+            _legacy._provider_usage_record('coingecko', 429)
+            stored = self._stored_day_count('coingecko')
+            self.assertEqual(stored['success_count'], 2)
+            self.assertEqual(stored['status_429_count'], 1)
+
+    def test_budget_exhaustion_skips_without_spending_tokens(self):
+        os.environ['COINGECKO_CALL_BUDGET_PER_DAY'] = '4'
+        with self.app.app_context(), patch.object(_legacy, 'notify_event') as notify:
+            results = [_legacy._provider_rate_limit_acquire('coingecko') for _ in range(6)]
+            self.assertEqual(results, [True, True, True, True, False, False])
+            self.assertEqual(notify.call_args.args[0], 'provider_budget_exhausted')
+            _legacy._provider_usage_flush()
+            self.assertEqual(self._stored_day_count('coingecko')['request_count'], 4)
+
+    def test_budget_is_shared_through_usage_window_table(self):
+        os.environ['COINGECKO_CALL_BUDGET_PER_DAY'] = '10'
+        with self.app.app_context(), patch.object(_legacy, 'notify_event'):
+            now_dt = datetime.utcnow()
+            db = get_db()
+            db.execute(
+                """
+                INSERT INTO api_provider_usage_window (provider, window, bucket, request_count)
+                VALUES ('coingecko', 'day', ?, 9)
+                """,
+                (_legacy._provider_usage_bucket('day', now_dt=now_dt),),
+            )
+            db.commit()
+            self.assertTrue(_legacy._provider_rate_limit_acquire('coingecko'))
+            self.assertFalse(_legacy._provider_rate_limit_acquire('coingecko'))
+
+    def test_minute_bucket_refills_after_burst(self):
+        os.environ['COINGECKO_CALL_BUDGET_PER_MINUTE'] = '60'
+        os.environ['COINGECKO_CALL_BURST'] = '5'
+        limits = {'minute': 60, 'hour': 0, 'day': 0}
+        now_dt = datetime(2026, 1, 5, 12, 30, 10)
+        with self.app.app_context():
+            wait_seconds, blocking = _legacy._provider_rate_limit_wait('coingecko', limits, now_dt)
+            self.assertEqual(wait_seconds, 0.0)
+            self.assertIsNone(blocking)
+
+            _legacy._provider_usage_pending_add('coingecko', now_dt, request_count=15)
+            wait_seconds, blocking = _legacy._provider_rate_limit_wait('coingecko', limits, now_dt)
+            self.assertAlmostEqual(wait_seconds, 1.0)
+            self.assertEqual(blocking['window'], 'minute')
+
+            with patch.object(_legacy.time, 'sleep') as sleep:
+                with patch.object(_legacy, 'datetime') as fake_datetime:
+                    clock = [now_dt, datetime(2026, 1, 5, 12, 30, 11)]
+                    fake_datetime.utcnow.side_effect = lambda: clock.pop(0) if len(clock) > 1 else clock[0]
+                    self.assertTrue(
+                        _legacy._provider_rate_limit_acquire('coingecko', max_wait_seconds=2.0)
+                    )
+                sleep.assert_called_once()
+                self.assertAlmostEqual(sleep.call_args.args[0], 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
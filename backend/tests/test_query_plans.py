@@ -0,0 +1,185 @@
+import os
+import re
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from app import create_app
+from app.auth import create_user_account
+from app.db import get_db
+from app.services import _legacy, portfolio
+
+# Tables (and the aliases the services use for them) that must always be
+# reached through an index from portfolio-scoped queries.
+_GUARDED_TABLES = {
+    "transactions": "transactions",
+    "t": "transactions",
+    "incomes": "incomes",
+    "i": "incomes",
+    "fixed_incomes": "fixed_incomes",
+    "fi": "fixed_incomes",
+    "position_state": "position_state",
+    "portfolio_monthly_flows": "portfolio_monthly_flows",
+    "f": "portfolio_monthly_flows",
+}
+_FULL_SCAN_RE = re.compile(r"^SCAN (\w+)(?! USING (?:COVERING )?INDEX)")
+_GUARDED_FROM_RE = re.compile(r"\bFROM\s+(transactions|incomes|fixed_incomes|position_state|portfolio_monthly_flows)\b", re.I)
+
+
+class QueryPlanRegressionTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        root = Path(self.tmpdir.name)
+        self.original_env = {
+            key: os.environ.get(key)
+            for key in (
+                'DATABASE',
+                'DATABASE_BACKUP_DIR',
+                'AUTH_SECRET_KEY_FILE',
+                'ADMIN_BOOTSTRAP_FILE',
+                'BACKGROUND_JOBS_LOCK_FILE',
+                'DATABASE_STARTUP_LOCK_FILE',
+            )
+        }
+        os.environ['DATABASE'] = str(root / 'test_query_plans.db')
+        os.environ['DATABASE_BACKUP_DIR'] = str(root / 'backups')
+        os.environ['AUTH_SECRET_KEY_FILE'] = str(root / '.flask-secret')
+        os.environ['ADMIN_BOOTSTRAP_FILE'] = str(root / 'admin-bootstrap.txt')
+        os.environ['BACKGROUND_JOBS_LOCK_FILE'] = str(root / '.bg.lock')
+        os.environ['DATABASE_STARTUP_LOCK_FILE'] = str(root / '.db.lock')
+        self.app = create_app()
+        self.fx_patch = patch.object(_legacy, '_get_usdbrl_rate', return_value=5.0)
+        self.fx_patch.start()
+
+    def tearDown(self):
+        self.fx_patch.stop()
+        for key, value in self.original_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        self.tmpdir.cleanup()
+
+    def _seed(self):
+        ok, _msg, user = create_user_account('plans_user', 'plans-pass-123', role='trader')
+        self.assertTrue(ok)
+        db = get_db()
+        pids = []
+        for name in ('A', 'B'):
+            cur = db.execute(
+                "INSERT INTO portfolios (name, user_id) VALUES (?, ?)",
+                (name, user['id']),
+            )
+            pids.append(int(cur.lastrowid))
+        db.execute(
+            """
+            INSERT INTO assets (ticker, name, sector, price)
+            VALUES ('ITUB4', 'Itau', 'Bancos', 30.0)
+            """
+        )
+        for pid in pids:
+            db.execute(
+                """
+                INSERT INTO transactions (portfolio_id, ticker, tx_type, shares, price, date)
+                VALUES (?, 'ITUB4', 'buy', 100, 25.0, '2026-01-05')
+                """,
+                (pid,),
+            )
+            db.execute(
+                """
+                INSERT INTO incomes (portfolio_id, ticker, income_type, amount, date)
+                VALUES (?, 'ITUB4', 'dividendo', 10.0, '2026-02-10')
+                """,
+                (pid,),
+            )
+        db.commit()
+        return pids
+
+    def _capture(self, fn):
+        statements = []
+        db = get_db()
+        db.set_trace_callback(statements.append)
+        try:
+            fn()
+        finally:
+            db.set_trace_callback(None)
+        return [
+            sql
+            for sql in statements
+            if sql.lstrip().upper().startswith("SELECT") and _GUARDED_FROM_RE.search(sql)
+        ]
+
+    def _assert_no_full_scans(self, label, fn):
+        statements = self._capture(fn)
+        self.assertTrue(statements, f"{label}: no guarded query captured")
+        db = get_db()
+        for sql in statements:
+            plan = db.execute("EXPLAIN QUERY PLAN " + sql).fetchall()
+            for row in plan:
+                match = _FULL_SCAN_RE.match(row["detail"])
+                if match and match.group(1) in _GUARDED_TABLES:
+                    self.fail(
+                        f"{label}: full scan of {_GUARDED_TABLES[match.group(1)]}\n"
+                        f"plan: {row['detail']}\nsql: {sql.strip()}"
+                    )
+
+    def test_managed_indexes_exist(self):
+        with self.app.app_context():
+            names = {
+                row['name']
+                for row in get_db().execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'index'"
+                ).fetchall()
+            }
+            for index_name in (
+                'idx_transactions_portfolio_ticker_date',
+                'idx_incomes_portfolio_date_ticker',
+                'idx_incomes_portfolio_ticker_date',
+                'idx_fixed_incomes_portfolio',
+            ):
+                with self.subTest(index=index_name):
+                    self.assertIn(index_name, names)
+
+    def test_hot_queries_use_indexes(self):
+        with self.app.app_context():
+            pids = self._seed()
+            cases = [
+                ('snapshot', lambda: _legacy.get_portfolio_snapshot(pids)),
+                ('monthly_class', lambda: _legacy._build_monthly_class_summary(pids)),
+                ('monthly_ticker', lambda: _legacy._build_monthly_ticker_summary(pids, months=24)),
+                ('asset_transactions', lambda: portfolio.get_asset_transactions('ITUB4', pids)),
+                ('asset_incomes', lambda: portfolio.get_asset_incomes('ITUB4', pids)),
+                ('asset_position', lambda: portfolio.get_asset_position_summary('ITUB4', pids)),
+                ('incomes', lambda: portfolio.get_incomes(pids)),
+                ('transactions', lambda: portfolio.get_transactions(pids)),
+                ('fixed_incomes', lambda: portfolio.get_fixed_incomes(pids)),
+            ]
+            for label, fn in cases:
+                with self.subTest(query=label):
+                    self._assert_no_full_scans(label, fn)
+
+    def test_position_replay_uses_indexes(self):
+        with self.app.app_context():
+            pids = self._seed()
+            get_db().execute("UPDATE position_state SET dirty = 2")
+            get_db().commit()
+            self._assert_no_full_scans(
+                'position_replay', lambda: _legacy.refresh_position_state(pids)
+            )
+
+    def test_monthly_flow_refresh_uses_indexes(self):
+        with self.app.app_context():
+            pids = self._seed()
+            self._assert_no_full_scans(
+                'monthly_flows_full', lambda: _legacy._refresh_monthly_flows(pids)
+            )
+            get_db().execute("UPDATE portfolio_dirty_months SET dirty_from = '2026-02' WHERE target = 'monthly_flows'")
+            get_db().commit()
+            self._assert_no_full_scans(
+                'monthly_flows_since', lambda: _legacy._refresh_monthly_flows(pids)
+            )
+
+
+if __name__ == '__main__':
+    unittest.main()
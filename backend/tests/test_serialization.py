@@ -0,0 +1,180 @@
+import gzip
+import json
+import os
+import random
+import tempfile
+import unittest
+import zlib
+from pathlib import Path
+
+from app import create_app, serialization
+from app.auth import create_user_account
+from app.db import get_db
+from app.services import _legacy
+
+
+def _dashboard_like_payload(seed=3):
+    """Shape and size close to /api/charts/dashboard for a ~60 asset portfolio."""
+    rng = random.Random(seed)
+    months = [f'{year}-{month:02d}' for year in (2024, 2025) for month in range(1, 13)]
+    days = [f'2025-{month:02d}-{day:02d}' for month in range(1, 13) for day in range(1, 29)]
+    tickers = [f'T{index:03d}3' for index in range(60)]
+    return {
+        'portfolio': {
+            'positions': [
+                {
+                    'ticker': ticker,
+                    'name': f'Empresa {ticker} S.A.',
+                    'sector': rng.choice(['Bancos', 'Energia', 'Mineração', 'Fundos Imobiliários']),
+                    'shares': rng.randint(1, 900),
+                    'avg_price': round(rng.uniform(5, 200), 4),
+                    'price': round(rng.uniform(5, 200), 4),
+                    'value': round(rng.uniform(100, 90000), 2),
+                    'open_pnl_pct': round(rng.uniform(-40, 80), 4),
+                    'variation_day': round(rng.gauss(0, 1.5), 4),
+                }
+                for ticker in tickers
+            ],
+        },
+        'monthly_class_summary': [
+            {'month': month, 'category': category, 'value': round(rng.uniform(0, 50000), 2)}
+            for month in months
+            for category in ('br_stocks', 'fiis', 'us_stocks', 'crypto', 'fixed_income')
+        ],
+        'monthly_ticker_summary': {
+            'months': months[-8:],
+            'rows': [
+                {'ticker': ticker, 'category': 'br_stocks', 'values': [round(rng.uniform(0, 900), 2) for _ in range(8)]}
+                for ticker in tickers
+            ],
+        },
+        'benchmark_chart': {
+            'labels': days,
+            'series': {
+                name: [None if rng.random() < 0.02 else round(rng.uniform(-10, 30), 6) for _ in days]
+                for name in ('carteira', 'ibov', 'cdi', 'ipca', 'sp500')
+            },
+        },
+    }
+
+
+class SerializationTest(unittest.TestCase):
+    def test_pack_payload_round_trip_and_legacy_text_rows(self):
+        payload = _dashboard_like_payload()
+        packed = serialization.pack_payload(payload)
+        self.assertIsInstance(packed, bytes)
+        self.assertEqual(serialization.unpack_payload(packed), payload)
+
+        small = {'rows': [], 'total': 1.5}
+        self.assertEqual(serialization.pack_payload(small), '{"rows":[],"total":1.5}')
+        self.assertEqual(serialization.unpack_payload(serialization.pack_payload(small)), small)
+
+        # Rows written before compression keep being read.
+        self.assertEqual(serialization.unpack_payload(json.dumps(payload, ensure_ascii=False)), payload)
+        self.assertEqual(serialization.unpack_payload(None, default=[]), [])
+        with self.assertRaises(ValueError):
+            serialization.unpack_payload(b'not zlib')
+
+    @unittest.skipIf(serialization.orjson is None, 'orjson not installed')
+    def test_fast_path_matches_stdlib_and_compresses(self):
+        payload = _dashboard_like_payload()
+        stdlib_body = json.dumps(payload, separators=(',', ':'), sort_keys=True).encode('utf-8')
+        fast_body = serialization.dumps_bytes(payload, sort_keys=True)
+        self.assertEqual(json.loads(fast_body), json.loads(stdlib_body))
+        self.assertLess(len(gzip.compress(fast_body, compresslevel=5, mtime=0)), len(fast_body) / 3)
+
+class JsonResponseCompressionTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        root = Path(self.tmpdir.name)
+        self.original_env = {
+            key: os.environ.get(key)
+            for key in (
+                'DATABASE',
+                'DATABASE_BACKUP_DIR',
+                'AUTH_SECRET_KEY_FILE',
+                'ADMIN_BOOTSTRAP_FILE',
+                'BACKGROUND_JOBS_LOCK_FILE',
+                'DATABASE_STARTUP_LOCK_FILE',
+            )
+        }
+        os.environ['DATABASE'] = str(root / 'test_serialization.db')
+        os.environ['DATABASE_BACKUP_DIR'] = str(root / 'backups')
+        os.environ['AUTH_SECRET_KEY_FILE'] = str(root / '.flask-secret')
+        os.environ['ADMIN_BOOTSTRAP_FILE'] = str(root / 'admin-bootstrap.txt')
+        os.environ['BACKGROUND_JOBS_LOCK_FILE'] = str(root / '.bg.lock')
+        os.environ['DATABASE_STARTUP_LOCK_FILE'] = str(root / '.db.lock')
+        self.app = create_app()
+        with self.app.app_context():
+            ok, _msg, user = create_user_account('gzip_user', 'gzip-pass-123', role='trader')
+            self.assertTrue(ok)
+            self.user_id = int(user['id'])
+            db = get_db()
+            db.executemany(
+                "INSERT INTO assets (ticker, name, sector, price) VALUES (?, ?, 'Energia', ?)",
+                [(f'T{index:03d}3', f'Empresa {index} Ação', 10.0 + index) for index in range(40)],
+            )
+            db.commit()
+
+    def tearDown(self):
+        for name, value in list(self.app.extensions.items()):
+            if name.endswith('_stop_event'):
+                value.set()
+        for name, value in list(self.app.extensions.items()):
+            if name.endswith('_thread'):
+                value.join(30)
+        for key, value in self.original_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        self.tmpdir.cleanup()
+
+    def test_large_json_is_compressed_by_accept_encoding(self):
+        client = self.app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = self.user_id
+
+        plain = client.get('/api/assets', headers={'Accept-Encoding': 'identity'})
+        self.assertEqual(plain.status_code, 200)
+        self.assertNotIn('Content-Encoding', plain.headers)
+        self.assertIn('Accept-Encoding', plain.headers['Vary'])
+        body = plain.get_json()
+        self.assertEqual(len(body['data']), 40)
+        self.assertIn('Empresa 39 Ação', {item['name'] for item in body['data']})
+
+        gzipped = client.get('/api/assets', headers={'Accept-Encoding': 'br;q=1.0, gzip;q=0.8'})
+        self.assertEqual(gzipped.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(int(gzipped.headers['Content-Length']), len(gzipped.data))
+        self.assertEqual(json.loads(gzip.decompress(gzipped.data)), body)
+
+        deflated = client.get('/api/assets', headers={'Accept-Encoding': 'deflate'})
+        self.assertEqual(deflated.headers['Content-Encoding'], 'deflate')
+        self.assertEqual(json.loads(zlib.decompress(deflated.data)), body)
+
+        # Small bodies and 304s go out untouched.
+        small = client.get('/api/auth/me', headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', small.headers)
+        cached = client.get(
+            '/api/assets', headers={'Accept-Encoding': 'gzip', 'If-None-Match': gzipped.headers['ETag']}
+        )
+        self.assertEqual(cached.status_code, 304)
+        self.assertNotIn('Content-Encoding', cached.headers)
+
+    def test_chart_snapshots_are_stored_compressed(self):
+        with self.app.app_context():
+            pid = int(
+                get_db().execute("INSERT INTO portfolios (name, user_id) VALUES ('Comp', ?)", (self.user_id,)).lastrowid
+            )
+            get_db().commit()
+            payload = _dashboard_like_payload()['benchmark_chart']
+            _legacy._chart_series_cache_write('bench|1|12m', payload, [f'portfolio:{pid}'])
+            stored = get_db().execute(
+                "SELECT payload_json FROM chart_series_cache WHERE cache_key = 'bench|1|12m'"
+            ).fetchone()['payload_json']
+            self.assertIsInstance(stored, bytes)
+            self.assertEqual(_legacy._chart_series_cache_read('bench|1|12m')[0], payload)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+import random
+import unittest
+from unittest import mock
+
+from app.services import _legacy
+
+
+def _reference_levels(keys, series_map, fill_before_first):
+    result = []
+    last_value = None
+    first_index = None
+    for idx, key in enumerate(keys):
+        if key in series_map:
+            last_value = series_map[key]
+            if first_index is None:
+                first_index = idx
+        result.append(last_value)
+    if fill_before_first and first_index is not None:
+        for idx in range(first_index):
+            result[idx] = result[first_index]
+    return result
+
+
+def _reference_daily(positions, day_keys, day_maps):
+    """Loop original de _portfolio_daily_value_series (sem a selecao por categoria)."""
+    usdbrl_map = day_maps.get(_legacy._USDBRL_HISTORY_KEY) or {}
+    usdbrl_levels = _reference_levels(day_keys, usdbrl_map, True) if usdbrl_map else []
+    totals = [0.0 for _ in day_keys]
+    included = []
+    for item in positions:
+        ticker = item['ticker']
+        current_value = float(item['value'])
+        levels = _reference_levels(day_keys, day_maps.get(ticker) or {}, True)
+        if _legacy._is_usd_quoted_ticker(ticker) and not _legacy._is_us_stock_ticker(ticker) and usdbrl_levels:
+            levels = [
+                None if value is None or fx in (None, 0) else float(value) * float(fx)
+                for value, fx in zip(levels, usdbrl_levels)
+            ]
+        latest = next((value for value in reversed(levels) if value not in (None, 0)), None)
+        if latest in (None, 0):
+            continue
+        for idx, value in enumerate(levels):
+            if value is not None:
+                totals[idx] += current_value * (float(value) / float(latest))
+        included.append(ticker)
+    return [round(float(value), 2) for value in totals] if included else [None for _ in day_keys]
+
+
+def _reference_monthly(positions, month_keys, month_maps):
+    """Loop original de _portfolio_monthly_cumulative."""
+    total_value = sum(float(item['value']) for item in positions)
+    usdbrl_map = month_maps.get(_legacy._USDBRL_HISTORY_KEY) or {}
+    usdbrl_levels = _reference_levels(month_keys, usdbrl_map, False) if usdbrl_map else []
+    weighted_rel = [0.0 for _ in month_keys]
+    weights_used = [0.0 for _ in month_keys]
+    for item in positions:
+        ticker = item['ticker']
+        weight = float(item['value']) / total_value
+        if not month_maps.get(ticker):
+            continue
+        levels = _reference_levels(month_keys, month_maps[ticker], False)
+        if _legacy._is_usd_quoted_ticker(ticker) and not _legacy._is_us_stock_ticker(ticker) and usdbrl_levels:
+            levels = [
+                (value * fx) if (value is not None and fx is not None) else None
+                for value, fx in zip(levels, usdbrl_levels)
+            ]
+        base = next((value for value in levels if value not in (None, 0)), None)
+        if base in (None, 0):
+            continue
+        for idx, value in enumerate(levels):
+            if value is not None:
+                weighted_rel[idx] += weight * (float(value) / float(base))
+                weights_used[idx] += weight
+    return [
+        None if weights_used[idx] <= 0 else ((weighted_rel[idx] / weights_used[idx]) - 1.0) * 100.0
+        for idx in range(len(month_keys))
+    ]
+
+
+def _ticker(index):
+    letters = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    stem = letters[index // 26 % 26] + letters[index % 26] + 'QZ'
+    if index % 10 == 3:
+        return f'{stem}-USD'
+    if index % 10 == 7:
+        return stem
+    return f'{stem}3'
+
+
+def _fixture(key_count, position_count, seed=7):
+    rng = random.Random(seed)
+    keys = [f'k{idx:04d}' for idx in range(key_count)]
+    positions = []
+    maps = {}
+    for index in range(position_count):
+        ticker = _ticker(index)
+        positions.append({'ticker': ticker, 'name': ticker, 'sector': 'Outros', 'value': rng.uniform(100.0, 5000.0)})
+        if index % 17 == 5:
+            continue  # sem historico
+        start = rng.randrange(0, key_count // 3) if index % 4 == 0 else 0
+        series = {}
+        price = rng.uniform(5.0, 300.0)
+        for key in keys[start:]:
+            price *= 1.0 + rng.gauss(0.0, 0.02)
+            if rng.random() < 0.15:
+                continue  # dia sem pregao
+            series[key] = 0.0 if index % 29 == 11 else price
+        maps[ticker] = series
+    maps[_legacy._USDBRL_HISTORY_KEY] = {
+        key: (0.0 if idx == key_count // 2 else 5.0 + idx * 0.001)
+        for idx, key in enumerate(keys)
+        if idx >= 3 and idx % 6
+    }
+    return keys, positions, maps
+
+
+class SeriesKernelTest(unittest.TestCase):
+    def _daily(self, keys, positions, maps):
+        with mock.patch.object(_legacy, '_download_daily_close_maps', return_value=maps):
+            return _legacy._portfolio_daily_value_series({'positions': positions}, keys, '2y')
+
+    def _monthly(self, keys, positions, maps):
+        with mock.patch.object(_legacy, '_download_monthly_close_maps', return_value=maps):
+            return _legacy._portfolio_monthly_cumulative({'positions': positions}, keys, '2y', 'all')
+
+    def test_matches_reference_loops_exactly(self):
+        keys, positions, maps = _fixture(120, 60)
+        daily = self._daily(keys, positions, maps)
+        self.assertEqual(daily['values'], _reference_daily(positions, keys, maps))
+        self.assertIn('AAQZ3', daily['included_tickers'])
+        self.assertIn('AFQZ3', daily['missing_tickers'])
+        self.assertEqual(self._monthly(keys, positions, maps), _reference_monthly(positions, keys, maps))
+
+        for ticker in ('AAQZ3', 'AEQZ3', 'ADQZ-USD'):
+            for fill in (True, False):
+                self.assertEqual(
+                    _legacy._levels_from_day_map(keys, maps[ticker], fill_before_first=fill),
+                    _reference_levels(keys, maps[ticker], fill),
+                )
+        levels = [None, 0, 0.0, 4.0, None, 5.0, 3.0]
+        self.assertEqual(_legacy._cumulative_pct_from_levels(levels), [None, -100.0, -100.0, 0.0, None, 25.0, -25.0])
+        self.assertEqual(_legacy._cumulative_pct_from_levels([None, 0]), [None, None])
+        self.assertEqual(_legacy._levels_from_month_map(['a', 'b', 'c'], {'b': 2.0}), [None, 2.0, 2.0])
+        self.assertEqual(_legacy._levels_from_day_map([], {'a': 1.0}), [])
+
+    def test_empty_history_keeps_none_series(self):
+        keys, positions, _maps = _fixture(10, 4)
+        daily = self._daily(keys, positions, {})
+        self.assertEqual(daily['values'], [None] * 10)
+        self.assertEqual(daily['included_tickers'], [])
+        self.assertEqual(self._monthly(keys, positions, {}), [None] * 10)
+
+    def test_matches_reference_at_500_days_by_200_positions(self):
+        keys, positions, maps = _fixture(500, 200)
+        self.assertEqual(self._daily(keys, positions, maps)['values'], _reference_daily(positions, keys, maps))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from app import create_app
+from app.services import _legacy, market_data
+from app.single_flight import get_single_flight_stats, single_flight
+
+
+class SingleFlightTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        root = Path(self.tmpdir.name)
+        self.original_env = {
+            key: os.environ.get(key)
+            for key in (
+                'DATABASE',
+                'DATABASE_BACKUP_DIR',
+                'AUTH_SECRET_KEY_FILE',
+                'ADMIN_BOOTSTRAP_FILE',
+                'BACKGROUND_JOBS_LOCK_FILE',
+                'DATABASE_STARTUP_LOCK_FILE',
+            )
+        }
+        os.environ['DATABASE'] = str(root / 'test_single_flight.db')
+        os.environ['DATABASE_BACKUP_DIR'] = str(root / 'backups')
+        os.environ['AUTH_SECRET_KEY_FILE'] = str(root / '.flask-secret')
+        os.environ['ADMIN_BOOTSTRAP_FILE'] = str(root / 'admin-bootstrap.txt')
+        os.environ['BACKGROUND_JOBS_LOCK_FILE'] = str(root / '.bg.lock')
+        os.environ['DATABASE_STARTUP_LOCK_FILE'] = str(root / '.db.lock')
+        self.app = create_app()
+        self.database = os.environ['DATABASE']
+
+    def tearDown(self):
+        for key, value in self.original_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        self.tmpdir.cleanup()
+
+    def _run_concurrently(self, count, target):
+        results = [None] * count
+        errors = [None] * count
+        barrier = threading.Barrier(count)
+
+        def _worker(index):
+            with self.app.app_context():
+                barrier.wait()
+                try:
+                    results[index] = target()
+                except Exception as exc:  # noqa: BLE001
+                    errors[index] = exc
+
+        threads = [threading.Thread(target=_worker, args=(index,)) for index in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+        return results, errors
+
+    def test_concurrent_callers_share_one_compute(self):
+        calls = []
+
+        def _compute():
+            calls.append(threading.get_ident())
+            time.sleep(0.3)
+            return {'value': 42}
+
+        before = get_single_flight_stats()
+        results, errors = self._run_concurrently(8, lambda: single_flight('test:shared', _compute))
+        self.assertEqual(errors, [None] * 8)
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(result is results[0] for result in results))
+        stats = get_single_flight_stats()
+        self.assertEqual(stats['followers'] - before['followers'], 7)
+        self.assertEqual(stats['in_flight'], 0)
+
+        # The lease row is gone once the leader finishes.
+        with sqlite3.connect(self.database) as connection:
+            total = connection.execute("SELECT COUNT(*) FROM single_flight_leases").fetchone()[0]
+        self.assertEqual(total, 0)
+
+    def test_followers_receive_the_leader_error(self):
+        def _compute():
+            time.sleep(0.2)
+            raise RuntimeError('provider down')
+
+        _results, errors = self._run_concurrently(4, lambda: single_flight('test:error', _compute))
+        self.assertTrue(all(isinstance(error, RuntimeError) for error in errors))
+
+    def test_other_worker_lease_is_awaited_through_the_shared_cache(self):
+        shared_cache = {}
+        with sqlite3.connect(self.database) as connection:
+            connection.execute(
+                "INSERT INTO single_flight_leases (lease_key, owner, expires_at) VALUES (?, ?, ?)",
+                ('test:cross', 'other-worker', time.time() + 30),
+            )
+
+        def _other_worker_finishes():
+            time.sleep(0.3)
+            shared_cache['test:cross'] = 'from other worker'
+            with sqlite3.connect(self.database) as connection:
+                connection.execute("DELETE FROM single_flight_leases WHERE lease_key = 'test:cross'")
+
+        threading.Thread(target=_other_worker_finishes).start()
+        calls = []
+        with self.app.app_context():
+            result = single_flight(
+                'test:cross',
+                lambda: calls.append(1) or 'computed here',
+                recheck_fn=lambda: shared_cache.get('test:cross'),
+                poll_seconds=0.05,
+            )
+        self.assertEqual(result, 'from other worker')
+        self.assertEqual(calls, [])
+
+    def test_expired_lease_is_taken_over(self):
+        with sqlite3.connect(self.database) as connection:
+            connection.execute(
+                "INSERT INTO single_flight_leases (lease_key, owner, expires_at) VALUES (?, ?, ?)",
+                ('test:stale', 'crashed-worker', time.time() - 1),
+            )
+        with self.app.app_context():
+            self.assertEqual(single_flight('test:stale', lambda: 'computed', poll_seconds=0.05), 'computed')
+
+
+    def test_per_worker_caches_do_not_wait_on_other_workers(self):
+        # Another worker is fetching the same history: its result would only
+        # land in its own memory, so this worker must not wait for the lease.
+        with sqlite3.connect(self.database) as connection:
+            connection.execute(
+                "INSERT INTO single_flight_leases (lease_key, owner, expires_at) VALUES (?, ?, ?)",
+                ('price_history:ITUB4:1y', 'other-worker', time.time() + 60),
+            )
+        history = ({'ticker': 'ITUB4', 'prices': [1.0]}, 'test')
+        with self.app.app_context(), mock.patch.object(_legacy, '_fetch_market_history', return_value=history):
+            _legacy._ASSET_PRICE_HISTORY_CACHE.clear()
+            started = time.monotonic()
+            self.assertEqual(market_data.get_asset_price_history('ITUB4', '1y'), history[0])
+            self.assertLess(time.monotonic() - started, 5.0)
+            _legacy._ASSET_PRICE_HISTORY_CACHE.clear()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from app import create_app
+from app.auth import create_user_account
+from app.db import get_db
+from app.services import _legacy, portfolio
+
+
+class SnapshotRebuildQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        root = Path(self.tmpdir.name)
+        self.original_env = {
+            key: os.environ.get(key)
+            for key in (
+                'DATABASE',
+                'DATABASE_BACKUP_DIR',
+                'AUTH_SECRET_KEY_FILE',
+                'ADMIN_BOOTSTRAP_FILE',
+                'BACKGROUND_JOBS_LOCK_FILE',
+                'DATABASE_STARTUP_LOCK_FILE',
+            )
+        }
+        os.environ['DATABASE'] = str(root / 'test_rebuild_queue.db')
+        os.environ['DATABASE_BACKUP_DIR'] = str(root / 'backups')
+        os.environ['AUTH_SECRET_KEY_FILE'] = str(root / '.flask-secret')
+        os.environ['ADMIN_BOOTSTRAP_FILE'] = str(root / 'admin-bootstrap.txt')
+        os.environ['BACKGROUND_JOBS_LOCK_FILE'] = str(root / '.bg.lock')
+        os.environ['DATABASE_STARTUP_LOCK_FILE'] = str(root / '.db.lock')
+        self.app = create_app()
+
+    def tearDown(self):
+        # The snapshot loops started by create_app also drain the queue; stop
+        # them before the temporary database goes away.
+        for name, value in list(self.app.extensions.items()):
+            if name.endswith('_stop_event'):
+                value.set()
+        for name, value in list(self.app.extensions.items()):
+            if name.endswith('_thread'):
+                value.join(30)
+        for key, value in self.original_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        self.tmpdir.cleanup()
+
+    def _seed(self):
+        ok, _msg, user = create_user_account('queue_user', 'queue-pass-123', role='trader')
+        self.assertTrue(ok)
+        db = get_db()
+        pids = [
+            int(db.execute("INSERT INTO portfolios (name, user_id) VALUES (?, ?)", (name, user['id'])).lastrowid)
+            for name in ('Acoes', 'Cripto', 'Parada')
+        ]
+        db.execute("INSERT INTO assets (ticker, name, sector, price) VALUES ('ITUB4', 'Itau', 'Bancos', 30.0)")
+        db.execute(
+            """
+            INSERT INTO transactions (portfolio_id, ticker, tx_type, shares, price, date)
+            VALUES (?, 'ITUB4', 'buy', 100, 25.0, '2026-01-05')
+            """,
+            (pids[0],),
+        )
+        db.commit()
+        _legacy.refresh_position_state(pids)
+        return pids
+
+    def _queue(self, target='chart'):
+        rows = get_db().execute(
+            "SELECT portfolio_id, priority FROM snapshot_rebuild_queue WHERE target = ? ORDER BY portfolio_id",
+            (target,),
+        ).fetchall()
+        return {int(row['portfolio_id']): int(row['priority']) for row in rows}
+
+    def test_only_dirty_portfolios_are_rebuilt_in_priority_order(self):
+        with self.app.app_context(), mock.patch.object(_legacy, '_warm_heavy_chart_series'):
+            acoes, cripto, parada = self._seed()
+            get_db().execute("DELETE FROM snapshot_rebuild_queue")
+            get_db().commit()
+
+            # Cold start: every portfolio without a snapshot is rebuilt once.
+            total = get_db().execute("SELECT COUNT(*) AS total FROM portfolios").fetchone()['total']
+            unused = AssertionError('resumo mensal montado no rebuild')
+            with mock.patch.object(_legacy, '_build_monthly_class_summary', side_effect=unused), mock.patch.object(
+                _legacy, '_build_monthly_ticker_summary', side_effect=unused
+            ):
+                first = portfolio.rebuild_dirty_chart_snapshots()
+            self.assertEqual((first['portfolios'], first['pending']), (total, 0))
+            self.assertEqual(
+                get_db().execute("SELECT COUNT(*) AS total FROM chart_snapshot_state").fetchone()['total'], total
+            )
+            idle = portfolio.rebuild_dirty_chart_snapshots()
+            self.assertEqual(idle['portfolios'], 0)
+
+            # A market-data change queues the holders; a mutation outranks it.
+            _legacy.mark_ticker_holders_dirty(['itub4'])
+            _legacy.invalidate_chart_snapshots([cripto])
+            self.assertEqual(
+                self._queue(),
+                {
+                    acoes: _legacy.SNAPSHOT_REBUILD_PRIORITY_MARKET_DATA,
+                    cripto: _legacy.SNAPSHOT_REBUILD_PRIORITY_MUTATION,
+                },
+            )
+
+            order = []
+            result = _legacy.rebuild_dirty_snapshots('chart', order.extend, batch_size=1)
+            self.assertEqual(order, [cripto, acoes])
+            self.assertEqual(result['portfolios'], 2)
+            self.assertNotIn(parada, order)
+            self.assertEqual(self._queue(), {})
+
+    def test_requeued_while_rebuilding_stays_dirty(self):
+        with self.app.app_context():
+            acoes, _cripto, _parada = self._seed()
+            with mock.patch.object(_legacy, '_enqueue_expired_snapshots'):
+                _legacy.mark_portfolios_dirty([acoes], targets=('chart',))
+
+                def _rebuild(pids):
+                    # Outra escrita chega enquanto o snapshot esta sendo montado.
+                    _legacy.mark_portfolios_dirty(pids, targets=('chart',))
+
+                result = _legacy.rebuild_dirty_snapshots('chart', _rebuild)
+            self.assertEqual((result['portfolios'], result['pending']), (1, 1))
+            self.assertIn(acoes, self._queue())
+
+    def test_fixed_income_changes_queue_fixed_income_target(self):
+        with self.app.app_context():
+            acoes, _cripto, _parada = self._seed()
+            get_db().execute("DELETE FROM snapshot_rebuild_queue")
+            get_db().commit()
+            portfolio.invalidate_fixed_income_snapshot([acoes])
+            self.assertEqual(self._queue('fixed_income'), {acoes: _legacy.SNAPSHOT_REBUILD_PRIORITY_MUTATION})
+            total = get_db().execute("SELECT COUNT(*) AS total FROM portfolios").fetchone()['total']
+            result = portfolio.rebuild_dirty_fixed_income_snapshots()
+            self.assertEqual(result['portfolios'], total)
+            self.assertEqual(self._queue('fixed_income'), {})
+
+    def test_snapshot_from_today_outlives_max_age_unless_queued(self):
+        with self.app.app_context():
+            stamp = _legacy._snapshot_now()
+            self.assertFalse(_legacy._snapshot_expired(stamp, 0, pending=False))
+            self.assertFalse(_legacy._snapshot_expired(stamp, 900, pending=True))
+            self.assertTrue(_legacy._snapshot_expired('2000-01-01T00:00:00', 10**12, pending=False))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,6 @@
 import { useState } from 'react'
+import 'chart.js/auto'
+import { Line } from 'react-chartjs-2'
 import { apiDelete, apiGet, apiPatch } from '../api'
 import { buildExportFilename, exportRowsAsCsv, exportTableAsPdf } from '../exporters'
 import StatePanel from '../components/StatePanel'
@@ -99,6 +101,13 @@ function buildFixedIncomeExportRows(items) {
   ]))
 }
 
+const DAILY_RANGE_OPTIONS = [
+  { key: '30d', label: '30d' },
+  { key: '90d', label: '90d' },
+  { key: '180d', label: '180d' },
+  { key: '1y', label: '1 ano' },
+]
+
 function FixedIncomePage({ selectedPortfolioIds, portfolios = [] }) {
   const [message, setMessage] = useState('')
   const [actionError, setActionError] = useState('')
@@ -110,6 +119,7 @@ function FixedIncomePage({ selectedPortfolioIds, portfolios = [] }) {
   const [editingFixedId, setEditingFixedId] = useState(null)
   const [savingEdit, setSavingEdit] = useState(false)
   const [editForm, setEditForm] = useState(EMPTY_EDIT_FORM)
+  const [dailyRange, setDailyRange] = useState('90d')
   const {
     data: payload,
     setData: setPayload,
@@ -123,6 +133,18 @@ function FixedIncomePage({ selectedPortfolioIds, portfolios = [] }) {
       sort_dir: sortDir,
     },
   })
+  const {
+    data: dailySeries = { labels: [], values: [], invested_values: [] },
+    loading: dailyLoading,
+    refreshing: dailyRefreshing,
+    error: dailyError,
+  } = useApiQuery('/api/charts/fixed-income-value-daily', {
+    params: {
+      portfolio_id: selectedPortfolioIds,
+      range: dailyRange,
+    },
+    initialData: { labels: [], values: [], invested_values: [] },
+  })
   const editInvestmentTypeSelectValue = FIXED_INVESTMENT_TYPE_SET.has(editForm.investment_type)
     ? editForm.investment_type
     : (editForm.investment_type ? 'OUTRO' : '')
@@ -346,6 +368,50 @@ function FixedIncomePage({ selectedPortfolioIds, portfolios = [] }) {
     { key: 'posfixado', label: 'Juros Pos-fixado', items: posfixadoItems },
   ]
 
+  const dailyLabels = Array.isArray(dailySeries?.labels) ? dailySeries.labels : []
+  const dailyValues = Array.isArray(dailySeries?.values) ? dailySeries.values : []
+  const dailyInvested = Array.isArray(dailySeries?.invested_values) ? dailySeries.invested_values : []
+  const hasDailyPoints = dailyValues.some((value) => Number(value) > 0)
+  const dailyChartData = {
+    labels: dailyLabels,
+    datasets: [
+      {
+        label: 'Valor bruto estimado (R$)',
+        data: dailyValues,
+        borderColor: '#0f8a77',
+        backgroundColor: 'rgba(15, 138, 119, 0.15)',
+        fill: true,
+        tension: 0.22,
+        pointRadius: 0,
+        pointHoverRadius: 3,
+      },
+      {
+        label: 'Aplicado (R$)',
+        data: dailyInvested,
+        borderColor: '#6b7280',
+        borderDash: [6, 4],
+        fill: false,
+        tension: 0,
+        pointRadius: 0,
+        pointHoverRadius: 3,
+      },
+    ],
+  }
+  const dailyChartOptions = {
+    responsive: true,
+    maintainAspectRatio: false,
+    scales: {
+      y: {
+        ticks: {
+          callback: (value) => brl(value),
+        },
+      },
+    },
+    plugins: {
+      legend: { display: true },
+    },
+  }
+
   return (
     <section>
       <h1>Renda Fixa</h1>
@@ -363,6 +429,38 @@ function FixedIncomePage({ selectedPortfolioIds, portfolios = [] }) {
         <article className="card"><h3>Total recebido</h3><p>{brl(summary.total_received)}</p></article>
       </div>
 
+      <article className="card chart-card">
+        <div className="chart-head-inline">
+          <div>
+            <h3>Valor da renda fixa (dia a dia)</h3>
+            <p className="subtitle">Valor bruto estimado pela curva de cada titulo (prefixado, CDI e IPCA) contra o total aplicado.</p>
+          </div>
+          <label>
+            Periodo
+            <select value={dailyRange} onChange={(event) => setDailyRange(String(event.target.value || '90d'))}>
+              {DAILY_RANGE_OPTIONS.map((item) => (
+                <option key={item.key} value={item.key}>{item.label}</option>
+              ))}
+            </select>
+          </label>
+        </div>
+        {(dailyLoading || dailyRefreshing) && <p className="subtitle">Atualizando grafico...</p>}
+        {!dailyLoading && !dailyRefreshing && dailyError && <p className="error">{dailyError}</p>}
+        {!dailyLoading && !dailyRefreshing && !dailyError && hasDailyPoints && (
+          <div className="chart-canvas-wrap">
+            <Line data={dailyChartData} options={dailyChartOptions} />
+          </div>
+        )}
+        {!dailyLoading && !dailyRefreshing && !dailyError && !hasDailyPoints && (
+          <StatePanel
+            compact
+            eyebrow="Historico diario"
+            title="Sem titulos ativos neste periodo"
+            description="Mude a janela do grafico ou cadastre aportes de renda fixa para acompanhar a curva diaria."
+          />
+        )}
+      </article>
+
       <div className="accordion-wrap">
         {groups.map((group) => {
           const sum = groupSummary(group.items)
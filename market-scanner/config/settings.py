@@ -148,6 +148,21 @@ class AppSettings:
     b3_page_size: int = 200
     fundamentals_enabled: bool = True
     fundamentals_ttl_hours: int = 24
+    # Calcula as metricas do lote inteiro em painel (data x ticker) no MetricEngine.
+    metric_panel_enabled: bool = True
+    # Estado incremental dos indicadores: scans seguintes so processam as barras novas.
+    incremental_metrics_enabled: bool = True
+    incremental_price_period: str = "3mo"
+    # "inline" calcula no proprio daemon; "process" usa um pool de processos
+    # (scan_workers=0 usa um worker por core) e mantem um unico writer no banco.
+    scan_executor: str = "inline"
+    scan_workers: int = 0
+    # Lotes baixados a frente do compute (download, calculo e escrita em paralelo).
+    scan_prefetch_batches: int = 2
+    # Retencao do historico de metricas: diario ate metric_history_daily_days,
+    # semanal depois disso e apagado apos metric_history_days (0 = manter).
+    metric_history_daily_days: int = 90
+    metric_history_days: int = 730
     telegram_bot_token: str = ""
     telegram_chat_id: str = ""
     telegram_thread_id: str = ""
@@ -248,6 +263,14 @@ def get_settings() -> AppSettings:
         b3_page_size=_get_int("B3_PAGE_SIZE", 200),
         fundamentals_enabled=_get_bool("SCANNER_FUNDAMENTALS_ENABLED", True),
         fundamentals_ttl_hours=_get_int("SCANNER_FUNDAMENTALS_TTL_HOURS", 24),
+        metric_panel_enabled=_get_bool("METRIC_PANEL_ENABLED", True),
+        incremental_metrics_enabled=_get_bool("INCREMENTAL_METRICS_ENABLED", True),
+        incremental_price_period=_get_env("INCREMENTAL_PRICE_PERIOD", "3mo"),
+        scan_executor=_get_env("SCAN_EXECUTOR", "inline").lower(),
+        scan_workers=_get_int("SCAN_WORKERS", 0),
+        scan_prefetch_batches=_get_int("SCAN_PREFETCH_BATCHES", 2),
+        metric_history_daily_days=_get_int("METRIC_HISTORY_DAILY_DAYS", 90),
+        metric_history_days=_get_int("METRIC_HISTORY_DAYS", 730),
         telegram_bot_token=_get_env("TELEGRAM_BOT_TOKEN", ""),
         telegram_chat_id=_get_env("TELEGRAM_CHAT_ID", ""),
         telegram_thread_id=_get_env("TELEGRAM_THREAD_ID", ""),
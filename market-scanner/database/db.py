@@ -3,6 +3,7 @@
 from __future__ import annotations
 
 import json
+import math
 import re
 from collections import defaultdict
 from contextlib import contextmanager
@@ -10,12 +11,14 @@ from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Iterator, Sequence
 
-from sqlalchemy import create_engine, desc, event, func, select, text, update
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, delete, desc, event, func, select, text, update
 from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session, sessionmaker
 
 from config.settings import AppSettings, TradeLevelSettings
-from database.models import Base, Metric, Price, Signal, TickerCatalog, Trade
+from database.models import Base, IndicatorState, LatestMetrics, Metric, PriceBar, Signal, TickerCatalog, Trade
 from database.trade_rules import candle_is_after_entry
 
 
@@ -25,6 +28,22 @@ FAILURE_TRADE_STATUS = "STOP_HIT"
 MANUAL_PROFIT_STATUS = "CLOSED_PROFIT"
 MANUAL_LOSS_STATUS = "CLOSED_LOSS"
 
+PRICE_COLUMNS = ("open", "high", "low", "close", "volume")
+# Mesmo formato que o DateTime do SQLAlchemy grava no SQLite.
+_SQLITE_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+_UPSERT_PRICE_BARS_SQL = (
+    "INSERT INTO price_bars (ticker, interval, timestamp, open, high, low, close, volume) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT (ticker, interval, timestamp) DO UPDATE SET "
+    "open = excluded.open, high = excluded.high, low = excluded.low, "
+    "close = excluded.close, volume = excluded.volume"
+)
+
+
+_PRICE_PERIOD_RE = re.compile(r"(\d+)(d|wk|mo|y)")
+# Diferenca relativa de fechamento que indica historico reajustado pelo provedor.
+_RESTATED_CLOSE_RTOL = 1e-6
+
 
 def _ticker_symbol_candidates(symbol: str) -> list[str]:
     value = str(symbol or "").strip().upper()
@@ -101,6 +120,35 @@ def _run_sqlite_migrations(engine, database_url: str) -> None:
             )
         if trade_columns and "invested_amount" not in trade_columns:
             connection.execute(text("ALTER TABLE trades ADD COLUMN invested_amount FLOAT"))
+        legacy_prices = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'prices'")
+        ).first()
+        if legacy_prices is not None:
+            # Tabela antiga (uma linha ORM por barra, com rowid e 4 indices):
+            # copia para price_bars e descarta.
+            connection.execute(
+                text(
+                    "INSERT OR IGNORE INTO price_bars "
+                    "(ticker, interval, timestamp, open, high, low, close, volume) "
+                    "SELECT ticker, interval, timestamp, open, high, low, close, volume FROM prices"
+                )
+            )
+            connection.execute(text("DROP TABLE prices"))
+        has_latest_metrics = connection.execute(text("SELECT 1 FROM latest_metrics LIMIT 1")).first()
+        if has_latest_metrics is None:
+            # Preenche o snapshot a partir do historico (bancos anteriores a tabela).
+            connection.execute(
+                text(
+                    "INSERT OR IGNORE INTO latest_metrics (ticker, interval, timestamp, metrics, updated_at) "
+                    "SELECT m.ticker, m.interval, m.timestamp, json_group_object(m.metric_name, m.metric_value), "
+                    "CURRENT_TIMESTAMP "
+                    "FROM metrics m "
+                    "JOIN (SELECT ticker, interval, MAX(timestamp) AS timestamp FROM metrics "
+                    "GROUP BY ticker, interval) last "
+                    "ON last.ticker = m.ticker AND last.interval = m.interval AND last.timestamp = m.timestamp "
+                    "GROUP BY m.ticker, m.interval, m.timestamp"
+                )
+            )
 
 
 @contextmanager
@@ -118,32 +166,111 @@ def session_scope(session_factory: sessionmaker[Session]) -> Iterator[Session]:
         session.close()
 
 
-def upsert_prices(
+def write_price_bars(
     session: Session,
     ticker: str,
     interval: str,
-    prices: Sequence[dict[str, float | datetime]],
-) -> None:
-    """Insert or update historical price rows."""
+    frame: pd.DataFrame,
+) -> int:
+    """Append new bars and overwrite changed ones; returns how many were written.
 
-    if not prices:
-        return
-    statement = sqlite_insert(Price).values(
-        [{**row, "ticker": ticker, "interval": interval} for row in prices]
-    )
-    update_map = {
-        "open": statement.excluded.open,
-        "high": statement.excluded.high,
-        "low": statement.excluded.low,
-        "close": statement.excluded.close,
-        "volume": statement.excluded.volume,
-    }
-    session.execute(
-        statement.on_conflict_do_update(
-            index_elements=["ticker", "timestamp", "interval"],
-            set_=update_map,
+    The stored bars overlapping ``frame`` are read back first, so a scan that
+    re-downloads a year of history only writes the bars that actually moved.
+    """
+
+    if frame.empty:
+        return 0
+    index = pd.DatetimeIndex(frame.index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    stamps = index.strftime(_SQLITE_DATETIME_FORMAT).tolist()
+    bars = frame.loc[:, list(PRICE_COLUMNS)].to_numpy(dtype=float).tolist()
+    connection = session.connection()
+    stored = {
+        row[0]: tuple(row[1:])
+        for row in connection.exec_driver_sql(
+            "SELECT timestamp, open, high, low, close, volume FROM price_bars "
+            "WHERE ticker = ? AND interval = ? AND timestamp >= ?",
+            (ticker, interval, min(stamps)),
         )
+    }
+    rows = [
+        (ticker, interval, stamp, *bar)
+        for stamp, bar in zip(stamps, bars)
+        if stored.get(stamp) != tuple(bar)
+    ]
+    if rows:
+        connection.exec_driver_sql(_UPSERT_PRICE_BARS_SQL, rows)
+    return len(rows)
+
+
+def load_price_frames(
+    session: Session,
+    tickers: Sequence[str],
+    interval: str,
+    since: datetime | None = None,
+) -> dict[str, pd.DataFrame]:
+    """Load stored bars as OHLCV frames (same shape as the collector's)."""
+
+    if not tickers:
+        return {}
+    placeholders = ", ".join("?" for _ in tickers)
+    sql = (
+        "SELECT ticker, timestamp, open, high, low, close, volume FROM price_bars "
+        f"WHERE interval = ? AND ticker IN ({placeholders})"
     )
+    params: list[object] = [interval, *tickers]
+    if since is not None:
+        sql += " AND timestamp >= ?"
+        params.append(since.strftime(_SQLITE_DATETIME_FORMAT))
+    rows = session.connection().exec_driver_sql(sql + " ORDER BY ticker, timestamp", tuple(params)).fetchall()
+    if not rows:
+        return {}
+    table = pd.DataFrame(rows, columns=["ticker", "timestamp", *PRICE_COLUMNS])
+    table["timestamp"] = pd.to_datetime(table["timestamp"], format="ISO8601")
+    return {
+        str(ticker): group.set_index("timestamp").loc[:, list(PRICE_COLUMNS)]
+        for ticker, group in table.groupby("ticker", sort=False)
+    }
+
+
+def price_period_start(period: str, now: datetime | None = None) -> datetime | None:
+    """First instant a BRAPI ``range`` (5d, 3mo, 1y, ytd...) covers; None for max/unknown."""
+
+    value = str(period or "").strip().lower()
+    now = now or datetime.utcnow()
+    if value == "ytd":
+        return datetime(now.year, 1, 1)
+    match = _PRICE_PERIOD_RE.fullmatch(value)
+    if match is None:
+        return None
+    amount = int(match.group(1))
+    days = {"d": 1, "wk": 7, "mo": 31, "y": 366}[match.group(2)] * amount
+    return now - timedelta(days=days)
+
+
+def merge_recent_bars(stored: pd.DataFrame, recent: pd.DataFrame) -> pd.DataFrame | None:
+    """Stored history extended with a recent download; None when they do not line up.
+
+    Recent bars replace the stored ones they overlap. A gap between the two,
+    or a closed overlapping bar whose close moved (the provider re-adjusted
+    the history for a split or dividend), means the stored bars are on an old
+    basis and the caller must download the full history instead.
+    """
+
+    if stored.empty or recent.empty:
+        return None
+    recent = recent.loc[:, list(PRICE_COLUMNS)].sort_index()
+    start = recent.index[0]
+    # O ultimo candle salvo pode ser intraday; so os fechados conferem a base.
+    closed = stored.index[stored.index >= start][:-1].intersection(recent.index)
+    if len(closed) == 0:
+        return None
+    before = stored.loc[closed, "close"].to_numpy(dtype=float)
+    after = recent.loc[closed, "close"].to_numpy(dtype=float)
+    if not np.allclose(after, before, rtol=_RESTATED_CLOSE_RTOL, atol=0.0):
+        return None
+    return pd.concat([stored.loc[stored.index < start, list(PRICE_COLUMNS)], recent])
 
 
 def upsert_metrics(
@@ -165,6 +292,180 @@ def upsert_metrics(
             set_={"metric_value": statement.excluded.metric_value},
         )
     )
+    timestamp = max(row["timestamp"] for row in metrics)
+    snapshot = sqlite_insert(LatestMetrics).values(
+        ticker=ticker,
+        interval=interval,
+        timestamp=timestamp,
+        metrics=json.dumps(
+            {
+                str(row["metric_name"]): _finite_or_none(row["metric_value"])
+                for row in metrics
+                if row["timestamp"] == timestamp
+            },
+            sort_keys=True,
+        ),
+        updated_at=datetime.utcnow(),
+    )
+    session.execute(
+        snapshot.on_conflict_do_update(
+            index_elements=["ticker", "interval"],
+            set_={
+                "timestamp": snapshot.excluded.timestamp,
+                "metrics": snapshot.excluded.metrics,
+                "updated_at": snapshot.excluded.updated_at,
+            },
+            # Um reprocessamento de barra antiga nao sobrescreve o snapshot atual.
+            where=LatestMetrics.timestamp <= snapshot.excluded.timestamp,
+        )
+    )
+
+
+def _finite_or_none(value: object) -> float | None:
+    try:
+        number = float(value)  # type: ignore[arg-type]
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+def load_latest_metrics(
+    session: Session,
+    tickers: Sequence[str],
+) -> dict[str, tuple[datetime, dict[str, float]]]:
+    """Latest (timestamp, metrics) per ticker from the ``latest_metrics`` snapshot."""
+
+    if not tickers:
+        return {}
+    rows = session.scalars(
+        select(LatestMetrics)
+        .where(LatestMetrics.ticker.in_(list(tickers)))
+        .order_by(desc(LatestMetrics.timestamp))
+    ).all()
+    latest: dict[str, tuple[datetime, dict[str, float]]] = {}
+    for row in rows:
+        if row.ticker in latest:
+            continue
+        values = {
+            str(name): float(value)
+            for name, value in json.loads(row.metrics).items()
+            if value is not None
+        }
+        latest[row.ticker] = (row.timestamp, values)
+    return latest
+
+
+def prune_metric_history(
+    session: Session,
+    interval: str,
+    *,
+    daily_days: int,
+    keep_days: int,
+    now: datetime | None = None,
+) -> int:
+    """Apply the metric retention policy; returns how many rows were deleted.
+
+    Rows newer than ``daily_days`` are kept as-is; older ones are downsampled
+    to the last snapshot of each week and dropped entirely past ``keep_days``
+    (``keep_days <= 0`` keeps the weekly history forever).
+    """
+
+    now = now or datetime.utcnow()
+    deleted = 0
+    if keep_days > 0:
+        result = session.execute(
+            delete(Metric).where(
+                Metric.interval == interval,
+                Metric.timestamp < now - timedelta(days=keep_days),
+            )
+        )
+        deleted += int(result.rowcount or 0)
+    if daily_days > 0:
+        result = session.execute(
+            text(
+                "DELETE FROM metrics "
+                "WHERE interval = :interval AND timestamp < :cutoff "
+                "AND (ticker, timestamp) NOT IN ("
+                "  SELECT ticker, MAX(timestamp) FROM metrics "
+                "  WHERE interval = :interval AND timestamp < :cutoff "
+                "  GROUP BY ticker, strftime('%Y-%W', timestamp)"
+                ")"
+            ),
+            {"interval": interval, "cutoff": (now - timedelta(days=daily_days)).strftime(_SQLITE_DATETIME_FORMAT)},
+        )
+        deleted += int(result.rowcount or 0)
+    return deleted
+
+
+def load_indicator_states(
+    session: Session,
+    tickers: Sequence[str],
+    interval: str,
+) -> dict[str, dict[str, object]]:
+    """Return saved streaming indicator payloads keyed by ticker."""
+
+    if not tickers:
+        return {}
+    rows = session.execute(
+        select(IndicatorState.ticker, IndicatorState.payload).where(
+            IndicatorState.ticker.in_(list(tickers)),
+            IndicatorState.interval == interval,
+        )
+    ).all()
+    states: dict[str, dict[str, object]] = {}
+    for ticker, payload in rows:
+        try:
+            states[ticker] = json.loads(payload)
+        except (TypeError, ValueError):
+            continue
+    return states
+
+
+def upsert_indicator_states(
+    session: Session,
+    interval: str,
+    states: dict[str, tuple[datetime, dict[str, object]]],
+) -> None:
+    """Insert or replace streaming indicator payloads (ticker -> (last bar, payload))."""
+
+    if not states:
+        return
+    now = datetime.utcnow()
+    statement = sqlite_insert(IndicatorState).values(
+        [
+            {
+                "ticker": ticker,
+                "interval": interval,
+                "last_timestamp": last_timestamp,
+                "payload": json.dumps(payload),
+                "updated_at": now,
+            }
+            for ticker, (last_timestamp, payload) in states.items()
+        ]
+    )
+    session.execute(
+        statement.on_conflict_do_update(
+            index_elements=["ticker", "interval"],
+            set_={
+                "last_timestamp": statement.excluded.last_timestamp,
+                "payload": statement.excluded.payload,
+                "updated_at": statement.excluded.updated_at,
+            },
+        )
+    )
+
+
+def delete_indicator_states(session: Session, tickers: Sequence[str], interval: str) -> None:
+    """Drop streaming state that can no longer be continued."""
+
+    if not tickers:
+        return
+    session.execute(
+        delete(IndicatorState).where(
+            IndicatorState.ticker.in_(list(tickers)),
+            IndicatorState.interval == interval,
+        )
+    )
 
 
 def upsert_signal(
@@ -529,9 +830,9 @@ def close_trade(
         latest_price = trade.last_price
     if latest_price is None:
         latest_row = session.scalar(
-            select(Price)
-            .where(Price.ticker == trade.ticker)
-            .order_by(desc(Price.timestamp))
+            select(PriceBar)
+            .where(PriceBar.ticker == trade.ticker)
+            .order_by(desc(PriceBar.timestamp))
             .limit(1)
         )
         latest_price = None if latest_row is None else latest_row.close
@@ -689,15 +990,11 @@ def _load_latest_metric_map(
 
     if not tickers:
         return {}
-    rows = session.scalars(
-        select(Metric)
-        .where(Metric.ticker.in_(list(tickers)), Metric.metric_name == metric_name)
-        .order_by(desc(Metric.timestamp))
-    ).all()
-    values: dict[str, float] = {}
-    for row in rows:
-        values.setdefault(row.ticker, float(row.metric_value))
-    return values
+    return {
+        ticker: metrics[metric_name]
+        for ticker, (_, metrics) in load_latest_metrics(session, tickers).items()
+        if metric_name in metrics
+    }
 
 
 def _build_trade_levels(
@@ -849,9 +1146,9 @@ def get_ticker_details(session: Session, symbol: str) -> dict[str, object]:
         .limit(1)
     )
     latest_price = session.scalar(
-        select(Price)
-        .where(Price.ticker.in_(list(symbol_set)))
-        .order_by(desc(Price.timestamp))
+        select(PriceBar)
+        .where(PriceBar.ticker.in_(list(symbol_set)))
+        .order_by(desc(PriceBar.timestamp))
         .limit(1)
     )
     latest_signal = session.scalar(
@@ -874,20 +1171,12 @@ def get_ticker_details(session: Session, symbol: str) -> dict[str, object]:
         )
     )
 
-    metric_rows = session.scalars(
-        select(Metric)
-        .where(Metric.ticker == resolved_symbol)
-        .order_by(desc(Metric.timestamp))
-        .limit(200)
-    ).all()
-
-    latest_metrics: dict[str, float] = {}
-    if metric_rows:
-        latest_timestamp = metric_rows[0].timestamp
-        for row in metric_rows:
-            if row.timestamp != latest_timestamp:
-                continue
-            latest_metrics[row.metric_name] = round(row.metric_value, 6)
+    latest_snapshot = load_latest_metrics(session, [resolved_symbol]).get(resolved_symbol)
+    latest_metrics: dict[str, float] = (
+        {}
+        if latest_snapshot is None
+        else {name: round(value, 6) for name, value in latest_snapshot[1].items()}
+    )
 
     return {
         "ticker": resolved_symbol,
@@ -33,18 +33,20 @@ class TickerCatalog(Base):
     last_scan_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True, index=True)
 
 
-class Price(Base):
-    """Historical OHLCV prices."""
+class PriceBar(Base):
+    """Historical OHLCV bars keyed by (ticker, interval, timestamp).
 
-    __tablename__ = "prices"
-    __table_args__ = (
-        UniqueConstraint("ticker", "timestamp", "interval", name="uq_prices_ticker_ts_int"),
-    )
+    WITHOUT ROWID makes the primary key the table itself: a ticker's bars are
+    stored contiguously and there is no separate rowid b-tree to maintain.
+    Written in bulk by ``write_price_bars``.
+    """
 
-    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    ticker: Mapped[str] = mapped_column(String(32), index=True)
-    timestamp: Mapped[datetime] = mapped_column(DateTime, index=True)
-    interval: Mapped[str] = mapped_column(String(16), default="1d", index=True)
+    __tablename__ = "price_bars"
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    ticker: Mapped[str] = mapped_column(String(32), primary_key=True)
+    interval: Mapped[str] = mapped_column(String(16), primary_key=True, default="1d")
+    timestamp: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
     open: Mapped[float] = mapped_column(Float)
     high: Mapped[float] = mapped_column(Float)
     low: Mapped[float] = mapped_column(Float)
@@ -74,6 +76,39 @@ class Metric(Base):
     metric_value: Mapped[float] = mapped_column(Float)
 
 
+class LatestMetrics(Base):
+    """Latest metric vector per ticker, packed as JSON in a single row.
+
+    Kept in step with ``metrics`` by ``upsert_metrics`` so detail and matrix
+    reads are one primary-key lookup instead of a scan over the history.
+    """
+
+    __tablename__ = "latest_metrics"
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    ticker: Mapped[str] = mapped_column(String(32), primary_key=True)
+    interval: Mapped[str] = mapped_column(String(16), primary_key=True, default="1d")
+    timestamp: Mapped[datetime] = mapped_column(DateTime)
+    metrics: Mapped[str] = mapped_column(Text)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class IndicatorState(Base):
+    """Per-ticker streaming indicator state for incremental scans."""
+
+    __tablename__ = "indicator_state"
+    __table_args__ = (
+        UniqueConstraint("ticker", "interval", name="uq_indicator_state_ticker_int"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    ticker: Mapped[str] = mapped_column(String(32), index=True)
+    interval: Mapped[str] = mapped_column(String(16), default="1d")
+    last_timestamp: Mapped[datetime] = mapped_column(DateTime)
+    payload: Mapped[str] = mapped_column(Text)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
 class Signal(Base):
     """Triggered buy signals."""
 
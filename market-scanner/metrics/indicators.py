@@ -10,9 +10,11 @@ import pandas as pd
 import pandas_ta as ta
 
 from config.settings import MetricSettings
+from metrics import panel
 
 
 MetricComputer = Callable[[pd.DataFrame, MetricSettings], pd.Series]
+PanelComputer = Callable[[dict[str, np.ndarray], MetricSettings], np.ndarray]
 
 
 @dataclass(frozen=True, slots=True)
@@ -25,6 +27,7 @@ class MetricDefinition:
     details: str = ""
     formula_template: str = ""
     parameters: tuple[str, ...] = ()
+    panel_computer: PanelComputer | None = None
 
 
 @dataclass(frozen=True, slots=True)
@@ -178,7 +181,9 @@ def compute_bollinger_position(frame: pd.DataFrame, settings: MetricSettings) ->
     bands = ta.bbands(
         frame["close"],
         length=settings.bollinger_length,
-        std=settings.bollinger_std,
+        lower_std=settings.bollinger_std,
+        upper_std=settings.bollinger_std,
+        ddof=panel.BOLLINGER_DDOF,
     )
     if bands is None or bands.empty:
         return pd.Series(index=frame.index, dtype=float)
@@ -254,6 +259,92 @@ def compute_relative_strength_vs_ibov(frame: pd.DataFrame, settings: MetricSetti
     return ((1.0 + ticker_return) / (1.0 + ibov_return)) - 1.0
 
 
+def panel_rsi(columns: dict[str, np.ndarray], settings: MetricSettings) -> np.ndarray:
+    return panel.rsi(columns["close"], settings.rsi_length)
+
+
+def panel_volume_spike(columns: dict[str, np.ndarray], settings: MetricSettings) -> np.ndarray:
+    return panel.divide(columns["volume"], panel.rolling_mean(columns["volume"], settings.volume_window))
+
+
+def panel_breakout_20(columns: dict[str, np.ndarray], settings: MetricSettings) -> np.ndarray:
+    rolling_high = panel.rolling_max(panel.shift(columns["high"], 1), settings.breakout_window)
+    return panel.divide(columns["close"] - rolling_high, rolling_high)
+
+
+def panel_distance_from_sma200(columns: dict[str, np.ndarray], settings: MetricSettings) -> np.ndarray:
+    return panel.divide(columns["close"] - columns["sma_200"], columns["sma_200"])
+
+
+def panel_bollinger_position(columns: dict[str, np.ndarray], settings: MetricSettings) -> np.ndarray:
+    lower, _mid, upper = panel.bbands(
+        columns["close"],
+        length=settings.bollinger_length,
+        std=settings.bollinger_std,
+        ddof=panel.BOLLINGER_DDOF,
+    )
+    width = upper - lower
+    width[width == 0] = np.nan
+    return panel.divide(columns["close"] - lower, width)
+
+
+def panel_atr_percent(columns: dict[str, np.ndarray], settings: MetricSettings) -> np.ndarray:
+    average_range = panel.atr(columns["high"], columns["low"], columns["close"], settings.atr_length)
+    return panel.divide(average_range, columns["close"])
+
+
+def panel_momentum(columns: dict[str, np.ndarray], settings: MetricSettings) -> np.ndarray:
+    return panel.pct_change(columns["close"], settings.momentum_length)
+
+
+def panel_trend_strength(columns: dict[str, np.ndarray], settings: MetricSettings) -> np.ndarray:
+    return panel.adx(columns["high"], columns["low"], columns["close"], settings.trend_length) / 100.0
+
+
+def panel_vwap_distance(columns: dict[str, np.ndarray], settings: MetricSettings) -> np.ndarray:
+    return panel.divide(columns["close"] - columns["vwap"], columns["vwap"])
+
+
+def panel_range_expansion(columns: dict[str, np.ndarray], settings: MetricSettings) -> np.ndarray:
+    true_range = columns["high"] - columns["low"]
+    return panel.divide(true_range, panel.rolling_mean(true_range, settings.range_window))
+
+
+def panel_higher_high_score(columns: dict[str, np.ndarray], settings: MetricSettings) -> np.ndarray:
+    high = columns["high"]
+    with np.errstate(invalid="ignore"):
+        higher_high = (high > panel.shift(high, 1)).astype(float)
+    # Padding rows stay missing so windows never reach before a ticker's first bar.
+    higher_high[np.isnan(high)] = np.nan
+    return panel.rolling_mean(higher_high, settings.higher_high_window)
+
+
+def panel_volatility_compression(columns: dict[str, np.ndarray], settings: MetricSettings) -> np.ndarray:
+    returns = panel.pct_change(columns["close"])
+    short_vol = panel.rolling_std(returns, settings.volatility_short_window)
+    long_vol = panel.rolling_std(returns, settings.volatility_long_window)
+    return panel.divide(short_vol, long_vol)
+
+
+def panel_momentum_90(columns: dict[str, np.ndarray], settings: MetricSettings) -> np.ndarray:
+    return panel.pct_change(columns["close"], settings.momentum_90_length)
+
+
+def panel_distance_52w_high(columns: dict[str, np.ndarray], settings: MetricSettings) -> np.ndarray:
+    window = settings.high_52w_window
+    min_periods = min(window, max(100, int(window * 0.7)))
+    rolling_52w_high = panel.rolling_max(columns["high"], window, min_periods=min_periods)
+    return panel.divide(columns["close"] - rolling_52w_high, rolling_52w_high)
+
+
+def panel_relative_strength_vs_ibov(columns: dict[str, np.ndarray], settings: MetricSettings) -> np.ndarray:
+    if "ibov_close" not in columns:
+        return np.full_like(columns["close"], np.nan)
+    ticker_return = panel.pct_change(columns["close"], settings.relative_strength_window)
+    ibov_return = panel.pct_change(columns["ibov_close"], settings.relative_strength_window)
+    return panel.divide(1.0 + ticker_return, 1.0 + ibov_return) - 1.0
+
+
 def default_metric_definitions() -> list[MetricDefinition]:
     """Return the default registry of supported metrics."""
 
@@ -265,6 +356,7 @@ def default_metric_definitions() -> list[MetricDefinition]:
             details="Índice de força relativa para medir sobrecompra/sobrevenda.",
             formula_template="RSI({rsi_length}) = 100 - 100/(1 + média_ganhos/média_perdas)",
             parameters=("rsi_length",),
+            panel_computer=panel_rsi,
         ),
         MetricDefinition(
             "volume_spike",
@@ -273,6 +365,7 @@ def default_metric_definitions() -> list[MetricDefinition]:
             details="Compara volume atual com média móvel do volume.",
             formula_template="volume_spike = volume / SMA(volume, {volume_window})",
             parameters=("volume_window",),
+            panel_computer=panel_volume_spike,
         ),
         MetricDefinition(
             "breakout_20",
@@ -284,6 +377,7 @@ def default_metric_definitions() -> list[MetricDefinition]:
                 "/ rolling_max(high.shift(1), {breakout_window})"
             ),
             parameters=("breakout_window",),
+            panel_computer=panel_breakout_20,
         ),
         MetricDefinition(
             "distance_from_sma200",
@@ -292,6 +386,7 @@ def default_metric_definitions() -> list[MetricDefinition]:
             details="Distância percentual do preço em relação à média longa.",
             formula_template="distance_from_sma200 = (close - SMA({sma_long_length})) / SMA({sma_long_length})",
             parameters=("sma_long_length",),
+            panel_computer=panel_distance_from_sma200,
         ),
         MetricDefinition(
             "bollinger_position",
@@ -303,6 +398,7 @@ def default_metric_definitions() -> list[MetricDefinition]:
                 "/ (BB_up({bollinger_length},{bollinger_std}) - BB_low({bollinger_length},{bollinger_std}))"
             ),
             parameters=("bollinger_length", "bollinger_std"),
+            panel_computer=panel_bollinger_position,
         ),
         MetricDefinition(
             "atr_percent",
@@ -311,6 +407,7 @@ def default_metric_definitions() -> list[MetricDefinition]:
             details="Volatilidade média do ativo normalizada pelo preço de fechamento.",
             formula_template="atr_percent = ATR({atr_length}) / close",
             parameters=("atr_length",),
+            panel_computer=panel_atr_percent,
         ),
         MetricDefinition(
             "momentum",
@@ -319,6 +416,7 @@ def default_metric_definitions() -> list[MetricDefinition]:
             details="Retorno percentual do fechamento em uma janela fixa.",
             formula_template="momentum = pct_change(close, {momentum_length})",
             parameters=("momentum_length",),
+            panel_computer=panel_momentum,
         ),
         MetricDefinition(
             "trend_strength",
@@ -327,6 +425,7 @@ def default_metric_definitions() -> list[MetricDefinition]:
             details="Força da tendência usando ADX normalizado em 0-1.",
             formula_template="trend_strength = ADX({trend_length}) / 100",
             parameters=("trend_length",),
+            panel_computer=panel_trend_strength,
         ),
         MetricDefinition(
             "vwap_distance",
@@ -335,6 +434,7 @@ def default_metric_definitions() -> list[MetricDefinition]:
             details="Distância percentual entre fechamento e VWAP acumulada.",
             formula_template="vwap_distance = (close - vwap) / vwap",
             parameters=(),
+            panel_computer=panel_vwap_distance,
         ),
         MetricDefinition(
             "range_expansion",
@@ -343,6 +443,7 @@ def default_metric_definitions() -> list[MetricDefinition]:
             details="Mede expansão de range diário versus média da janela.",
             formula_template="range_expansion = (high - low) / SMA(high - low, {range_window})",
             parameters=("range_window",),
+            panel_computer=panel_range_expansion,
         ),
         MetricDefinition(
             "higher_high_score",
@@ -351,6 +452,7 @@ def default_metric_definitions() -> list[MetricDefinition]:
             details="Frequência de topos ascendentes na janela.",
             formula_template="higher_high_score = rolling_mean(high > high.shift(1), {higher_high_window})",
             parameters=("higher_high_window",),
+            panel_computer=panel_higher_high_score,
         ),
         MetricDefinition(
             "volatility_compression",
@@ -362,6 +464,7 @@ def default_metric_definitions() -> list[MetricDefinition]:
                 "/ std(pct_change(close), {volatility_long_window})"
             ),
             parameters=("volatility_short_window", "volatility_long_window"),
+            panel_computer=panel_volatility_compression,
         ),
         MetricDefinition(
             "momentum_90",
@@ -370,6 +473,7 @@ def default_metric_definitions() -> list[MetricDefinition]:
             details="Retorno percentual de médio prazo do fechamento.",
             formula_template="momentum_90 = pct_change(close, {momentum_90_length})",
             parameters=("momentum_90_length",),
+            panel_computer=panel_momentum_90,
         ),
         MetricDefinition(
             "distance_52w_high",
@@ -381,6 +485,7 @@ def default_metric_definitions() -> list[MetricDefinition]:
                 "/ rolling_max(high, {high_52w_window})"
             ),
             parameters=("high_52w_window",),
+            panel_computer=panel_distance_52w_high,
         ),
         MetricDefinition(
             "relative_strength_vs_ibov",
@@ -392,6 +497,7 @@ def default_metric_definitions() -> list[MetricDefinition]:
                 "/ (1 + ret(ibov_close,{relative_strength_window}))) - 1"
             ),
             parameters=("relative_strength_window",),
+            panel_computer=panel_relative_strength_vs_ibov,
         ),
     ]
 
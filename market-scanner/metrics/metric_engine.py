@@ -6,10 +6,13 @@ from dataclasses import dataclass
 from datetime import datetime
 from math import isnan
 
+import numpy as np
 import pandas as pd
 
 from config.settings import AppSettings
+from metrics import panel
 from metrics.indicators import MetricDefinition, default_metric_definitions
+from metrics.streaming import HELPER_KEYS, STREAMING_METRIC_KEYS, StreamingIndicators
 
 
 @dataclass(slots=True)
@@ -46,17 +49,153 @@ class MetricEngine:
         typical_price = (frame["high"] + frame["low"] + frame["close"]) / 3.0
         cumulative_volume = frame["volume"].cumsum().replace(0, pd.NA)
         frame["vwap"] = (typical_price * frame["volume"]).cumsum() / cumulative_volume
+        benchmark_close = self._benchmark_for(frame, benchmark_prices)
+        if benchmark_close is not None:
+            frame["ibov_close"] = benchmark_close.ffill()
+
+        for metric in self.registry:
+            frame[metric.key] = metric.computer(frame, self.settings.metrics)
+        return self._snapshot(frame)
+
+    def compute_many(
+        self,
+        frames: dict[str, pd.DataFrame],
+        benchmark_prices: pd.DataFrame | None = None,
+    ) -> dict[str, MetricComputation | None]:
+        """Compute metrics for a batch of tickers at once (panel mode).
+
+        Every indicator runs on right-aligned date x ticker arrays instead of one
+        small pandas frame per ticker. Results match ``compute`` ticker by
+        ticker; tickers with too little history map to None.
+        """
+
+        results: dict[str, MetricComputation | None] = {ticker: None for ticker in frames}
+        eligible = {
+            ticker: frame
+            for ticker, frame in frames.items()
+            if not frame.empty and len(frame.index) >= self.settings.metrics.sma_long_length
+        }
+        if not eligible:
+            return results
+        if any(metric.panel_computer is None for metric in self.registry):
+            for ticker, frame in eligible.items():
+                results[ticker] = self.compute(frame, benchmark_prices=benchmark_prices)
+            return results
+
+        price_panel = panel.build_price_panel(eligible)
+        columns = dict(price_panel.columns)
+        close = columns["close"]
+        volume = columns["volume"]
+        columns["sma_21"] = panel.rolling_mean(close, self.settings.metrics.sma_short_length)
+        columns["sma_200"] = panel.rolling_mean(close, self.settings.metrics.sma_long_length)
+        typical_price = (columns["high"] + columns["low"] + close) / 3.0
+        cumulative_volume = panel.cumsum(volume)
+        cumulative_volume[cumulative_volume == 0] = np.nan
+        columns["vwap"] = panel.divide(panel.cumsum(typical_price * volume), cumulative_volume)
         if benchmark_prices is not None and not benchmark_prices.empty:
-            benchmark_close = benchmark_prices["close"].sort_index()
-            benchmark_close.index = benchmark_close.index.normalize()
-            benchmark_close = benchmark_close[~benchmark_close.index.duplicated(keep="last")]
-            ticker_dates = pd.Series(frame.index.normalize(), index=frame.index)
-            frame["ibov_close"] = ticker_dates.map(benchmark_close).ffill()
+            columns["ibov_close"] = panel.align_benchmark(price_panel, benchmark_prices)
+        for metric in self.registry:
+            columns[metric.key] = metric.panel_computer(columns, self.settings.metrics)
+
+        derived_keys = [key for key in columns if key not in panel.PANEL_FIELDS]
+        for position, ticker in enumerate(price_panel.tickers):
+            base = price_panel.frames[position]
+            derived = pd.DataFrame(
+                {key: price_panel.column_for(columns[key], position) for key in derived_keys},
+                index=base.index,
+            )
+            frame = pd.concat([base.drop(columns=derived_keys, errors="ignore"), derived], axis=1)
+            results[ticker] = self._snapshot(frame)
+        return results
+
+    def build_streaming_state(
+        self,
+        prices: pd.DataFrame,
+        benchmark_prices: pd.DataFrame | None = None,
+    ) -> StreamingIndicators | None:
+        """Replay a full history into streaming state, committing all but the latest bar."""
+
+        if len(prices.index) < self.settings.metrics.sma_long_length or not self._streamable(prices):
+            return None
+        frame = prices.sort_index()
+        bars = frame[list(panel.PANEL_FIELDS)].to_numpy(dtype=np.float64)
+        benchmark_close = self._benchmark_values(frame, benchmark_prices)
+        return StreamingIndicators.replay(
+            self.settings.metrics,
+            frame.index[:-1],
+            [tuple(bar) for bar in bars[:-1].tolist()],
+            benchmark_close[:-1],
+        )
 
+    def compute_streaming(
+        self,
+        prices: pd.DataFrame,
+        state: StreamingIndicators,
+        benchmark_prices: pd.DataFrame | None = None,
+    ) -> MetricComputation | None:
+        """Advance ``state`` to the latest bar of ``prices`` and snapshot it.
+
+        Only the bars after the last committed one are processed, so ``prices``
+        can be a short recent window. Returns None (leaving ``state`` untouched)
+        when the state cannot continue from ``prices`` - a gap, a restated
+        committed bar or missing values - and the caller must recompute the
+        full history and rebuild the state.
+        """
+
+        if state.last_timestamp is None or not self._streamable(prices):
+            return None
+        frame = prices.sort_index()
+        if not frame.index.is_unique or state.last_timestamp not in frame.index:
+            return None
+        committed = frame.loc[state.last_timestamp, list(panel.PANEL_FIELDS)].to_numpy(dtype=np.float64)
+        if not np.allclose(committed, state.last_bar, rtol=1e-9, atol=0.0):
+            return None
+        pending = frame.loc[frame.index > state.last_timestamp]
+        if pending.empty:
+            return None
+
+        bars = [tuple(bar) for bar in pending[list(panel.PANEL_FIELDS)].to_numpy(dtype=np.float64).tolist()]
+        benchmark_close = self._benchmark_values(pending, benchmark_prices)
+        # Outputs of the committed bar and of every new bar, so the rows the
+        # exit checks compare (-1 vs -2) are filled however many bars arrived.
+        outputs = [dict(state.last_outputs)]
+        for position in range(len(bars) - 1):
+            outputs.append(state.push(pending.index[position], bars[position], benchmark_close[position]))
+        outputs.append(state.evaluate(bars[-1], benchmark_close[-1]))
+
+        keys = [key for key in HELPER_KEYS if key != "ibov_close" or benchmark_prices is not None]
+        keys += [metric.key for metric in self.registry]
+        values = np.full((len(frame.index), len(keys)), np.nan, dtype=np.float64)
+        values[-len(outputs) :] = [[row.get(key, np.nan) for key in keys] for row in outputs]
+        derived = pd.DataFrame(values, index=frame.index, columns=keys)
+        return self._snapshot(pd.concat([frame.drop(columns=keys, errors="ignore"), derived], axis=1))
+
+    def _streamable(self, prices: pd.DataFrame) -> bool:
+        if prices.empty or any(metric.key not in STREAMING_METRIC_KEYS for metric in self.registry):
+            return False
+        return bool(np.isfinite(prices[list(panel.PANEL_FIELDS)].to_numpy(dtype=np.float64)).all())
+
+    def _benchmark_for(self, frame: pd.DataFrame, benchmark_prices: pd.DataFrame | None) -> pd.Series | None:
+        """Benchmark close on each of the frame's dates (not forward-filled)."""
+
+        if benchmark_prices is None or benchmark_prices.empty:
+            return None
+        benchmark_close = benchmark_prices["close"].sort_index()
+        benchmark_close.index = benchmark_close.index.normalize()
+        benchmark_close = benchmark_close[~benchmark_close.index.duplicated(keep="last")]
+        ticker_dates = pd.Series(frame.index.normalize(), index=frame.index)
+        return ticker_dates.map(benchmark_close)
+
+    def _benchmark_values(self, frame: pd.DataFrame, benchmark_prices: pd.DataFrame | None) -> list[float]:
+        benchmark_close = self._benchmark_for(frame, benchmark_prices)
+        if benchmark_close is None:
+            return [np.nan] * len(frame.index)
+        return benchmark_close.to_numpy(dtype=np.float64).tolist()
+
+    def _snapshot(self, frame: pd.DataFrame) -> MetricComputation:
         metric_values: dict[str, float] = {}
         labels: dict[str, str] = {}
         for metric in self.registry:
-            frame[metric.key] = metric.computer(frame, self.settings.metrics)
             latest_value = frame[metric.key].iloc[-1]
             if latest_value is None or pd.isna(latest_value) or (isinstance(latest_value, float) and isnan(latest_value)):
                 continue
@@ -0,0 +1,241 @@
+"""Panel (date x ticker) arrays and NumPy kernels for batch metric computation.
+
+Each ticker's history is right-aligned in its column: the last row of the panel
+is every ticker's latest bar and shorter histories are padded with NaN at the
+top. Windows therefore run over each ticker's own bars, exactly like the
+per-ticker path, while every kernel works on all tickers at once.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+PANEL_FIELDS = ("open", "high", "low", "close", "volume")
+# Sample deviation, pandas-ta's effective ``bbands`` default (the per-ticker path
+# passes it explicitly so both paths draw the same bands).
+BOLLINGER_DDOF = 1
+
+
+@dataclass(slots=True)
+class PricePanel:
+    """Right-aligned OHLCV arrays for a batch of tickers."""
+
+    tickers: list[str]
+    frames: list[pd.DataFrame]
+    columns: dict[str, np.ndarray]
+    lengths: np.ndarray
+
+    @property
+    def rows(self) -> int:
+        return int(self.lengths.max()) if len(self.lengths) else 0
+
+    def column_for(self, values: np.ndarray, position: int) -> np.ndarray:
+        """Return one ticker's slice of a panel array, without the padding."""
+
+        return values[self.rows - int(self.lengths[position]) :, position]
+
+
+def build_price_panel(frames: dict[str, pd.DataFrame]) -> PricePanel:
+    """Stack normalized OHLCV frames into right-aligned panel arrays."""
+
+    tickers = list(frames)
+    sorted_frames = [frames[ticker].sort_index() for ticker in tickers]
+    lengths = np.array([len(frame.index) for frame in sorted_frames], dtype=np.int64)
+    rows = int(lengths.max()) if len(lengths) else 0
+    columns: dict[str, np.ndarray] = {}
+    for field in PANEL_FIELDS:
+        values = np.full((rows, len(tickers)), np.nan, dtype=np.float64)
+        for position, frame in enumerate(sorted_frames):
+            if field in frame.columns and lengths[position]:
+                values[rows - lengths[position] :, position] = frame[field].to_numpy(dtype=np.float64)
+        columns[field] = values
+    return PricePanel(tickers=tickers, frames=sorted_frames, columns=columns, lengths=lengths)
+
+
+def align_benchmark(panel: PricePanel, benchmark_prices: pd.DataFrame) -> np.ndarray:
+    """Map benchmark closes onto each ticker's own dates, forward-filled."""
+
+    benchmark_close = benchmark_prices["close"].sort_index()
+    benchmark_close.index = benchmark_close.index.normalize()
+    benchmark_close = benchmark_close[~benchmark_close.index.duplicated(keep="last")]
+    values = np.full((panel.rows, len(panel.tickers)), np.nan, dtype=np.float64)
+    for position, frame in enumerate(panel.frames):
+        if not panel.lengths[position]:
+            continue
+        mapped = pd.Series(frame.index.normalize(), index=frame.index).map(benchmark_close)
+        values[panel.rows - panel.lengths[position] :, position] = mapped.to_numpy(dtype=np.float64)
+    return pd.DataFrame(values).ffill().to_numpy()
+
+
+def shift(values: np.ndarray, periods: int = 1) -> np.ndarray:
+    result = np.full_like(values, np.nan)
+    if periods >= len(values):
+        return result
+    if periods > 0:
+        result[periods:] = values[:-periods]
+    elif periods < 0:
+        result[:periods] = values[-periods:]
+    else:
+        result[:] = values
+    return result
+
+
+def divide(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return numerator / denominator
+
+
+def pct_change(values: np.ndarray, periods: int = 1) -> np.ndarray:
+    return divide(values, shift(values, periods)) - 1.0
+
+
+def _windows(values: np.ndarray, window: int, min_periods: int) -> tuple[np.ndarray, int]:
+    if min_periods < window:
+        padding = np.full((window - 1, values.shape[1]), np.nan, dtype=values.dtype)
+        return sliding_window_view(np.vstack([padding, values]), window, axis=0), 0
+    return sliding_window_view(values, window, axis=0), window - 1
+
+
+def _rolling(values: np.ndarray, window: int, reducer, min_periods: int | None = None) -> np.ndarray:
+    window = int(window)
+    min_periods = window if min_periods is None else int(min_periods)
+    result = np.full_like(values, np.nan, dtype=np.float64)
+    if window <= 0 or (min_periods >= window and len(values) < window):
+        return result
+    view, offset = _windows(values, window, min_periods)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        reduced = reducer(view)
+    if min_periods < window:
+        counts = np.count_nonzero(~np.isnan(view), axis=-1)
+        reduced = np.where(counts >= max(min_periods, 1), reduced, np.nan)
+    result[offset:] = reduced
+    return result
+
+
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    return _rolling(values, window, lambda view: view.mean(axis=-1))
+
+
+def rolling_std(values: np.ndarray, window: int, ddof: int = 1) -> np.ndarray:
+    return _rolling(values, window, lambda view: view.std(axis=-1, ddof=ddof))
+
+
+def rolling_max(values: np.ndarray, window: int, min_periods: int | None = None) -> np.ndarray:
+    if min_periods is None or min_periods >= window:
+        return _rolling(values, window, lambda view: view.max(axis=-1))
+    return _rolling(
+        values,
+        window,
+        lambda view: np.where(np.isnan(view), -np.inf, view).max(axis=-1),
+        min_periods=min_periods,
+    )
+
+
+def cumsum(values: np.ndarray) -> np.ndarray:
+    """Cumulative sum that skips NaN but keeps NaN at missing rows (pandas semantics)."""
+
+    result = np.nancumsum(values, axis=0)
+    result[np.isnan(values)] = np.nan
+    return result
+
+
+def rma(values: np.ndarray, length: int) -> np.ndarray:
+    """Wilder's moving average as pandas-ta's ``rma``: ``ewm(alpha=1/length, adjust=False).mean()``.
+
+    No warm-up: each column starts at its first observation.
+    """
+
+    return pd.DataFrame(values).ewm(alpha=1.0 / length, adjust=False).mean().to_numpy()
+
+
+def first_rows(values: np.ndarray) -> np.ndarray:
+    """Row of each ticker's first bar (the end of its NaN padding)."""
+
+    return np.argmax(~np.isnan(values), axis=0)
+
+
+def presma(values: np.ndarray, length: int, starts: np.ndarray) -> np.ndarray:
+    """pandas-ta ATR seeding: the first ``length`` bars collapse into their mean.
+
+    The mean lands on each ticker's ``length``-th bar and the bars before it are
+    dropped, so the RMA that follows starts from an SMA instead of one bar.
+    """
+
+    rows = np.arange(len(values))[:, None]
+    seeding = (rows >= starts) & (rows < starts + length)
+    window = np.where(seeding, values, np.nan)
+    seed = divide(np.nansum(window, axis=0), np.count_nonzero(~np.isnan(window), axis=0))
+    result = np.where(rows < starts + length - 1, np.nan, values)
+    columns = np.flatnonzero(starts + length - 1 < len(values))
+    result[starts[columns] + length - 1, columns] = seed[columns]
+    return result
+
+
+def non_zero_range(high: np.ndarray, low: np.ndarray) -> np.ndarray:
+    diff = high - low
+    has_zero = np.any(diff == 0, axis=0)
+    if has_zero.any():
+        diff = diff + np.where(has_zero, np.finfo(float).eps, 0.0)
+    return diff
+
+
+def true_range(
+    high: np.ndarray, low: np.ndarray, close: np.ndarray, drift: int = 1, prenan: bool = False
+) -> np.ndarray:
+    prev_close = shift(close, drift)
+    ranges = np.stack([non_zero_range(high, low), high - prev_close, prev_close - low])
+    ranges = np.abs(ranges)
+    result = np.where(np.isnan(ranges), -np.inf, ranges).max(axis=0)
+    result[np.all(np.isnan(ranges), axis=0)] = np.nan
+    if prenan:
+        # The first real bar of each ticker has no previous close.
+        result[np.isnan(prev_close) & ~np.isnan(close)] = np.nan
+    return result
+
+
+def atr(high: np.ndarray, low: np.ndarray, close: np.ndarray, length: int, prenan: bool = False) -> np.ndarray:
+    ranges = true_range(high, low, close, prenan=prenan)
+    return rma(presma(ranges, length, first_rows(close)), length)
+
+
+def rsi(close: np.ndarray, length: int, scalar: float = 100.0) -> np.ndarray:
+    change = close - shift(close, 1)
+    with np.errstate(invalid="ignore"):
+        positive = np.where(change < 0, 0.0, change)
+        negative = np.where(change > 0, 0.0, change)
+    positive_avg = rma(positive, length)
+    negative_avg = rma(negative, length)
+    return scalar * divide(positive_avg, positive_avg + np.abs(negative_avg))
+
+
+def adx(high: np.ndarray, low: np.ndarray, close: np.ndarray, length: int, scalar: float = 100.0) -> np.ndarray:
+    average_range = atr(high, low, close, length, prenan=True)
+    up = high - shift(high, 1)
+    down = shift(low, 1) - low
+    with np.errstate(invalid="ignore"):
+        positive = np.where((up > down) & (up > 0), up, 0.0)
+        negative = np.where((down > up) & (down > 0), down, 0.0)
+    # bool * NaN stays NaN in pandas; keep the missing first bar missing.
+    positive[np.isnan(up)] = np.nan
+    negative[np.isnan(down)] = np.nan
+    epsilon = np.finfo(float).eps
+    positive[np.abs(positive) < epsilon] = 0.0
+    negative[np.abs(negative) < epsilon] = 0.0
+    k = divide(scalar, average_range)
+    dmp = k * rma(positive, length)
+    dmn = k * rma(negative, length)
+    dx = scalar * divide(np.abs(dmp - dmn), dmp + dmn)
+    return rma(dx, length)
+
+
+def bbands(
+    close: np.ndarray, length: int, std: float, ddof: int = BOLLINGER_DDOF
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    deviations = std * rolling_std(close, length, ddof=ddof)
+    mid = rolling_mean(close, length)
+    return mid - deviations, mid, mid + deviations
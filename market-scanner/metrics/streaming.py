@@ -0,0 +1,482 @@
+"""Streaming indicator state: update every metric one bar at a time.
+
+`StreamingIndicators` keeps, per ticker, the rolling windows and Wilder
+accumulators behind the registry metrics, so a new (or revised) latest bar
+costs O(1) per metric instead of a full recompute over the downloaded year.
+
+Bars are *committed* once a newer bar exists; the latest bar is only
+*evaluated* on top of the committed state, because it keeps changing while
+the session is open. The state models the same trailing window a full
+recompute sees (``horizon`` bars): cumulative VWAP terms and the 52-week high
+drop the oldest bar as new ones are committed. The Wilder averages (RSI, ATR,
+ADX) keep their whole history, so they differ from a recompute of a sliding
+window only by the weight of the dropped bars, ``(1 - 1/length) ** horizon``.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import sys
+from collections import deque
+from dataclasses import asdict
+from datetime import datetime
+from typing import Iterable, Sequence
+
+import pandas as pd
+
+from config.settings import MetricSettings
+from metrics.panel import BOLLINGER_DDOF
+
+
+STATE_VERSION = 2
+NAN = float("nan")
+EPSILON = sys.float_info.epsilon
+
+STREAMING_METRIC_KEYS = (
+    "rsi",
+    "volume_spike",
+    "breakout_20",
+    "distance_from_sma200",
+    "bollinger_position",
+    "atr_percent",
+    "momentum",
+    "trend_strength",
+    "vwap_distance",
+    "range_expansion",
+    "higher_high_score",
+    "volatility_compression",
+    "momentum_90",
+    "distance_52w_high",
+    "relative_strength_vs_ibov",
+)
+HELPER_KEYS = ("sma_21", "sma_200", "vwap", "ibov_close")
+
+Bar = tuple[float, float, float, float, float]
+
+
+def settings_fingerprint(settings: MetricSettings) -> str:
+    return json.dumps(asdict(settings), sort_keys=True)
+
+
+def _divide(numerator: float, denominator: float) -> float:
+    if denominator == 0 or math.isnan(denominator):
+        return NAN
+    return numerator / denominator
+
+
+class RollingWindow:
+    """Fixed-size window with running sums (mean/std need a full window)."""
+
+    __slots__ = ("size", "values", "_anchor", "_sum", "_sum_sq")
+
+    def __init__(self, size: int, values: Iterable[float] = ()) -> None:
+        self.size = int(size)
+        self.values: deque[float] = deque(values, maxlen=self.size)
+        # Sums are kept around an anchor close to the data and rebuilt exactly
+        # whenever the state is loaded, so rounding never piles up.
+        self._anchor = self.values[0] if self.values else 0.0
+        self._sum = math.fsum(value - self._anchor for value in self.values)
+        self._sum_sq = math.fsum((value - self._anchor) ** 2 for value in self.values)
+
+    def _with(self, value: float) -> tuple[int, float, float]:
+        shifted = value - self._anchor
+        total = self._sum + shifted
+        total_sq = self._sum_sq + shifted * shifted
+        count = len(self.values) + 1
+        if len(self.values) == self.size:
+            oldest = self.values[0] - self._anchor
+            total -= oldest
+            total_sq -= oldest * oldest
+            count -= 1
+        return count, total, total_sq
+
+    def push(self, value: float) -> None:
+        if not self.values:
+            self._anchor, self._sum, self._sum_sq = value, 0.0, 0.0
+        _count, self._sum, self._sum_sq = self._with(value)
+        self.values.append(value)
+
+    def sum_with(self, value: float) -> float:
+        count, total, _total_sq = self._with(value)
+        return self._anchor * count + total
+
+    def mean_with(self, value: float) -> float:
+        count, total, _total_sq = self._with(value)
+        if count < self.size:
+            return NAN
+        return self._anchor + total / count
+
+    def std_with(self, value: float, ddof: int = 1) -> float:
+        count, total, total_sq = self._with(value)
+        if count < self.size or count <= ddof:
+            return NAN
+        variance = (total_sq - total * total / count) / (count - ddof)
+        return math.sqrt(max(variance, 0.0))
+
+
+class RollingMax:
+    """Sliding maximum over a monotonic deque of ``(sequence, value)`` pairs."""
+
+    __slots__ = ("size", "min_periods", "count", "_sequence", "_entries")
+
+    def __init__(self, size: int, min_periods: int | None = None) -> None:
+        self.size = int(size)
+        self.min_periods = self.size if min_periods is None else int(min_periods)
+        self.count = 0
+        self._sequence = 0
+        self._entries: deque[tuple[int, float]] = deque()
+
+    def push(self, value: float) -> None:
+        self._sequence += 1
+        while self._entries and self._entries[-1][1] <= value:
+            self._entries.pop()
+        self._entries.append((self._sequence, value))
+        while self._entries[0][0] <= self._sequence - self.size:
+            self._entries.popleft()
+        self.count = min(self.count + 1, self.size)
+
+    def current(self) -> float:
+        """Maximum of the committed window."""
+
+        if self.count < self.min_periods or not self._entries:
+            return NAN
+        return self._entries[0][1]
+
+    def max_with(self, value: float) -> float:
+        """Maximum of the window that would end at ``value``."""
+
+        if min(self.count + 1, self.size) < self.min_periods:
+            return NAN
+        first_kept = self._sequence + 2 - self.size
+        for sequence, candidate in self._entries:
+            if sequence >= first_kept:
+                return max(candidate, value)
+        return value
+
+    def to_payload(self) -> dict[str, object]:
+        return {
+            "count": self.count,
+            "entries": [[self._sequence - sequence, value] for sequence, value in self._entries],
+        }
+
+    @classmethod
+    def from_payload(cls, size: int, min_periods: int | None, payload: dict) -> RollingMax:
+        window = cls(size, min_periods)
+        window.count = int(payload["count"])
+        window._sequence = window.size
+        window._entries = deque((window.size - int(age), float(value)) for age, value in payload["entries"])
+        return window
+
+
+class WilderAverage:
+    """Recursive form of pandas-ta's ``rma``: ``ewm(alpha=1/length, adjust=False).mean()``.
+
+    Follows the pandas kernel (``ignore_na=False``) step by step, so a stream
+    that starts at the first bar reproduces it exactly. With ``presma`` the
+    first ``length`` inputs are held back and their mean seeds the average,
+    like ``ta.atr``.
+    """
+
+    __slots__ = ("length", "alpha", "decay", "weighted", "old_weight", "seed")
+
+    def __init__(
+        self,
+        length: int,
+        weighted: float = NAN,
+        old_weight: float = 1.0,
+        seed: list[float] | None = None,
+        presma: bool = False,
+    ) -> None:
+        self.length = int(length)
+        # pandas turns alpha into a center of mass and back; keep the same rounding.
+        alpha = 1.0 / self.length
+        self.alpha = 1.0 / (1.0 + (1.0 - alpha) / alpha)
+        self.decay = 1.0 - self.alpha
+        self.weighted = weighted
+        self.old_weight = old_weight
+        self.seed = seed if seed is not None else ([] if presma else None)
+
+    def _advance(self, value: float) -> tuple[float, float, list[float] | None]:
+        seed = self.seed
+        if seed is not None:
+            seed = [*seed, value]
+            if len(seed) < self.length:
+                return self.weighted, self.old_weight, seed
+            known = [item for item in seed if item == item]
+            value = math.fsum(known) / len(known) if known else NAN
+            seed = None
+        weighted = self.weighted
+        old_weight = self.old_weight
+        is_observation = value == value
+        if weighted == weighted:
+            old_weight *= self.decay
+            if is_observation:
+                if weighted != value:
+                    weighted = old_weight * weighted + self.alpha * value
+                    weighted /= old_weight + self.alpha
+                old_weight = 1.0
+        elif is_observation:
+            weighted = value
+        return weighted, old_weight, seed
+
+    def value_with(self, value: float) -> float:
+        return self._advance(value)[0]
+
+    def push(self, value: float) -> None:
+        self.weighted, self.old_weight, self.seed = self._advance(value)
+
+    def to_payload(self) -> list[object]:
+        return [self.weighted, self.old_weight, self.seed]
+
+
+class StreamingIndicators:
+    """Per-ticker indicator state for the default metric registry."""
+
+    _WINDOWS = (
+        "sma_short",
+        "sma_long",
+        "bollinger",
+        "volume",
+        "range",
+        "higher_high",
+        "returns_short",
+        "returns_long",
+        "vwap_price_volume",
+        "vwap_volume",
+    )
+    _MAXIMA = ("breakout_high", "high_52w")
+    _AVERAGES = ("rsi_gain", "rsi_loss", "atr", "adx_range", "adx_plus", "adx_minus", "adx")
+
+    def __init__(self, settings: MetricSettings, horizon: int) -> None:
+        self.settings = settings
+        self.horizon = int(horizon)
+        self.bars = 0
+        self.last_timestamp: pd.Timestamp | None = None
+        self.last_bar: Bar | None = None
+        self.last_benchmark = NAN
+        self.last_outputs: dict[str, float] = {}
+        lag = max(settings.momentum_length, settings.momentum_90_length, settings.relative_strength_window)
+        self.closes: deque[float] = deque(maxlen=lag)
+        self.benchmark_closes: deque[float] = deque(maxlen=settings.relative_strength_window)
+
+        self.sma_short = RollingWindow(settings.sma_short_length)
+        self.sma_long = RollingWindow(settings.sma_long_length)
+        self.bollinger = RollingWindow(settings.bollinger_length)
+        self.volume = RollingWindow(settings.volume_window)
+        self.range = RollingWindow(settings.range_window)
+        self.higher_high = RollingWindow(settings.higher_high_window)
+        self.returns_short = RollingWindow(settings.volatility_short_window)
+        self.returns_long = RollingWindow(settings.volatility_long_window)
+        self.vwap_price_volume = RollingWindow(self.horizon)
+        self.vwap_volume = RollingWindow(self.horizon)
+
+        self.breakout_high = RollingMax(settings.breakout_window)
+        self.high_52w = RollingMax(*self._high_52w_window())
+
+        self.rsi_gain = WilderAverage(settings.rsi_length)
+        self.rsi_loss = WilderAverage(settings.rsi_length)
+        self.atr = WilderAverage(settings.atr_length, presma=True)
+        self.adx_range = WilderAverage(settings.trend_length, presma=True)
+        self.adx_plus = WilderAverage(settings.trend_length)
+        self.adx_minus = WilderAverage(settings.trend_length)
+        self.adx = WilderAverage(settings.trend_length)
+
+    def _high_52w_window(self) -> tuple[int, int]:
+        window = self.settings.high_52w_window
+        min_periods = min(window, max(100, int(window * 0.7)))
+        return min(window, self.horizon), min_periods
+
+    def _fits(self, bars_back: int) -> bool:
+        """A full recompute over ``horizon`` bars cannot look further back."""
+
+        return bars_back < self.horizon and len(self.closes) >= bars_back
+
+    def push(self, timestamp: pd.Timestamp, bar: Bar, benchmark_close: float = NAN) -> dict[str, float]:
+        """Commit a closed bar and return its outputs."""
+
+        outputs, inputs = self._step(bar, benchmark_close)
+        for name, value in inputs.items():
+            getattr(self, name).push(value)
+        self.closes.append(bar[3])
+        self.benchmark_closes.append(outputs["ibov_close"])
+        self.last_benchmark = outputs["ibov_close"]
+        self.last_timestamp = timestamp
+        self.last_bar = bar
+        self.last_outputs = outputs
+        self.bars += 1
+        return outputs
+
+    def evaluate(self, bar: Bar, benchmark_close: float = NAN) -> dict[str, float]:
+        """Outputs for ``bar`` as the next bar, without committing it."""
+
+        return self._step(bar, benchmark_close)[0]
+
+    def _step(self, bar: Bar, benchmark_close: float) -> tuple[dict[str, float], dict[str, float]]:
+        settings = self.settings
+        _open, high, low, close, volume = bar
+        if self.last_bar is None:
+            prev_high = prev_low = prev_close = NAN
+        else:
+            _prev_open, prev_high, prev_low, prev_close, _prev_volume = self.last_bar
+        benchmark = benchmark_close if benchmark_close == benchmark_close else self.last_benchmark
+
+        bar_range = high - low
+        change = close - prev_close
+        # ta.atr keeps the first bar's high-low range; the ADX's ATR (prenan) drops it.
+        true_range = bar_range or EPSILON
+        adx_range = NAN
+        plus_move = minus_move = NAN
+        if self.last_bar is not None:
+            true_range = adx_range = max(true_range, abs(high - prev_close), abs(prev_close - low))
+            up = high - prev_high
+            down = prev_low - low
+            plus_move = up if up > down and up > 0 else 0.0
+            minus_move = down if down > up and down > 0 else 0.0
+            plus_move = 0.0 if abs(plus_move) < EPSILON else plus_move
+            minus_move = 0.0 if abs(minus_move) < EPSILON else minus_move
+
+        inputs: dict[str, float] = {
+            "sma_short": close,
+            "sma_long": close,
+            "bollinger": close,
+            "volume": volume,
+            "range": bar_range,
+            "higher_high": 1.0 if high > prev_high else 0.0,
+            "vwap_price_volume": (high + low + close) / 3.0 * volume,
+            "vwap_volume": volume,
+            "high_52w": high,
+            "breakout_high": high,
+            "rsi_gain": NAN if change != change else max(change, 0.0),
+            "rsi_loss": NAN if change != change else min(change, 0.0),
+            "atr": true_range,
+            "adx_range": adx_range,
+            "adx_plus": plus_move,
+            "adx_minus": minus_move,
+        }
+        if self.last_bar is not None:
+            inputs["returns_short"] = close / prev_close - 1.0
+            inputs["returns_long"] = inputs["returns_short"]
+
+        sma_21 = self.sma_short.mean_with(close)
+        sma_200 = self.sma_long.mean_with(close)
+        vwap = _divide(
+            self.vwap_price_volume.sum_with(inputs["vwap_price_volume"]),
+            self.vwap_volume.sum_with(volume),
+        )
+
+        gain = self.rsi_gain.value_with(inputs["rsi_gain"])
+        loss = self.rsi_loss.value_with(inputs["rsi_loss"])
+        rsi = 100.0 * _divide(gain, gain + abs(loss))
+
+        adx_scale = _divide(100.0, self.adx_range.value_with(adx_range))
+        plus = adx_scale * self.adx_plus.value_with(plus_move)
+        minus = adx_scale * self.adx_minus.value_with(minus_move)
+        inputs["adx"] = 100.0 * _divide(abs(plus - minus), plus + minus)
+
+        middle = self.bollinger.mean_with(close)
+        deviation = settings.bollinger_std * self.bollinger.std_with(close, ddof=BOLLINGER_DDOF)
+        lower = middle - deviation
+        width = (middle + deviation) - lower
+
+        if "returns_short" in inputs:
+            short_vol = self.returns_short.std_with(inputs["returns_short"])
+            long_vol = self.returns_long.std_with(inputs["returns_long"])
+        else:
+            short_vol = long_vol = NAN
+
+        rolling_high = self.breakout_high.current() if self.breakout_high.size < self.horizon else NAN
+        high_52w = self.high_52w.max_with(high)
+
+        momentum = momentum_90 = relative_strength = NAN
+        if self._fits(settings.momentum_length):
+            momentum = close / self.closes[-settings.momentum_length] - 1.0
+        if self._fits(settings.momentum_90_length):
+            momentum_90 = close / self.closes[-settings.momentum_90_length] - 1.0
+        window = settings.relative_strength_window
+        if self._fits(window) and len(self.benchmark_closes) >= window:
+            ticker_return = close / self.closes[-window] - 1.0
+            benchmark_return = _divide(benchmark, self.benchmark_closes[-window]) - 1.0
+            relative_strength = _divide(1.0 + ticker_return, 1.0 + benchmark_return) - 1.0
+
+        outputs = {
+            "sma_21": sma_21,
+            "sma_200": sma_200,
+            "vwap": vwap,
+            "ibov_close": benchmark,
+            "rsi": rsi,
+            "volume_spike": _divide(volume, self.volume.mean_with(volume)),
+            "breakout_20": _divide(close - rolling_high, rolling_high),
+            "distance_from_sma200": _divide(close - sma_200, sma_200),
+            "bollinger_position": _divide(close - lower, width),
+            "atr_percent": _divide(self.atr.value_with(true_range), close),
+            "momentum": momentum,
+            "trend_strength": self.adx.value_with(inputs["adx"]) / 100.0,
+            "vwap_distance": _divide(close - vwap, vwap),
+            "range_expansion": _divide(bar_range, self.range.mean_with(bar_range)),
+            "higher_high_score": self.higher_high.mean_with(inputs["higher_high"]),
+            "volatility_compression": _divide(short_vol, long_vol),
+            "momentum_90": momentum_90,
+            "distance_52w_high": _divide(close - high_52w, high_52w),
+            "relative_strength_vs_ibov": relative_strength,
+        }
+        return outputs, inputs
+
+    def to_payload(self) -> dict[str, object]:
+        return {
+            "version": STATE_VERSION,
+            "settings": settings_fingerprint(self.settings),
+            "horizon": self.horizon,
+            "bars": self.bars,
+            "last_timestamp": self.last_timestamp.isoformat() if self.last_timestamp is not None else None,
+            "last_bar": list(self.last_bar) if self.last_bar is not None else None,
+            "last_benchmark": self.last_benchmark,
+            "last_outputs": self.last_outputs,
+            "closes": list(self.closes),
+            "benchmark_closes": list(self.benchmark_closes),
+            "windows": {name: list(getattr(self, name).values) for name in self._WINDOWS},
+            "maxima": {name: getattr(self, name).to_payload() for name in self._MAXIMA},
+            "averages": {name: getattr(self, name).to_payload() for name in self._AVERAGES},
+        }
+
+    @classmethod
+    def from_payload(cls, settings: MetricSettings, payload: dict) -> StreamingIndicators | None:
+        """Rebuild a saved state; None when it was built for other settings."""
+
+        if payload.get("version") != STATE_VERSION or payload.get("settings") != settings_fingerprint(settings):
+            return None
+        state = cls(settings, int(payload["horizon"]))
+        state.bars = int(payload["bars"])
+        if payload["last_timestamp"]:
+            state.last_timestamp = pd.Timestamp(payload["last_timestamp"])
+        if payload["last_bar"]:
+            state.last_bar = tuple(float(value) for value in payload["last_bar"])
+        state.last_benchmark = float(payload["last_benchmark"])
+        state.last_outputs = {key: float(value) for key, value in payload["last_outputs"].items()}
+        state.closes.extend(payload["closes"])
+        state.benchmark_closes.extend(payload["benchmark_closes"])
+        for name in cls._WINDOWS:
+            setattr(state, name, RollingWindow(getattr(state, name).size, payload["windows"][name]))
+        state.breakout_high = RollingMax.from_payload(settings.breakout_window, None, payload["maxima"]["breakout_high"])
+        state.high_52w = RollingMax.from_payload(*state._high_52w_window(), payload["maxima"]["high_52w"])
+        for name in cls._AVERAGES:
+            weighted, old_weight, seed = payload["averages"][name]
+            average = getattr(state, name)
+            seed = [float(value) for value in seed] if seed is not None else None
+            setattr(state, name, WilderAverage(average.length, float(weighted), float(old_weight), seed))
+        return state
+
+    @classmethod
+    def replay(
+        cls,
+        settings: MetricSettings,
+        timestamps: Sequence[datetime],
+        bars: Sequence[Bar],
+        benchmark_closes: Sequence[float],
+    ) -> StreamingIndicators:
+        """Build the state by committing every bar of a history."""
+
+        state = cls(settings, horizon=len(bars) + 1)
+        for timestamp, bar, benchmark_close in zip(timestamps, bars, benchmark_closes):
+            state.push(timestamp, bar, benchmark_close)
+        return state
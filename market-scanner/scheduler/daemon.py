@@ -2,11 +2,17 @@
 
 from __future__ import annotations
 
+import multiprocessing
+import os
 import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from dataclasses import dataclass
 from datetime import datetime, time, timedelta, timezone
+from queue import Queue
 from threading import Condition, Event, Lock, Thread
-from typing import Iterable
+from time import perf_counter
+from typing import Iterable, Iterator
 from zoneinfo import ZoneInfo
 
 import exchange_calendars as xcals
@@ -19,21 +25,31 @@ from collector.brapi_client import BRAPIClient
 from collector.ticker_provider import B3ListedTicker, B3TickerProvider
 from config.settings import AppSettings
 from database.db import (
+    delete_indicator_states,
     has_backend_assets_table,
     list_backend_br_asset_symbols,
     list_open_trade_tickers,
+    load_indicator_states,
+    load_price_frames,
     mark_missing_tickers_inactive,
+    merge_recent_bars,
+    price_period_start,
+    prune_metric_history,
     session_scope,
     touch_ticker_scan_status,
     update_backend_asset_market_snapshot,
     update_open_trades_for_ticker,
+    upsert_indicator_states,
     upsert_metrics,
-    upsert_prices,
     upsert_signal,
     upsert_ticker_catalog,
+    write_price_bars,
 )
-from metrics.metric_engine import MetricEngine
+from metrics.metric_engine import MetricComputation, MetricEngine
+from metrics.streaming import StreamingIndicators
 from scheduler.notifier import send_telegram_alert
+from scheduler.scan_pipeline import END, ScanBatch, StageTimings, WaitClock, drain, put
+from scheduler.scan_worker import BatchAnalyzer, TickerAnalysis, analyze_in_worker, init_worker
 from signals.signal_engine import SignalEngine
 
 
@@ -69,6 +85,9 @@ class MarketScannerDaemon:
         self.ticker_provider = ticker_provider or B3TickerProvider(settings)
         self.metric_engine = metric_engine or MetricEngine(settings)
         self.signal_engine = signal_engine or SignalEngine(settings)
+        self.batch_analyzer = BatchAnalyzer(settings, self.metric_engine, self.signal_engine)
+        self._scan_pool: ProcessPoolExecutor | None = None
+        self._scan_pool_lock = Lock()
         self.market_timezone = ZoneInfo(self.MARKET_TIMEZONE)
         self.market_calendar = xcals.get_calendar("BVMF")
         self.scheduler = BackgroundScheduler(timezone=self.market_timezone)
@@ -80,6 +99,7 @@ class MarketScannerDaemon:
         self._scan_active_force = False
         self._scan_active_started_at: datetime | None = None
         self._scan_last_summary = ScanSummary(0, 0, 0)
+        self._scan_stage_timings: StageTimings | None = None
         self._scan_last_finished_at: datetime | None = None
         self._stop_event = Event()
         # Cache de fundamentos (DY/P/L) — buscado no maximo 1x por TTL (~24h)
@@ -90,31 +110,6 @@ class MarketScannerDaemon:
         self._alerted_keys: set[tuple[str, str]] = set()
         self._exit_alerted_keys: set[tuple[str, str]] = set()
 
-    def _exit_signal(self, computation) -> str | None:
-        """Perda de tendencia: fechou abaixo da SMA200 (cruzando pra baixo) ou
-        rompeu a minima de 20 dias. Usado so para posicoes abertas."""
-        frame = computation.frame
-        try:
-            close = frame["close"]
-        except Exception:  # noqa: BLE001
-            return None
-        reasons: list[str] = []
-        if "sma_200" in frame.columns and len(close) >= 2:
-            sma = frame["sma_200"]
-            try:
-                if close.iloc[-1] < sma.iloc[-1] and close.iloc[-2] >= sma.iloc[-2]:
-                    reasons.append("perdeu a SMA200")
-            except Exception:  # noqa: BLE001
-                pass
-        if "low" in frame.columns and len(frame) >= 21:
-            try:
-                recent_low = float(frame["low"].iloc[-21:-1].min())
-                if float(close.iloc[-1]) < recent_low:
-                    reasons.append("rompeu a minima de 20 dias")
-            except Exception:  # noqa: BLE001
-                pass
-        return " + ".join(reasons) if reasons else None
-
     def _maybe_exit_alert(self, ticker: str, reason: str, computation) -> bool:
         key = (ticker, str(computation.timestamp)[:10])
         if key in self._exit_alerted_keys:
@@ -237,6 +232,7 @@ class MarketScannerDaemon:
         if self.scheduler.running:
             self.scheduler.shutdown(wait=False)
             logger.info("Market scanner scheduler stopped")
+        self._shutdown_analysis_pool()
         self._stop_event.set()
 
     def run_forever(self) -> None:
@@ -353,6 +349,9 @@ class MarketScannerDaemon:
                     "signals_triggered": int(self._scan_last_summary.signals_triggered),
                 },
                 "last_finished_at": last_finished_at,
+                "stage_timings": self._scan_stage_timings.snapshot()
+                if self._scan_stage_timings is not None
+                else None,
             }
 
     def _begin_scan_locked(self, requested_symbols: list[str] | None, force: bool) -> int:
@@ -457,149 +456,145 @@ class MarketScannerDaemon:
         processed = 0
         triggered = 0
         alerted_this_scan = 0
-        for batch in self._chunks(tickers, self.settings.download_batch_size):
-            try:
-                data = self.brapi_client.download_batch(
-                    batch,
-                    period=self.settings.price_period,
-                    interval=self.settings.price_interval,
-                )
-                missing = sorted(set(batch) - set(data.keys()))
-                if missing:
-                    logger.warning(
-                        "Some official B3 tickers were not returned by BRAPI",
-                        missing_count=len(missing),
-                        sample_missing=missing[:10],
-                    )
-            except Exception as exc:
-                logger.exception("Batch download failed", error=str(exc), batch_size=len(batch))
+        timings = StageTimings()
+        with self._scan_condition:
+            self._scan_stage_timings = timings
+        cancel = Event()
+        fetched: Queue = Queue(maxsize=max(1, self.settings.scan_prefetch_batches))
+        computed: Queue = Queue(maxsize=1)
+        stages = [
+            Thread(
+                target=self._fetch_stage,
+                args=(tickers, benchmark_frame, fetched, cancel, timings),
+                name="scan-fetch",
+                daemon=True,
+            ),
+            Thread(
+                target=self._compute_stage,
+                args=(fetched, computed, benchmark_frame, fundamentals, open_trade_tickers, cancel, timings),
+                name="scan-compute",
+                daemon=True,
+            ),
+        ]
+        for stage in stages:
+            stage.start()
+        try:
+            for batch in drain(computed, cancel):
+                write_started = perf_counter()
+                waited = WaitClock()
+                if batch.download_failed:
+                    with session_scope(self.session_factory) as session:
+                        touch_ticker_scan_status(
+                            session,
+                            [ticker.removesuffix(".SA") for ticker in batch.tickers],
+                            yahoo_supported=False,
+                            scanned_at=scan_started_at,
+                        )
+                    timings.add("write", perf_counter() - write_started, batches=1)
+                    continue
+
                 with session_scope(self.session_factory) as session:
+                    can_sync_backend_assets = has_backend_assets_table(session)
+                    touch_ticker_scan_status(
+                        session,
+                        [ticker.removesuffix(".SA") for ticker in batch.data.keys()],
+                        yahoo_supported=True,
+                        scanned_at=scan_started_at,
+                    )
                     touch_ticker_scan_status(
                         session,
-                        [ticker.removesuffix(".SA") for ticker in batch],
+                        [ticker.removesuffix(".SA") for ticker in batch.missing],
                         yahoo_supported=False,
                         scanned_at=scan_started_at,
                     )
-                continue
-
-            with session_scope(self.session_factory) as session:
-                can_sync_backend_assets = has_backend_assets_table(session)
-                touch_ticker_scan_status(
-                    session,
-                    [ticker.removesuffix(".SA") for ticker in data.keys()],
-                    yahoo_supported=True,
-                    scanned_at=scan_started_at,
-                )
-                touch_ticker_scan_status(
-                    session,
-                    [ticker.removesuffix(".SA") for ticker in missing],
-                    yahoo_supported=False,
-                    scanned_at=scan_started_at,
-                )
-                for ticker, frame in data.items():
-                    try:
-                        price_rows = [
-                            {
-                                "timestamp": timestamp.to_pydatetime(),
-                                "open": float(row["open"]),
-                                "high": float(row["high"]),
-                                "low": float(row["low"]),
-                                "close": float(row["close"]),
-                                "volume": float(row["volume"]),
-                            }
-                            for timestamp, row in frame.iterrows()
-                        ]
-                        upsert_prices(session, ticker, self.settings.price_interval, price_rows)
-                        latest_bar = frame.iloc[-1]
-                        update_open_trades_for_ticker(
-                            session,
-                            ticker,
-                            high=float(latest_bar["high"]),
-                            low=float(latest_bar["low"]),
-                            close=float(latest_bar["close"]),
-                            candle_timestamp=latest_bar.name.to_pydatetime(),
-                        )
-
-                        if can_sync_backend_assets:
-                            closes = [float(value) for value in frame["close"].tolist() if value is not None]
-                            variation_day = 0.0
-                            variation_7d = 0.0
-                            variation_30d = 0.0
-                            if len(closes) >= 2 and closes[-2] != 0:
-                                variation_day = ((closes[-1] / closes[-2]) - 1.0) * 100.0
-                            if len(closes) >= 8 and closes[-8] != 0:
-                                variation_7d = ((closes[-1] / closes[-8]) - 1.0) * 100.0
-                            if len(closes) >= 31 and closes[-31] != 0:
-                                variation_30d = ((closes[-1] / closes[-31]) - 1.0) * 100.0
-                            update_backend_asset_market_snapshot(
+                    for analysis in drain(batch.analyses, cancel, waited):
+                        ticker = analysis.ticker
+                        frame = batch.data[ticker]
+                        try:
+                            write_price_bars(session, ticker, self.settings.price_interval, frame)
+                            latest_bar = frame.iloc[-1]
+                            update_open_trades_for_ticker(
                                 session,
-                                ticker=ticker.removesuffix(".SA"),
-                                price=float(latest_bar["close"]),
-                                variation_day=variation_day,
-                                variation_7d=variation_7d,
-                                variation_30d=variation_30d,
-                                updated_at=datetime.utcnow(),
+                                ticker,
+                                high=float(latest_bar["high"]),
+                                low=float(latest_bar["low"]),
+                                close=float(latest_bar["close"]),
+                                candle_timestamp=latest_bar.name.to_pydatetime(),
                             )
 
-                        computation = self.metric_engine.compute(
-                            frame,
-                            benchmark_prices=benchmark_frame,
-                        )
-                        if computation is None:
-                            logger.debug("Skipping ticker with insufficient history", ticker=ticker)
-                            continue
-
-                        # Injeta fundamentos (DY/P/L) como metricas, para pesarem no
-                        # sinal/score e aparecerem na matriz. Sao valores pontuais do
-                        # BRAPI (nao vem do frame de precos).
-                        fund = fundamentals.get(ticker) or {}
-                        dy_value = fund.get("dividend_yield")
-                        if dy_value is not None:
-                            computation.metrics["dividend_yield"] = dy_value
-                            computation.labels["dividend_yield"] = "Dividend Yield"
-                        pe_value = fund.get("price_earnings")
-                        if pe_value is not None and pe_value > 0:
-                            computation.metrics["price_earnings"] = pe_value
-                            computation.labels["price_earnings"] = "P/L"
-
-                        upsert_metrics(
-                            session,
-                            ticker,
-                            self.settings.price_interval,
-                            self.metric_engine.to_rows(ticker, computation),
-                        )
+                            if can_sync_backend_assets:
+                                closes = [float(value) for value in frame["close"].tolist() if value is not None]
+                                variation_day = 0.0
+                                variation_7d = 0.0
+                                variation_30d = 0.0
+                                if len(closes) >= 2 and closes[-2] != 0:
+                                    variation_day = ((closes[-1] / closes[-2]) - 1.0) * 100.0
+                                if len(closes) >= 8 and closes[-8] != 0:
+                                    variation_7d = ((closes[-1] / closes[-8]) - 1.0) * 100.0
+                                if len(closes) >= 31 and closes[-31] != 0:
+                                    variation_30d = ((closes[-1] / closes[-31]) - 1.0) * 100.0
+                                update_backend_asset_market_snapshot(
+                                    session,
+                                    ticker=ticker.removesuffix(".SA"),
+                                    price=float(latest_bar["close"]),
+                                    variation_day=variation_day,
+                                    variation_7d=variation_7d,
+                                    variation_30d=variation_30d,
+                                    updated_at=datetime.utcnow(),
+                                )
+
+                            if analysis.state is not None:
+                                batch.saved_states[ticker] = analysis.state
+                            if analysis.error is not None:
+                                logger.error("Ticker processing failed", ticker=ticker, error=analysis.error)
+                                continue
+                            computation = analysis.computation
+                            if computation is None:
+                                logger.debug("Skipping ticker with insufficient history", ticker=ticker)
+                                continue
 
-                        decision = self.signal_engine.evaluate(ticker, computation)
-                        if decision is not None:
-                            upsert_signal(
+                            upsert_metrics(
                                 session,
-                                ticker=decision.ticker,
-                                timestamp=decision.timestamp,
-                                price=decision.price,
-                                score=decision.score,
-                                metrics_triggered=decision.metrics_triggered,
+                                ticker,
+                                self.settings.price_interval,
+                                self.metric_engine.to_rows(ticker, computation),
                             )
-                            triggered += 1
-                            if (
-                                self.settings.alerts_enabled
-                                and decision.score >= self.settings.alert_min_score
-                                and alerted_this_scan < self.settings.alert_max_per_scan
-                                and self._maybe_alert(decision)
-                            ):
-                                alerted_this_scan += 1
-
-                        # Sinal de SAIDA para posicoes abertas (perda de tendencia).
-                        if (
-                            self.settings.alerts_enabled
-                            and ticker.removesuffix(".SA").upper() in open_trade_tickers
-                        ):
-                            exit_reason = self._exit_signal(computation)
-                            if exit_reason:
-                                self._maybe_exit_alert(ticker, exit_reason, computation)
-                        processed += 1
-                    except Exception as exc:
-                        logger.exception("Ticker processing failed", ticker=ticker, error=str(exc))
 
+                            decision = analysis.decision
+                            if decision is not None:
+                                upsert_signal(
+                                    session,
+                                    ticker=decision.ticker,
+                                    timestamp=decision.timestamp,
+                                    price=decision.price,
+                                    score=decision.score,
+                                    metrics_triggered=decision.metrics_triggered,
+                                )
+                                triggered += 1
+                                if (
+                                    self.settings.alerts_enabled
+                                    and decision.score >= self.settings.alert_min_score
+                                    and alerted_this_scan < self.settings.alert_max_per_scan
+                                    and self._maybe_alert(decision)
+                                ):
+                                    alerted_this_scan += 1
+
+                            # Sinal de SAIDA para posicoes abertas (perda de tendencia).
+                            if analysis.exit_reason:
+                                self._maybe_exit_alert(ticker, analysis.exit_reason, computation)
+                            processed += 1
+                        except Exception as exc:
+                            logger.exception("Ticker processing failed", ticker=ticker, error=str(exc))
+                self._save_indicator_states(batch.saved_states, batch.rebuilt)
+                timings.add("write", perf_counter() - write_started - waited.seconds, batches=1)
+        finally:
+            cancel.set()
+            for stage in stages:
+                stage.join()
+            timings.finish()
+
+        if requested_symbols is None:
+            self._prune_metric_history()
         logger.info(
             "Market scan completed",
             tickers_loaded=len(tickers),
@@ -612,6 +607,336 @@ class MarketScannerDaemon:
             signals_triggered=triggered,
         )
 
+    def _fetch_stage(
+        self,
+        tickers: list[str],
+        benchmark_frame: pd.DataFrame | None,
+        out_queue: Queue,
+        cancel: Event,
+        timings: StageTimings,
+    ) -> None:
+        """Baixa os lotes a frente do compute; a fila limitada segura o prefetch."""
+
+        try:
+            for chunk in self._chunks(tickers, self.settings.download_batch_size):
+                if cancel.is_set():
+                    return
+                started = perf_counter()
+                batch = ScanBatch(tickers=chunk)
+                states = self._load_indicator_states(chunk)
+                try:
+                    batch.data = self._download_batch_prices(chunk, states)
+                    batch.missing = sorted(set(chunk) - set(batch.data.keys()))
+                    if batch.missing:
+                        logger.warning(
+                            "Some official B3 tickers were not returned by BRAPI",
+                            missing_count=len(batch.missing),
+                            sample_missing=batch.missing[:10],
+                        )
+                except Exception as exc:
+                    logger.exception("Batch download failed", error=str(exc), batch_size=len(chunk))
+                    batch.download_failed = True
+                if not batch.download_failed:
+                    batch.computations, batch.saved_states, batch.rebuilt = self._advance_indicator_states(
+                        batch.data,
+                        benchmark_frame,
+                        states,
+                    )
+                timings.add("fetch", perf_counter() - started, batches=1)
+                if not put(out_queue, batch, cancel):
+                    return
+        except Exception as exc:  # noqa: BLE001
+            logger.exception("Scan fetch stage failed", error=str(exc))
+        finally:
+            put(out_queue, END, cancel)
+
+    def _compute_stage(
+        self,
+        in_queue: Queue,
+        out_queue: Queue,
+        benchmark_frame: pd.DataFrame | None,
+        fundamentals: dict[str, dict[str, float | None]],
+        open_trade_tickers: set[str],
+        cancel: Event,
+        timings: StageTimings,
+    ) -> None:
+        """Analisa cada lote e repassa os resultados ao writer conforme saem."""
+
+        try:
+            for batch in drain(in_queue, cancel):
+                # O writer abre a sessao do lote enquanto as analises chegam.
+                if not put(out_queue, batch, cancel):
+                    return
+                try:
+                    if batch.download_failed:
+                        continue
+                    analyses = self._analyze_batch(
+                        batch.data,
+                        benchmark_frame,
+                        batch.computations,
+                        fundamentals,
+                        open_trade_tickers,
+                    )
+                    while not cancel.is_set():
+                        started = perf_counter()
+                        analysis = next(analyses, END)
+                        timings.add("compute", perf_counter() - started)
+                        if analysis is END or not put(batch.analyses, analysis, cancel):
+                            break
+                finally:
+                    batch.analyses.put(END)
+                    timings.add("compute", 0.0, batches=1)
+        except Exception as exc:  # noqa: BLE001
+            logger.exception("Scan compute stage failed", error=str(exc))
+        finally:
+            put(out_queue, END, cancel)
+
+    def _prune_metric_history(self) -> None:
+        try:
+            with session_scope(self.session_factory) as session:
+                deleted = prune_metric_history(
+                    session,
+                    self.settings.price_interval,
+                    daily_days=self.settings.metric_history_daily_days,
+                    keep_days=self.settings.metric_history_days,
+                )
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("Metric history pruning failed", error=str(exc))
+            return
+        if deleted:
+            logger.info("Pruned metric history", rows=deleted)
+
+    def _load_indicator_states(self, batch: list[str]) -> dict[str, StreamingIndicators]:
+        if not self.settings.incremental_metrics_enabled:
+            return {}
+        try:
+            with session_scope(self.session_factory) as session:
+                payloads = load_indicator_states(session, batch, self.settings.price_interval)
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("Indicator state load failed; recomputing batch", error=str(exc))
+            return {}
+        states: dict[str, StreamingIndicators] = {}
+        for ticker, payload in payloads.items():
+            try:
+                state = StreamingIndicators.from_payload(self.settings.metrics, payload)
+            except (KeyError, TypeError, ValueError):
+                state = None
+            if state is not None:
+                states[ticker] = state
+        return states
+
+    def _load_stored_history(self, tickers: list[str]) -> dict[str, pd.DataFrame]:
+        """Bars from price_bars that already cover ``price_period`` for ``tickers``."""
+
+        since = price_period_start(self.settings.price_period)
+        if not tickers or since is None:
+            return {}
+        try:
+            with session_scope(self.session_factory) as session:
+                frames = load_price_frames(session, tickers, self.settings.price_interval, since=since)
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("Stored price history load failed; downloading full history", error=str(exc))
+            return {}
+        # Folga de uma semana para fim de semana/feriado no inicio da janela.
+        covered_until = since + timedelta(days=7)
+        return {
+            ticker: frame
+            for ticker, frame in frames.items()
+            if len(frame.index) >= self.settings.metrics.sma_long_length and frame.index[0] <= covered_until
+        }
+
+    def _download_batch_prices(
+        self,
+        batch: list[str],
+        states: dict[str, StreamingIndicators],
+    ) -> dict[str, pd.DataFrame]:
+        """Tickers with indicator state or a stored history only need recent bars.
+
+        Stored histories are extended with the recent download; a ticker whose
+        history was re-adjusted by the provider, and any ticker without
+        stored bars, gets the full history.
+        """
+
+        data: dict[str, pd.DataFrame] = {}
+        stored = self._load_stored_history([ticker for ticker in batch if ticker not in states])
+        recent = [ticker for ticker in batch if ticker in states or ticker in stored]
+        if recent:
+            data.update(
+                self.brapi_client.download_batch(
+                    recent,
+                    period=self.settings.incremental_price_period,
+                    interval=self.settings.price_interval,
+                )
+            )
+        restated: list[str] = []
+        for ticker, history in stored.items():
+            frame = data.get(ticker)
+            if frame is None:
+                continue
+            merged = merge_recent_bars(history, frame)
+            if merged is None:
+                restated.append(ticker)
+                del data[ticker]
+            else:
+                data[ticker] = merged
+        full_history = [ticker for ticker in batch if ticker not in states and ticker not in stored] + restated
+        if full_history:
+            data.update(
+                self.brapi_client.download_batch(
+                    full_history,
+                    period=self.settings.price_period,
+                    interval=self.settings.price_interval,
+                )
+            )
+        return data
+
+    def _advance_indicator_states(
+        self,
+        data: dict[str, pd.DataFrame],
+        benchmark_frame: pd.DataFrame | None,
+        states: dict[str, StreamingIndicators],
+    ) -> tuple[dict[str, MetricComputation], dict[str, dict[str, object]], list[str]]:
+        """Avanca o estado incremental com as barras novas do lote.
+
+        Tickers cujo estado nao continua (gap, barra reescrita) baixam o
+        historico completo para recalculo; o estado novo sai da analise.
+        """
+
+        computations: dict[str, MetricComputation] = {}
+        saved: dict[str, dict[str, object]] = {}
+        rebuild: list[str] = []
+        for ticker, state in states.items():
+            frame = data.get(ticker)
+            if frame is None:
+                continue
+            try:
+                computation = self.metric_engine.compute_streaming(
+                    frame,
+                    state,
+                    benchmark_prices=benchmark_frame,
+                )
+            except Exception as exc:  # noqa: BLE001
+                logger.warning("Incremental metrics failed; recomputing", ticker=ticker, error=str(exc))
+                computation = None
+            if computation is None:
+                rebuild.append(ticker)
+                continue
+            computations[ticker] = computation
+            saved[ticker] = state.to_payload()
+        if rebuild:
+            logger.info("Rebuilding indicator state from full history", tickers=len(rebuild))
+            try:
+                data.update(
+                    self.brapi_client.download_batch(
+                        rebuild,
+                        period=self.settings.price_period,
+                        interval=self.settings.price_interval,
+                    )
+                )
+            except Exception as exc:  # noqa: BLE001
+                logger.warning("Full history download failed", error=str(exc), tickers=len(rebuild))
+        return computations, saved, rebuild
+
+    def _save_indicator_states(self, saved: dict[str, dict[str, object]], rebuilt: list[str]) -> None:
+        if not self.settings.incremental_metrics_enabled or not (saved or rebuilt):
+            return
+        try:
+            with session_scope(self.session_factory) as session:
+                delete_indicator_states(
+                    session,
+                    [ticker for ticker in rebuilt if ticker not in saved],
+                    self.settings.price_interval,
+                )
+                upsert_indicator_states(
+                    session,
+                    self.settings.price_interval,
+                    {
+                        ticker: (pd.Timestamp(payload["last_timestamp"]).to_pydatetime(), payload)
+                        for ticker, payload in saved.items()
+                    },
+                )
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("Indicator state save failed", error=str(exc))
+
+    def _analyze_batch(
+        self,
+        data: dict[str, pd.DataFrame],
+        benchmark_frame: pd.DataFrame | None,
+        computations: dict[str, MetricComputation],
+        fundamentals: dict[str, dict[str, float | None]],
+        open_trade_tickers: set[str],
+    ) -> Iterator[TickerAnalysis]:
+        """Metricas e sinais do lote, entregues ao writer conforme ficam prontos.
+
+        Tickers ja calculados pelo estado incremental terminam inline (so falta
+        o sinal). O recalculo completo vai para o pool de processos quando
+        SCAN_EXECUTOR=process; um worker que falha cai para o caminho inline.
+        """
+
+        streamed = {ticker: data[ticker] for ticker in computations if ticker in data}
+        if streamed:
+            yield from self.batch_analyzer.analyze(
+                streamed,
+                benchmark_frame,
+                fundamentals,
+                open_trade_tickers,
+                computations=computations,
+            )
+        pending = {ticker: frame for ticker, frame in data.items() if ticker not in computations}
+        pool = self._analysis_pool()
+        if pool is None or len(pending) < 2:
+            yield from self.batch_analyzer.analyze(pending, benchmark_frame, fundamentals, open_trade_tickers)
+            return
+
+        tickers = list(pending)
+        chunk_size = max(1, -(-len(tickers) // self._scan_workers()))
+        futures = {}
+        for chunk in self._chunks(tickers, chunk_size):
+            frames = {ticker: pending[ticker] for ticker in chunk}
+            future = pool.submit(
+                analyze_in_worker,
+                frames,
+                benchmark_frame,
+                {ticker: fundamentals[ticker] for ticker in chunk if ticker in fundamentals},
+                open_trade_tickers,
+            )
+            futures[future] = frames
+        for future in as_completed(futures):
+            frames = futures[future]
+            try:
+                results = future.result()
+            except Exception as exc:  # noqa: BLE001
+                logger.warning("Scan worker failed; analyzing chunk inline", error=str(exc), tickers=len(frames))
+                if isinstance(exc, BrokenProcessPool):
+                    self._shutdown_analysis_pool()
+                results = self.batch_analyzer.analyze(frames, benchmark_frame, fundamentals, open_trade_tickers)
+            yield from results
+
+    def _scan_workers(self) -> int:
+        return max(1, self.settings.scan_workers or os.cpu_count() or 1)
+
+    def _analysis_pool(self) -> ProcessPoolExecutor | None:
+        if self.settings.scan_executor != "process":
+            return None
+        with self._scan_pool_lock:
+            if self._scan_pool is None:
+                workers = self._scan_workers()
+                # spawn: o daemon ja tem threads (APScheduler/API) quando o pool sobe.
+                self._scan_pool = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=init_worker,
+                    initargs=(self.settings,),
+                )
+                logger.info("Scan process pool started", workers=workers)
+            return self._scan_pool
+
+    def _shutdown_analysis_pool(self) -> None:
+        with self._scan_pool_lock:
+            pool, self._scan_pool = self._scan_pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
     def _merge_backend_assets_catalog(self, catalog: list[B3ListedTicker]) -> list[B3ListedTicker]:
         """Merge BR tickers already registered by backend assets into scanner universe."""
 
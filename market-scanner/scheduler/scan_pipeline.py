@@ -0,0 +1,116 @@
+"""Plumbing for the pipelined market scan (fetch -> compute -> write).
+
+Stages run in their own threads and hand batches over bounded queues, so a
+slow stage applies backpressure instead of letting prefetched frames pile
+up. Every blocking call polls a shared cancel event: when the writer stops
+(error or shutdown) the upstream stages unblock and exit.
+"""
+
+from __future__ import annotations
+
+import queue
+from dataclasses import dataclass, field
+from threading import Event, Lock
+from time import perf_counter
+from typing import TYPE_CHECKING, Iterator
+
+import pandas as pd
+
+if TYPE_CHECKING:
+    from metrics.metric_engine import MetricComputation
+
+
+END = object()
+_POLL_SECONDS = 0.2
+
+
+@dataclass(slots=True)
+class ScanBatch:
+    """One download batch travelling through the pipeline."""
+
+    tickers: list[str]
+    data: dict[str, pd.DataFrame] = field(default_factory=dict)
+    missing: list[str] = field(default_factory=list)
+    download_failed: bool = False
+    computations: dict[str, MetricComputation] = field(default_factory=dict)
+    saved_states: dict[str, dict[str, object]] = field(default_factory=dict)
+    rebuilt: list[str] = field(default_factory=list)
+    # Filled by the compute stage while the writer consumes it; ends with END.
+    analyses: queue.Queue = field(default_factory=queue.Queue)
+
+
+class WaitClock:
+    """Time a consumer spent blocked on its input queue."""
+
+    __slots__ = ("seconds",)
+
+    def __init__(self) -> None:
+        self.seconds = 0.0
+
+
+class StageTimings:
+    """Thread-safe busy time per stage for one scan run."""
+
+    STAGES = ("fetch", "compute", "write")
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self._started = perf_counter()
+        self._finished: float | None = None
+        self._seconds = {stage: 0.0 for stage in self.STAGES}
+        self._batches = {stage: 0 for stage in self.STAGES}
+
+    def add(self, stage: str, seconds: float, batches: int = 0) -> None:
+        with self._lock:
+            self._seconds[stage] += max(0.0, seconds)
+            self._batches[stage] += batches
+
+    def finish(self) -> None:
+        with self._lock:
+            self._finished = perf_counter()
+
+    def snapshot(self) -> dict[str, object]:
+        with self._lock:
+            wall = (self._finished or perf_counter()) - self._started
+            busy = sum(self._seconds.values())
+            payload: dict[str, object] = {
+                "finished": self._finished is not None,
+                "wall_seconds": round(wall, 3),
+                # > 1.0 means stages overlapped; 1.0 is a fully serial scan.
+                "overlap_ratio": round(busy / wall, 3) if wall > 0 else 0.0,
+            }
+            for stage in self.STAGES:
+                payload[f"{stage}_seconds"] = round(self._seconds[stage], 3)
+                payload[f"{stage}_batches"] = self._batches[stage]
+            return payload
+
+
+def put(target: queue.Queue, item: object, cancel: Event) -> bool:
+    """Blocking put that gives up once the pipeline is cancelled."""
+
+    while not cancel.is_set():
+        try:
+            target.put(item, timeout=_POLL_SECONDS)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def drain(source: queue.Queue, cancel: Event, clock: WaitClock | None = None) -> Iterator:
+    """Yield items until END (or cancellation), optionally timing the waits."""
+
+    while True:
+        started = perf_counter()
+        item = END
+        while not cancel.is_set():
+            try:
+                item = source.get(timeout=_POLL_SECONDS)
+                break
+            except queue.Empty:
+                continue
+        if clock is not None:
+            clock.seconds += perf_counter() - started
+        if item is END:
+            return
+        yield item
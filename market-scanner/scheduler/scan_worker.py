@@ -0,0 +1,160 @@
+"""Scan analysis stage: metrics and signals for a batch of price frames.
+
+Everything here is free of I/O so it can run inline or inside a worker
+process. The daemon keeps downloads and every database write in its own
+thread and feeds the `TickerAnalysis` results to a single writer.
+"""
+
+from __future__ import annotations
+
+import traceback
+from dataclasses import dataclass
+
+import pandas as pd
+from loguru import logger
+
+from config.settings import AppSettings
+from metrics.metric_engine import MetricComputation, MetricEngine
+from signals.signal_engine import SignalDecision, SignalEngine
+
+
+@dataclass(slots=True)
+class TickerAnalysis:
+    """Outcome of analyzing one ticker; ``error`` isolates per-ticker failures."""
+
+    ticker: str
+    computation: MetricComputation | None = None
+    decision: SignalDecision | None = None
+    exit_reason: str | None = None
+    state: dict[str, object] | None = None
+    error: str | None = None
+
+
+def exit_signal(computation: MetricComputation) -> str | None:
+    """Perda de tendencia: fechou abaixo da SMA200 (cruzando pra baixo) ou
+    rompeu a minima de 20 dias. Usado so para posicoes abertas."""
+    frame = computation.frame
+    try:
+        close = frame["close"]
+    except Exception:  # noqa: BLE001
+        return None
+    reasons: list[str] = []
+    if "sma_200" in frame.columns and len(close) >= 2:
+        sma = frame["sma_200"]
+        try:
+            if close.iloc[-1] < sma.iloc[-1] and close.iloc[-2] >= sma.iloc[-2]:
+                reasons.append("perdeu a SMA200")
+        except Exception:  # noqa: BLE001
+            pass
+    if "low" in frame.columns and len(frame) >= 21:
+        try:
+            recent_low = float(frame["low"].iloc[-21:-1].min())
+            if float(close.iloc[-1]) < recent_low:
+                reasons.append("rompeu a minima de 20 dias")
+        except Exception:  # noqa: BLE001
+            pass
+    return " + ".join(reasons) if reasons else None
+
+
+class BatchAnalyzer:
+    """Compute metrics, streaming state and signal decisions for a batch."""
+
+    def __init__(
+        self,
+        settings: AppSettings,
+        metric_engine: MetricEngine | None = None,
+        signal_engine: SignalEngine | None = None,
+    ) -> None:
+        self.settings = settings
+        self.metric_engine = metric_engine or MetricEngine(settings)
+        self.signal_engine = signal_engine or SignalEngine(settings)
+
+    def analyze(
+        self,
+        frames: dict[str, pd.DataFrame],
+        benchmark_frame: pd.DataFrame | None,
+        fundamentals: dict[str, dict[str, float | None]],
+        open_trade_tickers: set[str],
+        computations: dict[str, MetricComputation] | None = None,
+    ) -> list[TickerAnalysis]:
+        """Analyze every frame; ``computations`` holds tickers already computed upstream."""
+
+        computations = dict(computations or {})
+        pending = {ticker: frame for ticker, frame in frames.items() if ticker not in computations}
+        if pending and self.settings.metric_panel_enabled:
+            try:
+                panel = self.metric_engine.compute_many(pending, benchmark_prices=benchmark_frame)
+                computations.update(
+                    {ticker: computation for ticker, computation in panel.items() if computation is not None}
+                )
+            except Exception as exc:  # noqa: BLE001
+                logger.warning(
+                    "Panel metric computation failed; falling back to per-ticker",
+                    error=str(exc),
+                    batch_size=len(pending),
+                )
+
+        results: list[TickerAnalysis] = []
+        for ticker, frame in frames.items():
+            analysis = TickerAnalysis(ticker=ticker)
+            try:
+                computation = computations.get(ticker)
+                if computation is None:
+                    computation = self.metric_engine.compute(frame, benchmark_prices=benchmark_frame)
+                if computation is not None:
+                    if ticker in pending and self.settings.incremental_metrics_enabled:
+                        state = self.metric_engine.build_streaming_state(frame, benchmark_prices=benchmark_frame)
+                        analysis.state = state.to_payload() if state is not None else None
+                    self._apply_fundamentals(computation, fundamentals.get(ticker) or {})
+                    analysis.computation = computation
+                    analysis.decision = self.signal_engine.evaluate(ticker, computation)
+                    if (
+                        self.settings.alerts_enabled
+                        and ticker.removesuffix(".SA").upper() in open_trade_tickers
+                    ):
+                        analysis.exit_reason = exit_signal(computation)
+            except Exception:  # noqa: BLE001
+                analysis.error = traceback.format_exc(limit=5)
+            results.append(analysis)
+        return results
+
+    def _apply_fundamentals(self, computation: MetricComputation, fund: dict[str, float | None]) -> None:
+        # Injeta fundamentos (DY/P/L) como metricas, para pesarem no
+        # sinal/score e aparecerem na matriz. Sao valores pontuais do
+        # BRAPI (nao vem do frame de precos).
+        dy_value = fund.get("dividend_yield")
+        if dy_value is not None:
+            computation.metrics["dividend_yield"] = dy_value
+            computation.labels["dividend_yield"] = "Dividend Yield"
+        pe_value = fund.get("price_earnings")
+        if pe_value is not None and pe_value > 0:
+            computation.metrics["price_earnings"] = pe_value
+            computation.labels["price_earnings"] = "P/L"
+
+
+_WORKER_ANALYZER: BatchAnalyzer | None = None
+
+
+def init_worker(settings: AppSettings) -> None:
+    """Process-pool initializer: build the engines once per worker."""
+
+    global _WORKER_ANALYZER
+    _WORKER_ANALYZER = BatchAnalyzer(settings)
+
+
+def analyze_in_worker(
+    frames: dict[str, pd.DataFrame],
+    benchmark_frame: pd.DataFrame | None,
+    fundamentals: dict[str, dict[str, float | None]],
+    open_trade_tickers: set[str],
+) -> list[TickerAnalysis]:
+    """Worker entry point; only the tail of each decorated frame is sent back."""
+
+    if _WORKER_ANALYZER is None:
+        raise RuntimeError("scan worker was not initialized")
+    results = _WORKER_ANALYZER.analyze(frames, benchmark_frame, fundamentals, open_trade_tickers)
+    for analysis in results:
+        if analysis.computation is not None:
+            # exit_signal already ran here; the writer only needs the latest bars.
+            analysis.computation.frame = analysis.computation.frame.iloc[-2:]
+    return results
@@ -0,0 +1,120 @@
+"""Snapshot latest_metrics e retencao do historico (database/db.py).
+
+Confere que o snapshot acompanha `upsert_metrics` na mesma transacao, que
+bancos antigos sao preenchidos na migracao e que a retencao reduz o
+historico a uma linha por semana e apaga o que passou do limite. Uso:
+
+    python tests/test_metric_snapshot.py
+"""
+
+import sqlite3
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy import func, select  # noqa: E402
+
+from config.settings import AppSettings  # noqa: E402
+from database.db import (  # noqa: E402
+    create_session_factory,
+    get_ticker_details,
+    load_latest_metrics,
+    prune_metric_history,
+    session_scope,
+    upsert_metrics,
+)
+from database.models import Metric  # noqa: E402
+
+
+def _session_factory(directory: str):
+    settings = AppSettings()
+    settings.database_url = f"sqlite:///{directory}/scanner.db"
+    return create_session_factory(settings)
+
+
+def _rows(timestamp: datetime, **values: float) -> list[dict[str, object]]:
+    return [
+        {"ticker": "ABCD3.SA", "timestamp": timestamp, "metric_name": name, "metric_value": value}
+        for name, value in values.items()
+    ]
+
+
+def test_snapshot_follows_latest_upsert():
+    day = datetime(2025, 3, 10, 3)
+    with tempfile.TemporaryDirectory() as directory:
+        factory = _session_factory(directory)
+        with session_scope(factory) as session:
+            upsert_metrics(session, "ABCD3.SA", "1d", _rows(day, rsi=41.0, atr_percent=2.5))
+            upsert_metrics(session, "ABCD3.SA", "1d", _rows(day + timedelta(days=1), rsi=44.0))
+        with session_scope(factory) as session:
+            # Reprocessar uma barra antiga nao volta o snapshot.
+            upsert_metrics(session, "ABCD3.SA", "1d", _rows(day, rsi=40.0, atr_percent=2.4))
+        with session_scope(factory) as session:
+            latest = load_latest_metrics(session, ["ABCD3.SA", "WXYZ4.SA"])
+            details = get_ticker_details(session, "ABCD3.SA")
+        assert list(latest) == ["ABCD3.SA"]
+        assert latest["ABCD3.SA"] == (day + timedelta(days=1), {"rsi": 44.0})
+        assert details["latest_metrics"] == {"rsi": 44.0}
+
+
+def test_existing_history_is_backfilled():
+    with tempfile.TemporaryDirectory() as directory:
+        connection = sqlite3.connect(f"{directory}/scanner.db")
+        connection.execute(
+            "CREATE TABLE metrics (id INTEGER PRIMARY KEY, ticker VARCHAR(32), timestamp DATETIME, "
+            "interval VARCHAR(16), metric_name VARCHAR(64), metric_value FLOAT, "
+            "CONSTRAINT uq_metrics_ticker_ts_int_name UNIQUE (ticker, timestamp, interval, metric_name))"
+        )
+        connection.executemany(
+            "INSERT INTO metrics (ticker, timestamp, interval, metric_name, metric_value) VALUES (?, ?, '1d', ?, ?)",
+            [
+                ("ABCD3.SA", "2025-03-10 03:00:00.000000", "rsi", 30.0),
+                ("ABCD3.SA", "2025-03-11 03:00:00.000000", "rsi", 35.0),
+                ("ABCD3.SA", "2025-03-11 03:00:00.000000", "atr_percent", 1.5),
+            ],
+        )
+        connection.commit()
+        connection.close()
+
+        factory = _session_factory(directory)
+        with session_scope(factory) as session:
+            latest = load_latest_metrics(session, ["ABCD3.SA"])
+        assert latest["ABCD3.SA"] == (datetime(2025, 3, 11, 3), {"rsi": 35.0, "atr_percent": 1.5})
+
+
+def test_retention_downsamples_to_weekly_and_drops_old_rows():
+    now = datetime(2025, 6, 30, 12)
+    start = now - timedelta(days=200)
+    with tempfile.TemporaryDirectory() as directory:
+        factory = _session_factory(directory)
+        with session_scope(factory) as session:
+            for offset in range(200):
+                upsert_metrics(session, "ABCD3.SA", "1d", _rows(start + timedelta(days=offset), rsi=50.0, adx=20.0))
+        with session_scope(factory) as session:
+            deleted = prune_metric_history(session, "1d", daily_days=30, keep_days=120, now=now)
+        with session_scope(factory) as session:
+            timestamps = sorted(session.scalars(select(Metric.timestamp).distinct()).all())
+            total = session.scalar(select(func.count()).select_from(Metric))
+            latest = load_latest_metrics(session, ["ABCD3.SA"])
+        assert deleted == 400 - total
+        assert timestamps[0] >= now - timedelta(days=120)
+        daily = [stamp for stamp in timestamps if stamp >= now - timedelta(days=30)]
+        weekly = [stamp for stamp in timestamps if stamp < now - timedelta(days=30)]
+        assert len(daily) == 30
+        assert len({stamp.strftime("%Y-%W") for stamp in weekly}) == len(weekly)
+        assert 12 <= len(weekly) <= 14
+        assert latest["ABCD3.SA"][0] == start + timedelta(days=199)
+
+
+def main() -> None:
+    for name, test in sorted(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"ok {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""Estado incremental dos indicadores (metrics/streaming.py).
+
+Os acumuladores sao comparados com pandas barra a barra; o caminho completo
+(`MetricEngine.compute_streaming`) e comparado com `compute` sobre a mesma
+janela deslizante que o download de 1 ano veria. As medias de Wilder carregam
+o historico inteiro, entao RSI/ATR/ADX toleram a diferenca do peso das barras
+que sairam da janela. Uso:
+
+    python tests/test_metric_streaming.py
+"""
+
+import json
+import math
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from config.settings import AppSettings, MetricSettings  # noqa: E402
+from metrics.streaming import RollingMax, RollingWindow, StreamingIndicators, WilderAverage  # noqa: E402
+
+TOLERANCE = 1e-9
+WILDER_TOLERANCE = 1e-6
+WILDER_METRICS = {"rsi", "atr_percent", "trend_strength"}
+
+
+def _series(length: int = 300, seed: int = 5) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return 20.0 * np.exp(np.cumsum(rng.normal(0.0, 0.02, length)))
+
+
+def _synthetic_frame(bars: int, seed: int = 9) -> tuple[pd.DataFrame, pd.DataFrame]:
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range("2024-01-02", periods=bars, tz="America/Sao_Paulo")
+    close = _series(bars, seed)
+    spread = np.abs(rng.normal(0.0, 0.01, bars)) * close
+    frame = pd.DataFrame(
+        {
+            "open": close * (1.0 + rng.normal(0.0, 0.005, bars)),
+            "high": close + spread,
+            "low": close - spread,
+            "close": close,
+            "volume": rng.integers(1_000, 5_000_000, bars).astype(float),
+        },
+        index=dates,
+    )
+    benchmark = pd.DataFrame({"close": 120_000.0 * np.exp(np.cumsum(rng.normal(0.0, 0.01, bars)))}, index=dates)
+    return frame, benchmark.drop(dates[bars // 2])
+
+
+def test_wilder_average_matches_pandas_ta_rma():
+    values = _series()
+    values[:3] = np.nan
+    values[40] = np.nan
+    rma = pd.Series(values).ewm(alpha=1.0 / 14, adjust=False).mean().to_numpy()
+    # presma do ta.atr: as 14 primeiras barras viram a media delas na 14a.
+    seeded = values.copy()
+    seeded[13] = np.nanmean(values[:14])
+    seeded[:13] = np.nan
+    presma = pd.Series(seeded).ewm(alpha=1.0 / 14, adjust=False).mean().to_numpy()
+    for average, expected in ((WilderAverage(14), rma), (WilderAverage(14, presma=True), presma)):
+        for position, (value, target) in enumerate(zip(values, expected)):
+            peeked = average.value_with(value)
+            average.push(value)
+            if math.isnan(target):
+                assert math.isnan(peeked), position
+            else:
+                assert abs(peeked - target) <= TOLERANCE * abs(target), position
+            if position == 10:
+                # Reload no meio da semente, como entre dois scans.
+                payload = json.loads(json.dumps(average.to_payload()))
+                average = WilderAverage(14, *payload)
+
+
+def test_rolling_window_and_max_match_pandas():
+    values = pd.Series(_series())
+    means = values.rolling(20).mean().to_numpy()
+    stds = values.rolling(20).std(ddof=0).to_numpy()
+    maxima = values.rolling(60, min_periods=42).max().to_numpy()
+    window = RollingWindow(20)
+    highest = RollingMax(60, min_periods=42)
+    for position, value in enumerate(values):
+        for actual, target in (
+            (window.mean_with(value), means[position]),
+            (window.std_with(value, ddof=0), stds[position]),
+            (highest.max_with(value), maxima[position]),
+        ):
+            if math.isnan(target):
+                assert math.isnan(actual)
+            else:
+                assert abs(actual - target) <= TOLERANCE * max(1.0, abs(target))
+        window.push(value)
+        highest.push(value)
+        if position % 50 == 0:
+            # Reload como a cada scan: as somas sao refeitas a partir da janela.
+            window = RollingWindow(20, window.values)
+            highest = RollingMax.from_payload(60, 42, json.loads(json.dumps(highest.to_payload())))
+
+
+def test_payload_rejects_other_settings():
+    state = StreamingIndicators(MetricSettings(), horizon=250)
+    payload = json.loads(json.dumps(state.to_payload()))
+    assert StreamingIndicators.from_payload(MetricSettings(), payload) is not None
+    assert StreamingIndicators.from_payload(MetricSettings(rsi_length=10), payload) is None
+
+
+def test_streaming_matches_full_recompute_on_sliding_window():
+    from metrics.metric_engine import MetricEngine
+
+    engine = MetricEngine(AppSettings())
+    full, benchmark = _synthetic_frame(330)
+    horizon = 250
+    state = engine.build_streaming_state(full.iloc[:horizon], benchmark_prices=benchmark)
+    assert state is not None
+    for end in range(horizon, len(full.index) + 1):
+        window = full.iloc[end - horizon : end]
+        payload = json.loads(json.dumps(state.to_payload()))
+        state = StreamingIndicators.from_payload(engine.settings.metrics, payload)
+
+        # Revisao intraday do candle atual nao altera o estado salvo.
+        revised = window.copy()
+        revised.iloc[-1, revised.columns.get_loc("close")] *= 0.99
+        revised.iloc[-1, revised.columns.get_loc("low")] = revised["close"].iloc[-1]
+        for prices in (revised, window):
+            actual = engine.compute_streaming(prices.iloc[-60:], state, benchmark_prices=benchmark)
+            expected = engine.compute(prices, benchmark_prices=benchmark)
+            assert actual is not None
+            assert actual.timestamp == expected.timestamp
+            assert set(actual.metrics) == set(expected.metrics)
+            for key, value in expected.metrics.items():
+                tolerance = WILDER_TOLERANCE if key in WILDER_METRICS else TOLERANCE
+                assert abs(actual.metrics[key] - value) <= tolerance * max(1.0, abs(value)), (end, key)
+            for key, value in expected.helpers.items():
+                assert abs(actual.helpers[key] - value) <= TOLERANCE * max(1.0, abs(value)), (end, key)
+            previous_sma = expected.frame["sma_200"].iloc[-2]
+            assert abs(actual.frame["sma_200"].iloc[-2] - previous_sma) <= TOLERANCE * previous_sma
+
+
+def test_streaming_fills_every_bar_when_several_arrive_at_once():
+    from metrics.metric_engine import MetricEngine
+
+    engine = MetricEngine(AppSettings())
+    full, benchmark = _synthetic_frame(260)
+    state = engine.build_streaming_state(full.iloc[:250], benchmark_prices=benchmark)
+    # Scan atrasado: cinco candles novos desde o ultimo estado salvo.
+    actual = engine.compute_streaming(full.iloc[200:255], state, benchmark_prices=benchmark)
+    expected = engine.compute(full.iloc[:255], benchmark_prices=benchmark)
+    assert actual is not None
+    for key in ("sma_200", "sma_21"):
+        got = actual.frame[key].iloc[-6:].to_numpy()
+        want = expected.frame[key].iloc[-6:].to_numpy()
+        assert np.all(np.abs(got - want) <= TOLERANCE * np.abs(want)), key
+    assert state.last_timestamp == full.index[253]
+
+
+def test_streaming_refuses_restated_or_gapped_history():
+    from metrics.metric_engine import MetricEngine
+
+    engine = MetricEngine(AppSettings())
+    full, benchmark = _synthetic_frame(260)
+    state = engine.build_streaming_state(full.iloc[:250], benchmark_prices=benchmark)
+    before = json.dumps(state.to_payload())
+
+    restated = full.iloc[200:252].copy()
+    restated["close"] *= 0.95  # ajuste de proventos reescreve o historico
+    assert engine.compute_streaming(restated, state, benchmark_prices=benchmark) is None
+    assert engine.compute_streaming(full.iloc[251:255], state, benchmark_prices=benchmark) is None
+    assert json.dumps(state.to_payload()) == before
+
+
+def main() -> None:
+    for name, test in sorted(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"ok {name}")
+
+
+if __name__ == "__main__":
+    main()
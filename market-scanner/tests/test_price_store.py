@@ -0,0 +1,141 @@
+"""Store de precos em colunas (price_bars, database/db.py).
+
+Confere que o scan so regrava as barras que mudaram, que a leitura volta no
+mesmo formato do coletor, que o historico salvo so e estendido com o download
+recente quando a base de ajuste nao mudou e que a tabela antiga `prices` e
+migrada. Uso:
+
+    python tests/test_price_store.py
+"""
+
+import sqlite3
+import sys
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from config.settings import AppSettings  # noqa: E402
+from database.db import (  # noqa: E402
+    create_session_factory,
+    get_ticker_details,
+    load_price_frames,
+    merge_recent_bars,
+    price_period_start,
+    session_scope,
+    write_price_bars,
+)
+
+
+def _frame(bars: int = 30, seed: int = 3) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = 10.0 + np.cumsum(rng.normal(0.0, 0.2, bars))
+    index = pd.date_range("2025-01-02 03:00", periods=bars, freq="B", name="timestamp")
+    return pd.DataFrame(
+        {
+            "open": close + 0.1,
+            "high": close + 0.3,
+            "low": close - 0.3,
+            "close": close,
+            "volume": rng.integers(1_000, 100_000, bars).astype(float),
+        },
+        index=index,
+    )
+
+
+def _session_factory(directory: str):
+    settings = AppSettings()
+    settings.database_url = f"sqlite:///{directory}/scanner.db"
+    return create_session_factory(settings)
+
+
+def test_only_changed_bars_are_written():
+    frame = _frame()
+    with tempfile.TemporaryDirectory() as directory:
+        factory = _session_factory(directory)
+        with session_scope(factory) as session:
+            assert write_price_bars(session, "ABCD3.SA", "1d", frame) == len(frame)
+        with session_scope(factory) as session:
+            assert write_price_bars(session, "ABCD3.SA", "1d", frame) == 0
+
+        revised = pd.concat([frame, _frame(bars=31).iloc[-1:]])
+        revised.iloc[-2, revised.columns.get_loc("close")] += 0.5
+        with session_scope(factory) as session:
+            assert write_price_bars(session, "ABCD3.SA", "1d", revised.iloc[-10:]) == 2
+
+        with session_scope(factory) as session:
+            loaded = load_price_frames(session, ["ABCD3.SA", "WXYZ4.SA"], "1d")
+            recent = load_price_frames(session, ["ABCD3.SA"], "1d", since=frame.index[-5].to_pydatetime())
+            details = get_ticker_details(session, "ABCD3")
+        assert list(loaded) == ["ABCD3.SA"]
+        pd.testing.assert_frame_equal(loaded["ABCD3.SA"], revised, check_freq=False)
+        assert len(recent["ABCD3.SA"].index) == 6
+        assert details["latest_price"] == round(float(revised["close"].iloc[-1]), 4)
+
+
+def test_stored_history_is_extended_only_on_the_same_basis():
+    full = _frame(bars=60)
+    with tempfile.TemporaryDirectory() as directory:
+        factory = _session_factory(directory)
+        with session_scope(factory) as session:
+            write_price_bars(session, "ABCD3.SA", "1d", full.iloc[:50])
+        with session_scope(factory) as session:
+            stored = load_price_frames(session, ["ABCD3.SA"], "1d")["ABCD3.SA"]
+
+    # Download recente: sobrepoe as 10 ultimas barras salvas e traz 10 novas.
+    recent = full.iloc[40:].copy()
+    recent.iloc[9, recent.columns.get_loc("close")] += 0.7  # ultimo candle salvo era intraday
+    merged = merge_recent_bars(stored, recent)
+    pd.testing.assert_frame_equal(merged, pd.concat([full.iloc[:40], recent]), check_freq=False)
+
+    adjusted = recent.copy()
+    adjusted["close"] *= 0.98  # provento reajustou o historico do provedor
+    assert merge_recent_bars(stored, adjusted) is None
+    assert merge_recent_bars(stored, full.iloc[51:]) is None  # buraco entre o salvo e o recente
+
+
+def test_price_period_start():
+    now = datetime(2025, 6, 30, 12, 0)
+    assert price_period_start("1y", now) == datetime(2024, 6, 29, 12, 0)
+    assert price_period_start("3mo", now) == datetime(2025, 3, 29, 12, 0)
+    assert price_period_start("ytd", now) == datetime(2025, 1, 1)
+    assert price_period_start("max", now) is None
+
+
+def test_legacy_prices_table_is_migrated():
+    with tempfile.TemporaryDirectory() as directory:
+        connection = sqlite3.connect(f"{directory}/scanner.db")
+        connection.execute(
+            "CREATE TABLE prices (id INTEGER PRIMARY KEY, ticker TEXT, timestamp DATETIME, interval TEXT, "
+            "open FLOAT, high FLOAT, low FLOAT, close FLOAT, volume FLOAT)"
+        )
+        connection.execute(
+            "INSERT INTO prices (ticker, timestamp, interval, open, high, low, close, volume) "
+            "VALUES ('ABCD3.SA', '2025-01-02 03:00:00.000000', '1d', 1.0, 2.0, 0.5, 1.5, 100.0)"
+        )
+        connection.commit()
+        connection.close()
+
+        factory = _session_factory(directory)
+        with session_scope(factory) as session:
+            frames = load_price_frames(session, ["ABCD3.SA"], "1d")
+            tables = {row[0] for row in session.connection().exec_driver_sql(
+                "SELECT name FROM sqlite_master WHERE type = 'table'"
+            )}
+        assert "prices" not in tables
+        assert frames["ABCD3.SA"]["close"].tolist() == [1.5]
+
+
+def main() -> None:
+    for name, test in sorted(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"ok {name}")
+
+
+if __name__ == "__main__":
+    main()
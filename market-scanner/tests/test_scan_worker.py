@@ -0,0 +1,110 @@
+"""Estagio de analise do scan (scheduler/scan_worker.py).
+
+Confere que o pool de processos devolve o mesmo resultado do caminho inline
+e que a falha de um ticker nao derruba o resto do lote. Precisa de
+pandas-ta instalado. Uso:
+
+    python tests/test_scan_worker.py
+"""
+
+import math
+import multiprocessing
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("pandas_ta")
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from config.settings import AppSettings  # noqa: E402
+from scheduler.scan_worker import BatchAnalyzer, analyze_in_worker, init_worker  # noqa: E402
+from test_metric_panel import _synthetic_frames  # noqa: E402
+
+
+def _settings() -> AppSettings:
+    settings = AppSettings()
+    # Gate baixo para que o lote sintetico gere decisoes a comparar.
+    settings.signal_rules.min_score = 0.0
+    settings.signal_rules.min_triggered_metrics = 1
+    return settings
+
+
+def _assert_same(inline, pooled) -> None:
+    assert inline.ticker == pooled.ticker
+    assert (inline.error is None) == (pooled.error is None)
+    if inline.computation is None:
+        assert pooled.computation is None
+        return
+    assert pooled.computation.timestamp == inline.computation.timestamp
+    assert pooled.computation.metrics.keys() == inline.computation.metrics.keys()
+    for key, value in inline.computation.metrics.items():
+        assert math.isclose(pooled.computation.metrics[key], value, rel_tol=0.0, abs_tol=0.0) or (
+            math.isnan(value) and math.isnan(pooled.computation.metrics[key])
+        )
+    assert (inline.decision is None) == (pooled.decision is None)
+    if inline.decision is not None:
+        assert pooled.decision.score == inline.decision.score
+        assert pooled.decision.metrics_triggered == inline.decision.metrics_triggered
+    assert pooled.exit_reason == inline.exit_reason
+    assert pooled.state == inline.state
+
+
+def test_process_pool_matches_inline_analysis():
+    settings = _settings()
+    frames, benchmark = _synthetic_frames(tickers=8, bars=260)
+    fundamentals = {"T001.SA": {"dividend_yield": 0.08, "price_earnings": 7.0}}
+    open_trades = {"T002", "T003"}
+    inline = BatchAnalyzer(settings).analyze(frames, benchmark, fundamentals, open_trades)
+
+    tickers = list(frames)
+    chunks = [tickers[:3], tickers[3:]]
+    with ProcessPoolExecutor(
+        max_workers=2,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_worker,
+        initargs=(settings,),
+    ) as pool:
+        futures = [
+            pool.submit(
+                analyze_in_worker,
+                {ticker: frames[ticker] for ticker in chunk},
+                benchmark,
+                {ticker: fundamentals[ticker] for ticker in chunk if ticker in fundamentals},
+                open_trades,
+            )
+            for chunk in chunks
+        ]
+        pooled = [analysis for future in futures for analysis in future.result()]
+
+    assert [analysis.ticker for analysis in pooled] == tickers
+    assert any(analysis.decision is not None for analysis in inline)
+    assert inline[1].computation.metrics["dividend_yield"] == 0.08
+    for left, right in zip(inline, pooled):
+        _assert_same(left, right)
+        if right.computation is not None:
+            assert len(right.computation.frame.index) == 2
+
+
+def test_ticker_failure_is_isolated():
+    frames, benchmark = _synthetic_frames(tickers=3, bars=260)
+    frames["T001.SA"] = frames["T001.SA"].drop(columns=["volume"])
+    results = BatchAnalyzer(_settings()).analyze(frames, benchmark, {}, set())
+    by_ticker = {analysis.ticker: analysis for analysis in results}
+    assert by_ticker["T001.SA"].error is not None
+    assert by_ticker["T001.SA"].computation is None
+    for ticker in ("T000.SA", "T002.SA"):
+        assert by_ticker[ticker].error is None
+        assert by_ticker[ticker].computation is not None
+
+
+def main() -> None:
+    test_process_pool_matches_inline_analysis()
+    test_ticker_failure_is_isolated()
+    print("ok")
+
+
+if __name__ == "__main__":
+    main()